@@ -0,0 +1,591 @@
+"""
+batch.py
+
+Runs both processing stages over many point files without any GUI interaction.
+
+Each input goes through DescriptionParser.process_file (replacement phase) and then
+parser3.process_file (format phase). A manifest records the content hash of every input
+together with a fingerprint of the configuration it was processed with, so a rerun over
+an unchanged archive only pays for hashing the files.
+
+Usage:
+    python batch.py N:/jobs/2023 N:/jobs/2024 --manifest N:/jobs/manifest.jsonl
+"""
+# Standard library imports
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+# Local imports
+import columnar
+import parser3
+from compressed import (create_member_text, inner_suffix, is_gzip, is_zip,
+                        point_file_members, strip_gzip, with_compression)
+from description_parser import STORAGE_TYPES, DescriptionParser
+from duplicates import (CORNER_REPORT_NAME, DUPLICATE_REPORT_NAME, MAX_POINTS, POINT_ENTRY_SIZE,
+                        CornerGrid, PointIndex, member_path, scan_zip)
+from keyindex import KeyIndex, index_path
+from manifest import DEFAULT_MANIFEST_NAME, Manifest, config_fingerprint, file_sha256
+from memory import MemoryBudget, PeakMemory, parse_size
+from pipeline import PipelineStats
+from point_schema import Schema, read_schema, sample_schema
+from records import WRITE_BATCH_ROWS, WRITE_BUFFER_SIZE
+from sniff import SNIFF_BYTES, FileFormat, sniff_bytes, sniff_file
+from suggest import DEFAULT_CACHE_SIZE, SuggestionIndex
+
+logger = logging.getLogger(__name__)
+
+POINT_FILE_EXTENSIONS = {'.txt', '.csv', '.asc'}
+# Rough bytes a cached list of code suggestions holds
+SUGGESTION_SIZE = 1024
+DEFAULT_PROPERTY_CORNERS_PATH = os.path.join(parser3.DIRNAME, 'config/property_corners.txt')
+DEFAULT_MISCELLANEOUS_PATH = os.path.join(parser3.DIRNAME, 'config/miscellaneous.txt')
+
+
+@dataclass
+class BatchReport:
+    """Outcome of a batch run."""
+
+    processed: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+    patched: list = field(default_factory=list)
+    # Queue statistics of each stage, for pipelined runs
+    pipeline: dict = field(default_factory=dict)
+    # PeakMemory of each stage, for runs with a memory budget
+    memory: dict = field(default_factory=dict)
+    # Point numbers used more than once, by kind, for runs that check for duplicates
+    duplicates: dict = field(default_factory=dict)
+    duplicate_report: str = None
+    # Property corners shot more than once, by kind, for runs with a corner tolerance
+    corners: dict = field(default_factory=dict)
+    corner_report: str = None
+
+    def summary(self) -> str:
+        """Return a one-line summary of the run."""
+        return (f"Processed {len(self.processed)}, skipped {len(self.skipped)} unchanged, "
+                f"failed {len(self.failed)}")
+
+
+def is_generated_file(path: Path) -> bool:
+    """Return True for files written by a previous run rather than by a data collector."""
+    return (path.name.startswith('preprocessed_')
+            or path.name in (DUPLICATE_REPORT_NAME, CORNER_REPORT_NAME)
+            or Path(strip_gzip(path.name)).stem.endswith(('_processed', '_unknown_codes')))
+
+
+def is_point_file(path: Path) -> bool:
+    """Return True for point files, gzip compressed point files and zip archives."""
+    return is_zip(path) or inner_suffix(path) in POINT_FILE_EXTENSIONS
+
+
+def collect_input_files(paths) -> list:
+    """
+    Expand the given files and directories into a sorted list of point files.
+
+    Directories are searched recursively for point file extensions, including gzip
+    compressed point files and zip archives, leaving out outputs written by earlier runs.
+
+    Args:
+        paths (list): Files and directories to process
+
+    Returns:
+        list: Paths of the point files to process
+    """
+    input_files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            for candidate in sorted(path.rglob('*')):
+                if (candidate.is_file()
+                        and is_point_file(candidate)
+                        and not is_generated_file(candidate)):
+                    input_files.append(candidate)
+        else:
+            input_files.append(path)
+    return input_files
+
+
+def preprocessed_path(input_file, compress: bool = None) -> Path:
+    """
+    Return the path DescriptionParser.process_file writes its output to.
+
+    Args:
+        input_file (str): Path to the input file
+        compress (bool): Whether the output is gzip compressed (default: if the input is)
+    """
+    input_path = Path(input_file)
+    return Path(with_compression(input_path.parent / f"preprocessed_{input_path.name}",
+                                 is_gzip(input_file) if compress is None else compress))
+
+
+def written_lines(chunks, outfile):
+    """Write each chunk of CSV text to outfile, then yield the lines of the chunk."""
+    for chunk in chunks:
+        outfile.write(chunk)
+        yield from io.StringIO(chunk, newline='')
+
+
+def process_zip(archive_path, description_parser: DescriptionParser,
+                catalog: parser3.CodeCatalog, engine: str = 'python',
+                description_column=None, point_index: PointIndex = None,
+                corner_grid: CornerGrid = None, memory_budget: MemoryBudget = None) -> str:
+    """
+    Run both stages over every point file inside a zip archive without extracting it.
+
+    Members are streamed straight out of the archive one at a time, a chunk of rows at
+    a time, and the outputs of each stage are written into new archives next to it:
+    preprocessed_{name}.zip and {name}_processed.zip, with the same member names the
+    stages use for plain files. Each chunk the replacement stage standardizes is written
+    to the preprocessed member and formatted into the processed one before the next is
+    read. Members that are empty or have too few columns are left out with a warning.
+    Each member is sniffed on its own and its outputs keep its encoding and dialect.
+
+    Args:
+        archive_path (str): Path to the zip archive
+        description_parser (DescriptionParser): Parser for the replacement stage
+        catalog (parser3.CodeCatalog): Compiled property corner and miscellaneous codes
+        engine (str): Formatting engine, one of parser3.ENGINES
+        description_column (int or str): Index or header name of the description column
+            (default: detected in each member)
+        point_index (PointIndex): Index to add the point numbers of each member to,
+            reported as crew.zip/day1/job.csv (optional)
+        corner_grid (CornerGrid): Grid to add the property corners of each member to
+            (optional)
+        memory_budget (MemoryBudget): Format no more rows at a time than fit in what is
+            left of it; description_parser's own budget sizes its chunks
+
+    Returns:
+        str: Path to the archive of processed outputs
+    """
+    indexes = [index for index in (point_index, corner_grid) if index is not None]
+    archive_path = Path(archive_path)
+    preprocessed_archive = archive_path.parent / f"preprocessed_{archive_path.name}"
+    output_archive = archive_path.parent / f"{archive_path.stem}_processed.zip"
+    temp_paths = [f"{preprocessed_archive}.tmp", f"{output_archive}.tmp"]
+    try:
+        with zipfile.ZipFile(archive_path) as source, \
+                zipfile.ZipFile(temp_paths[0], 'w', zipfile.ZIP_DEFLATED) as preprocessed, \
+                zipfile.ZipFile(temp_paths[1], 'w', zipfile.ZIP_DEFLATED) as output:
+            for name in point_file_members(source, POINT_FILE_EXTENSIONS):
+                member = PurePosixPath(name)
+                preprocessed_name = str(member.with_name(f"preprocessed_{member.name}"))
+                with source.open(name) as stream:
+                    sample = stream.read(SNIFF_BYTES)
+                    try:
+                        file_format = sniff_bytes(sample)
+                        schema = sample_schema(sample, file_format, description_column)
+                        stream.seek(0)
+                        chunks = description_parser.standardize_chunks(stream, file_format,
+                                                                       schema)
+                    except ValueError as e:
+                        # Including pandas' EmptyDataError for empty members
+                        logger.warning("Leaving out %s from %s: %s", name, archive_path, e)
+                        continue
+                    with create_member_text(preprocessed, preprocessed_name,
+                                            file_format.encoding,
+                                            file_format.errors) as preprocessed_file, \
+                            create_member_text(
+                                output, parser3.processed_output_path(preprocessed_name),
+                                file_format.encoding, file_format.errors) as outfile:
+                        parser3.format_stream(written_lines(chunks, preprocessed_file), outfile,
+                                              catalog, engine, file_format, schema,
+                                              memory_budget)
+                for index in indexes:
+                    index.scan_member(source, name, member_path(archive_path, name),
+                                      file_format, schema)
+        os.replace(temp_paths[0], preprocessed_archive)
+        os.replace(temp_paths[1], output_archive)
+    finally:
+        for temp_path in temp_paths:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return str(output_archive)
+
+
+def columnar_output_missing(input_file, output_format: str) -> bool:
+    """Return True if a columnar output was asked for and the file does not have one."""
+    if output_format == 'csv' or is_zip(input_file):
+        return False
+    processed = parser3.processed_output_path(str(preprocessed_path(input_file)))
+    return not os.path.isfile(columnar.columnar_output_path(processed, output_format))
+
+
+def mark_formatted(preprocessed, output_file, codes: str):
+    """Record in the key index of preprocessed which processed output was written from it."""
+    path = index_path(preprocessed)
+    key_index = KeyIndex.load(path) if path.exists() else None
+    if key_index is not None:
+        key_index.formatted = {"codes": codes, "size": os.path.getsize(output_file)}
+        key_index.save(path)
+
+
+def reapply_indexed(description_parser: DescriptionParser, input_file, property_codes: list,
+                    misc_codes: list, file_format: FileFormat = None, schema: Schema = None,
+                    compress: bool = None):
+    """
+    Patch the outputs of an indexed file after a dictionary edit.
+
+    Args:
+        description_parser (DescriptionParser): Parser holding the current dictionary
+        input_file (str): Path to the input file
+        property_codes (list): List of valid property corner codes
+        misc_codes (list): List of valid miscellaneous codes
+        file_format (FileFormat): Encoding and dialect of the input (default: sniffed)
+        schema (Schema): Column layout of the input (default: detected)
+        compress (bool): Whether the outputs are gzip compressed (default: if the input
+            is)
+
+    Returns:
+        str: Path to the processed output, or None if the file needs a full run
+    """
+    preprocessed = preprocessed_path(input_file, compress)
+    output_file = parser3.processed_output_path(str(preprocessed))
+    path = index_path(preprocessed)
+    key_index = KeyIndex.load(path) if path.exists() else None
+    codes = config_fingerprint({}, property_codes, misc_codes)
+    if (key_index is None or not os.path.isfile(output_file)
+            or key_index.formatted != {"codes": codes, "size": os.path.getsize(output_file)}):
+        return None
+
+    result = description_parser.reapply_dictionary(str(input_file), file_format, schema,
+                                                   compress)
+    if result is None:
+        return None
+    _, rows = result
+    try:
+        parser3.patch_file(str(preprocessed), rows, property_codes, misc_codes, file_format,
+                           schema)
+    except ValueError as e:
+        logger.info("%s", e)
+        return None
+    mark_formatted(preprocessed, output_file, codes)
+    return output_file
+
+
+def run_batch(paths, dictionary_path: str = None,
+              property_corners_path: str = DEFAULT_PROPERTY_CORNERS_PATH,
+              miscellaneous_path: str = DEFAULT_MISCELLANEOUS_PATH,
+              manifest_path: str = None, force: bool = False,
+              incremental: bool = False, report_unknown: bool = False,
+              key_index: bool = False, engine: str = 'python',
+              storage: str = 'object', output_format: str = 'csv',
+              compress: bool = False, description_column=None,
+              batch_rows: int = WRITE_BATCH_ROWS, buffer_size: int = WRITE_BUFFER_SIZE,
+              background_writer: bool = False, pipeline: bool = False,
+              resume: bool = False, max_memory: int = None,
+              check_duplicates: bool = False,
+              corner_tolerance: float = None) -> BatchReport:
+    """
+    Run both processing stages over every point file found in paths.
+
+    Args:
+        paths (list): Files and directories to process
+        dictionary_path (str): Path to the replacement dictionary (optional)
+        property_corners_path (str): Path to the property corners file
+        miscellaneous_path (str): Path to the miscellaneous codes file
+        manifest_path (str): Path to the manifest (default: alongside the first input)
+        force (bool): Reprocess files even if the manifest says they are unchanged
+        incremental (bool): Only process rows appended to files since the last run
+        report_unknown (bool): Write a report of unknown codes, with suggested
+            replacements, next to each output
+        key_index (bool): Keep a key index next to each output and, after a dictionary
+            edit, only recompute the rows the edit can affect
+        engine (str): Formatting engine for the second stage, one of parser3.ENGINES
+        storage (str): How the first stage holds descriptions, one of
+            description_parser.STORAGE_TYPES
+        output_format (str): Also write each output in this columnar format, one of
+            columnar.OUTPUT_FORMATS; 'csv' writes only the processed CSV
+        compress (bool): Gzip the outputs of both stages. Outputs of .gz inputs are
+            always compressed, and zip archives always produce zip archives
+        description_column (int or str): Index or header name of the column both stages
+            read descriptions from (default: the column named Description, Desc or Code,
+            or the fifth column)
+        batch_rows (int): Rows the format stage formats and writes at a time
+        buffer_size (int): Buffer size of the format stage's output files in bytes
+        background_writer (bool): Write format stage output from a background thread
+            while the next batch is formatted
+        pipeline (bool): In both stages, read each input ahead and write each output
+            behind on their own threads; the queue depths and stalls of each stage are
+            logged and returned in BatchReport.pipeline
+        resume (bool): Continue files an interrupted run left partly written from their
+            last checkpoints instead of starting them over
+        max_memory (int): Memory budget in bytes. Files that would not fit in memory
+            are streamed in chunks, batch and cache sizes shrink to fit, and the unknown
+            code report spills to disk; the peak resident size of each stage is logged
+            and returned in BatchReport.memory
+        check_duplicates (bool): Index the point numbers of every file, including the
+            unchanged ones, and write a report of the point numbers used more than once,
+            as duplicates or with conflicting coordinates, next to the manifest
+        corner_tolerance (float): Also write a report of the property corners of every
+            file shot more than once within this distance of each other, flagging those
+            given conflicting sizes, next to the manifest
+
+    Zip archives are processed in full whenever they change, without key indexes,
+    unknown code reports or columnar outputs.
+
+    The encoding and CSV dialect of each file are sniffed once, from its first few
+    kilobytes, and its column layout is detected from its first rows; both stages use
+    them, and outputs are written in the same format.
+
+    Returns:
+        BatchReport: The processed, skipped and failed files
+
+    Raises:
+        ValueError: If the code lists could not be loaded
+        ImportError: If the output format needs pyarrow and it is not installed
+    """
+    columnar.require_pyarrow(output_format)
+    budget = MemoryBudget(max_memory) if max_memory else None
+    description_parser = DescriptionParser(dictionary_path=dictionary_path, gui_mode=False,
+                                           storage=storage, pipeline=pipeline,
+                                           memory_budget=budget)
+    property_codes, misc_codes = parser3.load_code_lists(property_corners_path,
+                                                         miscellaneous_path)
+    if not property_codes or not misc_codes:
+        raise ValueError("Failed to load configuration files")
+    # Options that change which outputs are written, or how they are written, so a file
+    # processed with other options is not current for this run
+    auto_column = description_column is None or description_column == 'auto'
+    options = {"compress": compress, "engine": engine, "storage": storage,
+               "description_column": None if auto_column else str(description_column)}
+    config = config_fingerprint(description_parser.replacement_dict, property_codes, misc_codes,
+                                options)
+    cache_size = (budget.capacity(SUGGESTION_SIZE, most=DEFAULT_CACHE_SIZE) if budget
+                  else DEFAULT_CACHE_SIZE)
+    suggestion_index = (SuggestionIndex(property_codes + misc_codes, cache_size=cache_size)
+                        if report_unknown else None)
+    codes = config_fingerprint({}, property_codes, misc_codes)
+    catalog = parser3.CodeCatalog(property_codes, misc_codes)
+
+    input_files = collect_input_files(paths)
+    if manifest_path is None:
+        first = Path(paths[0]) if paths else Path.cwd()
+        manifest_dir = first if first.is_dir() else first.parent
+        manifest_path = manifest_dir / DEFAULT_MANIFEST_NAME
+    manifest = Manifest(manifest_path)
+    point_index = corner_grid = None
+    if check_duplicates:
+        point_index = PointIndex(budget.capacity(POINT_ENTRY_SIZE) if budget else MAX_POINTS)
+    if corner_tolerance is not None:
+        corner_grid = CornerGrid(catalog, corner_tolerance)
+    indexes = [index for index in (point_index, corner_grid) if index is not None]
+
+    report = BatchReport()
+    format_stats = PipelineStats()
+    peaks = {'replace': PeakMemory(), 'format': PeakMemory()}
+    if output_format != 'csv':
+        peaks['columnar'] = PeakMemory()
+
+    def measure(stage: str):
+        """Track the peak memory of a stage, if there is a budget to report it against."""
+        return peaks[stage] if budget else contextlib.nullcontext()
+
+    for input_file in input_files:
+        try:
+            content_hash = file_sha256(input_file)
+            # Measured after hashing, so a file that grows from here on gets a new hash
+            input_size = os.path.getsize(input_file)
+            if (not force and manifest.is_current(input_file, content_hash, config)
+                    and not columnar_output_missing(input_file, output_format)):
+                logger.info("Skipping unchanged file: %s", input_file)
+                report.skipped.append(str(input_file))
+                if indexes and is_zip(input_file):
+                    scan_zip(input_file, indexes, POINT_FILE_EXTENSIONS, description_column)
+                elif indexes:
+                    file_format = sniff_file(input_file)
+                    schema = read_schema(input_file, file_format, description_column)
+                    for index in indexes:
+                        index.scan_file(input_file, file_format, schema)
+                continue
+
+            if is_zip(input_file):
+                output_file = process_zip(input_file, description_parser, catalog, engine,
+                                          description_column, point_index, corner_grid,
+                                          budget)
+                manifest.record(input_file, content_hash, config, output_file)
+                report.processed.append(str(input_file))
+                continue
+
+            file_format = sniff_file(input_file)
+            schema = read_schema(input_file, file_format, description_column)
+            logger.info("%s: %s layout, %d header rows", input_file, schema.layout,
+                        schema.header_rows)
+            if key_index and not report_unknown and manifest.lookup(input_file):
+                output_file = reapply_indexed(description_parser, input_file, property_codes,
+                                              misc_codes, file_format, schema,
+                                              compress or None)
+                if output_file:
+                    for index in indexes:
+                        index.scan_file(input_file, file_format, schema)
+                    if output_format != 'csv':
+                        columnar.write_columnar(input_file,
+                                                preprocessed_path(input_file, compress or None),
+                                                output_file, property_codes, misc_codes,
+                                                output_format, file_format, schema, budget)
+                    manifest.record(input_file, content_hash, config, output_file)
+                    report.processed.append(str(input_file))
+                    report.patched.append(str(input_file))
+                    continue
+
+            with measure('replace'):
+                preprocessed = description_parser.process_file(str(input_file),
+                                                               incremental=incremental,
+                                                               build_index=key_index,
+                                                               compress=compress or None,
+                                                               file_format=file_format,
+                                                               schema=schema,
+                                                               resume=resume,
+                                                               input_size=input_size)
+            for index in indexes:
+                index.alias(preprocessed, input_file)
+            with measure('format'):
+                output_file = parser3.process_file(str(preprocessed), property_codes,
+                                                   misc_codes, gui_mode=False,
+                                                   incremental=incremental,
+                                                   suggestion_index=suggestion_index,
+                                                   engine=engine, file_format=file_format,
+                                                   schema=schema, batch_rows=batch_rows,
+                                                   buffer_size=buffer_size,
+                                                   background_writer=background_writer,
+                                                   pipeline=pipeline,
+                                                   pipeline_stats=format_stats,
+                                                   resume=resume, memory_budget=budget,
+                                                   point_index=point_index,
+                                                   corner_grid=corner_grid)
+            if key_index:
+                mark_formatted(preprocessed, output_file, codes)
+            if output_format != 'csv':
+                with measure('columnar'):
+                    columnar.write_columnar(input_file, preprocessed, output_file,
+                                            property_codes, misc_codes, output_format,
+                                            file_format, schema, budget)
+            manifest.record(input_file, content_hash, config, output_file)
+            report.processed.append(str(input_file))
+        except Exception as e:
+            logger.error("Failed to process %s: %s", input_file, e)
+            report.failed.append(str(input_file))
+
+    manifest.compact()
+    stats = description_parser.prefilter_stats
+    logger.info("Prefilter skipped %d of %d rows (%.1f%%)", stats.rejected, stats.rows,
+                100 * stats.rejection_rate)
+    if pipeline:
+        report.pipeline = {'replace': description_parser.pipeline_stats,
+                           'format': format_stats}
+        for stage, pipeline_stats in report.pipeline.items():
+            logger.info("%s stage pipeline: %s", stage.capitalize(), pipeline_stats.summary())
+    if point_index is not None:
+        report.duplicate_report = str(Path(manifest_path).parent / DUPLICATE_REPORT_NAME)
+        report.duplicates = point_index.write(report.duplicate_report)
+    if corner_grid is not None:
+        report.corner_report = str(Path(manifest_path).parent / CORNER_REPORT_NAME)
+        report.corners = corner_grid.write(report.corner_report)
+    if budget:
+        report.memory = peaks
+        for stage, peak in peaks.items():
+            logger.info("%s stage memory: %s", stage.capitalize(), peak.summary(budget))
+    logger.info(report.summary())
+    return report
+
+
+def main(argv=None):
+    """Command line entry point for batch processing."""
+    arg_parser = argparse.ArgumentParser(
+        description="Run the description parser over many point files")
+    arg_parser.add_argument("paths", nargs='+', help="Point files or directories to process")
+    arg_parser.add_argument("--dictionary", help="Path to the replacement dictionary")
+    arg_parser.add_argument("--property-corners", default=DEFAULT_PROPERTY_CORNERS_PATH,
+                            help="Path to the property corners file")
+    arg_parser.add_argument("--miscellaneous", default=DEFAULT_MISCELLANEOUS_PATH,
+                            help="Path to the miscellaneous codes file")
+    arg_parser.add_argument("--manifest", help="Path to the manifest of processed files")
+    arg_parser.add_argument("--force", action="store_true",
+                            help="Reprocess files even if they are unchanged")
+    arg_parser.add_argument("--incremental", action="store_true",
+                            help="Only process rows appended since the last run")
+    arg_parser.add_argument("--report-unknown", action="store_true",
+                            help="Write a report of unknown codes with suggested replacements")
+    arg_parser.add_argument("--key-index", action="store_true",
+                            help="After dictionary edits, only recompute the rows they affect")
+    arg_parser.add_argument("--engine", choices=parser3.ENGINES, default='python',
+                            help="Format descriptions row by row or a column at a time")
+    arg_parser.add_argument("--storage", choices=STORAGE_TYPES, default='object',
+                            help="Hold descriptions as strings, categories or Arrow strings")
+    arg_parser.add_argument("--output-format", choices=columnar.OUTPUT_FORMATS, default='csv',
+                            help="Also write each output as Parquet, Feather or Arrow IPC")
+    arg_parser.add_argument("--compress", action="store_true",
+                            help="Write gzip compressed outputs")
+    arg_parser.add_argument("--description-column", default='auto',
+                            help="Index (from 0) or header name of the description column")
+    arg_parser.add_argument("--write-batch-rows", type=int, default=WRITE_BATCH_ROWS,
+                            help="Rows formatted and written at a time")
+    arg_parser.add_argument("--write-buffer", type=int, default=WRITE_BUFFER_SIZE,
+                            help="Output file buffer size in bytes")
+    arg_parser.add_argument("--background-writer", action="store_true",
+                            help="Write output while the next rows are formatted")
+    arg_parser.add_argument("--pipeline", action="store_true",
+                            help="Read ahead and write behind on their own threads in both "
+                                 "stages, and report which stage is the bottleneck")
+    arg_parser.add_argument("--max-memory", type=parse_size,
+                            help="Memory budget, such as 4G; large files are streamed and "
+                                 "each stage reports its peak against it")
+    arg_parser.add_argument("--resume", action="store_true",
+                            help="Continue files an interrupted run left partly written "
+                                 "from their last checkpoints")
+    arg_parser.add_argument("--check-duplicates", action="store_true",
+                            help="Report point numbers used more than once across the files")
+    arg_parser.add_argument("--corner-tolerance", type=float,
+                            help="Report property corners shot more than once within this "
+                                 "distance, such as 0.1")
+    args = arg_parser.parse_args(argv)
+
+    report = run_batch(args.paths, dictionary_path=args.dictionary,
+                       property_corners_path=args.property_corners,
+                       miscellaneous_path=args.miscellaneous,
+                       manifest_path=args.manifest, force=args.force,
+                       incremental=args.incremental,
+                       report_unknown=args.report_unknown,
+                       key_index=args.key_index,
+                       engine=args.engine,
+                       storage=args.storage,
+                       output_format=args.output_format,
+                       compress=args.compress,
+                       description_column=args.description_column,
+                       batch_rows=args.write_batch_rows,
+                       buffer_size=args.write_buffer,
+                       background_writer=args.background_writer,
+                       pipeline=args.pipeline,
+                       resume=args.resume,
+                       max_memory=args.max_memory,
+                       check_duplicates=args.check_duplicates,
+                       corner_tolerance=args.corner_tolerance)
+
+    for patched in report.patched:
+        print(f"patched (dictionary edit): {patched}")
+    for skipped in report.skipped:
+        print(f"skipped (unchanged): {skipped}")
+    for failed in report.failed:
+        print(f"FAILED: {failed}")
+    for stage, pipeline_stats in report.pipeline.items():
+        print(f"{stage} stage pipeline: {pipeline_stats.summary()}")
+    for stage, peak in report.memory.items():
+        print(f"{stage} stage memory: {peak.summary(MemoryBudget(args.max_memory))}")
+    if report.duplicate_report:
+        print(f"duplicate points: {report.duplicates['duplicate']} duplicated, "
+              f"{report.duplicates['conflict']} with conflicting coordinates "
+              f"-> {report.duplicate_report}")
+    if report.corner_report:
+        print(f"property corners: {report.corners['repeat']} shot more than once, "
+              f"{report.corners['size-conflict']} with conflicting sizes "
+              f"-> {report.corner_report}")
+    print(report.summary())
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+benchmark_engines.py
+
+Measures the formatting stage with the row-by-row python engine and the column-at-a-time
+numpy engine, and checks that both give the same descriptions.
+
+Usage:
+    python benchmarks/benchmark_engines.py --rows 500000
+"""
+# Standard library imports
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Local imports
+import parser3  # noqa: E402
+import vectorized  # noqa: E402
+from synthetic import generate_rows  # noqa: E402
+
+CONFIG_DIR = Path(__file__).parent.parent / "config"
+
+
+def best_time(function, repeat: int) -> tuple:
+    """Return the fastest of repeat runs and the result of the last one."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(argv=None):
+    """Run the benchmark and print the results."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    arg_parser.add_argument("--rows", type=int, default=200000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    property_codes, misc_codes = parser3.load_code_lists(
+        str(CONFIG_DIR / "property_corners.txt"), str(CONFIG_DIR / "miscellaneous.txt"))
+    catalog = parser3.CodeCatalog(property_codes, misc_codes)
+    descriptions = [row[4] for row in generate_rows(args.rows)[1:]]
+
+    python_seconds, expected = best_time(
+        lambda: [parser3.format_description(d, catalog) for d in descriptions], args.repeat)
+    numpy_seconds, result = best_time(
+        lambda: vectorized.format_descriptions(descriptions, catalog), args.repeat)
+    if list(result) != expected:
+        raise AssertionError("The numpy engine differs from the python engine")
+
+    print(f"{args.rows} rows, {len(set(descriptions))} distinct descriptions")
+    print(f"python: {python_seconds:.3f} s")
+    print(f"numpy:  {numpy_seconds:.3f} s ({python_seconds / numpy_seconds:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+benchmark_equivalence.py
+
+Checks that every engine writes exactly what the original formatting rules write, and how
+much faster it is. Every engine runs both stages over a corpus of point files, generated
+or read from a directory of real jobs; the final outputs are compared with those of the
+reference, the frozen copy of the rules in reference_parser3.py, row by row, and each
+differing row is cut down to a one-row file to see whether it reproduces on its own. The
+run fails if any engine differs.
+
+Speedups are for both stages end to end, reading and writing included, against the
+python engine batch.py runs by default. On 4 generated files of 50000 rows the numpy
+engine is about 1.09x and the memory budget engine about 0.75x, that is slower: the
+numpy engine formats descriptions about 10x faster (benchmark_engines.py), but the
+formatting is only a small part of a whole run.
+
+Usage:
+    python benchmarks/benchmark_equivalence.py --files 4 --rows 50000
+    python benchmarks/benchmark_equivalence.py --corpus /data/jobs --repro-dir repros
+"""
+# Standard library imports
+import argparse
+import csv
+import gzip
+import io
+import itertools
+import logging
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Local imports
+import parser3  # noqa: E402
+from batch import collect_input_files  # noqa: E402
+import reference_parser3  # noqa: E402
+from benchmark_engines import CONFIG_DIR  # noqa: E402
+from compressed import is_gzip, is_zip, open_text, strip_gzip  # noqa: E402
+from description_parser import DescriptionParser, resolve_storage  # noqa: E402
+from memory import MemoryBudget, resident_size  # noqa: E402
+from point_schema import read_schema  # noqa: E402
+from sniff import sniff_file  # noqa: E402
+from synthetic import generate_bytes  # noqa: E402
+
+# Memory the budget engine is given on top of what the process holds when it starts, so
+# that all but small files are read and formatted in chunks
+BUDGET_HEADROOM = 16 * 1024 ** 2
+
+
+def engines(dictionary_path: str, property_codes: list, misc_codes: list) -> dict:
+    """
+    Return the engines, by name, as functions that run both stages on a point file.
+
+    Each function takes the path of a point file and returns the path of its final
+    output, written next to it. 'reference' formats with the frozen rules in
+    reference_parser3.py, 'python' is the row-by-row engine batch.py runs by default and
+    the others are the alternatives to it.
+    """
+    catalog = parser3.CodeCatalog(property_codes, misc_codes)
+
+    def files(engine: str = 'python', storage: str = 'object', pipeline: bool = False,
+              budget: bool = False):
+        memory_budget = MemoryBudget(resident_size() + BUDGET_HEADROOM) if budget else None
+        description_parser = DescriptionParser(dictionary_path, gui_mode=False,
+                                               storage=storage, pipeline=pipeline,
+                                               memory_budget=memory_budget)
+
+        def run(input_file: str) -> str:
+            file_format = sniff_file(input_file)
+            schema = read_schema(input_file, file_format)
+            preprocessed = description_parser.process_file(input_file,
+                                                           file_format=file_format,
+                                                           schema=schema)
+            return parser3.process_file(str(preprocessed), property_codes, misc_codes,
+                                        gui_mode=False, engine=engine,
+                                        file_format=file_format, schema=schema,
+                                        background_writer=pipeline, pipeline=pipeline,
+                                        memory_budget=memory_budget)
+        return run
+
+    def stream(input_file: str) -> str:
+        """Run both stages as batch.process_zip does for an archive member."""
+        file_format = sniff_file(input_file)
+        schema = read_schema(input_file, file_format)
+        text = io.StringIO(newline='')
+        with (gzip.open if is_gzip(input_file) else open)(input_file, 'rb') as source:
+            stream_parser.process_stream(source, text, file_format, schema)
+        text.seek(0)
+        input_path = Path(strip_gzip(input_file))
+        output_file = str(input_path.parent / f"{input_path.stem}_stream{input_path.suffix}")
+        with open_text(output_file, 'w', encoding=file_format.encoding,
+                       errors=file_format.errors) as outfile:
+            parser3.format_stream(text, outfile, catalog, 'python', file_format, schema)
+        return output_file
+
+    def reference(input_file: str) -> str:
+        file_format = sniff_file(input_file)
+        schema = read_schema(input_file, file_format)
+        preprocessed = reference_parser.process_file(input_file, file_format=file_format,
+                                                     schema=schema)
+        return reference_parser3.process_file(str(preprocessed), property_codes,
+                                              misc_codes, file_format, schema)
+
+    reference_parser = DescriptionParser(dictionary_path, gui_mode=False)
+    stream_parser = DescriptionParser(dictionary_path, gui_mode=False)
+    runs = {'reference': reference, 'python': files()}
+    runs.update((engine, files(engine=engine)) for engine in parser3.ENGINES
+                if engine != 'python')
+    for storage in ('category', 'pyarrow'):
+        if resolve_storage(storage) == storage:
+            runs[storage] = files(storage=storage)
+    runs['pipeline'] = files(pipeline=True)
+    runs['budget'] = files(budget=True)
+    runs['stream'] = stream
+    return runs
+
+
+def run_copy(run, input_file, directory: Path) -> tuple:
+    """Copy a point file into directory, run an engine on the copy and time it."""
+    directory.mkdir(parents=True, exist_ok=True)
+    copy = directory / Path(input_file).name
+    shutil.copyfile(input_file, copy)
+    started = time.perf_counter()
+    output_file = run(str(copy))
+    return output_file, time.perf_counter() - started
+
+
+def read_rows(path, file_format) -> tuple:
+    """Return the text of an output and its rows."""
+    with open_text(path, encoding=file_format.encoding, errors=file_format.errors) as f:
+        text = f.read()
+    return text, list(csv.reader(io.StringIO(text, newline=''), **file_format.csv_options()))
+
+
+def differences(expected_file, actual_file, file_format, limit: int) -> tuple:
+    """
+    Compare two outputs row by row.
+
+    Returns:
+        tuple: The number of rows that differ, the first limit of them as (index,
+        expected row, actual row) with None for a missing row, and whether the outputs
+        differ in their bytes even where every row is the same
+    """
+    expected_text, expected = read_rows(expected_file, file_format)
+    actual_text, actual = read_rows(actual_file, file_format)
+    rows = [(index, want, got) for index, (want, got) in enumerate(
+        itertools.zip_longest(expected, actual)) if want != got]
+    return len(rows), rows[:limit], not rows and expected_text != actual_text
+
+
+def reproduce(input_file, index: int, reference, candidate, directory: Path) -> Path:
+    """
+    Cut a point file down to its header rows and one row, and check the row still differs.
+
+    The outputs keep one row per input row, so the row at index of an output came from
+    the row at index of the input.
+
+    Returns:
+        Path: The one-row file if the engines differ on it, otherwise None
+    """
+    file_format = sniff_file(input_file)
+    schema = read_schema(input_file, file_format)
+    with open_text(input_file, encoding=file_format.encoding,
+                   errors=file_format.errors) as f:
+        rows = list(csv.reader(f, **file_format.csv_options()))
+    if index >= len(rows):
+        return None
+    directory.mkdir(parents=True, exist_ok=True)
+    name = Path(strip_gzip(input_file))
+    repro = directory / f"{name.stem}_row{index + 1}{name.suffix}"
+    with open_text(repro, 'w', encoding=file_format.encoding,
+                   errors=file_format.errors) as f:
+        csv.writer(f, **file_format.csv_options()).writerows(
+            rows[:schema.header_rows] + [rows[index]])
+    with tempfile.TemporaryDirectory() as work_dir:
+        expected, _ = run_copy(reference, repro, Path(work_dir) / 'reference')
+        actual, _ = run_copy(candidate, repro, Path(work_dir) / 'candidate')
+        differing, _, _ = differences(expected, actual, file_format, 1)
+    return repro if differing else None
+
+
+def generate_corpus(directory: Path, files: int, rows: int) -> list:
+    """Write generated point files, every other one gzip compressed."""
+    paths = []
+    for seed in range(files):
+        data = generate_bytes(rows, seed)
+        if seed % 2:
+            path = directory / f"points_{seed}.csv.gz"
+            path.write_bytes(gzip.compress(data))
+        else:
+            path = directory / f"points_{seed}.csv"
+            path.write_bytes(data)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    """Run the benchmark and print the results."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    arg_parser.add_argument("--corpus", nargs='+',
+                            help="Point files or directories of them (default: generated)")
+    arg_parser.add_argument("--files", type=int, default=4,
+                            help="Generated files, if no corpus is given")
+    arg_parser.add_argument("--rows", type=int, default=50000,
+                            help="Rows in each generated file")
+    arg_parser.add_argument("--reference", default='reference',
+                            help="Engine the outputs are compared with")
+    arg_parser.add_argument("--baseline", default='python',
+                            help="Engine the speedups are measured against")
+    arg_parser.add_argument("--engines", nargs='+',
+                            help="Engines to check (default: all of the others)")
+    arg_parser.add_argument("--max-diffs", type=int, default=5,
+                            help="Differing rows shown for each engine and file")
+    arg_parser.add_argument("--repro-dir",
+                            help="Keep the one-row reproductions in this directory")
+    args = arg_parser.parse_args(argv)
+    # The stages log every file they process, which would bury the report
+    logging.disable(logging.INFO)
+
+    property_codes, misc_codes = parser3.load_code_lists(
+        str(CONFIG_DIR / "property_corners.txt"), str(CONFIG_DIR / "miscellaneous.txt"))
+    runs = engines(str(CONFIG_DIR / "replacement_dict.json"), property_codes, misc_codes)
+    names = args.engines or [name for name in runs if name != args.reference]
+    if args.baseline not in names and args.baseline != args.reference:
+        names.insert(0, args.baseline)
+    for name in [args.reference] + names:
+        if name not in runs:
+            arg_parser.error(f"engine {name!r} is not available, expected one of "
+                             f"{', '.join(runs)}")
+
+    seconds = dict.fromkeys([args.reference] + names, 0.0)
+    differing = dict.fromkeys(names, 0)
+    total_rows = 0
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        if args.corpus:
+            corpus = collect_input_files(args.corpus)
+            for path in [path for path in corpus if is_zip(path)]:
+                print(f"Skipping archive {path}")
+            corpus = [path for path in corpus if not is_zip(path)]
+        else:
+            corpus = generate_corpus(directory, args.files, args.rows)
+        repro_dir = Path(args.repro_dir) if args.repro_dir else directory / 'repros'
+
+        for number, input_file in enumerate(corpus):
+            work_dir = directory / f"{number:04d}"
+            expected, taken = run_copy(runs[args.reference], input_file,
+                                       work_dir / args.reference)
+            seconds[args.reference] += taken
+            file_format = sniff_file(input_file)
+            total_rows += len(read_rows(expected, file_format)[1])
+            for name in names:
+                try:
+                    actual, taken = run_copy(runs[name], input_file, work_dir / name)
+                except Exception as e:
+                    differing[name] += 1
+                    print(f"\n{name}: {input_file} failed: {e!r}")
+                    continue
+                seconds[name] += taken
+                count, rows, bytes_only = differences(expected, actual, file_format,
+                                                      args.max_diffs)
+                if bytes_only:
+                    differing[name] += 1
+                    print(f"\n{name}: {input_file} has the same rows but different bytes "
+                          f"(quoting, line endings or encoding)")
+                if not count:
+                    continue
+                differing[name] += count
+                print(f"\n{name}: {input_file} differs in {count} rows")
+                for index, want, got in rows:
+                    repro = reproduce(input_file, index, runs[args.reference], runs[name],
+                                      repro_dir / name / f"{number:04d}")
+                    print(f"  row {index + 1}")
+                    print(f"    {args.reference + ':':<11} {want}")
+                    print(f"    {name + ':':<11} {got}")
+                    print(f"    reproduces with one row: {repro}" if repro else
+                          "    only differs within the whole file")
+
+    print(f"\n{len(corpus)} files, {total_rows} rows")
+    print(f"Speedups are end to end, both stages, against the {args.baseline} engine")
+    print(f"{'engine':<10} {'seconds':>9} {'rows/s':>10} {'speedup':>8}  differences")
+    for name, taken in seconds.items():
+        speedup = seconds[args.baseline] / taken if taken else 0.0
+        print(f"{name:<10} {taken:>9.3f} {total_rows / taken if taken else 0:>10.0f} "
+              f"{speedup:>7.2f}x  "
+              f"{'reference' if name == args.reference else differing[name]}")
+    return 1 if any(differing.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+benchmark_memory.py
+
+Traces the memory each stage allocates on generated files of increasing size: the
+replace stage, the format stage with each engine and, when pyarrow is installed, the
+parquet output. For every stage and size it reports the tracemalloc peak, the blocks held
+at the peak and the lines of the package that held the most memory then. With --baseline
+the peaks are compared with a report saved earlier with --json, and the benchmark fails
+if any of them grew by more than the tolerance.
+
+Usage:
+    python benchmarks/benchmark_memory.py --rows 10000 50000 200000 --json memory.json
+    python benchmarks/benchmark_memory.py --baseline memory.json --tolerance 0.1
+"""
+# Standard library imports
+import argparse
+import gc
+import json
+import logging
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Local imports
+import columnar  # noqa: E402
+import parser3  # noqa: E402
+from benchmark_writer import CONFIG_DIR  # noqa: E402
+from description_parser import DescriptionParser  # noqa: E402
+from synthetic import write_point_file  # noqa: E402
+
+PACKAGE_DIR = str(Path(__file__).parent.parent.resolve())
+BENCHMARK_DIR = str(Path(__file__).parent.resolve())
+
+# How often the traced size is checked for a new peak
+SAMPLE_SECONDS = 0.01
+# A snapshot is only taken again once the traced size is this much above the last one
+SNAPSHOT_GROWTH = 1.05
+
+
+class TracedPeak:
+    """
+    Traces the memory allocated inside its with block and keeps a snapshot near the peak.
+
+    A background thread checks the traced size every SAMPLE_SECONDS and takes a snapshot
+    whenever it is SNAPSHOT_GROWTH above the last one, so the snapshot kept shows what
+    was held close to the peak rather than what was left at the end.
+    """
+
+    def __init__(self, frames: int):
+        self.frames = frames
+        self.peak = 0
+        self.snapshot = None
+        self._snapshot_size = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        gc.collect()
+        tracemalloc.start(self.frames)
+        self._thread = threading.Thread(target=self._sample, name="traced-peak", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.peak = tracemalloc.get_traced_memory()[1]
+        if self.snapshot is None:
+            self.snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+    def _sample(self):
+        """Snapshot the traces each time the traced size reaches a new high."""
+        while not self._stop.wait(SAMPLE_SECONDS):
+            size = tracemalloc.get_traced_memory()[0]
+            if size > self._snapshot_size * SNAPSHOT_GROWTH:
+                self.snapshot = tracemalloc.take_snapshot()
+                self._snapshot_size = size
+
+
+def allocation_site(traceback) -> str:
+    """Return the innermost line of the package in a traceback, or the innermost line."""
+    for frame in reversed(traceback):
+        if frame.filename.startswith(PACKAGE_DIR) and \
+                not frame.filename.startswith(BENCHMARK_DIR):
+            return f"{Path(frame.filename).name}:{frame.lineno}"
+    frame = traceback[-1]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+def top_sites(snapshot, count: int) -> tuple:
+    """
+    Group the memory held in a snapshot by the line of the package that allocated it.
+
+    Returns:
+        tuple: Blocks held in total, and the count largest sites as dicts with the site,
+        its size in bytes and its number of blocks
+    """
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, threading.__file__),
+        tracemalloc.Filter(False, __file__)])
+    sites = {}
+    blocks = 0
+    for statistic in snapshot.statistics('traceback'):
+        site = sites.setdefault(allocation_site(statistic.traceback),
+                                {'size': 0, 'blocks': 0})
+        site['size'] += statistic.size
+        site['blocks'] += statistic.count
+        blocks += statistic.count
+    largest = sorted(sites.items(), key=lambda item: -item[1]['size'])[:count]
+    return blocks, [dict(site=name, **site) for name, site in largest]
+
+
+def stages(dictionary_path: str, property_codes: list, misc_codes: list) -> dict:
+    """Return a function running each stage on a point file, by stage name."""
+    def replace(input_file):
+        DescriptionParser(dictionary_path, gui_mode=False).process_file(input_file)
+
+    def format_with(engine: str):
+        def format_stage(input_file):
+            parser3.process_file(preprocessed(input_file), property_codes, misc_codes,
+                                 gui_mode=False, engine=engine)
+        return format_stage
+
+    def parquet(input_file):
+        columnar.write_columnar(input_file, preprocessed(input_file),
+                                parser3.processed_output_path(preprocessed(input_file)),
+                                property_codes, misc_codes, 'parquet')
+
+    runs = {'replace': replace}
+    runs.update((f"format-{engine}", format_with(engine)) for engine in parser3.ENGINES)
+    runs['parquet'] = parquet
+    return runs
+
+
+def preprocessed(input_file) -> str:
+    """Return the path the replace stage writes its output to."""
+    input_path = Path(input_file)
+    return str(input_path.parent / f"preprocessed_{input_path.name}")
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Return a line for each stage and size whose peak grew by more than tolerance."""
+    before = {(result['stage'], result['rows']): result['peak'] for result in baseline}
+    regressions = []
+    for result in results:
+        peak = before.get((result['stage'], result['rows']))
+        if peak and result['peak'] > peak * (1 + tolerance):
+            regressions.append(f"{result['stage']} at {result['rows']} rows: "
+                               f"{peak / 2**20:.1f}MB -> {result['peak'] / 2**20:.1f}MB "
+                               f"(+{100 * (result['peak'] / peak - 1):.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    """Run the benchmark and print the results."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    arg_parser.add_argument("--rows", type=int, nargs='+', default=[10000, 50000, 200000],
+                            help="Sizes of the generated files")
+    arg_parser.add_argument("--top", type=int, default=5,
+                            help="Allocation sites listed for each stage and size")
+    arg_parser.add_argument("--frames", type=int, default=10,
+                            help="Frames traced for each allocation")
+    arg_parser.add_argument("--json", help="Write the report to this file")
+    arg_parser.add_argument("--baseline", help="Report written earlier with --json")
+    arg_parser.add_argument("--tolerance", type=float, default=0.1,
+                            help="Growth in a peak over the baseline that fails the run")
+    args = arg_parser.parse_args(argv)
+    # The stages log every file they process, which would bury the report
+    logging.disable(logging.INFO)
+
+    property_codes, misc_codes = parser3.load_code_lists(
+        str(CONFIG_DIR / "property_corners.txt"), str(CONFIG_DIR / "miscellaneous.txt"))
+    runs = stages(str(CONFIG_DIR / "replacement_dict.json"), property_codes, misc_codes)
+    try:
+        columnar.require_pyarrow('parquet')
+    except ImportError:
+        print("parquet: not available")
+        del runs['parquet']
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.rows:
+            input_file = str(Path(directory) / f"points_{rows}.csv")
+            write_point_file(input_file, rows)
+            for stage, run in runs.items():
+                started = time.perf_counter()
+                with TracedPeak(args.frames) as traced:
+                    run(input_file)
+                seconds = time.perf_counter() - started
+                blocks, sites = top_sites(traced.snapshot, args.top)
+                results.append({'stage': stage, 'rows': rows, 'peak': traced.peak,
+                                'blocks': blocks, 'seconds': seconds, 'sites': sites})
+
+    print(f"{'stage':<14} {'rows':>8} {'peak':>10} {'per row':>9} {'blocks':>9} "
+          f"{'traced':>9}")
+    for result in results:
+        print(f"{result['stage']:<14} {result['rows']:>8} {result['peak'] / 2**20:>8.1f}MB "
+              f"{result['peak'] / result['rows']:>8.0f}B {result['blocks']:>9} "
+              f"{result['seconds']:>8.2f}s")
+    largest = max(args.rows)
+    for result in results:
+        if result['rows'] != largest:
+            continue
+        print(f"\n{result['stage']} at {largest} rows, held near the peak:")
+        for site in result['sites']:
+            print(f"  {site['size'] / 2**20:>8.1f}MB {site['blocks']:>9} blocks  "
+                  f"{site['site']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nPeaks more than {100 * args.tolerance:.0f}% above the baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo peak more than {100 * args.tolerance:.0f}% above the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+benchmark_pipeline.py
+
+Measures the format stage reading from and writing to a simulated network share, one
+step after the other and pipelined with a read-ahead and a writer thread, and prints the
+queue statistics the pipeline reports.
+
+Usage:
+    python benchmarks/benchmark_pipeline.py --rows 200000 --latency-ms 2 --mb-per-s 40
+"""
+# Standard library imports
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Local imports
+import parser3  # noqa: E402
+from benchmark_writer import CONFIG_DIR, SlowDrive, best_time  # noqa: E402
+from pipeline import PIPELINE_BLOCK_SIZE, PipelineStats, ReadAhead  # noqa: E402
+from point_schema import DEFAULT_SCHEMA  # noqa: E402
+from records import WRITE_BATCH_ROWS, WRITE_BUFFER_SIZE, RecordWriter, read_records  # noqa: E402
+from synthetic import generate_bytes  # noqa: E402
+
+
+class SlowSource(io.RawIOBase):
+    """An in-memory file whose reads take as long as they would on a slow drive."""
+
+    def __init__(self, data: bytes, latency: float, bytes_per_second: float):
+        super().__init__()
+        self.data = io.BytesIO(data)
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = self.data.readinto(buffer)
+        time.sleep(self.latency + size / self.bytes_per_second)
+        return size
+
+
+def format_stage(source, drive, catalog, pipelined: bool, stats: PipelineStats):
+    """Read, format and write rows a batch at a time, as parser3.process_file does."""
+    if pipelined:
+        source = ReadAhead(source, stats=stats.read)
+    infile = io.TextIOWrapper(io.BufferedReader(source, PIPELINE_BLOCK_SIZE), encoding='utf8',
+                              newline='')
+    outfile = io.TextIOWrapper(io.BufferedWriter(drive, WRITE_BUFFER_SIZE), encoding='utf8',
+                               newline='')
+    with infile, RecordWriter(outfile, background=pipelined, stats=stats.write) as writer:
+        count = 0
+        while rows := read_records(infile, 4, limit=WRITE_BATCH_ROWS)[0]:
+            for row in rows[1 if not count else 0:]:
+                parser3.format_row(row, catalog, DEFAULT_SCHEMA)
+            writer.write(rows)
+            count += len(rows)
+    outfile.flush()
+
+
+def main(argv=None):
+    """Run the benchmark and print the results."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    arg_parser.add_argument("--rows", type=int, default=200000)
+    arg_parser.add_argument("--latency-ms", type=float, default=2.0,
+                            help="Time each read or write call waits before any data moves")
+    arg_parser.add_argument("--mb-per-s", type=float, default=40.0,
+                            help="Simulated read and write throughput")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    property_codes, misc_codes = parser3.load_code_lists(
+        str(CONFIG_DIR / "property_corners.txt"), str(CONFIG_DIR / "miscellaneous.txt"))
+    catalog = parser3.CodeCatalog(property_codes, misc_codes)
+    # Descriptions without quotes, so every row takes the split path
+    data = generate_bytes(args.rows).replace(b'"', b'')
+    latency, bytes_per_second = args.latency_ms / 1000, args.mb_per_s * 1e6
+
+    def run(pipelined: bool) -> tuple:
+        source = SlowSource(data, latency, bytes_per_second)
+        drive = SlowDrive(latency, bytes_per_second)
+        stats = PipelineStats()
+        started = time.perf_counter()
+        format_stage(source, drive, catalog, pipelined, stats)
+        stats.seconds = time.perf_counter() - started
+        return drive.data.getvalue(), stats
+
+    sequential_seconds, (expected, _) = best_time(lambda: run(False), args.repeat)
+    pipelined_seconds, (result, stats) = best_time(lambda: run(True), args.repeat)
+    if result != expected:
+        raise AssertionError("The pipelined output differs")
+
+    print(f"{args.rows} rows, {args.latency_ms} ms per call, {args.mb_per_s} MB/s")
+    print(f"sequential {sequential_seconds:.3f} s")
+    print(f"pipelined  {pipelined_seconds:.3f} s "
+          f"({sequential_seconds / pipelined_seconds:.1f}x)")
+    print(stats.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
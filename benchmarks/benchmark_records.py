@@ -0,0 +1,82 @@
+"""
+benchmark_records.py
+
+Measures reading and writing point files in the format stage with the csv module and
+with the record reader that splits rows only up to the description, for exports with a
+growing number of attribute columns after it.
+
+Usage:
+    python benchmarks/benchmark_records.py --rows 200000 --extra-columns 0 10 40
+"""
+# Standard library imports
+import argparse
+import csv
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Local imports
+from records import read_records, write_records  # noqa: E402
+from synthetic import generate_rows  # noqa: E402
+
+
+def best_time(function, repeat: int) -> tuple:
+    """Return the fastest of repeat runs and the result of the last one."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def wide_text(rows: list, extra_columns: int) -> str:
+    """Return rows as CSV text with attribute columns added after the description."""
+    buffer = io.StringIO(newline='')
+    writer = csv.writer(buffer)
+    for number, row in enumerate(rows):
+        writer.writerow(row + [f"ATTR{column}_{number % 97}" for column in range(extra_columns)])
+    return buffer.getvalue()
+
+
+def csv_module(text: str) -> str:
+    """Read and write every field with the csv module, as the format stage used to."""
+    output = io.StringIO(newline='')
+    csv.writer(output).writerows(list(csv.reader(io.StringIO(text, newline=''))))
+    return output.getvalue()
+
+
+def record_reader(text: str) -> str:
+    """Read and write rows split only up to the description."""
+    output = io.StringIO(newline='')
+    rows, quoted = read_records(io.StringIO(text, newline=''), 4)
+    write_records(output, rows, quoted)
+    return output.getvalue()
+
+
+def main(argv=None):
+    """Run the benchmark and print the results."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    arg_parser.add_argument("--rows", type=int, default=200000)
+    arg_parser.add_argument("--extra-columns", type=int, nargs='+', default=[0, 10, 40])
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    rows = generate_rows(args.rows)
+    print(f"{args.rows} rows")
+    for extra_columns in args.extra_columns:
+        text = wide_text(rows, extra_columns)
+        csv_seconds, expected = best_time(lambda: csv_module(text), args.repeat)
+        record_seconds, result = best_time(lambda: record_reader(text), args.repeat)
+        if result != expected:
+            raise AssertionError("The record reader output differs from the csv module")
+        print(f"{5 + extra_columns:3d} columns: csv {csv_seconds:.3f} s, "
+              f"records {record_seconds:.3f} s ({csv_seconds / record_seconds:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+benchmark_replacements.py
+
+Measures the replacement stage with and without the prefilter that lets descriptions
+containing no dictionary key skip the replacements.
+
+Usage:
+    python benchmarks/benchmark_replacements.py --rows 200000 --extra-keys 400
+"""
+# Standard library imports
+import argparse
+import io
+import json
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Third-party imports
+import pandas as pd  # noqa: E402
+# Local imports
+from description_parser import PrefilterStats, apply_replacements  # noqa: E402
+from synthetic import generate_bytes  # noqa: E402
+
+DEFAULT_DICTIONARY = Path(__file__).parent.parent / "config" / "replacement_dict.json"
+
+
+def unfiltered(descriptions: pd.Series, replacement_dict: dict) -> pd.Series:
+    """Apply every key to every description, as the replacement stage used to."""
+    for old_text, new_text in replacement_dict.items():
+        descriptions = descriptions.str.replace(old_text, new_text, regex=False)
+    return descriptions
+
+
+def best_time(function, repeat: int) -> tuple:
+    """Return the fastest of repeat runs and the result of the last one."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(argv=None):
+    """Run the benchmark and print the results."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    arg_parser.add_argument("--rows", type=int, default=200000)
+    arg_parser.add_argument("--extra-keys", type=int, default=0,
+                            help="Random keys added to the dictionary to simulate growth")
+    arg_parser.add_argument("--dictionary", default=str(DEFAULT_DICTIONARY))
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    with open(args.dictionary, 'r', encoding='utf-8') as f:
+        replacement_dict = json.load(f)
+    rng = random.Random(0)
+    for _ in range(args.extra_keys):
+        key = ''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(3, 7)))
+        replacement_dict[key + rng.choice(['', ' '])] = "X"
+
+    descriptions = pd.read_csv(io.BytesIO(generate_bytes(args.rows))).iloc[:, -1]
+    plain_seconds, expected = best_time(
+        lambda: unfiltered(descriptions, replacement_dict), args.repeat)
+    stats = PrefilterStats()
+    filtered_seconds, result = best_time(
+        lambda: apply_replacements(descriptions, replacement_dict, stats=stats), args.repeat)
+    if not result.equals(expected):
+        raise AssertionError("Prefiltered replacements differ from unfiltered replacements")
+
+    print(f"{args.rows} rows, {len(replacement_dict)} keys")
+    print(f"unfiltered:  {plain_seconds:.3f} s")
+    print(f"prefiltered: {filtered_seconds:.3f} s "
+          f"({plain_seconds / filtered_seconds:.1f}x, "
+          f"{100 * stats.rejection_rate:.1f}% of rows skipped)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
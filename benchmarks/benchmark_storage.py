@@ -0,0 +1,82 @@
+"""
+benchmark_storage.py
+
+Compares the memory used by the description column, and the time taken to replace and
+format it, when it is held as Python strings, as a categorical or as Arrow strings.
+Storage types that are not available (pyarrow without pyarrow installed) are skipped.
+
+Usage:
+    python benchmarks/benchmark_storage.py --rows 500000
+"""
+# Standard library imports
+import argparse
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Third-party imports
+import pandas as pd  # noqa: E402
+# Local imports
+import parser3  # noqa: E402
+import vectorized  # noqa: E402
+from description_parser import (STORAGE_TYPES, apply_replacements, resolve_storage,  # noqa: E402
+                                to_storage)
+from synthetic import generate_bytes  # noqa: E402
+
+CONFIG_DIR = Path(__file__).parent.parent / "config"
+
+
+def best_time(function, repeat: int) -> tuple:
+    """Return the fastest of repeat runs and the result of the last one."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(argv=None):
+    """Run the benchmark and print the results."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    arg_parser.add_argument("--rows", type=int, default=200000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    with open(CONFIG_DIR / "replacement_dict.json", 'r', encoding='utf-8') as f:
+        replacement_dict = json.load(f)
+    property_codes, misc_codes = parser3.load_code_lists(
+        str(CONFIG_DIR / "property_corners.txt"), str(CONFIG_DIR / "miscellaneous.txt"))
+    catalog = parser3.CodeCatalog(property_codes, misc_codes)
+    column = pd.read_csv(io.BytesIO(generate_bytes(args.rows))).iloc[:, -1]
+
+    print(f"{args.rows} rows, {column.nunique()} distinct descriptions")
+    print(f"{'storage':<10} {'memory':>10} {'replace':>9} {'format':>9}")
+    baseline = None
+    for storage in STORAGE_TYPES:
+        if resolve_storage(storage) != storage:
+            print(f"{storage:<10} not available")
+            continue
+        descriptions = to_storage(column, storage)
+        memory = descriptions.memory_usage(deep=True)
+        replace_seconds, replaced = best_time(
+            lambda: apply_replacements(descriptions, replacement_dict), args.repeat)
+        format_seconds, formatted = best_time(
+            lambda: vectorized.format_descriptions(replaced, catalog), args.repeat)
+        if baseline is None:
+            baseline = (memory, replace_seconds, format_seconds, list(formatted))
+        elif list(formatted) != baseline[3]:
+            raise AssertionError(f"{storage} storage gives different descriptions")
+        print(f"{storage:<10} {memory / 2**20:>8.1f}MB {replace_seconds:>8.3f}s "
+              f"{format_seconds:>8.3f}s   ({baseline[0] / memory:.1f}x less memory, "
+              f"{(baseline[1] + baseline[2]) / (replace_seconds + format_seconds):.1f}x "
+              f"faster)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+benchmark_writer.py
+
+Measures the format stage with rows written one at a time by csv.writer, as it used to
+write them, and in batches by RecordWriter in the foreground and from a background
+thread. A latency per write call and a throughput limit simulate a network drive.
+
+Usage:
+    python benchmarks/benchmark_writer.py --rows 200000 --latency-ms 2 --mb-per-s 40
+"""
+# Standard library imports
+import argparse
+import csv
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Local imports
+import parser3  # noqa: E402
+from point_schema import DEFAULT_SCHEMA  # noqa: E402
+from records import (WRITE_BATCH_ROWS, WRITE_BUFFER_SIZE, RecordWriter, batches,  # noqa: E402
+                     read_records)
+from synthetic import generate_bytes  # noqa: E402
+
+CONFIG_DIR = Path(__file__).parent.parent / "config"
+
+
+class SlowDrive(io.RawIOBase):
+    """An in-memory file whose writes take as long as they would on a slow drive."""
+
+    def __init__(self, latency: float, bytes_per_second: float):
+        super().__init__()
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.data = io.BytesIO()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        # Sleeping releases the GIL, as waiting on a real drive does
+        time.sleep(self.latency + len(data) / self.bytes_per_second)
+        return self.data.write(data)
+
+
+def row_by_row(text: str, catalog, outfile):
+    """Read every field and format and write each row in turn with csv.writer."""
+    writer = csv.writer(outfile)
+    for row in csv.reader(io.StringIO(text, newline='')):
+        writer.writerow(parser3.format_row(row, catalog))
+
+
+def batched(text: str, catalog, outfile, background: bool, batch_rows: int):
+    """Format rows a batch at a time and write each batch in one call."""
+    rows, quoted = read_records(io.StringIO(text, newline=''), 4)
+    with RecordWriter(outfile, batch_rows=batch_rows, background=background) as writer:
+        for offset, batch, batch_quoted in batches(rows, quoted, batch_rows):
+            for row in batch[1 if offset == 0 else 0:]:
+                parser3.format_row(row, catalog, DEFAULT_SCHEMA)
+            writer.write(batch, batch_quoted)
+
+
+def best_time(function, repeat: int) -> tuple:
+    """Return the fastest of repeat runs and the result of the last one."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(argv=None):
+    """Run the benchmark and print the results."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    arg_parser.add_argument("--rows", type=int, default=200000)
+    arg_parser.add_argument("--batch-rows", type=int, default=WRITE_BATCH_ROWS)
+    arg_parser.add_argument("--latency-ms", type=float, default=2.0,
+                            help="Time each write call waits before any data is sent")
+    arg_parser.add_argument("--mb-per-s", type=float, default=40.0,
+                            help="Simulated write throughput")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    property_codes, misc_codes = parser3.load_code_lists(
+        str(CONFIG_DIR / "property_corners.txt"), str(CONFIG_DIR / "miscellaneous.txt"))
+    catalog = parser3.CodeCatalog(property_codes, misc_codes)
+    text = generate_bytes(args.rows).decode('utf8')
+
+    def run(write, buffer_size: int) -> bytes:
+        drive = SlowDrive(args.latency_ms / 1000, args.mb_per_s * 1e6)
+        outfile = io.TextIOWrapper(io.BufferedWriter(drive, buffer_size), encoding='utf8',
+                                   newline='')
+        write(outfile)
+        outfile.flush()
+        return drive.data.getvalue()
+
+    writers = [
+        # The io module's default buffer, as the format stage used to open its output
+        ("row by row", io.DEFAULT_BUFFER_SIZE,
+         lambda f: row_by_row(text, catalog, f)),
+        ("batched", WRITE_BUFFER_SIZE,
+         lambda f: batched(text, catalog, f, False, args.batch_rows)),
+        ("background", WRITE_BUFFER_SIZE,
+         lambda f: batched(text, catalog, f, True, args.batch_rows)),
+    ]
+    timings, results = {}, set()
+    for name, buffer_size, write in writers:
+        timings[name], result = best_time(lambda: run(write, buffer_size), args.repeat)
+        results.add(result)
+    if len(results) != 1:
+        raise AssertionError("The writers wrote different output")
+
+    print(f"{args.rows} rows, {args.latency_ms} ms per write, {args.mb_per_s} MB/s")
+    for name, seconds in timings.items():
+        print(f"{name:11s} {seconds:.3f} s ({timings['row by row'] / seconds:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+load_test_service.py
+
+Measures latency of the asyncio ParserService while many users submit files at once.
+
+Each simulated user submits generated point files back to back; the script reports
+latency percentiles for all submissions together with overall throughput, and checks
+that the event loop stayed responsive while the work ran on the executor.
+
+Usage:
+    python benchmarks/load_test_service.py --users 12 --requests 10 --rows 5000
+"""
+# Standard library imports
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Local imports
+from service import ParserService  # noqa: E402
+from synthetic import generate_bytes  # noqa: E402
+
+DEFAULT_DICTIONARY = Path(__file__).parent.parent / "config" / "replacement_dict.json"
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    """Return the value at a fraction of a sorted list."""
+    return ordered[round(fraction * (len(ordered) - 1))]
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Return the worst delay seen by a timer on the event loop while work runs."""
+    worst = 0.0
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - expected)
+    return worst
+
+
+async def simulate_user(service: ParserService, payloads: list, latencies: list):
+    """Submit each payload in turn and record how long it took."""
+    for payload in payloads:
+        started = time.perf_counter()
+        await service.process_bytes(payload)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_load_test(args) -> dict:
+    """Run the load test and return the measurements."""
+    payloads = [generate_bytes(args.rows, seed) for seed in range(args.requests)]
+    latencies = []
+    async with ParserService.from_config_files(
+            str(args.dictionary), max_workers=args.workers,
+            use_processes=not args.threads) as service:
+        # Warm up every worker so start-up cost is not counted
+        await asyncio.gather(*(service.process_bytes(payloads[0])
+                               for _ in range(args.workers or 1)))
+
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(measure_loop_lag(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(simulate_user(service, payloads, latencies)
+                               for _ in range(args.users)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        loop_lag = await lag_task
+
+    ordered = sorted(latencies)
+    return {
+        "submissions": len(ordered),
+        "elapsed_seconds": elapsed,
+        "throughput_per_second": len(ordered) / elapsed,
+        "rows_per_second": len(ordered) * args.rows / elapsed,
+        "mean": statistics.fmean(ordered),
+        "p50": percentile(ordered, 0.50),
+        "p90": percentile(ordered, 0.90),
+        "p99": percentile(ordered, 0.99),
+        "max": ordered[-1],
+        "worst_event_loop_lag": loop_lag,
+    }
+
+
+def main(argv=None):
+    """Command line entry point for the load test."""
+    arg_parser = argparse.ArgumentParser(description="Load test the asyncio ParserService")
+    arg_parser.add_argument("--users", type=int, default=12, help="Concurrent users")
+    arg_parser.add_argument("--requests", type=int, default=10,
+                            help="Files submitted by each user")
+    arg_parser.add_argument("--rows", type=int, default=5000, help="Rows per file")
+    arg_parser.add_argument("--workers", type=int, default=None,
+                            help="Executor workers (default: CPU count)")
+    arg_parser.add_argument("--threads", action="store_true",
+                            help="Use a thread pool instead of worker processes")
+    arg_parser.add_argument("--dictionary", default=DEFAULT_DICTIONARY,
+                            help="Path to the replacement dictionary")
+    args = arg_parser.parse_args(argv)
+
+    results = asyncio.run(run_load_test(args))
+    print(f"{results['submissions']} submissions of {args.rows} rows from {args.users} users "
+          f"in {results['elapsed_seconds']:.2f}s")
+    print(f"throughput: {results['throughput_per_second']:.1f} files/s, "
+          f"{results['rows_per_second']:.0f} rows/s")
+    print("latency (s): " + ", ".join(f"{key} {results[key]:.3f}"
+                                      for key in ("mean", "p50", "p90", "p99", "max")))
+    print(f"worst event loop lag: {results['worst_event_loop_lag'] * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+reference_parser3.py
+
+A frozen copy of the formatting rules parser3.py applied before any faster engine was
+added, which benchmark_equivalence.py checks every engine against. It is deliberately
+slow and is not to be changed along with parser3.py: if an engine differs from it, the
+engine is wrong, or the rules were changed on purpose and the change has to be made here
+as well.
+
+Only the rules are frozen. The original read UTF-8 comma separated files and took any
+row with a numeric second column for a point; rows are read here in the sniffed dialect
+and past the detected header rows, as every engine reads them.
+"""
+# Standard library imports
+import csv
+import re
+
+# Local imports
+from compressed import open_text
+from parser3 import processed_output_path
+from point_schema import Schema
+from sniff import FileFormat
+
+
+def item_is_size(item: str) -> bool:
+    """
+    Check if the item is a size (e.g., 1/4, 1/2, 3/4, 1, 2, 3).
+
+    Args:
+        item (str): The item to check
+
+    Returns:
+        bool: True if the item is a size, False otherwise
+    """
+    if item.startswith('\\'):
+        item = item[1:]  # Remove leading backslash if present
+    if item.endswith('"'):
+        item = item[:-1]  # Remove trailing double quote if present
+    size_pattern = r'(?:\d+\s+\d+/\d+|\d+/\d+|\d+)(?:"|\')?'
+    return bool(re.match(size_pattern, item))
+
+
+def number_of_codes(description_items: list, property_codes: list, misc_codes: list) -> str:
+    """
+    Check if the description contains one or two valid codes.
+
+    Args:
+        description_items (list): List of description items to check
+        property_codes (list): List of valid property corner codes
+        misc_codes (list): List of valid miscellaneous codes
+
+    Returns:
+        str: 'zero', 'one', or 'two' based on the number of valid codes found.
+    """
+    valid_codes = 0
+
+    # Check first two items in the description for valid codes
+    for item in description_items[:2]:
+        if item.upper() in (code.upper() for code in property_codes + misc_codes):
+            valid_codes += 1
+
+    if valid_codes == 0:
+        return 'zero'
+    elif valid_codes == 1:
+        return 'one'
+    else:
+        return 'two'
+
+
+def format_description(description: str, property_codes: list, misc_codes: list) -> str:
+    """
+    Apply the formatting rules to one description.
+
+    Args:
+        description (str): The description
+        property_codes (list): List of valid property corner codes
+        misc_codes (list): List of valid miscellaneous codes
+
+    Returns:
+        str: The formatted description
+    """
+    desc_items = description.strip().split()
+
+    if len(desc_items) >= 2:
+        # Special bypass condition: if 'TREE' is present, skip all processing
+        if any(item.upper() == 'TREE' for item in desc_items):
+            # No processing applied - keep description as is
+            pass
+        else:
+            code_count = number_of_codes(desc_items, property_codes, misc_codes)
+
+            if code_count == 'one':
+                # Rule for ONE code
+                if len(desc_items) >= 2 and desc_items[0] != "TREE":
+                    # If first item is property code and second is size,
+                    # add backslash
+                    if desc_items[0].upper() in (code.upper()
+                        for code in property_codes) \
+                            and item_is_size(desc_items[1]) \
+                            and not desc_items[1].startswith('\\'):
+                        desc_items[1] = '\\' + desc_items[1]
+                    # If first is size and second is property code,
+                    # swap and add backslash
+                    elif item_is_size(desc_items[0]) and desc_items[1].upper() in \
+                        (code.upper() for code in property_codes):
+                        size_item = desc_items[0]
+                        if not size_item.startswith('\\'):
+                            size_item = '\\' + size_item
+                        desc_items[0], desc_items[1] = desc_items[1], size_item
+                    # If first item is property code and second is not a size,
+                    # add forward slash
+                    elif desc_items[0].upper() in \
+                            (code.upper() for code in property_codes) \
+                            and not item_is_size(desc_items[1]) \
+                            and not desc_items[1].startswith('/') \
+                            and not desc_items[1].startswith('\\'):
+                        desc_items[1] = '/' + desc_items[1]
+                    # If first item is miscellaneous code, add forward
+                    # slash to second item
+                    elif desc_items[0].upper() in \
+                            (code.upper() for code in misc_codes):
+                        if not desc_items[1].startswith('/') \
+                                and not desc_items[1].startswith('\\'):
+                            desc_items[1] = '/' + desc_items[1]
+
+            elif code_count == 'two':
+                # Rule for TWO codes - ensure property corner code is
+                # after first code
+                # Check if we need to reorder codes
+                if desc_items[0].upper() in (code.upper()
+                        for code in property_codes) and desc_items[1].upper() in \
+                            (code.upper() for code in misc_codes):
+                    # Swap so property code comes after misc code
+                    desc_items[0], desc_items[1] = desc_items[1], desc_items[0]
+
+                # Now handle the third item
+                if len(desc_items) >= 3 and desc_items[1] != "TREE":
+                    if item_is_size(desc_items[2]):
+                        if not desc_items[2].startswith('\\'):
+                            desc_items[2] = '\\' + desc_items[2]
+                    else:
+                        if not desc_items[2].startswith('/') and not \
+                                desc_items[2].startswith('\\') and \
+                                desc_items[1] != "TREE":
+                            desc_items[2] = '/' + desc_items[2]
+
+    return ' '.join(desc_items)
+
+
+def process_file(input_file: str, property_codes: list, misc_codes: list,
+                 file_format: FileFormat, schema: Schema) -> str:
+    """
+    Format a preprocessed file row by row and write the output where parser3 writes it.
+
+    Args:
+        input_file (str): Path to the preprocessed CSV file
+        property_codes (list): List of valid property corner codes
+        misc_codes (list): List of valid miscellaneous codes
+        file_format (FileFormat): Encoding and dialect of the file
+        schema (Schema): Column layout of the file
+
+    Returns:
+        str: Path to the output file
+    """
+    with open_text(input_file, encoding=file_format.encoding,
+                   errors=file_format.errors) as infile:
+        rows = list(csv.reader(infile, **file_format.csv_options()))
+
+    output_file = processed_output_path(input_file)
+    with open_text(output_file, 'w', encoding=file_format.encoding,
+                   errors=file_format.errors) as outfile:
+        writer = csv.writer(outfile, **file_format.csv_options())
+        for number, row in enumerate(rows):
+            if number >= schema.header_rows and schema.is_data(row):
+                row[schema.description] = format_description(row[schema.description],
+                                                             property_codes, misc_codes)
+            writer.writerow(row)
+    return output_file
@@ -0,0 +1,74 @@
+"""
+synthetic.py
+
+Generates realistic point files for benchmarks: a PNEZD header followed by rows whose
+descriptions mix property corner codes, miscellaneous codes, sizes, non-standard codes
+from the replacement dictionary and free text, in the proportions seen in field data.
+"""
+# Standard library imports
+import csv
+import io
+import random
+
+PROPERTY_CODES = ["IRF", "IPF", "PCF", "RBF", "RBS", "CMF", "PKF"]
+MISC_CODES = ["EP", "TOC", "BOC", "MH", "FH", "PP", "SIGN", "WV", "CL", "FL"]
+NON_STANDARD_CODES = ["IRFF", "IR", "PFC", "RBR", "EOP", "MANHOLE", "HYD"]
+SIZES = ["1/2", "5/8", "3/4", "1", '1/2"', "2"]
+WORDS = ["CAP", "BENT", "LEANING", "DISTURBED", "NAIL", "SET", "OLD", "NEW", "TREE"]
+
+
+def random_description(rng: random.Random) -> str:
+    """Return one plausible field description."""
+    kind = rng.random()
+    if kind < 0.25:
+        parts = [rng.choice(PROPERTY_CODES), rng.choice(SIZES)]
+    elif kind < 0.35:
+        parts = [rng.choice(SIZES), rng.choice(PROPERTY_CODES)]
+    elif kind < 0.45:
+        parts = [rng.choice(PROPERTY_CODES), rng.choice(MISC_CODES), rng.choice(SIZES)]
+    elif kind < 0.70:
+        parts = [rng.choice(MISC_CODES), rng.choice(WORDS)]
+    elif kind < 0.85:
+        parts = [rng.choice(NON_STANDARD_CODES), rng.choice(SIZES + WORDS)]
+    else:
+        parts = [rng.choice(WORDS), rng.choice(WORDS)]
+    if rng.random() < 0.3:
+        parts.append(rng.choice(WORDS))
+    return ' '.join(parts)
+
+
+def generate_rows(count: int, seed: int = 0) -> list:
+    """
+    Generate point rows with a header.
+
+    Args:
+        count (int): Number of data rows
+        seed (int): Random seed, so runs are repeatable
+
+    Returns:
+        list: Header row followed by count data rows
+    """
+    rng = random.Random(seed)
+    rows = [["Point", "Northing", "Easting", "Elevation", "Description"]]
+    for point in range(1, count + 1):
+        rows.append([
+            str(point),
+            f"{rng.uniform(100000, 200000):.3f}",
+            f"{rng.uniform(500000, 600000):.3f}",
+            f"{rng.uniform(0, 300):.3f}",
+            random_description(rng),
+        ])
+    return rows
+
+
+def generate_bytes(count: int, seed: int = 0) -> bytes:
+    """Return a generated point file as UTF-8 bytes."""
+    buffer = io.StringIO(newline='')
+    csv.writer(buffer).writerows(generate_rows(count, seed))
+    return buffer.getvalue().encode('utf8')
+
+
+def write_point_file(path, count: int, seed: int = 0):
+    """Write a generated point file to path."""
+    with open(path, 'wb') as f:
+        f.write(generate_bytes(count, seed))
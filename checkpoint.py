@@ -0,0 +1,290 @@
+"""
+checkpoint.py
+
+Checkpoints let both processing stages pick up where the previous run stopped when a
+point file only grows between runs, as it does when data collectors sync several times
+a day.
+
+A checkpoint is stored next to the output file as "{output_file}.checkpoint.json" and
+records how many bytes of the input were processed, a checksum of those bytes and the
+size of the output afterwards. On the next run the input is only processed from the
+recorded offset if the prefix checksum still matches and the output has not been
+touched; otherwise the caller falls back to a full run.
+
+Exports often end without a newline after the last row. Once a file has stopped growing
+that row is processed too, but the checkpoint still ends at the last newline and also
+records the size of the output with the row; the next run cuts the output back and
+reads the row again, in case more of it was written since.
+
+Full runs write to a partial file, "{output_file}.part", which is renamed over the
+output only once it is complete, so an interrupted run never leaves a truncated output
+behind. Every CHECKPOINT_ROWS rows the partial file is flushed to disk and gets a
+checkpoint of its own; resume_partial picks an interrupted run up from there.
+"""
+# Standard library imports
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SUFFIX = '.checkpoint.json'
+PARTIAL_SUFFIX = '.part'
+READ_CHUNK_SIZE = 1024 * 1024
+# Rows written to a partial file between checkpoints
+CHECKPOINT_ROWS = 1024 * 1024
+
+
+def checkpoint_path(output_file) -> Path:
+    """Return the path of the checkpoint kept alongside an output file."""
+    return Path(f"{output_file}{CHECKPOINT_SUFFIX}")
+
+
+def partial_path(output_file) -> Path:
+    """Return the path a full run writes to before it is committed to output_file."""
+    return Path(f"{output_file}{PARTIAL_SUFFIX}")
+
+
+def complete_length(path) -> int:
+    """
+    Return the number of bytes in a file up to and including its last newline.
+
+    Anything after the last newline may be a row that is still being written, so it is
+    left for the next run.
+
+    Args:
+        path (str): Path to the file
+
+    Returns:
+        int: Offset just past the last newline, or 0 if the file has none
+    """
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        while position > 0:
+            block_start = max(0, position - READ_CHUNK_SIZE)
+            f.seek(block_start)
+            block = f.read(position - block_start)
+            newline = block.rfind(b'\n')
+            if newline != -1:
+                return block_start + newline + 1
+            position = block_start
+    return 0
+
+
+def settled_length(path, size: int, end: int) -> int:
+    """
+    Return how many bytes of a file to process.
+
+    A file that is still the size it had when it was hashed or sniffed has stopped
+    growing, so a last row without a newline is complete and is processed as well.
+
+    Args:
+        path (str): Path to the file
+        size (int): Size of the file when it was hashed or sniffed
+        end (int): Offset just past the last newline, from complete_length
+
+    Returns:
+        int: The size of the file if it has not changed, otherwise end
+    """
+    return size if os.path.getsize(path) == size else end
+
+
+def prefix_checksum(path, length: int) -> str:
+    """
+    Hash the first length bytes of a file.
+
+    Args:
+        path (str): Path to the file
+        length (int): Number of bytes to hash
+
+    Returns:
+        str: Hex encoded SHA-256 digest of the prefix
+    """
+    digest = hashlib.sha256()
+    remaining = length
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+class PrefixHasher:
+    """
+    Hashes a growing prefix of a file, reading each byte only once.
+
+    Checkpoints of a long run each need the checksum of everything processed so far;
+    hashing the prefix from the start every time would read the input over and over.
+    """
+
+    def __init__(self, path):
+        """
+        Start hashing an empty prefix.
+
+        Args:
+            path (str): Path to the file
+        """
+        self.path = path
+        self.length = 0
+        self._digest = hashlib.sha256()
+
+    def checksum(self, length: int) -> str:
+        """
+        Return the checksum of the first length bytes, as prefix_checksum would.
+
+        Args:
+            length (int): Number of bytes to hash; no less than for the previous call
+
+        Returns:
+            str: Hex encoded SHA-256 digest of the prefix
+        """
+        with open(self.path, 'rb') as f:
+            f.seek(self.length)
+            while self.length < length:
+                chunk = f.read(min(READ_CHUNK_SIZE, length - self.length))
+                if not chunk:
+                    break
+                self._digest.update(chunk)
+                self.length += len(chunk)
+        return self._digest.hexdigest()
+
+
+def flush_to_disk(stream):
+    """Flush a file opened for writing and wait until its contents are on disk."""
+    stream.flush()
+    os.fsync(stream.fileno())
+
+
+def load_checkpoint(output_file):
+    """
+    Load the checkpoint for an output file.
+
+    Args:
+        output_file (str): Path to the output file
+
+    Returns:
+        dict: The checkpoint, or None if there is no usable checkpoint
+    """
+    path = checkpoint_path(output_file)
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning("Ignoring unreadable checkpoint %s: %s", path, e)
+        return None
+
+
+def save_checkpoint(output_file, input_file, offset: int, checksum: str = None,
+                    output_size: int = None, **extra):
+    """
+    Record that the first offset bytes of input_file have been written to output_file.
+
+    Args:
+        output_file (str): Path to the output file
+        input_file (str): Path to the input file
+        offset (int): Number of input bytes processed
+        checksum (str): Checksum of those bytes, if already known (see PrefixHasher)
+        output_size (int): Size of the output written from those bytes, if the row after
+            the last newline was written after them (default: the size of the output)
+        **extra: Additional stage specific values to keep in the checkpoint
+    """
+    state = {
+        "input": str(Path(input_file).resolve()),
+        "offset": offset,
+        "checksum": checksum or prefix_checksum(input_file, offset),
+        "output_size": os.path.getsize(output_file),
+    }
+    if output_size is not None:
+        state["output_size"], state["tail_output_size"] = output_size, state["output_size"]
+    state.update(extra)
+    path = checkpoint_path(output_file)
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+
+def resume_offsets(input_file, output_file) -> tuple[int, int, dict]:
+    """
+    Work out which byte range of the input still needs processing.
+
+    If the last run also wrote the row after the last newline, the output is cut back to
+    the size it had before that row so the row is processed again.
+
+    Args:
+        input_file (str): Path to the input file
+        output_file (str): Path to the output file written by earlier runs
+
+    Returns:
+        tuple: (start, end, checkpoint). start is 0 when a full run is needed, end is the
+        offset just past the last complete line, and checkpoint is the saved state the
+        start offset came from (None for a full run).
+    """
+    end = complete_length(input_file)
+    state = load_checkpoint(output_file)
+    if state is None or not Path(output_file).is_file():
+        return 0, end, None
+
+    offset = state.get("offset", 0)
+    if offset > end:
+        logger.info("Input %s is shorter than the checkpoint; running in full", input_file)
+        return 0, end, None
+    output_size = os.path.getsize(output_file)
+    if output_size not in (state.get("output_size"), state.get("tail_output_size")):
+        logger.info("Output %s changed since the checkpoint; running in full", output_file)
+        return 0, end, None
+    if prefix_checksum(input_file, offset) != state.get("checksum"):
+        logger.info("Previously processed rows of %s changed; running in full", input_file)
+        return 0, end, None
+    if output_size != state["output_size"]:
+        logger.info("Processing the last row of %s again", input_file)
+        os.truncate(output_file, state["output_size"])
+
+    logger.info("Resuming %s at byte %d of %d", input_file, offset, end)
+    return offset, end, state
+
+
+def resume_partial(input_file, output_file) -> tuple[int, int, dict]:
+    """
+    Work out where an interrupted full run of output_file stopped.
+
+    Rows written to the partial file after its last checkpoint may be incomplete, so
+    the file is cut back to the size the checkpoint recorded before it is checked like
+    any other output.
+
+    Args:
+        input_file (str): Path to the input file
+        output_file (str): Path to the output file the run was writing
+
+    Returns:
+        tuple: (start, end, checkpoint) as for resume_offsets, with start 0 and no
+        checkpoint when there is nothing to resume
+    """
+    partial = partial_path(output_file)
+    state = load_checkpoint(partial)
+    if state is None or not partial.is_file():
+        return 0, complete_length(input_file), None
+    size = state.get("output_size", 0)
+    if os.path.getsize(partial) > size:
+        logger.info("Discarding rows written to %s after its last checkpoint", partial)
+        os.truncate(partial, size)
+    return resume_offsets(input_file, partial)
+
+
+def discard_partial(output_file):
+    """Remove the partial file of output_file and its checkpoint, if there are any."""
+    for path in (partial_path(output_file), checkpoint_path(partial_path(output_file))):
+        path.unlink(missing_ok=True)
+
+
+def commit_partial(output_file):
+    """Replace output_file with its complete partial file and drop the checkpoint."""
+    os.replace(partial_path(output_file), output_file)
+    checkpoint_path(partial_path(output_file)).unlink(missing_ok=True)
@@ -0,0 +1,291 @@
+"""
+columnar.py
+
+Parquet, Feather and Arrow IPC versions of the processed output, written alongside the
+processed CSV for tools that would otherwise parse the CSV again.
+
+Each table holds the original columns of the input file as text, followed by:
+
+    raw_description     the description as it was in the input file
+    final_description   the description as written to the processed CSV
+    rule_replaced       whether the replacement dictionary changed the description
+    rule_<name>         whether each formatting rule in vectorized.RULES applied
+
+The table is built from the input file and the outputs of both stages, read side by side a
+chunk of rows at a time and written as Arrow record batches, so memory use does not grow
+with the size of the file; under a memory budget the batches are sized to fit it.
+
+The formats need pyarrow (pip install description-parser[arrow]):
+
+    parquet   compressed, for archiving and for tools that read Parquet
+    feather   Feather v2 with LZ4 compression, smaller than Arrow IPC but read with a copy
+    arrow     uncompressed Arrow IPC file, which load_table memory-maps without copying
+
+Example:
+    path = write_columnar("job.csv", "preprocessed_job.csv", "job_processed.csv",
+                          property_codes, misc_codes, "arrow")
+    table = load_table(path)
+"""
+# Standard library imports
+import itertools
+import os
+# Third-party imports
+import numpy as np
+import pandas as pd
+# Local imports
+import parser3
+from compressed import strip_gzip
+from description_parser import SAMPLE_ROWS
+from memory import MemoryBudget
+from point_schema import Schema, read_schema
+from sniff import FileFormat, sniff_file
+import vectorized
+
+# Output formats accepted by batch.py; csv is the processed CSV alone
+OUTPUT_FORMATS = ('csv', 'parquet', 'feather', 'arrow')
+EXTENSIONS = {'parquet': '.parquet', 'feather': '.feather', 'arrow': '.arrow'}
+# Rows in each record batch, or the most if there is a memory budget
+BATCH_ROWS = 65536
+# Copies of a row held while its batch is built: one from each of the three files read
+# and the Arrow batch
+TABLE_COPIES = 4
+
+
+def require_pyarrow(output_format: str):
+    """
+    Check that pyarrow is available for a columnar output format.
+
+    Args:
+        output_format (str): One of OUTPUT_FORMATS
+
+    Raises:
+        ValueError: If the format is unknown
+        ImportError: If the format needs pyarrow and it is not installed
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format!r}, expected one of "
+                         f"{', '.join(OUTPUT_FORMATS)}")
+    if output_format == 'csv':
+        return
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError(f"{output_format} output needs pyarrow: "
+                          "pip install description-parser[arrow]") from e
+
+
+def columnar_output_path(processed_file: str, output_format: str) -> str:
+    """Return the path of the columnar output written next to a processed CSV file."""
+    base, _ = os.path.splitext(strip_gzip(processed_file))
+    return base + EXTENSIONS[output_format]
+
+
+def _read_text(path: str, file_format: FileFormat, chunk_rows: int = None):
+    """Read a CSV file with every field kept exactly as written, in chunks if given."""
+    return pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_rows,
+                       **file_format.read_csv_options())
+
+
+def batch_rows(input_file: str, file_format: FileFormat,
+               memory_budget: MemoryBudget = None) -> int:
+    """
+    Return how many rows to put in each record batch.
+
+    Args:
+        input_file (str): Path to the original input file
+        file_format (FileFormat): Encoding and dialect of the file
+        memory_budget (MemoryBudget): Size batches to fit in this budget (default:
+            BATCH_ROWS rows)
+
+    Returns:
+        int: Rows per batch
+    """
+    if memory_budget is None:
+        return BATCH_ROWS
+    sample = pd.read_csv(input_file, dtype=str, keep_default_na=False, nrows=SAMPLE_ROWS,
+                         **file_format.read_csv_options())
+    if not len(sample):
+        return BATCH_ROWS
+    return memory_budget.capacity(
+        sample.memory_usage(deep=True).sum() / len(sample) * TABLE_COPIES, most=BATCH_ROWS)
+
+
+def _table_frame(table: pd.DataFrame, preprocessed: pd.DataFrame, processed: pd.DataFrame,
+                 first_row: int, catalog: parser3.CodeCatalog, schema: Schema) -> pd.DataFrame:
+    """Add the description and rule columns to a chunk of input rows starting at first_row."""
+    rows = len(table)
+    table['raw_description'] = table.iloc[:, schema.description]
+    if processed.shape[1] > schema.description:
+        table['final_description'] = processed.iloc[:, schema.description].to_numpy()
+    else:
+        table['final_description'] = ''
+
+    # Header rows parser3 passes through unformatted get no rule flags; the first header
+    # row is the one pandas reads as column names
+    positions = np.arange(max(schema.header_rows - 1 - first_row, 0), rows)
+    if preprocessed.shape[1] > schema.description:
+        replaced = preprocessed.iloc[:, schema.description].to_numpy(dtype=object)
+    else:
+        replaced = np.full(rows, '', dtype=object)
+        positions = positions[:0]
+    table['rule_replaced'] = replaced != table['raw_description'].to_numpy()
+
+    # The descriptions themselves come from the processed CSV; formatting the chunk again
+    # is only how the rules that applied to each row are found
+    rules = {}
+    vectorized.format_descriptions(replaced[positions], catalog, rules)
+    for rule in vectorized.RULES:
+        flags = np.zeros(rows, dtype=bool)
+        flags[positions] = rules[rule]
+        table['rule_' + rule] = flags
+    return table
+
+
+def build_batches(input_file: str, preprocessed_file: str, processed_file: str,
+                  catalog: parser3.CodeCatalog, file_format: FileFormat = None,
+                  schema: Schema = None, memory_budget: MemoryBudget = None):
+    """
+    Build the columnar output for a file a chunk of rows at a time.
+
+    The three files are read side by side, so only one chunk of each is held at once.
+
+    Args:
+        input_file (str): Path to the original input file
+        preprocessed_file (str): Path to the output of the replacement stage
+        processed_file (str): Path to the output of the format stage
+        catalog (parser3.CodeCatalog): Compiled property corner and miscellaneous codes
+        file_format (FileFormat): Encoding and dialect of the files (default: sniffed
+            from the input file)
+        schema (Schema): Column layout of the files (default: detected from the
+            preprocessed file)
+        memory_budget (MemoryBudget): Size chunks to fit in this budget (default:
+            BATCH_ROWS rows)
+
+    Yields:
+        pd.DataFrame: The table for each chunk of data rows of the input file; a single
+        empty one if there are none
+
+    Raises:
+        ValueError: If the three files do not have the same number of rows
+    """
+    if file_format is None:
+        file_format = sniff_file(input_file)
+    if schema is None:
+        schema = read_schema(preprocessed_file, file_format)
+    chunk_rows = batch_rows(input_file, file_format, memory_budget)
+    first_row = 0
+    with _read_text(input_file, file_format, chunk_rows) as tables, \
+            _read_text(preprocessed_file, file_format, chunk_rows) as preprocessed, \
+            _read_text(processed_file, file_format, chunk_rows) as processed:
+        for chunks in itertools.zip_longest(tables, preprocessed, processed):
+            if any(chunk is None or len(chunk) != len(chunks[0]) for chunk in chunks):
+                raise ValueError(f"{input_file}, {preprocessed_file} and {processed_file} "
+                                 "do not have the same number of rows")
+            yield _table_frame(*chunks, first_row, catalog, schema)
+            first_row += len(chunks[0])
+    if not first_row:
+        yield _table_frame(*(_read_text(path, file_format).iloc[:0]
+                             for path in (input_file, preprocessed_file, processed_file)),
+                           0, catalog, schema)
+
+
+def build_table(input_file: str, preprocessed_file: str, processed_file: str,
+                catalog: parser3.CodeCatalog, file_format: FileFormat = None,
+                schema: Schema = None) -> pd.DataFrame:
+    """
+    Build the whole columnar output for a file in memory; see build_batches.
+
+    Returns:
+        pd.DataFrame: One row per data row of the input file
+    """
+    return pd.concat(build_batches(input_file, preprocessed_file, processed_file, catalog,
+                                   file_format, schema), ignore_index=True)
+
+
+def write_batches(batches, path: str, output_format: str):
+    """
+    Write tables a record batch at a time, atomically, in a columnar format.
+
+    Args:
+        batches: Iterable of pd.DataFrame with the same columns, as build_batches yields
+        path (str): Path of the output file
+        output_format (str): 'parquet', 'feather' or 'arrow'
+    """
+    require_pyarrow(output_format)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    temp_path = f"{path}.tmp"
+    writer = None
+    try:
+        for frame in batches:
+            batch = pa.RecordBatch.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                if output_format == 'parquet':
+                    writer = pq.ParquetWriter(temp_path, batch.schema)
+                else:
+                    # Feather v2 is the Arrow IPC file format with compressed buffers
+                    options = pa.ipc.IpcWriteOptions(
+                        compression='lz4' if output_format == 'feather' else None)
+                    writer = pa.ipc.new_file(temp_path, batch.schema, options=options)
+            writer.write_table(pa.Table.from_batches([batch]))
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(temp_path, path)
+
+
+def load_table(path: str):
+    """
+    Open a columnar output with memory mapping.
+
+    Arrow IPC files are mapped without copying, so even large outputs open almost
+    instantly; call to_pandas() on the result for a DataFrame.
+
+    Args:
+        path (str): Path to a .parquet, .feather or .arrow file
+
+    Returns:
+        pyarrow.Table: The table
+    """
+    require_pyarrow('arrow')
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    if path.endswith(EXTENSIONS['parquet']):
+        return pq.read_table(path, memory_map=True)
+    if path.endswith(EXTENSIONS['feather']):
+        return feather.read_table(path, memory_map=True)
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def write_columnar(input_file: str, preprocessed_file: str, processed_file: str,
+                   property_codes: list, misc_codes: list, output_format: str,
+                   file_format: FileFormat = None, schema: Schema = None,
+                   memory_budget: MemoryBudget = None) -> str:
+    """
+    Write the columnar output for a file next to its processed CSV.
+
+    Args:
+        input_file (str): Path to the original input file
+        preprocessed_file (str): Path to the output of the replacement stage
+        processed_file (str): Path to the output of the format stage
+        property_codes (list): List of valid property corner codes
+        misc_codes (list): List of valid miscellaneous codes
+        output_format (str): 'parquet', 'feather' or 'arrow'
+        file_format (FileFormat): Encoding and dialect of the input (default: sniffed)
+        schema (Schema): Column layout of the input (default: detected)
+        memory_budget (MemoryBudget): Write record batches that fit in this budget
+            (default: BATCH_ROWS rows)
+
+    Returns:
+        str: Path to the columnar output
+    """
+    batches = build_batches(input_file, preprocessed_file, processed_file,
+                            parser3.CodeCatalog(property_codes, misc_codes), file_format,
+                            schema, memory_budget)
+    path = columnar_output_path(str(processed_file), output_format)
+    write_batches(batches, path, output_format)
+    return path
@@ -0,0 +1,138 @@
+"""
+compressed.py
+
+Streaming access to compressed point files, so archived crew data can be processed
+without extracting it to disk first.
+
+Gzip files (job.csv.gz) are read and written through gzip streams wherever a plain file
+would be opened. Zip archives are read member by member straight out of the archive,
+and members are streamed rather than held in memory whole.
+
+Example:
+    with open_text("job.csv.gz") as f:
+        rows = list(csv.reader(f))
+
+    with zipfile.ZipFile("crew.zip") as archive:
+        for name in point_file_members(archive):
+            with archive.open(name) as member:
+                ...
+"""
+# Standard library imports
+import gzip
+import io
+import os
+import zipfile
+from pathlib import PurePath
+
+GZIP_SUFFIX = '.gz'
+ZIP_SUFFIX = '.zip'
+
+# Most of the size reduction of level 9 in a fraction of the time
+COMPRESS_LEVEL = 6
+
+
+def is_gzip(path) -> bool:
+    """Return True if path names a gzip compressed file."""
+    return str(path).lower().endswith(GZIP_SUFFIX)
+
+
+def is_zip(path) -> bool:
+    """Return True if path names a zip archive."""
+    return str(path).lower().endswith(ZIP_SUFFIX)
+
+
+def strip_gzip(path: str) -> str:
+    """Return path without its .gz suffix, if it has one."""
+    path = str(path)
+    return path[:-len(GZIP_SUFFIX)] if is_gzip(path) else path
+
+
+def with_compression(path: str, compress: bool) -> str:
+    """Return path with a .gz suffix if compress is true, and without one otherwise."""
+    path = strip_gzip(path)
+    return path + GZIP_SUFFIX if compress else path
+
+
+def inner_suffix(path) -> str:
+    """Return the extension of a file, looking through a .gz suffix (job.csv.gz -> .csv)."""
+    return PurePath(strip_gzip(path)).suffix.lower()
+
+
+def uncompressed_size(path) -> int:
+    """
+    Return the size of a file once decompressed, without decompressing it.
+
+    A gzip file ends with the size of its data modulo 2**32, which is exact for anything
+    under 4 GB. Files of several gzip members report only the last one, so treat the
+    result as an estimate.
+
+    Args:
+        path (str): Path to a plain or gzip compressed file
+
+    Returns:
+        int: Size in bytes
+    """
+    size = os.path.getsize(path)
+    if not is_gzip(path) or size < 4:
+        return size
+    with open(path, 'rb') as f:
+        f.seek(-4, os.SEEK_END)
+        return int.from_bytes(f.read(4), 'little')
+
+
+def open_text(path, mode: str = 'r', compressed: bool = None, encoding: str = 'utf8',
+              errors: str = 'strict', buffering: int = -1):
+    """
+    Open a CSV file for text reading or writing, through gzip if it is compressed.
+
+    Args:
+        path (str): Path to the file, or a binary stream already open in mode; closing
+            the text stream closes it too, unless it is gzip compressed
+        mode (str): 'r', 'w' or 'a'
+        compressed (bool): Whether the file is gzip compressed; by default this is
+            worked out from the .gz suffix, and streams are taken to be uncompressed
+        encoding (str): Text encoding of the file
+        errors (str): Encoding error handler
+        buffering (int): Buffer size in bytes for plain files (default: the io module's
+            default); gzip streams buffer their own compressed blocks
+
+    Returns:
+        A text stream with universal newlines turned off, as the csv module expects
+    """
+    stream = isinstance(path, io.IOBase)
+    if compressed is None:
+        compressed = not stream and is_gzip(path)
+    if compressed:
+        return gzip.open(path, mode + 't', encoding=encoding, errors=errors, newline='',
+                         compresslevel=COMPRESS_LEVEL)
+    if stream:
+        return io.TextIOWrapper(path, encoding=encoding, errors=errors, newline='')
+    return open(path, mode, buffering=buffering, newline='', encoding=encoding, errors=errors)
+
+
+def point_file_members(archive: zipfile.ZipFile, extensions) -> list:
+    """
+    List the point files inside a zip archive.
+
+    Args:
+        archive (zipfile.ZipFile): The open archive
+        extensions (Iterable): Lowercase point file extensions, such as '.csv'
+
+    Returns:
+        list: Member names, in archive order
+    """
+    return [info.filename for info in archive.infolist()
+            if not info.is_dir() and inner_suffix(info.filename) in extensions]
+
+
+def open_member_text(archive: zipfile.ZipFile, name: str, encoding: str = 'utf8',
+                     errors: str = 'strict'):
+    """Open a member of a zip archive as a text stream, decompressing it as it is read."""
+    return io.TextIOWrapper(archive.open(name), encoding=encoding, errors=errors, newline='')
+
+
+def create_member_text(archive: zipfile.ZipFile, name: str, encoding: str = 'utf8',
+                       errors: str = 'strict'):
+    """Open a new member of a zip archive for writing text, compressing it as it is written."""
+    return io.TextIOWrapper(archive.open(name, 'w', force_zip64=True), encoding=encoding,
+                            errors=errors, newline='')
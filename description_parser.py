@@ -16,15 +16,34 @@ Future improvements could include:
 
 """
 # Standard library imports
+import contextlib
+import io
+import itertools
 import json
 import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 import tkinter as tk
 from tkinter import filedialog, messagebox
 # Third-party imports
+import numpy as np
 import pandas as pd
 # Local imports
-from parser3 import main as parser3_main
+import checkpoint
+from checkpoint import complete_length
+from compressed import is_gzip, open_text, uncompressed_size, with_compression
+from keyindex import KeyIndex, index_path
+from manifest import file_sha256
+from memory import MemoryBudget, format_size
+from parser3 import main as parser3_main, resumable
+from pipeline import PipelineStats, WriteBehind, open_read_ahead
+from point_schema import DEFAULT_SCHEMA, Schema, find_description_column, read_schema
+from records import WRITE_BATCH_ROWS
+from sniff import DEFAULT_FORMAT, FileFormat, sniff_file
 
 # Set up logging
 logging.basicConfig(
@@ -53,16 +72,270 @@ DEFAULT_DICT_PATHS = [
     "replacement_dict.json"                            # Current directory
 ]
 
+# How the description column is held in memory: Python string objects, a categorical of
+# the distinct descriptions, or one Arrow buffer for the whole column
+STORAGE_TYPES = ('object', 'category', 'pyarrow')
+
+# Rows read to measure how much memory a file will take as a DataFrame
+SAMPLE_ROWS = 1000
+# Copies of the data held while a frame is standardized and written: the frame, the
+# descriptions as they were, and the text of the batch being written
+FRAME_COPIES = 3
+# Rows of a stream standardized at a time, unless fewer fit in the memory budget
+STREAM_CHUNK_ROWS = 65536
+
+@dataclass
+class PrefilterStats:
+    """How many descriptions the replacement prefilter let through."""
+
+    rows: int = 0
+    candidates: int = 0
+
+    @property
+    def rejected(self) -> int:
+        """Number of descriptions that skipped the replacement stage."""
+        return self.rows - self.candidates
+
+    @property
+    def rejection_rate(self) -> float:
+        """Fraction of descriptions that skipped the replacement stage."""
+        return self.rejected / self.rows if self.rows else 0.0
+
+
+@lru_cache(maxsize=32)
+def compile_prefilter(keys: tuple) -> re.Pattern:
+    """
+    Compile a pattern that finds any of the dictionary keys in a description.
+
+    Descriptions without any key are left unchanged by every replacement, so they can
+    skip the replacement stage. The keys are merged into a trie shaped pattern, such as
+    AC (?:P(?:AD|ERCH)|STAND) for the AC keys, so the regular expression engine checks
+    each position against the first characters of all keys at once instead of trying
+    every key in turn. Matching stops at the shortest key on each branch, because any
+    description containing a longer key also contains it.
+
+    Args:
+        keys (tuple): The dictionary keys
+
+    Returns:
+        re.Pattern: A pattern that matches a description if it contains any key
+    """
+    trie = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def branch(node: dict) -> str:
+        if '' in node:
+            return ''
+        branches = [re.escape(char) + branch(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+    return re.compile(branch(trie))
+
+
+def resolve_storage(storage: str) -> str:
+    """
+    Check a description storage type, falling back to 'category' without pyarrow.
+
+    Args:
+        storage (str): One of STORAGE_TYPES
+
+    Returns:
+        str: The storage type to use
+
+    Raises:
+        ValueError: If the storage type is unknown
+    """
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage {storage!r}, expected one of "
+                         f"{', '.join(STORAGE_TYPES)}")
+    if storage == 'pyarrow':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            logger.warning("pyarrow is not installed; storing descriptions as categories")
+            return 'category'
+    return storage
+
+
+def to_storage(descriptions: pd.Series, storage: str) -> pd.Series:
+    """
+    Convert a description column read by pandas to the given storage type.
+
+    Only text columns are converted; a column pandas read as numbers is returned
+    unchanged so that it is written back exactly as before.
+
+    Args:
+        descriptions (pd.Series): The description column
+        storage (str): One of STORAGE_TYPES, as returned by resolve_storage
+
+    Returns:
+        pd.Series: The converted column
+    """
+    if storage == 'object' or descriptions.dtype != object:
+        return descriptions
+    if storage == 'category':
+        return descriptions.astype('category')
+    return descriptions.astype('string[pyarrow]')
+
+
+def common_dtype(first: np.dtype, second: np.dtype) -> np.dtype:
+    """
+    Return the dtype of a column read in two parts that pandas read as first and second.
+
+    Integers and floats combine to the wider number type; anything else mixed becomes
+    object, as when pandas concatenates the chunks of a file it parsed in parts.
+    """
+    if first == second:
+        return first
+    if first.kind in 'iuf' and second.kind in 'iuf':
+        return np.result_type(first, second)
+    return np.dtype(object)
+
+
+def count_changes(before: pd.Series, after: pd.Series) -> int:
+    """
+    Count the rows whose description differs, with missing descriptions counted as changed.
+
+    Args:
+        before (pd.Series): Descriptions before the replacements
+        after (pd.Series): Descriptions after the replacements
+
+    Returns:
+        int: Number of changed rows
+    """
+    if isinstance(before.dtype, pd.CategoricalDtype):
+        # Compare references to the categories instead of building a string per row;
+        # code -1 picks the NaN appended to each array, which never equals itself
+        before_text = np.append(before.cat.categories.to_numpy(dtype=object), np.nan)
+        after_text = np.append(after.cat.categories.to_numpy(dtype=object), np.nan)
+        return int((before_text[before.cat.codes.to_numpy()]
+                    != after_text[after.cat.codes.to_numpy()]).sum())
+    return int((before != after).fillna(True).sum())
+
+
+def count_rows(data: bytes, file_format: FileFormat) -> int:
+    """Return the number of rows pandas reads from CSV data that has no header."""
+    try:
+        return len(pd.read_csv(io.BytesIO(data), header=None, dtype=str,
+                               **file_format.read_csv_options()))
+    except pd.errors.EmptyDataError:
+        return 0
+
+
+def hold_back(frames, rows: int, held: list):
+    """
+    Yield DataFrames without the last rows of the last one.
+
+    Args:
+        frames (Iterable): DataFrames to yield
+        rows (int): Number of rows to leave out
+        held (list): The rows left out are added to this list, as a DataFrame, once the
+            frames have all been yielded
+    """
+    previous = None
+    for df in frames:
+        if previous is not None:
+            yield previous
+        previous = df
+    if previous is not None:
+        split = max(len(previous) - rows, 0)
+        yield previous.iloc[:split]
+        held.append(previous.iloc[split:])
+
+
+def _replace_categories(descriptions: pd.Series, replacement_dict: dict, matches: dict,
+                        stats: PrefilterStats) -> pd.Series:
+    """Apply the replacements to each distinct description of a categorical column once."""
+    categories = pd.Series(descriptions.cat.categories, dtype=object)
+    codes = descriptions.cat.codes.to_numpy()
+    if stats is not None:
+        candidates = categories.str.contains(compile_prefilter(tuple(replacement_dict)),
+                                             na=False).to_numpy()
+        stats.rows += len(descriptions)
+        stats.candidates += int(np.append(candidates, False)[codes].sum())
+
+    category_matches = {} if matches is not None else None
+    replaced = apply_replacements(categories, replacement_dict, category_matches)
+    if matches is not None:
+        for key, found in category_matches.items():
+            matches[key] = np.flatnonzero(np.isin(codes, found)).tolist()
+
+    # Different descriptions can become the same one, so the categories are rebuilt
+    new_codes, new_categories = pd.factorize(replaced)
+    codes = np.where(codes >= 0, new_codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, new_categories),
+                     index=descriptions.index, name=descriptions.name)
+
+
+def apply_replacements(descriptions: pd.Series, replacement_dict: dict,
+                       matches: dict = None, stats: PrefilterStats = None) -> pd.Series:
+    """
+    Apply every replacement in the dictionary, in order, to a column of descriptions.
+
+    Only descriptions that contain at least one key go through the replacements; the
+    rest cannot change. A categorical column is replaced category by category, and an
+    Arrow string column is searched and replaced by pyarrow's compute kernels.
+
+    Args:
+        descriptions (pd.Series): The description column, in any of the STORAGE_TYPES
+        replacement_dict (dict): Non-standard text mapped to its standard replacement
+        matches (dict): If given, filled with the positions of the rows each key matched
+        stats (PrefilterStats): If given, the rows checked and let through are added to it
+
+    Returns:
+        pd.Series: The standardized descriptions
+    """
+    if not replacement_dict:
+        return descriptions
+    if isinstance(descriptions.dtype, pd.CategoricalDtype):
+        return _replace_categories(descriptions, replacement_dict, matches, stats)
+    # The pattern is passed as text because pyarrow compiles it with its own engine
+    prefilter = compile_prefilter(tuple(replacement_dict)).pattern
+    candidates = descriptions.str.contains(prefilter, na=False).to_numpy().nonzero()[0]
+    if stats is not None:
+        stats.rows += len(descriptions)
+        stats.candidates += len(candidates)
+
+    subset = descriptions.iloc[candidates]
+    for old_text, new_text in replacement_dict.items():
+        if matches is not None:
+            found = subset.str.contains(old_text, regex=False, na=False).to_numpy()
+            matches[old_text] = candidates[found].tolist()
+        subset = subset.str.replace(old_text, new_text, regex=False)
+
+    descriptions = descriptions.copy()
+    descriptions.iloc[candidates] = subset.to_numpy()
+    return descriptions
+
+
 class DescriptionParser:
     """Class to handle the standardization of descriptions in CSV files."""
 
-    def __init__(self, dictionary_path: str = None, gui_mode: bool = True):
+    def __init__(self, dictionary_path: str = None, gui_mode: bool = True,
+                 storage: str = 'object', pipeline: bool = False,
+                 memory_budget: MemoryBudget = None):
         """
         Initialize the DescriptionParser with a dictionary file path.
 
         Args:
             dictionary_path (str): Path to the dictionary file (optional)
             gui_mode (bool): Whether to show GUI dialogs (default: True)
+            storage (str): How to hold the description column, one of STORAGE_TYPES.
+                'category' and 'pyarrow' use far less memory on large files; 'pyarrow'
+                falls back to 'category' when pyarrow is not installed
+            pipeline (bool): Read each input ahead and write each output behind on
+                their own threads (see pipeline.py); their queue statistics are added
+                up in pipeline_stats
+            memory_budget (MemoryBudget): If given, files whose DataFrame would not fit
+                in what is left of the budget are read, standardized and written a chunk
+                of rows at a time
+
+        Raises:
+            ValueError: If the storage type is unknown
         """
         if dictionary_path is None:
             # Try to find dictionary file in multiple locations
@@ -71,6 +344,11 @@ class DescriptionParser:
             self.dictionary_path = Path(dictionary_path)
         self.replacement_dict = self._load_dictionary()
         self.gui_mode = gui_mode
+        self.storage = resolve_storage(storage)
+        self.prefilter_stats = PrefilterStats()
+        self.pipeline = pipeline
+        self.pipeline_stats = PipelineStats()
+        self.memory_budget = memory_budget
 
     def _find_dictionary_file(self) -> Path:
         """Find the dictionary file from multiple possible locations."""
@@ -152,13 +430,352 @@ class DescriptionParser:
             logger.info("File selection cancelled")
         return file_path
 
-    def process_file(self, input_file: str) -> str:
+    def _read_increment(self, input_file: str, start: int, end: int, saved: dict,
+                        file_format: FileFormat):
+        """
+        Read the rows stored between two byte offsets of the input file.
+
+        Rows after the header are parsed with the column names and dtypes saved in the
+        checkpoint so they are written out exactly as a full run would write them.
+
+        Args:
+            input_file (str): Path to the input CSV file
+            start (int): Offset of the first unprocessed row, 0 for a full read
+            end (int): Offset just past the last complete row
+            saved (dict): Checkpoint the start offset came from
+            file_format (FileFormat): Encoding and dialect of the input file
+
+        Returns:
+            pd.DataFrame: The rows in the byte range
+        """
+        with open(input_file, 'rb') as f:
+            f.seek(start)
+            data = io.BytesIO(f.read(end - start))
+        if start == 0:
+            return pd.read_csv(data, **file_format.read_csv_options())
+        return pd.read_csv(data, header=None, names=saved["columns"], dtype=saved["dtypes"],
+                           **file_format.read_csv_options())
+
+    def _read_pipelined(self, input_file: str, file_format: FileFormat,
+                        stats: PipelineStats) -> pd.DataFrame:
+        """Read a whole input file, with its blocks read ahead by a background thread."""
+        with open_read_ahead(input_file, stats=stats.read) as source:
+            return pd.read_csv(source, compression='gzip' if is_gzip(input_file) else None,
+                               **file_format.read_csv_options())
+
+    def _chunk_rows(self, input_file: str, file_format: FileFormat) -> int:
+        """
+        Decide whether an input file fits in the memory budget as one DataFrame.
+
+        The memory a row takes is measured on the first SAMPLE_ROWS rows and multiplied
+        by FRAME_COPIES; the number of rows is estimated from the size of the file.
+
+        Args:
+            input_file (str): Path to the input CSV file
+            file_format (FileFormat): Encoding and dialect of the input
+
+        Returns:
+            int: Rows to read at a time, or None to read the whole file at once
+        """
+        if self.memory_budget is None:
+            return None
+        with open_text(input_file, encoding=file_format.encoding,
+                       errors=file_format.errors) as f:
+            lines = list(itertools.islice(f, SAMPLE_ROWS))
+        text = ''.join(lines)
+        sample = pd.read_csv(io.StringIO(text), **file_format.read_csv_options())
+        if sample.empty:
+            return None
+        row_size = sample.memory_usage(deep=True).sum() / len(sample) * FRAME_COPIES
+        line_size = len(text.encode(file_format.encoding, file_format.errors)) / len(lines)
+        needed = uncompressed_size(input_file) / line_size * row_size
+        if self.memory_budget.fits(needed):
+            return None
+        chunk_rows = self.memory_budget.capacity(row_size)
+        logger.info("%s needs about %s in memory; reading %d rows at a time", input_file,
+                    format_size(needed), chunk_rows)
+        return chunk_rows
+
+    def _read_chunks(self, input_file: str, file_format: FileFormat, limit: int,
+                     chunk_rows: int, stats: PipelineStats) -> tuple:
+        """
+        Read an input file a chunk of rows at a time.
+
+        pandas works out the type of each column from the rows it reads, so chunks read
+        on their own can disagree with each other and with a read of the whole file. The
+        file is read twice: once to combine the types of the chunks the way pandas
+        combines those of its own internal chunks, then again with those types.
+
+        Args:
+            input_file (str): Path to the input CSV file
+            file_format (FileFormat): Encoding and dialect of the input
+            limit (int): Read only this many bytes (default: the whole file)
+            chunk_rows (int): Rows per chunk
+            stats (PipelineStats): Statistics to add the read-ahead queue's to
+
+        Returns:
+            tuple: The dtype of each column as a string, as checkpoints record them, and
+            an iterator over the chunks
+        """
+        def chunks(dtype: dict = None):
+            with open_read_ahead(input_file, limit=limit, stats=stats.read) as source, \
+                    pd.read_csv(source, compression='gzip' if is_gzip(input_file) else None,
+                                chunksize=chunk_rows, dtype=dtype,
+                                **file_format.read_csv_options()) as reader:
+                yield from reader
+
+        dtypes = {}
+        for chunk in chunks():
+            for column, dtype in chunk.dtypes.items():
+                dtypes[column] = common_dtype(dtypes.get(column, dtype), dtype)
+        return {column: str(dtype) for column, dtype in dtypes.items()}, chunks(dtypes)
+
+    def _write_frames(self, frames, output_file: Path, file_format: FileFormat,
+                      append: bool, compressed: bool = None, stats: PipelineStats = None,
+                      checkpoint_rows: int = None, save=None):
+        """
+        Write DataFrames one after the other as a CSV file, a batch of rows at a time.
+
+        The file is the same as one written by to_csv from all of the rows at once.
+
+        Args:
+            frames (Iterable): DataFrames with the same columns
+            output_file (Path): File to write
+            file_format (FileFormat): Encoding and dialect to write in
+            append (bool): Add the rows, without a header, to the end of the file
+            compressed (bool): Write gzip (default: if output_file ends in .gz)
+            stats (PipelineStats): If given, each batch is turned into text while a
+                WriteBehind thread writes the one before it, and the thread's queue
+                statistics are added here
+            checkpoint_rows (int): Rows written between calls to save
+            save (Callable): Called with the number of rows written so far, once they
+                are on disk
+        """
+        batch_rows = min(WRITE_BATCH_ROWS, checkpoint_rows or WRITE_BATCH_ROWS)
+        written = 0
+        next_checkpoint = checkpoint_rows
+        with open_text(output_file, 'a' if append else 'w', compressed=compressed,
+                       encoding=file_format.encoding, errors=file_format.errors) as outfile, \
+                (WriteBehind(outfile, stats=stats.write) if stats
+                 else contextlib.nullcontext(outfile)) as writer:
+            for df in frames:
+                # A DataFrame without rows still has a header to write
+                for start in range(0, max(len(df), 1), batch_rows):
+                    writer.write(df.iloc[start:start + batch_rows].to_csv(
+                        index=False, header=not append,
+                        sep=file_format.delimiter, quotechar=file_format.quotechar))
+                    append = True
+                    written += len(df.iloc[start:start + batch_rows])
+                    if save and written >= next_checkpoint:
+                        if stats:
+                            writer.sync()
+                        checkpoint.flush_to_disk(outfile)
+                        save(written)
+                        next_checkpoint = written + checkpoint_rows
+
+    def _description_column(self, df: pd.DataFrame, schema: Schema = None) -> int:
+        """
+        Return the index of the description column of a DataFrame.
+
+        Raises:
+            ValueError: If the data has fewer than 5 columns or no description column
+        """
+        if df.shape[1] < 5:
+            error_msg = f"CSV file must have at least 5 columns. Found: {df.shape[1]}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        if schema is None:
+            column = find_description_column([str(name) for name in df.columns])
+            column = DEFAULT_SCHEMA.description if column is None else column
+        else:
+            column = schema.description
+        if column >= df.shape[1]:
+            error_msg = f"No description column {column}: the data has {df.shape[1]} columns"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        return column
+
+    def _resume_point(self, input_file: str, output_file: Path, dtypes: dict,
+                      resume: bool) -> tuple:
+        """
+        Find how far an interrupted full run got, or discard what it left behind.
+
+        Args:
+            input_file (str): Path to the input CSV file
+            output_file (Path): Output the run was writing
+            dtypes (dict): Column types of the input as read now
+            resume (bool): Resume from the partial file if it can be
+
+        Returns:
+            tuple: Rows already written and how many of them changed, both 0 when the
+            run starts over
+        """
+        if resume:
+            start, end, saved = checkpoint.resume_partial(input_file, output_file)
+            if (start and start == end and saved.get("dtypes") == dtypes
+                    and saved.get("input_size") == os.path.getsize(input_file)):
+                logger.info("Resuming %s after %d rows", input_file, saved["rows"])
+                return saved["rows"], saved["changes"]
+            if start:
+                logger.info("%s changed since it was checkpointed; starting over", input_file)
+        checkpoint.discard_partial(output_file)
+        return 0, 0
+
+    def standardize_frame(self, df: pd.DataFrame, matches: dict = None,
+                          schema: Schema = None) -> tuple:
+        """
+        Apply the replacement dictionary to the description column of a DataFrame, in place.
+
+        Args:
+            df (pd.DataFrame): The point data
+            matches (dict): If given, filled with the rows each key matched
+            schema (Schema): Column layout of the data (default: the description column is
+                found by its name in the header, or is the fifth column)
+
+        Returns:
+            tuple: The descriptions before the replacements, and how many rows changed
+
+        Raises:
+            ValueError: If the data has fewer than 5 columns or no description column
+        """
+        column = self._description_column(df, schema)
+        df.isetitem(column, to_storage(df.iloc[:, column], self.storage))
+        original_values = df.iloc[:, column].copy()
+
+        stats = PrefilterStats()
+        df.isetitem(column, apply_replacements(df.iloc[:, column], self.replacement_dict,
+                                               matches, stats))
+        self.prefilter_stats.rows += stats.rows
+        self.prefilter_stats.candidates += stats.candidates
+        logger.info("Prefilter skipped %d of %d rows (%.1f%%)", stats.rejected,
+                    stats.rows, 100 * stats.rejection_rate)
+        return original_values, count_changes(original_values, df.iloc[:, column])
+
+    def process_stream(self, source, target, file_format: FileFormat = DEFAULT_FORMAT,
+                       schema: Schema = None) -> int:
+        """
+        Standardize point data read from one stream and write it to another.
+
+        Used for point files inside archives, which have no path of their own.
+
+        Args:
+            source: A binary or text stream of CSV data
+            target: A text stream the standardized CSV is written to
+            file_format (FileFormat): Dialect of the data, kept for the output; the
+                encoding applies to binary sources only
+            schema (Schema): Column layout of the data (default: from its header)
+
+        Returns:
+            int: Number of descriptions changed
+
+        Raises:
+            pd.errors.EmptyDataError: If the stream holds no data
+            ValueError: If the data has fewer than 5 columns
+        """
+        df = pd.read_csv(source, **file_format.read_csv_options())
+        _, changes_made = self.standardize_frame(df, schema=schema)
+        df.to_csv(target, index=False, sep=file_format.delimiter,
+                  quotechar=file_format.quotechar)
+        return changes_made
+
+    def standardize_chunks(self, source, file_format: FileFormat = DEFAULT_FORMAT,
+                           schema: Schema = None):
+        """
+        Standardize point data read from a seekable stream, a chunk of rows at a time.
+
+        Chunks are STREAM_CHUNK_ROWS rows, or fewer if the memory budget is tight. The
+        stream is read twice, as _read_chunks reads a file: straight away, to check the
+        columns and combine the column types of the chunks, then again as the returned
+        iterator is consumed.
+
+        Args:
+            source: A seekable binary stream of CSV data, such as a zip archive member
+            file_format (FileFormat): Encoding and dialect of the data, kept for the output
+            schema (Schema): Column layout of the data (default: from its header)
+
+        Returns:
+            Iterator: The standardized CSV text of each chunk, the header first; joined
+            up, the same text process_stream writes
+
+        Raises:
+            pd.errors.EmptyDataError: If the stream holds no data
+            ValueError: If the data has fewer than 5 columns
+        """
+        start = source.tell()
+        options = file_format.read_csv_options()
+        chunk_rows = STREAM_CHUNK_ROWS
+        if self.memory_budget is not None:
+            sample = pd.read_csv(source, nrows=SAMPLE_ROWS, **options)
+            source.seek(start)
+            if len(sample):
+                chunk_rows = self.memory_budget.capacity(
+                    sample.memory_usage(deep=True).sum() / len(sample) * FRAME_COPIES,
+                    most=chunk_rows)
+
+        dtypes = {}
+        with pd.read_csv(source, chunksize=chunk_rows, **options) as reader:
+            for chunk in reader:
+                if not dtypes:
+                    self._description_column(chunk, schema)
+                for column, dtype in chunk.dtypes.items():
+                    dtypes[column] = common_dtype(dtypes.get(column, dtype), dtype)
+        source.seek(start)
+
+        def chunks():
+            with pd.read_csv(source, chunksize=chunk_rows, dtype=dtypes, **options) as reader:
+                for number, df in enumerate(reader):
+                    self.standardize_frame(df, schema=schema)
+                    yield df.to_csv(index=False, header=not number, sep=file_format.delimiter,
+                                    quotechar=file_format.quotechar)
+        return chunks()
+
+    def process_file(self, input_file: str, incremental: bool = False,
+                     build_index: bool = False, compress: bool = None,
+                     file_format: FileFormat = None, schema: Schema = None,
+                     resume: bool = False,
+                     checkpoint_rows: int = checkpoint.CHECKPOINT_ROWS,
+                     input_size: int = None) -> str:
         """
-        Process the input CSV file and standardize the last column.
-        Returns the path to the output file.
+        Process the input CSV file and standardize its description column, the one the
+        schema names. Returns the path to the output file.
+
+        In incremental mode only the rows appended since the last incremental run are
+        processed and appended to the existing output. If the previously processed part
+        of the input has changed, or there is no checkpoint yet, the whole file is
+        processed. A last row without a newline is only processed once the file has
+        stopped growing, and is processed again by the next run.
 
         Args:
             input_file (str): Path to the input CSV file
+            incremental (bool): Only process rows appended since the last run
+            build_index (bool): Write a key index next to the output so later dictionary
+                edits can be applied with reapply_dictionary. Only full runs are indexed;
+                appending rows in incremental mode removes the index
+            compress (bool): Write a gzip compressed output (preprocessed_job.csv.gz). By
+                default the output is compressed if the input is. Compressed inputs are
+                always processed in full
+            file_format (FileFormat): Encoding and dialect of the input, which the
+                output is written in as well; sniffed from the start of the file if not
+                given
+            schema (Schema): Column layout of the input, which says which column holds
+                the descriptions; detected from its first rows if not given
+            resume (bool): Continue an interrupted full run from its last checkpoint; by
+                default a partial file left behind is discarded. Resumed runs do not
+                build a key index
+            checkpoint_rows (int): Rows written between checkpoints of a full run
+            input_size (int): Size of the input when it was hashed; the file has stopped
+                growing if it is still this size (default: its size when it is sniffed)
+
+        With pipeline set, full reads are read ahead and every output is written behind
+        on background threads. Increments are small and are read in one go.
+
+        A full run writes to a partial file next to the output and renames it over the
+        output once it is complete. Unless the input or output is compressed or the input
+        is UTF-16, the partial file is flushed to disk and checkpointed every
+        checkpoint_rows rows. Column types depend on every row of the file, so a resumed
+        run parses the whole input again, then replaces and writes only the rows past the
+        checkpoint; it is only resumed if the input has not changed.
 
         Raises:
             pd.errors.EmptyDataError: If the CSV file is empty
@@ -167,31 +784,146 @@ class DescriptionParser:
             KeyError: If replacement_dict contains keys not found in the data
         """
         try:
+            # Generate output filename
+            input_path = Path(input_file)
+            if compress is None:
+                compress = is_gzip(input_file)
+            output_file = Path(with_compression(
+                input_path.parent / f"preprocessed_{input_path.name}", compress))
+            if input_size is None:
+                input_size = os.path.getsize(input_file)
+            if file_format is None:
+                file_format = sniff_file(input_file)
+            if schema is None:
+                schema = read_schema(input_file, file_format)
+            if incremental and not resumable(input_file, file_format):
+                logger.info("Processing %s in full", input_file)
+                incremental = False
+
             # Read the CSV file
-            df = pd.read_csv(input_file)
+            start = 0
+            stats = PipelineStats()
+            started = time.perf_counter()
+            chunk_rows = None
+            frames = None
+            tail_rows = 0
+            if incremental:
+                start, end, saved = checkpoint.resume_offsets(input_file, output_file)
+                stop = checkpoint.settled_length(input_file, input_size, end)
+                if start and start == stop:
+                    logger.info("No new rows in %s", input_file)
+                    return output_file
+                if end and stop > end:
+                    # The rows after the last newline are written last, on their own
+                    with open(input_file, 'rb') as f:
+                        f.seek(end)
+                        tail_rows = count_rows(f.read(stop - end), file_format)
+                if start:
+                    try:
+                        df = self._read_increment(input_file, start, stop, saved, file_format)
+                    except ValueError as e:
+                        logger.info("New rows do not match the saved column types (%s); "
+                                    "running in full", e)
+                        start = 0
+            if not start:
+                chunk_rows = self._chunk_rows(input_file, file_format)
+                if chunk_rows:
+                    dtypes, frames = self._read_chunks(input_file, file_format,
+                                                       stop if incremental else None,
+                                                       chunk_rows, stats)
+                elif incremental:
+                    df = self._read_increment(input_file, start, stop, saved, file_format)
+                elif self.pipeline:
+                    df = self._read_pipelined(input_file, file_format, stats)
+                else:
+                    df = pd.read_csv(input_file, **file_format.read_csv_options())
+            if frames is None:
+                # Checkpoints record the dtypes pandas read, before any storage conversion
+                dtypes = {column: str(dtype) for column, dtype in df.dtypes.items()}
+                frames = [df]
 
-            # Validate that file has at least 5 columns
-            if df.shape[1] < 5:
-                error_msg = f"CSV file must have at least 5 columns. Found: {df.shape[1]}"
-                logger.error(error_msg)
-                raise ValueError(error_msg)
+            # Full runs write to a partial file that replaces the output once complete
+            target = output_file if start else checkpoint.partial_path(output_file)
+            checkpointed = (not start and resumable(input_file, file_format)
+                            and not is_gzip(output_file))
+            done, changes_done = self._resume_point(input_file, output_file, dtypes,
+                                                    resume and checkpointed)
 
-            # Store original values for verification
-            original_values = df.iloc[:, -1].copy()
+            # A key index holds every row, so only files read in one go are indexed
+            indexing = build_index and not start and not done and not chunk_rows
+            if build_index and chunk_rows:
+                logger.info("Not indexing %s, which is read in chunks", input_file)
+            matches = {} if indexing else None
+            if checkpointed:
+                # Every checkpoint covers the whole input, whose column types were
+                # worked out from all of its rows
+                checked = complete_length(input_file)
+                checksum = checkpoint.prefix_checksum(input_file, checked)
 
-            # Apply replacements to the last column
-            for old_text, new_text in self.replacement_dict.items():
-                df.iloc[:, -1] = df.iloc[:, -1].str.replace(old_text, new_text, regex=False)
+            # Rows and changes written before the frame being written, and that frame
+            rows_before, changes_before, current = done, changes_done, None
 
-            # Calculate number of changes made
-            changes_made = (original_values != df.iloc[:, -1]).sum()
+            def standardized():
+                """Apply replacements to the description column of each frame to write."""
+                nonlocal rows_before, changes_before, current
+                seen = 0
+                for df in frames:
+                    seen += len(df)
+                    if len(df) and seen <= done:
+                        continue
+                    if seen - len(df) < done:
+                        df = df.iloc[done - seen + len(df):].reset_index(drop=True)
+                    if current:
+                        rows_before += len(current[1])
+                        changes_before += current[2]
+                    original_values, changed = self.standardize_frame(df, matches, schema)
+                    current = (original_values, df, changed)
+                    yield df
 
-            # Generate output filename
-            input_path = Path(input_file)
-            output_file = input_path.parent / f"preprocessed_{input_path.name}"
+            def save(written: int):
+                # Counts cover the rows written by the interrupted run as well
+                original_values, df, _ = current
+                rows = done + written - rows_before
+                column = self._description_column(df, schema)
+                changes = changes_before + count_changes(original_values.iloc[:rows],
+                                                         df.iloc[:rows, column])
+                checkpoint.save_checkpoint(target, input_file, checked, checksum,
+                                           input_size=os.path.getsize(input_file),
+                                           dtypes=dtypes, rows=done + written,
+                                           changes=changes)
 
             # Save processed file
-            df.to_csv(output_file, index=False)
+            held = []
+            self._write_frames(hold_back(standardized(), tail_rows, held) if tail_rows
+                               else standardized(), target, file_format, bool(start or done),
+                               is_gzip(output_file), stats if self.pipeline else None,
+                               checkpoint_rows, save if checkpointed else None)
+            formatted_size = None
+            if held:
+                # The checkpoint leaves these rows out, so the output can be cut back to
+                # before them should the last row turn out to be incomplete
+                formatted_size = os.path.getsize(target)
+                self._write_frames(held, target, file_format, True, is_gzip(output_file))
+            changes_made = changes_before + (current[2] if current else 0)
+            if not start:
+                checkpoint.commit_partial(output_file)
+            if self.pipeline:
+                stats.seconds = time.perf_counter() - started
+                logger.info("Pipeline for %s: %s", input_file, stats.summary())
+                self.pipeline_stats.add(stats)
+            if indexing:
+                key_index = KeyIndex.build(file_sha256(input_file), current[0],
+                                           self.replacement_dict, matches)
+                key_index.output_size = os.path.getsize(output_file)
+                key_index.save(index_path(output_file))
+            elif index_path(output_file).exists():
+                index_path(output_file).unlink()
+            if incremental:
+                checkpoint.save_checkpoint(
+                    output_file, input_file, end, output_size=formatted_size,
+                    columns=list(dtypes),
+                    dtypes=dtypes,
+                )
 
             success_msg = f"Processing complete! Made {changes_made} replacements\nSaved as: {output_file}"
             logger.info(success_msg)
@@ -236,6 +968,73 @@ class DescriptionParser:
                     logger.warning("Could not show GUI error: %s ", gui_error)
             raise
         return output_file
+
+    def reapply_dictionary(self, input_file: str, file_format: FileFormat = None,
+                           schema: Schema = None, compress: bool = None):
+        """
+        Bring an indexed output up to date with the current dictionary.
+
+        Only the rows the key index says can be affected by the dictionary edits are
+        recomputed; their new descriptions are patched into the existing output, which is
+        rewritten to a partial file that replaces it once complete, as process_file does.
+
+        Args:
+            input_file (str): Path to the input CSV file processed earlier with build_index
+            file_format (FileFormat): Encoding and dialect of the input (default: sniffed)
+            schema (Schema): Column layout of the input (default: detected)
+            compress (bool): Whether the output was gzip compressed (default: if the
+                input is), as given to process_file
+
+        Returns:
+            tuple: (output file, set of recomputed rows), or None if there is no usable
+            index and the file has to be processed in full
+        """
+        input_path = Path(input_file)
+        if compress is None:
+            compress = is_gzip(input_file)
+        output_file = Path(with_compression(
+            input_path.parent / f"preprocessed_{input_path.name}", compress))
+        key_index = KeyIndex.load(index_path(output_file))
+        if (key_index is None or not output_file.is_file()
+                or os.path.getsize(output_file) != key_index.output_size
+                or file_sha256(input_file) != key_index.input_hash):
+            return None
+        affected = key_index.affected_rows(self.replacement_dict)
+        if affected is None:
+            logger.info("Dictionary keys were reordered; %s needs a full run", input_file)
+            return None
+
+        if affected:
+            if file_format is None:
+                file_format = sniff_file(input_file)
+            if schema is None:
+                schema = read_schema(input_file, file_format)
+            column = schema.description
+            df = pd.read_csv(input_file, **file_format.read_csv_options())
+            previous = pd.read_csv(output_file, usecols=[column], dtype=str,
+                                   keep_default_na=False,
+                                   **file_format.read_csv_options()).iloc[:, 0]
+            rows = sorted(affected)
+            matches = {}
+            recomputed = apply_replacements(df.iloc[rows, column].reset_index(drop=True),
+                                            self.replacement_dict, matches)
+            descriptions = previous.astype(object)
+            descriptions.iloc[rows] = recomputed.to_numpy()
+            df.isetitem(column, descriptions.to_numpy())
+            self._write_frames([df], checkpoint.partial_path(output_file), file_format,
+                               False, is_gzip(output_file))
+            checkpoint.commit_partial(output_file)
+            key_index.update(self.replacement_dict, affected,
+                             {key: [rows[i] for i in found] for key, found in matches.items()})
+        else:
+            key_index.update(self.replacement_dict, affected, {})
+        key_index.output_size = os.path.getsize(output_file)
+        key_index.save(index_path(output_file))
+        logger.info("Recomputed %d of %d rows of %s", len(affected), key_index.rows,
+                    input_file)
+        return output_file, affected
+
+
 def main(argument=None):
     """Main execution function."""
     try:
@@ -0,0 +1,589 @@
+"""
+duplicates.py
+
+Finds point numbers used more than once across the files of a job, and property corners
+shot more than once.
+
+When crews merge files, a point number that appears twice with different coordinates
+quietly overwrites the first point once the merged file is imported into Carlson.
+PointIndex is a hash index from each point number to the file and line it was first seen
+on and a hash of its coordinates. Rows are added to it while the format stage runs; a
+point number seen again is either a true duplicate, the same shot exported twice, or a
+conflicting re-use with different coordinates.
+
+Memory stays bounded however many points are indexed: once the index holds max_points
+point numbers (MAX_POINTS unless a memory budget says otherwise) they are spilled to a temporary file, sorted by point number, and the runs
+are merged back when the report is written, as the unknown code report does. Only point
+numbers seen more than once keep a list of where they were seen.
+
+Property corners (IRF, PCF, RBF and the other codes in property_corners.txt) are often
+shot again on a later visit, under a new point number. CornerGrid hashes every corner
+into a grid of square cells as wide as the tolerance, so the corners within the tolerance
+of a new one can only be in its own cell or the eight around it. Each corner is compared
+with those alone, which keeps the check close to linear instead of comparing every pair,
+and corners within the tolerance of each other are joined into clusters. A cluster whose
+corners were given different sizes (1/2 and 5/8, say) is reported as a size conflict.
+
+Usage:
+    python duplicates.py N:/jobs/2024/crew1.csv N:/jobs/2024/crew2.csv
+    python duplicates.py N:/jobs/2024/*.csv --corner-tolerance 0.1
+"""
+# Standard library imports
+import argparse
+import csv
+import heapq
+import logging
+import math
+import sys
+import zipfile
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+# Local imports
+from compressed import is_gzip, is_zip, open_member_text, open_text, point_file_members
+from memory import read_spilled, sorted_spilled, spill
+from parser3 import CodeCatalog, item_is_size
+from pipeline import open_read_ahead
+from point_schema import Schema, read_schema, sample_schema
+from records import WRITE_BATCH_ROWS, read_records
+from sniff import DEFAULT_FORMAT, SNIFF_BYTES, FileFormat, sniff_bytes, sniff_file
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_REPORT_NAME = "duplicate_points.csv"
+CORNER_REPORT_NAME = "corner_clusters.csv"
+# Distance, in the units of the coordinates, within which two corner shots are the same
+DEFAULT_TOLERANCE = 0.1
+# Places coordinates are compared to, so 1000.5 and 1000.500 are the same shot
+COORDINATE_DECIMALS = 3
+# Locations listed for each point number in the report
+MAX_LOCATIONS = 10
+# Rough bytes the index holds per point number
+POINT_ENTRY_SIZE = 256
+# Point numbers held in memory before the index spills, about 256 MB without a budget
+MAX_POINTS = 1024 * 1024
+
+
+def point_key(point: str) -> str:
+    """Return a point number as it is compared: 0012 and 12 are the same point."""
+    point = point.strip()
+    return str(int(point)) if point.isdigit() else point
+
+
+def _coordinate(text: str):
+    """Return a coordinate rounded to COORDINATE_DECIMALS, or its text if not a number."""
+    try:
+        value = float(text)
+    except ValueError:
+        return text.strip()
+    return round(value, COORDINATE_DECIMALS) if math.isfinite(value) else text.strip()
+
+
+def coordinate_hash(northing: str, easting: str, elevation: str) -> int:
+    """Return a hash of a point's coordinates, equal for the same shot written differently."""
+    return hash((_coordinate(northing), _coordinate(easting), _coordinate(elevation)))
+
+
+def point_fields(row: list, schema: Schema, file_format: FileFormat = DEFAULT_FORMAT):
+    """
+    Return the point number, northing, easting and elevation of a row.
+
+    Args:
+        row (list): A row read with records.read_records; columns after the description
+            are split out of the raw rest of the row
+        schema (Schema): Column layout of the file
+        file_format (FileFormat): Dialect of the row
+
+    Returns:
+        tuple: The four fields, or None if the row is too short to hold them
+    """
+    columns = (schema.point, schema.northing, schema.easting, schema.elevation)
+    if max(columns) > schema.description and len(row) == schema.description + 2:
+        row = row[:-1] + row[-1].split(file_format.delimiter)
+    if len(row) <= max(columns):
+        return None
+    return tuple(row[column] for column in columns)
+
+
+def member_path(archive_path, name: str) -> str:
+    """Return the name the rows of an archive member are reported under: crew.zip/day1/job.csv."""
+    return str(Path(archive_path) / name)
+
+
+def scan_zip(archive_path, indexes: list, extensions, description_column=None):
+    """
+    Add the rows of every point file inside a zip archive to each index.
+
+    Members are sniffed on their own, as batch.process_zip does; empty members are left
+    out.
+
+    Args:
+        archive_path (str): Path to the zip archive
+        indexes (list): The RowIndex objects to add the rows to
+        extensions (Iterable): Lowercase point file extensions, such as '.csv'
+        description_column (int or str): Index or header name of the description column
+            (default: detected in each member)
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        for name in point_file_members(archive, extensions):
+            with archive.open(name) as stream:
+                sample = stream.read(SNIFF_BYTES)
+            if not sample:
+                continue
+            file_format = sniff_bytes(sample)
+            schema = sample_schema(sample, file_format, description_column)
+            for index in indexes:
+                index.scan_member(archive, name, member_path(archive_path, name),
+                                  file_format, schema)
+
+
+@dataclass
+class PointReuse:
+    """A point number seen more than once, and the first MAX_LOCATIONS places it was seen."""
+
+    point: str
+    count: int
+    conflicting: bool
+    locations: list
+
+    @property
+    def kind(self) -> str:
+        """'conflict' if the coordinates differ between the uses, otherwise 'duplicate'."""
+        return 'conflict' if self.conflicting else 'duplicate'
+
+
+class RowIndex:
+    """
+    An index filled one row at a time while the format stage runs.
+
+    Files are reported by the name they were added under, or by the name given to alias.
+    Subclasses implement add_row.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.files = []
+        self._file_ids = {}
+        self._aliases = {}
+
+    def alias(self, path, name):
+        """Report the rows added for path as coming from name."""
+        self._aliases[str(path)] = str(name)
+
+    def _file_id(self, path) -> int:
+        """Return the number the index stores for a file."""
+        name = self._aliases.get(str(path), str(path))
+        file_id = self._file_ids.get(name)
+        if file_id is None:
+            file_id = self._file_ids[name] = len(self.files)
+            self.files.append(name)
+        return file_id
+
+    def add_row(self, path, line_number: int, row: list, schema: Schema,
+                file_format: FileFormat = DEFAULT_FORMAT):
+        """Record a row read with records.read_records, counting lines from 1."""
+        raise NotImplementedError
+
+    def scan_file(self, path, file_format: FileFormat = None, schema: Schema = None,
+                  end: int = None):
+        """
+        Add every row of a file past its header rows, without formatting it.
+
+        Args:
+            path (str): Path to the point file, which may be gzip compressed
+            file_format (FileFormat): Encoding and dialect of the file (default: sniffed)
+            schema (Schema): Column layout of the file (default: detected)
+            end (int): Only read the rows before this byte offset, such as the part of
+                the file an earlier incremental run formatted
+        """
+        if file_format is None:
+            file_format = sniff_file(path)
+        if schema is None:
+            schema = read_schema(path, file_format)
+        text = {'encoding': file_format.encoding, 'errors': file_format.errors}
+        with open_read_ahead(path, limit=end) as source, \
+                open_text(source, compressed=is_gzip(path), **text) as infile:
+            self.scan_text(infile, path, file_format, schema)
+
+    def scan_member(self, archive: zipfile.ZipFile, name: str, path, file_format: FileFormat,
+                    schema: Schema):
+        """
+        Add every row of a point file inside a zip archive past its header rows.
+
+        Args:
+            archive (zipfile.ZipFile): The open archive
+            name (str): Name of the member
+            path (str): Name the rows are reported under, such as crew.zip/day1/job.csv
+            file_format (FileFormat): Encoding and dialect of the member
+            schema (Schema): Column layout of the member
+        """
+        with open_member_text(archive, name, file_format.encoding,
+                              file_format.errors) as infile:
+            self.scan_text(infile, path, file_format, schema)
+
+    def scan_text(self, infile, path, file_format: FileFormat, schema: Schema):
+        """Add every row read from a text stream past the header rows, as coming from path."""
+        count = 0
+        while rows := read_records(infile, schema.description, file_format,
+                                   WRITE_BATCH_ROWS)[0]:
+            for line_number, row in enumerate(rows, start=count + 1):
+                if line_number > schema.header_rows:
+                    self.add_row(path, line_number, row, schema, file_format)
+            count += len(rows)
+
+
+class PointIndex(RowIndex):
+    """
+    Point numbers seen so far, where they were first seen, and a hash of their coordinates.
+
+    The index is spilled to a temporary file, sorted by point number, whenever it holds
+    more than max_points point numbers.
+    """
+
+    def __init__(self, max_points: int = MAX_POINTS):
+        """
+        Start an empty index.
+
+        Args:
+            max_points (int): Point numbers held in memory before they are spilled to disk,
+                or None for no limit
+        """
+        super().__init__()
+        self.max_points = max_points
+        # Point number -> (coordinate hash, file id, line) of its first use
+        self._points = {}
+        # Point number -> [count, conflicting, locations] once it is used again
+        self._reused = {}
+        self._runs = []
+
+    @property
+    def spilled(self) -> bool:
+        """True if some of the index is in temporary files rather than in memory."""
+        return bool(self._runs)
+
+    def add(self, path, line_number: int, point: str, coordinates: int):
+        """
+        Record a point seen on a line of a file.
+
+        Args:
+            path (str): The file
+            line_number (int): Row of the file, counted from 1 including header rows
+            point (str): Point number or name
+            coordinates (int): coordinate_hash of the point
+        """
+        point = point_key(point)
+        if not point:
+            return
+        self.rows += 1
+        location = (self._file_id(path), line_number)
+        first = self._points.get(point)
+        if first is None:
+            self._points[point] = (coordinates,) + location
+            if self.max_points and len(self._points) > self.max_points:
+                self._spill()
+            return
+        reuse = self._reused.get(point)
+        if reuse is None:
+            reuse = self._reused[point] = [1, False, [first[1:]]]
+        reuse[0] += 1
+        reuse[1] = reuse[1] or coordinates != first[0]
+        if len(reuse[2]) < MAX_LOCATIONS:
+            reuse[2].append(location)
+
+    def add_row(self, path, line_number: int, row: list, schema: Schema,
+                file_format: FileFormat = DEFAULT_FORMAT):
+        """Record the point on a row, unless it is too short to hold one."""
+        fields = point_fields(row, schema, file_format)
+        if fields is not None:
+            self.add(path, line_number, fields[0], coordinate_hash(*fields[1:]))
+
+    def _spill(self):
+        """Move the point numbers held in memory to a temporary file, sorted."""
+        self._runs.append(spill(self._entries()))
+        logger.info("Spilled %d point numbers to disk", len(self._points))
+        self._points, self._reused = {}, {}
+
+    def _entries(self):
+        """Yield (point, coordinate hash, count, conflicting, locations) held in memory."""
+        for point in sorted(self._points):
+            coordinates, file_id, line_number = self._points[point]
+            count, conflicting, locations = self._reused.get(
+                point, (1, False, [(file_id, line_number)]))
+            yield point, coordinates, count, conflicting, locations
+
+    def _merged(self):
+        """Yield every point number with its runs added together, in point number order."""
+        runs = [read_spilled(run, close=False) for run in self._runs]
+        merged = None
+        # Runs are in the order they were spilled, so locations stay in the order seen
+        for point, coordinates, count, conflicting, locations in heapq.merge(
+                *runs, self._entries(), key=lambda item: item[0]):
+            if merged and merged[0] == point:
+                merged[2] += count
+                merged[3] = merged[3] or conflicting or coordinates != merged[1]
+                merged[4] = (merged[4] + locations)[:MAX_LOCATIONS]
+                continue
+            if merged:
+                yield merged
+            merged = [point, coordinates, count, conflicting, locations]
+        if merged:
+            yield merged
+
+    def reuses(self):
+        """
+        Yield the point numbers seen more than once, conflicts first, then by point number.
+
+        Yields:
+            PointReuse: Each point number used more than once
+        """
+        reused = (PointReuse(point, count, conflicting,
+                             [(self.files[file_id], line) for file_id, line in locations])
+                  for point, _, count, conflicting, locations in self._merged() if count > 1)
+        yield from sorted_spilled(reused, key=lambda reuse: (not reuse.conflicting,
+                                                             reuse.point),
+                                  max_items=self.max_points or sys.maxsize)
+
+    def write(self, report_file: str) -> dict:
+        """
+        Write the report as a CSV file, one row at a time.
+
+        Returns:
+            dict: Number of point numbers of each kind, 'duplicate' and 'conflict'
+        """
+        kinds = {'duplicate': 0, 'conflict': 0}
+        with open(report_file, 'w', newline='', encoding='utf8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Point", "Kind", "Count", "Locations"])
+            for reuse in self.reuses():
+                writer.writerow([reuse.point, reuse.kind, reuse.count,
+                                 '; '.join(f"{path}:{line}" for path, line in reuse.locations)])
+                kinds[reuse.kind] += 1
+        logger.info("Wrote %d duplicate and %d conflicting point numbers to %s",
+                    kinds['duplicate'], kinds['conflict'], report_file)
+        return kinds
+
+
+def corner_size(item: str) -> str:
+    """Return a size item the way it is compared: \\1/2 and 1/2" are the same size."""
+    return item.lstrip('\\').rstrip('"')
+
+
+@dataclass
+class CornerCluster:
+    """Property corner shots within the tolerance of each other."""
+
+    # (point, file, line, code, size) of each shot, in the order they were added
+    corners: list
+    # Diagonal of the box around the shots
+    extent: float
+
+    @property
+    def sizes(self) -> list:
+        """The different sizes the shots were given, leaving out shots without one."""
+        return sorted({corner[4] for corner in self.corners if corner[4]})
+
+    @property
+    def kind(self) -> str:
+        """'size-conflict' if the shots were given different sizes, otherwise 'repeat'."""
+        return 'size-conflict' if len(self.sizes) > 1 else 'repeat'
+
+
+class CornerGrid(RowIndex):
+    """
+    Property corner shots hashed into a grid of cells as wide as the tolerance.
+
+    Shots within the tolerance of each other, in northing and easting, are joined into
+    clusters as they are added; a shot close to two clusters joins them into one. Every
+    corner is held in memory, which is a small share of the points of a job.
+    """
+
+    def __init__(self, catalog: CodeCatalog, tolerance: float = DEFAULT_TOLERANCE):
+        """
+        Start an empty grid.
+
+        Args:
+            catalog (CodeCatalog): Compiled codes, whose property codes mark the corners
+            tolerance (float): Greatest distance between two shots of the same corner, in
+                the units of the coordinates
+        """
+        if not tolerance > 0:
+            raise ValueError(f"The corner tolerance must be positive, got {tolerance}")
+        super().__init__()
+        self.catalog = catalog
+        self.tolerance = tolerance
+        self._northings = array('d')
+        self._eastings = array('d')
+        # (point, file id, line, code, size) of each corner
+        self._corners = []
+        # Union-find parent of each corner
+        self._parents = array('q')
+        self._cells = {}
+
+    def __len__(self) -> int:
+        return len(self._corners)
+
+    def _root(self, corner: int) -> int:
+        """Return the corner that stands for the cluster a corner is in."""
+        parents = self._parents
+        while parents[corner] != corner:
+            parents[corner] = parents[parents[corner]]
+            corner = parents[corner]
+        return corner
+
+    def add(self, path, line_number: int, point: str, northing: float, easting: float,
+            code: str, size: str = ''):
+        """
+        Record a property corner shot.
+
+        Args:
+            path (str): The file
+            line_number (int): Row of the file, counted from 1 including header rows
+            point (str): Point number or name
+            northing (float): Northing of the shot
+            easting (float): Easting of the shot
+            code (str): Property corner code
+            size (str): Size of the corner, if it was given one
+        """
+        self.rows += 1
+        corner = len(self._corners)
+        self._northings.append(northing)
+        self._eastings.append(easting)
+        self._corners.append((point, self._file_id(path), line_number, code, size))
+        self._parents.append(corner)
+        row = math.floor(northing / self.tolerance)
+        column = math.floor(easting / self.tolerance)
+        for cell in ((row + i, column + j) for i in (-1, 0, 1) for j in (-1, 0, 1)):
+            for other in self._cells.get(cell, ()):
+                if math.hypot(northing - self._northings[other],
+                              easting - self._eastings[other]) <= self.tolerance:
+                    self._parents[self._root(other)] = self._root(corner)
+        self._cells.setdefault((row, column), []).append(corner)
+
+    def add_row(self, path, line_number: int, row: list, schema: Schema,
+                file_format: FileFormat = DEFAULT_FORMAT):
+        """
+        Record the shot on a row if its description starts with a property corner code.
+
+        The code is the first of the first two items that is a property code, as the
+        formatting rules read it; the size is the first of the first three items that is
+        a size, before or after formatting. Rows without numeric coordinates are left out.
+        """
+        fields = point_fields(row, schema, file_format)
+        if fields is None:
+            return
+        items = row[schema.description].split()
+        code = next((item.upper() for item in items[:2]
+                     if item.upper() in self.catalog.property_codes), None)
+        if code is None:
+            return
+        try:
+            northing, easting = float(fields[1]), float(fields[2])
+        except ValueError:
+            return
+        if not (math.isfinite(northing) and math.isfinite(easting)):
+            return
+        size = next((corner_size(item) for item in items[:3]
+                     if item.upper() != code and item_is_size(item)), '')
+        self.add(path, line_number, fields[0].strip(), northing, easting, code, size)
+
+    def clusters(self) -> list:
+        """
+        Return the corners shot more than once, size conflicts first.
+
+        Returns:
+            list: A CornerCluster for each group of two or more shots
+        """
+        groups = {}
+        for corner in range(len(self._corners)):
+            groups.setdefault(self._root(corner), []).append(corner)
+        clusters = []
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            northings = [self._northings[corner] for corner in members]
+            eastings = [self._eastings[corner] for corner in members]
+            corners = [(point, self.files[file_id], line, code, size)
+                       for point, file_id, line, code, size
+                       in (self._corners[corner] for corner in members)]
+            clusters.append(CornerCluster(corners, math.hypot(
+                max(northings) - min(northings), max(eastings) - min(eastings))))
+        # Groups are in the order their first shot was added
+        clusters.sort(key=lambda cluster: cluster.kind != 'size-conflict')
+        return clusters
+
+    def write(self, report_file: str) -> dict:
+        """
+        Write the report as a CSV file.
+
+        Returns:
+            dict: Number of clusters of each kind, 'repeat' and 'size-conflict'
+        """
+        kinds = {'repeat': 0, 'size-conflict': 0}
+        with open(report_file, 'w', newline='', encoding='utf8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Cluster", "Kind", "Count", "Extent", "Codes", "Sizes",
+                             "Points"])
+            for number, cluster in enumerate(self.clusters(), start=1):
+                codes = sorted({corner[3] for corner in cluster.corners})
+                writer.writerow([number, cluster.kind, len(cluster.corners),
+                                 f"{cluster.extent:.3f}", ' '.join(codes),
+                                 ' '.join(cluster.sizes),
+                                 '; '.join(f"{point} {path}:{line}" for point, path, line, _, _
+                                           in cluster.corners)])
+                kinds[cluster.kind] += 1
+        logger.info("Wrote %d repeated corners and %d with conflicting sizes to %s",
+                    kinds['repeat'], kinds['size-conflict'], report_file)
+        return kinds
+
+
+def main(argv=None):
+    """Command line entry point for duplicate point checks."""
+    arg_parser = argparse.ArgumentParser(
+        description="Find point numbers used more than once across point files, and "
+                    "property corners shot more than once")
+    arg_parser.add_argument("files", nargs='+',
+                            help="Point files or zip archives of them to check together")
+    arg_parser.add_argument("--output", help="Path to the report (default: "
+                                             f"{DUPLICATE_REPORT_NAME} next to the first file)")
+    arg_parser.add_argument("--corner-tolerance", type=float,
+                            help="Also report property corners shot more than once within "
+                                 f"this distance, in {CORNER_REPORT_NAME}")
+    arg_parser.add_argument("--property-corners", help="Path to the property corners file")
+    args = arg_parser.parse_args(argv)
+
+    # Imported here because batch uses this module
+    from batch import (DEFAULT_MISCELLANEOUS_PATH, DEFAULT_PROPERTY_CORNERS_PATH,
+                       POINT_FILE_EXTENSIONS)
+    from parser3 import load_code_lists
+
+    indexes = [PointIndex()]
+    if args.corner_tolerance is not None:
+
+        property_codes, misc_codes = load_code_lists(
+            args.property_corners or DEFAULT_PROPERTY_CORNERS_PATH, DEFAULT_MISCELLANEOUS_PATH)
+        indexes.append(CornerGrid(CodeCatalog(property_codes, misc_codes),
+                                  args.corner_tolerance))
+    for input_file in args.files:
+        if is_zip(input_file):
+            scan_zip(input_file, indexes, POINT_FILE_EXTENSIONS)
+            continue
+        file_format = sniff_file(input_file)
+        schema = read_schema(input_file, file_format)
+        for index in indexes:
+            index.scan_file(input_file, file_format, schema)
+
+    directory = Path(args.files[0]).parent
+    report_file = args.output or str(directory / DUPLICATE_REPORT_NAME)
+    kinds = indexes[0].write(report_file)
+    print(f"{indexes[0].rows} points: {kinds['duplicate']} duplicated, {kinds['conflict']} "
+          f"re-used with different coordinates -> {report_file}")
+    if len(indexes) > 1:
+        report_file = str(directory / CORNER_REPORT_NAME)
+        kinds = indexes[1].write(report_file)
+        print(f"{indexes[1].rows} property corners: {kinds['repeat']} shot more than once, "
+              f"{kinds['size-conflict']} with conflicting sizes -> {report_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
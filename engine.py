@@ -0,0 +1,175 @@
+"""
+engine.py
+
+A reusable, in-memory version of both processing stages for code that already holds
+point data as rows or as a DataFrame column and does not want to round-trip through
+temporary files.
+
+The configuration is compiled once when a DescriptionEngine is created and never changes
+afterwards, so one engine can be shared by any number of threads. Rows and descriptions
+are processed lazily: the process_* methods are generators that yield one result at a
+time, so arbitrarily long inputs can be streamed through them.
+
+Example:
+    engine = DescriptionEngine.from_config_files("config/replacement_dict.json")
+    file_format = sniff_file(path)
+    with open_text(path, encoding=file_format.encoding, errors=file_format.errors) as f:
+        for row in engine.process_rows(csv.reader(f, **file_format.csv_options())):
+            writer.writerow(row)
+
+    df["Description"] = list(engine.process_column(df["Description"]))
+"""
+# Standard library imports
+import itertools
+import json
+from functools import lru_cache
+from typing import Iterable, Iterator
+# Local imports
+import parser3
+from description_parser import compile_prefilter
+from batch import DEFAULT_MISCELLANEOUS_PATH, DEFAULT_PROPERTY_CORNERS_PATH
+from point_schema import SCHEMA_ROWS, Schema, detect_schema
+
+DEFAULT_CACHE_SIZE = 4096
+
+
+class DescriptionEngine:
+    """Applies the replacement and format stages to rows and descriptions in memory."""
+
+    def __init__(self, replacement_dict: dict, property_codes: list, misc_codes: list,
+                 description_column=None, cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        Compile the configuration.
+
+        Args:
+            replacement_dict (dict): Non-standard text mapped to its standard replacement
+            property_codes (list): List of valid property corner codes
+            misc_codes (list): List of valid miscellaneous codes
+            description_column (int or str): Index or header name of the description
+                column (default: the column named Description, Desc or Code, or the
+                fifth column)
+            cache_size (int): Number of distinct descriptions to remember results for;
+                field data repeats the same descriptions constantly (0 disables caching)
+        """
+        self.replacements = tuple(replacement_dict.items())
+        self._prefilter = (compile_prefilter(tuple(replacement_dict))
+                           if replacement_dict else None)
+        self.catalog = parser3.CodeCatalog(property_codes, misc_codes)
+        self.description_column = description_column
+        # lru_cache is thread-safe, and the cached function only reads immutable state
+        self._process_cached = (lru_cache(maxsize=cache_size)(self._process_description)
+                                if cache_size else self._process_description)
+
+    @classmethod
+    def from_config_files(cls, dictionary_path: str,
+                          property_corners_path: str = DEFAULT_PROPERTY_CORNERS_PATH,
+                          miscellaneous_path: str = DEFAULT_MISCELLANEOUS_PATH,
+                          **kwargs) -> 'DescriptionEngine':
+        """
+        Create an engine from the usual configuration files.
+
+        Args:
+            dictionary_path (str): Path to the replacement dictionary
+            property_corners_path (str): Path to the property corners file
+            miscellaneous_path (str): Path to the miscellaneous codes file
+            **kwargs: Passed on to DescriptionEngine
+
+        Returns:
+            DescriptionEngine: The compiled engine
+
+        Raises:
+            ValueError: If the dictionary is not a JSON object
+        """
+        with open(dictionary_path, 'r', encoding='utf-8') as f:
+            replacement_dict = json.load(f)
+        if not isinstance(replacement_dict, dict):
+            raise ValueError("Dictionary file must contain a valid JSON object")
+        with open(property_corners_path, 'r', encoding='utf8') as f:
+            property_codes = [line.strip() for line in f]
+        with open(miscellaneous_path, 'r', encoding='utf8') as f:
+            misc_codes = [line.strip() for line in f]
+        return cls(replacement_dict, property_codes, misc_codes, **kwargs)
+
+    def standardize(self, description: str) -> str:
+        """
+        Apply the replacement stage to one description.
+
+        Args:
+            description (str): The description
+
+        Returns:
+            str: The description with every replacement applied in order
+        """
+        if self._prefilter is None or not self._prefilter.search(description):
+            return description
+        for old_text, new_text in self.replacements:
+            description = description.replace(old_text, new_text)
+        return description
+
+    def _process_description(self, description: str) -> str:
+        """Apply both stages to one description, without caching."""
+        return parser3.format_description(self.standardize(description), self.catalog)
+
+    def process_description(self, description):
+        """
+        Apply both stages to one description.
+
+        Args:
+            description (str): The description; anything that is not a string, such as a
+                missing value, is returned unchanged
+
+        Returns:
+            str: The processed description
+        """
+        if not isinstance(description, str):
+            return description
+        return self._process_cached(description)
+
+    def process_column(self, descriptions: Iterable) -> Iterator:
+        """
+        Lazily apply both stages to a column of descriptions.
+
+        Args:
+            descriptions (Iterable): A pandas Series or any iterable of descriptions
+
+        Yields:
+            str: Each processed description, in input order
+        """
+        for description in descriptions:
+            yield self.process_description(description)
+
+    def process_rows(self, rows: Iterable, schema: Schema = None) -> Iterator[list]:
+        """
+        Lazily apply both stages to point rows.
+
+        Without a schema, the first SCHEMA_ROWS rows are read ahead to detect the header
+        rows and the description column, as process_file does for a file. Header rows and
+        rows too short to have a description are passed through. Input rows are never
+        modified; each yielded row is a new list.
+
+        Args:
+            rows (Iterable): Row tuples or lists, for example from csv.reader
+            schema (Schema): Column layout of the rows (default: detected)
+
+        Yields:
+            list: Each processed row, in input order
+
+        Raises:
+            ValueError: If the description column is named but not in the header
+        """
+        rows = iter(rows)
+        sample = []
+        if schema is None:
+            sample = [list(row) for row in itertools.islice(rows, SCHEMA_ROWS)]
+            schema = detect_schema(sample, self.description_column)
+        column = schema.description
+        for index, row in enumerate(itertools.chain(sample, rows)):
+            row = list(row)
+            if index >= schema.header_rows and len(row) > column:
+                row[column] = self.process_description(row[column])
+            yield row
+
+    def cache_info(self):
+        """Return hit and miss statistics for the description cache, if enabled."""
+        cache_info = getattr(self._process_cached, 'cache_info', None)
+        return cache_info() if cache_info else None
@@ -0,0 +1,193 @@
+"""
+keyindex.py
+
+An inverted index from replacement dictionary keys to the rows they changed, kept next to
+the preprocessed output so that an edit to replacement_dict.json only recomputes the rows
+it can affect instead of the whole file.
+
+The index is stored as "{preprocessed_file}.keyindex.json" and records:
+
+    - the dictionary the output was produced with, in order
+    - for every key, the rows whose description contained the key when it was applied
+    - for every distinct item of the raw descriptions, the rows it appears in
+    - a hash of the input and the size of the output, so stale indexes are never used
+
+Rows are numbered from 0 in the order pandas reads them, excluding the header.
+
+When the dictionary changes, rows matched by a removed or changed key are affected. Rows
+an added key could match are found from the item index: any row containing the key must
+contain its longest non-blank fragment inside one of its items, so only the distinct
+items need to be searched. An added key can also match text that an earlier replacement
+produced, so rows changed by keys whose replacement shares a character with the added key
+are affected as well. The result can include rows that end up unchanged, but never misses
+a row that changes.
+"""
+# Standard library imports
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = '.keyindex.json'
+
+
+def index_path(output_file) -> Path:
+    """Return the path of the key index kept alongside a preprocessed output file."""
+    return Path(f"{output_file}{INDEX_SUFFIX}")
+
+
+class KeyIndex:
+    """Which rows of a file each dictionary key matched, and which rows hold each item."""
+
+    def __init__(self, input_hash: str, dictionary: list, rows: int, matches: dict,
+                 items: dict, output_size: int = None, formatted: dict = None):
+        """
+        Create an index.
+
+        Args:
+            input_hash (str): SHA-256 of the input file the rows were read from
+            dictionary (list): (key, replacement) pairs in the order they were applied
+            rows (int): Number of rows in the file
+            matches (dict): Each key mapped to the set of rows it matched
+            items (dict): Each distinct description item mapped to the rows containing it
+            output_size (int): Size of the preprocessed output the index describes
+            formatted (dict): Details of the processed output written from it, if any
+        """
+        self.input_hash = input_hash
+        self.dictionary = [tuple(pair) for pair in dictionary]
+        self.rows = rows
+        self.matches = matches
+        self.items = items
+        self.output_size = output_size
+        self.formatted = formatted
+
+    @classmethod
+    def build(cls, input_hash: str, descriptions, replacement_dict: dict,
+              matches: dict) -> 'KeyIndex':
+        """
+        Index a freshly processed file.
+
+        Args:
+            input_hash (str): SHA-256 of the input file
+            descriptions (Iterable): Raw descriptions in row order; non-strings are skipped
+            replacement_dict (dict): The dictionary that was applied
+            matches (dict): Rows each key matched, as collected by apply_replacements
+
+        Returns:
+            KeyIndex: The index
+        """
+        items = {}
+        rows = 0
+        for row, description in enumerate(descriptions):
+            rows += 1
+            if isinstance(description, str):
+                for item in set(description.split()):
+                    items.setdefault(item, []).append(row)
+        return cls(input_hash, list(replacement_dict.items()), rows,
+                   {key: set(found) for key, found in matches.items()}, items)
+
+    @classmethod
+    def load(cls, path) -> 'KeyIndex':
+        """
+        Read an index, returning None if it is missing or unreadable.
+
+        Args:
+            path (str): Path to the index file
+
+        Returns:
+            KeyIndex: The index, or None
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            return cls(state["input_hash"], state["dictionary"], state["rows"],
+                       {key: set(found) for key, found in state["matches"].items()},
+                       state["items"], state.get("output_size"), state.get("formatted"))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Ignoring unreadable key index %s: %s", path, e)
+            return None
+
+    def save(self, path):
+        """Write the index atomically, so a crash never leaves a partial index behind."""
+        path = Path(path)
+        state = {
+            "input_hash": self.input_hash,
+            "dictionary": self.dictionary,
+            "rows": self.rows,
+            "matches": {key: sorted(found) for key, found in self.matches.items()},
+            "items": self.items,
+            "output_size": self.output_size,
+            "formatted": self.formatted,
+        }
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_path, path)
+
+    def rows_containing(self, key: str) -> set:
+        """
+        Return every row whose raw description could contain key.
+
+        Args:
+            key (str): A dictionary key
+
+        Returns:
+            set: Candidate row numbers
+        """
+        fragments = key.split()
+        if not fragments:
+            # A key of only whitespace can match any description
+            return set(range(self.rows))
+        fragment = max(fragments, key=len)
+        candidates = set()
+        for item, rows in self.items.items():
+            if fragment in item:
+                candidates.update(rows)
+        return candidates
+
+    def affected_rows(self, replacement_dict: dict):
+        """
+        Work out which rows can change when the dictionary is replaced.
+
+        Args:
+            replacement_dict (dict): The new dictionary
+
+        Returns:
+            set: Rows to recompute, or None if the keys the dictionaries share were
+            reordered, in which case every row has to be recomputed
+        """
+        old = dict(self.dictionary)
+        shared_old = [key for key, _ in self.dictionary if key in replacement_dict]
+        shared_new = [key for key in replacement_dict if key in old]
+        if shared_old != shared_new:
+            return None
+
+        affected = set()
+        for key, replacement in self.dictionary:
+            if replacement_dict.get(key) != replacement:
+                affected |= self.matches.get(key, set())
+        for key in replacement_dict:
+            if key in old:
+                continue
+            affected |= self.rows_containing(key)
+            characters = set(key)
+            for earlier_key, replacement in self.dictionary:
+                if not replacement or characters & set(replacement):
+                    affected |= self.matches.get(earlier_key, set())
+        return affected
+
+    def update(self, replacement_dict: dict, recomputed: set, matches: dict):
+        """
+        Record the results of recomputing rows with a new dictionary.
+
+        Args:
+            replacement_dict (dict): The new dictionary
+            recomputed (set): Rows that were recomputed
+            matches (dict): Rows each key matched among the recomputed rows
+        """
+        self.matches = {key: (self.matches.get(key, set()) - recomputed)
+                        | set(matches.get(key, ()))
+                        for key in replacement_dict}
+        self.dictionary = list(replacement_dict.items())
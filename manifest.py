@@ -0,0 +1,184 @@
+"""
+manifest.py
+
+Keeps a record of the point files that have already been run through both processing
+stages so that batch reruns over an archive can skip files that have not changed.
+
+The manifest is a JSON-lines file. Each line records one processed input:
+
+    {"input": "...", "sha256": "...", "size": 1234, "config": "...",
+     "output": "...", "processed_at": "2024-01-01T00:00:00"}
+
+Later lines win over earlier lines for the same input, so recording a file is a cheap
+append. A file can be skipped when its content hash and the configuration fingerprint
+both match the last record and the recorded output still exists.
+"""
+# Standard library imports
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST_NAME = ".description_parser_manifest.jsonl"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path) -> str:
+    """
+    Hash the contents of a file.
+
+    Args:
+        path (str): Path to the file to hash
+
+    Returns:
+        str: Hex encoded SHA-256 digest of the file contents
+    """
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def config_fingerprint(replacement_dict: dict, property_codes: list, misc_codes: list,
+                       options: dict = None) -> str:
+    """
+    Fingerprint the configuration used to process a file.
+
+    The replacement dictionary is hashed as an ordered list of pairs because the
+    replacements are applied in dictionary order.
+
+    Args:
+        replacement_dict (dict): Replacement dictionary used by the first stage
+        property_codes (list): Property corner codes used by the second stage
+        misc_codes (list): Miscellaneous codes used by the second stage
+        options (dict): Run options that change which outputs are written or what they
+            hold, such as compression (optional)
+
+    Returns:
+        str: Hex encoded SHA-256 digest of the configuration
+    """
+    config = {
+        "replacements": list(replacement_dict.items()),
+        "property_codes": list(property_codes),
+        "misc_codes": list(misc_codes),
+    }
+    if options:
+        config["options"] = sorted(options.items())
+    payload = json.dumps(
+        config,
+        ensure_ascii=False,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class Manifest:
+    """Record of processed input files backed by a JSON-lines file."""
+
+    def __init__(self, manifest_path):
+        """
+        Load the manifest from disk, if it exists.
+
+        Args:
+            manifest_path (str): Path to the JSON-lines manifest file
+        """
+        self.manifest_path = Path(manifest_path)
+        self.entries = {}
+        self._lines_on_disk = 0
+        self._load()
+
+    @staticmethod
+    def _key(input_file) -> str:
+        """Normalise an input path so the same file always maps to the same entry."""
+        return os.path.normcase(str(Path(input_file).resolve()))
+
+    def _load(self):
+        """Read every record in the manifest file, keeping the last one for each input."""
+        if not self.manifest_path.exists():
+            return
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    self.entries[self._key(entry["input"])] = entry
+                except (json.JSONDecodeError, KeyError, TypeError) as e:
+                    logger.warning("Ignoring bad manifest line %d in %s: %s",
+                                   line_number, self.manifest_path, e)
+                self._lines_on_disk += 1
+        logger.info("Loaded manifest with %d entries from %s",
+                    len(self.entries), self.manifest_path)
+
+    def lookup(self, input_file):
+        """
+        Return the last record for an input file.
+
+        Args:
+            input_file (str): Path to the input file
+
+        Returns:
+            dict: The manifest record, or None if the file has not been processed
+        """
+        return self.entries.get(self._key(input_file))
+
+    def is_current(self, input_file, content_hash: str, config: str) -> bool:
+        """
+        Check whether a file was already processed with identical content and configuration.
+
+        Args:
+            input_file (str): Path to the input file
+            content_hash (str): SHA-256 of the current file contents
+            config (str): Fingerprint of the current configuration
+
+        Returns:
+            bool: True if the file can be skipped
+        """
+        entry = self.lookup(input_file)
+        if entry is None:
+            return False
+        return (entry.get("sha256") == content_hash
+                and entry.get("config") == config
+                and Path(entry.get("output", "")).is_file())
+
+    def record(self, input_file, content_hash: str, config: str, output_file):
+        """
+        Record a processed file by appending a line to the manifest.
+
+        Args:
+            input_file (str): Path to the input file
+            content_hash (str): SHA-256 of the processed file contents
+            config (str): Fingerprint of the configuration used
+            output_file (str): Path to the final output file
+        """
+        entry = {
+            "input": str(Path(input_file).resolve()),
+            "sha256": content_hash,
+            "size": os.path.getsize(input_file),
+            "config": config,
+            "output": str(Path(output_file).resolve()),
+            "processed_at": datetime.now().isoformat(timespec='seconds'),
+        }
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.entries[self._key(input_file)] = entry
+        self._lines_on_disk += 1
+
+    def compact(self):
+        """Rewrite the manifest with one line per input once superseded lines pile up."""
+        if self._lines_on_disk <= 2 * len(self.entries):
+            return
+        temp_path = self.manifest_path.with_name(self.manifest_path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(temp_path, self.manifest_path)
+        self._lines_on_disk = len(self.entries)
+        logger.info("Compacted manifest to %d entries", len(self.entries))
@@ -0,0 +1,262 @@
+"""
+memory.py
+
+Keeps a batch run within a memory budget on machines that would otherwise swap.
+
+With a MemoryBudget every stage sizes its work to the memory the process has left: the
+replace stage reads a file in chunks when the whole DataFrame would not fit, the format
+stage formats fewer rows at a time, caches hold fewer entries, and the unknown code report
+spills its counts to temporary files once it holds more codes than fit. Sizes are worked
+out from the resident size of the process and the measured size of a sample of rows, so
+they are estimates; only USABLE_FRACTION of what is left is planned for, which leaves
+room for allocator overhead and the copies the estimates do not see.
+
+PeakMemory samples the resident size from a background thread while a stage runs, so
+each stage can report the most it used against the budget.
+
+Example:
+    budget = MemoryBudget(parse_size("2G"))
+    peak = PeakMemory()
+    with peak:
+        rows = budget.capacity(row_bytes, most=WRITE_BATCH_ROWS)
+        ...
+    logger.info("Format stage: %s", peak.summary(budget))
+"""
+# Standard library imports
+import heapq
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
+
+# Fraction of the memory left that a stage plans to use
+USABLE_FRACTION = 0.5
+# Fewest rows or entries a stage works with, however little memory is left
+MIN_ITEMS = 1000
+# How often PeakMemory samples the resident size
+SAMPLE_SECONDS = 0.02
+# Items sorted in memory before sorted_spilled writes them to a temporary file
+SPILL_ITEMS = 100000
+
+UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(text) -> int:
+    """
+    Parse a memory size such as 512M, 4G, 1.5GB or 1048576.
+
+    Args:
+        text (str): The size, in bytes unless it ends in K, M, G or T (optionally
+            followed by B), counted in powers of 1024
+
+    Returns:
+        int: Size in bytes
+
+    Raises:
+        ValueError: If text is not a size
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*', str(text), re.I)
+    if not match:
+        raise ValueError(f"Not a memory size: {text!r}")
+    return int(float(match[1]) * UNITS[match[2].upper()])
+
+
+def format_size(size: int) -> str:
+    """Return a size in bytes as a short human readable string, such as 1.5 GB."""
+    for unit in ('T', 'G', 'M', 'K'):
+        if size >= UNITS[unit]:
+            return f"{size / UNITS[unit]:.1f} {unit}B"
+    return f"{size} B"
+
+
+def resident_size() -> int:
+    """
+    Return the memory the process holds in RAM, in bytes.
+
+    Where the current size cannot be read (neither Linux nor Windows), the peak size
+    since the process started is returned instead.
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        pass
+    if sys.platform == 'win32':
+        # Imported here because they are only needed on Windows
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage',
+                    'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage',
+                    'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.WorkingSetSize
+    # Imported here because the module does not exist on Windows
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes everywhere but macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def row_size(rows: list) -> float:
+    """Return the average memory held by rows of strings, such as read_records returns."""
+    if not rows:
+        return 0.0
+    total = sum(sys.getsizeof(row) + sum(sys.getsizeof(field) for field in row)
+                for row in rows)
+    return total / len(rows)
+
+
+class MemoryBudget:
+    """The most memory a run may hold, and how much work fits in what is left of it."""
+
+    def __init__(self, limit: int):
+        """
+        Create a budget.
+
+        Args:
+            limit (int): Largest resident size of the process in bytes
+        """
+        if limit < 1:
+            raise ValueError(f"The memory budget must be positive, got {limit}")
+        self.limit = limit
+
+    def headroom(self) -> int:
+        """Return the bytes left before the process reaches the limit."""
+        return max(self.limit - resident_size(), 0)
+
+    def fits(self, size: float) -> bool:
+        """Return True if size bytes fit in the part of the headroom a stage may plan for."""
+        return size <= self.headroom() * USABLE_FRACTION
+
+    def capacity(self, item_size: float, most: int = None, least: int = MIN_ITEMS) -> int:
+        """
+        Return how many items of a given size fit in the headroom a stage may plan for.
+
+        Args:
+            item_size (float): Bytes each item holds
+            most (int): Never return more than this
+            least (int): Never return less than this, so work still moves forward when
+                the budget is already spent
+
+        Returns:
+            int: Number of items
+        """
+        count = max(int(self.headroom() * USABLE_FRACTION / max(item_size, 1)), least)
+        return count if most is None else min(count, most)
+
+
+class PeakMemory:
+    """
+    The highest resident size of the process seen inside its with blocks.
+
+    The size is sampled every SAMPLE_SECONDS from a background thread, so a spike shorter
+    than that can be missed. The same tracker can be entered again, for each file of a
+    stage; peak is the highest size over all of them.
+    """
+
+    def __init__(self):
+        self.peak = 0
+        self._stop = None
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = max(self.peak, resident_size())
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="peak-memory", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, resident_size())
+
+    def _sample(self):
+        """Record the resident size until the with block ends."""
+        while not self._stop.wait(SAMPLE_SECONDS):
+            self.peak = max(self.peak, resident_size())
+
+    def summary(self, budget: MemoryBudget = None) -> str:
+        """Return the peak, and its share of the budget if there is one."""
+        if budget is None:
+            return f"peak {format_size(self.peak)}"
+        return (f"peak {format_size(self.peak)} of {format_size(budget.limit)} budget "
+                f"({100 * self.peak / budget.limit:.0f}%)")
+
+
+def spill(items):
+    """
+    Write items to an anonymous temporary file, which is removed once closed.
+
+    Args:
+        items (Iterable): Picklable items
+
+    Returns:
+        The file, to read the items back from with read_spilled
+    """
+    f = tempfile.TemporaryFile()
+    try:
+        for item in items:
+            pickle.dump(item, f, pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+def read_spilled(f, close: bool = True):
+    """
+    Yield the items written to a file by spill, in order.
+
+    Args:
+        f: File returned by spill; it is read from the start
+        close (bool): Close, and so remove, the file once every item has been read
+    """
+    f.seek(0)
+    while True:
+        try:
+            yield pickle.load(f)
+        except EOFError:
+            break
+    if close:
+        f.close()
+
+
+def sorted_spilled(items, key=None, max_items: int = SPILL_ITEMS):
+    """
+    Yield items in sorted order, holding no more than max_items of them in memory.
+
+    Items are sorted max_items at a time, each sorted run is spilled to a temporary file,
+    and the runs are merged as they are read back. Nothing is written to disk if all of
+    the items fit.
+
+    Args:
+        items (Iterable): Picklable items
+        key (Callable): Sort key, as for sorted
+        max_items (int): Items sorted in memory at a time
+
+    Yields:
+        The items, sorted
+    """
+    runs, batch = [], []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= max_items:
+            batch.sort(key=key)
+            runs.append(spill(batch))
+            batch = []
+    batch.sort(key=key)
+    if not runs:
+        yield from batch
+        return
+    yield from heapq.merge(*(read_spilled(run) for run in runs), batch, key=key)
@@ -0,0 +1,374 @@
+"""
+miner.py
+
+Finds the most common non-standard codes across an archive of point files, as candidates
+for new keys in replacement_dict.json.
+
+Every description is reduced to its leading code and its first two items. Whenever the
+code is not in property_corners.txt or miscellaneous.txt, both the code and the two-item
+phrase are counted, since dictionary keys can be single codes (PLANTER) or phrases
+(SSMH RIM). Years of archives hold far more distinct phrases than are worth keeping in
+memory, so counts go into a Count-Min sketch of fixed size and only the heaviest
+candidates are tracked exactly, together with a few example rows each.
+
+Files are mined in chunks by a pool of worker processes. Each worker returns its sketch
+and its heaviest candidates; sketches add up cell by cell, so the partial results are
+merged into exactly the sketch a single process would have built.
+
+Usage:
+    python miner.py N:/jobs --dictionary config/replacement_dict.json --output candidates.csv
+"""
+# Standard library imports
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import sys
+import zipfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+# Local imports
+import parser3
+from batch import (DEFAULT_MISCELLANEOUS_PATH, DEFAULT_PROPERTY_CORNERS_PATH,
+                   POINT_FILE_EXTENSIONS, collect_input_files)
+from compressed import is_zip, open_member_text, open_text, point_file_members
+from point_schema import Schema, read_schema, sample_schema
+from sniff import SNIFF_BYTES, FileFormat, sniff_bytes, sniff_file
+from suggest import SuggestionIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SKETCH_WIDTH = 1 << 16
+DEFAULT_SKETCH_DEPTH = 4
+DEFAULT_CAPACITY = 2000
+DEFAULT_TOP = 100
+FILES_PER_TASK = 16
+MAX_EXAMPLES = 3
+
+
+class CountMinSketch:
+    """
+    Approximate counts in fixed memory.
+
+    Estimates never undercount; they overcount by at most a small fraction of the total
+    count with high probability, which is plenty to rank heavy hitters.
+    """
+
+    def __init__(self, width: int = DEFAULT_SKETCH_WIDTH, depth: int = DEFAULT_SKETCH_DEPTH):
+        """
+        Create an empty sketch.
+
+        Args:
+            width (int): Counters per row; more counters mean smaller overcounts
+            depth (int): Number of rows; more rows mean fewer bad estimates
+        """
+        self.width = width
+        self.depth = depth
+        self.rows = [array('Q', bytes(8 * width)) for _ in range(depth)]
+        self.total = 0
+
+    def _cells(self, key: str):
+        """Yield the counter index for key in each row."""
+        digest = hashlib.blake2b(key.encode('utf8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for row in range(self.depth):
+            yield (first + row * second) % self.width
+
+    def add(self, key: str, count: int = 1):
+        """Count key count more times."""
+        for row, cell in zip(self.rows, self._cells(key)):
+            row[cell] += count
+        self.total += count
+
+    def estimate(self, key: str) -> int:
+        """Return the estimated count of key."""
+        return min(row[cell] for row, cell in zip(self.rows, self._cells(key)))
+
+    def merge(self, other: 'CountMinSketch'):
+        """
+        Add the counts of a sketch with the same dimensions.
+
+        Raises:
+            ValueError: If the sketches have different dimensions
+        """
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Cannot merge sketches with different dimensions")
+        for row, other_row in zip(self.rows, other.rows):
+            for cell, count in enumerate(other_row):
+                if count:
+                    row[cell] += count
+        self.total += other.total
+
+
+class HeavyHitters:
+    """Tracks the most frequent keys of a stream, with example rows, in bounded memory."""
+
+    def __init__(self, sketch: CountMinSketch = None, capacity: int = DEFAULT_CAPACITY):
+        """
+        Start an empty tracker.
+
+        Args:
+            sketch (CountMinSketch): Sketch that holds the counts (default: a new one)
+            capacity (int): Number of keys to track; up to twice as many are held between
+                prunes
+        """
+        self.sketch = sketch or CountMinSketch()
+        self.capacity = capacity
+        self.examples = {}
+
+    def add(self, key: str):
+        """
+        Count key once.
+
+        Returns:
+            list: The example list of key if it is still tracked and wants more examples,
+            otherwise None
+        """
+        self.sketch.add(key)
+        examples = self.examples.get(key)
+        if examples is None:
+            examples = self.examples[key] = []
+            if len(self.examples) > 2 * self.capacity:
+                self.prune()
+                examples = self.examples.get(key)
+        return examples if examples is not None and len(examples) < MAX_EXAMPLES else None
+
+    def prune(self):
+        """Stop tracking all but the capacity heaviest keys."""
+        keep = dict(self.top(self.capacity))
+        self.examples = {key: self.examples[key] for key in keep}
+
+    def top(self, count: int) -> list:
+        """
+        Return the heaviest tracked keys.
+
+        Args:
+            count (int): Number of keys to return
+
+        Returns:
+            list: (key, estimated count) pairs, heaviest first
+        """
+        estimates = [(key, self.sketch.estimate(key)) for key in self.examples]
+        estimates.sort(key=lambda item: (-item[1], item[0]))
+        return estimates[:count]
+
+    def merge(self, other: 'HeavyHitters'):
+        """Add the counts and tracked keys of another tracker."""
+        self.sketch.merge(other.sketch)
+        for key, examples in other.examples.items():
+            mine = self.examples.setdefault(key, [])
+            mine.extend(examples[:MAX_EXAMPLES - len(mine)])
+        if len(self.examples) > 2 * self.capacity:
+            self.prune()
+
+
+def candidate_keys(description: str, catalog: parser3.CodeCatalog) -> list:
+    """
+    Return the keys to count for a description.
+
+    Args:
+        description (str): A raw description
+        catalog (parser3.CodeCatalog): Compiled property corner and miscellaneous codes
+
+    Returns:
+        list: The unknown code and the phrase of the first two items, or an empty list if
+        the code is known
+    """
+    code = parser3.find_unknown_code(description, catalog)
+    if not code:
+        return []
+    phrase = ' '.join(description.split()[:2])
+    return [code] if phrase == code else [code, phrase]
+
+
+def mine_rows(infile, name: str, catalog: parser3.CodeCatalog, hitters: HeavyHitters,
+              file_format: FileFormat, schema: Schema):
+    """Count the unknown codes in the rows of one point file past its header rows."""
+    column = schema.description
+    rows = csv.reader(infile, **file_format.csv_options())
+    for line_number, row in enumerate(rows, start=1):
+        if line_number <= schema.header_rows or len(row) <= column:
+            continue
+        for key in candidate_keys(row[column], catalog):
+            examples = hitters.add(key)
+            if examples is not None:
+                examples.append(f"{name}:{line_number}: {file_format.delimiter.join(row)}")
+
+
+def mine_files(paths, catalog: parser3.CodeCatalog, sketch_width: int = DEFAULT_SKETCH_WIDTH,
+               sketch_depth: int = DEFAULT_SKETCH_DEPTH,
+               capacity: int = DEFAULT_CAPACITY) -> HeavyHitters:
+    """
+    Count the unknown codes in a group of point files.
+
+    Gzip compressed files are read as they are decompressed, and the point files inside
+    zip archives one member at a time, without extracting them; examples from a member
+    name it as crew.zip/day1/job.csv. The encoding and dialect of each file are sniffed
+    and its layout detected, as the processing stages do; undecodable bytes are replaced
+    so the examples can be written out.
+
+    Args:
+        paths (list): Point files, gzip compressed point files and zip archives to read
+        catalog (parser3.CodeCatalog): Compiled property corner and miscellaneous codes
+        sketch_width (int): Counters per sketch row
+        sketch_depth (int): Number of sketch rows
+        capacity (int): Number of candidates to track
+
+    Returns:
+        HeavyHitters: The counts, with example rows as "file:line: row" strings
+    """
+    hitters = HeavyHitters(CountMinSketch(sketch_width, sketch_depth), capacity)
+    for path in paths:
+        try:
+            if is_zip(path):
+                with zipfile.ZipFile(path) as archive:
+                    for name in point_file_members(archive, POINT_FILE_EXTENSIONS):
+                        with archive.open(name) as stream:
+                            sample = stream.read(SNIFF_BYTES)
+                        file_format = sniff_bytes(sample)
+                        schema = sample_schema(sample, file_format)
+                        with open_member_text(archive, name, file_format.encoding,
+                                              'replace') as f:
+                            mine_rows(f, str(Path(path) / name), catalog, hitters,
+                                      file_format, schema)
+            else:
+                file_format = sniff_file(path)
+                schema = read_schema(path, file_format)
+                with open_text(path, encoding=file_format.encoding, errors='replace') as f:
+                    mine_rows(f, path, catalog, hitters, file_format, schema)
+        except (OSError, EOFError, csv.Error, zipfile.BadZipFile) as e:
+            logger.error("Could not mine %s: %s", path, e)
+    return hitters
+
+
+# Worker state, loaded once per worker by _init_worker
+_worker_config = {}
+
+
+def _init_worker(property_codes: list, misc_codes: list, sketch_width: int,
+                 sketch_depth: int, capacity: int):
+    """Compile the code catalog once for each worker."""
+    _worker_config["catalog"] = parser3.CodeCatalog(property_codes, misc_codes)
+    _worker_config["sketch"] = (sketch_width, sketch_depth, capacity)
+
+
+def _mine_in_worker(paths: list) -> HeavyHitters:
+    """Mine a chunk of files with the catalog compiled by _init_worker."""
+    return mine_files(paths, _worker_config["catalog"], *_worker_config["sketch"])
+
+
+def mine_archive(paths, property_codes: list, misc_codes: list, workers: int = None,
+                 sketch_width: int = DEFAULT_SKETCH_WIDTH,
+                 sketch_depth: int = DEFAULT_SKETCH_DEPTH,
+                 capacity: int = DEFAULT_CAPACITY) -> HeavyHitters:
+    """
+    Count the unknown codes in every point file found in paths.
+
+    Args:
+        paths (list): Files and directories to mine
+        property_codes (list): List of valid property corner codes
+        misc_codes (list): List of valid miscellaneous codes
+        workers (int): Number of worker processes (default: CPU count; 1 mines in this
+            process)
+        sketch_width (int): Counters per sketch row
+        sketch_depth (int): Number of sketch rows
+        capacity (int): Number of candidates to track
+
+    Returns:
+        HeavyHitters: The merged counts
+    """
+    input_files = [str(path) for path in collect_input_files(paths)]
+    chunks = [input_files[i:i + FILES_PER_TASK]
+              for i in range(0, len(input_files), FILES_PER_TASK)]
+    logger.info("Mining %d files in %d chunks", len(input_files), len(chunks))
+
+    merged = HeavyHitters(CountMinSketch(sketch_width, sketch_depth), capacity)
+    if workers == 1:
+        catalog = parser3.CodeCatalog(property_codes, misc_codes)
+        merged.merge(mine_files(input_files, catalog, sketch_width, sketch_depth, capacity))
+        return merged
+
+    with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(list(property_codes), list(misc_codes), sketch_width, sketch_depth,
+                      capacity)) as executor:
+        for partial in executor.map(_mine_in_worker, chunks):
+            merged.merge(partial)
+    return merged
+
+
+def rank_candidates(hitters: HeavyHitters, replacement_dict: dict = None,
+                    suggestion_index: SuggestionIndex = None, top: int = DEFAULT_TOP) -> list:
+    """
+    Turn mined counts into a ranked list of candidate dictionary keys.
+
+    Args:
+        hitters (HeavyHitters): The mined counts
+        replacement_dict (dict): Existing dictionary; keys already in it are left out
+        suggestion_index (SuggestionIndex): Index used to suggest replacements (optional)
+        top (int): Number of candidates to return
+
+    Returns:
+        list: [candidate, estimated count, suggestions, examples] rows, heaviest first
+    """
+    existing = {key.strip().upper() for key in replacement_dict or {}}
+    rows = []
+    for key, count in hitters.top(len(hitters.examples)):
+        if key.upper() in existing:
+            continue
+        suggestions = ''
+        if suggestion_index is not None:
+            suggestions = '; '.join(f"{code} ({distance})" for code, distance
+                                    in suggestion_index.suggest(key.split()[0]))
+        rows.append([key, count, suggestions, ' | '.join(hitters.examples[key])])
+        if len(rows) == top:
+            break
+    return rows
+
+
+def main(argv=None):
+    """Command line entry point for mining archives."""
+    arg_parser = argparse.ArgumentParser(
+        description="Find common non-standard codes to add to the replacement dictionary")
+    arg_parser.add_argument("paths", nargs='+', help="Point files or directories to mine")
+    arg_parser.add_argument("--dictionary",
+                            help="Replacement dictionary whose keys are left out of the results")
+    arg_parser.add_argument("--property-corners", default=DEFAULT_PROPERTY_CORNERS_PATH,
+                            help="Path to the property corners file")
+    arg_parser.add_argument("--miscellaneous", default=DEFAULT_MISCELLANEOUS_PATH,
+                            help="Path to the miscellaneous codes file")
+    arg_parser.add_argument("--output", default="candidates.csv",
+                            help="Where to write the ranked candidates")
+    arg_parser.add_argument("--top", type=int, default=DEFAULT_TOP,
+                            help="Number of candidates to write")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="Number of worker processes")
+    args = arg_parser.parse_args(argv)
+
+    property_codes, misc_codes = parser3.load_code_lists(args.property_corners,
+                                                         args.miscellaneous)
+    if not property_codes or not misc_codes:
+        print("Failed to load configuration files")
+        return 1
+    replacement_dict = {}
+    if args.dictionary:
+        with open(args.dictionary, 'r', encoding='utf-8') as f:
+            replacement_dict = json.load(f)
+
+    hitters = mine_archive(args.paths, property_codes, misc_codes, workers=args.workers)
+    rows = rank_candidates(hitters, replacement_dict,
+                           SuggestionIndex(property_codes + misc_codes), args.top)
+    with open(args.output, 'w', newline='', encoding='utf8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Candidate", "Estimated Count", "Suggestions", "Examples"])
+        writer.writerows(rows)
+    print(f"Wrote {len(rows)} candidates to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,11 +4,26 @@
 import re
 import os
 import csv
+import io
+import itertools
 import logging
 # import tkinter as tk
 from tkinter import messagebox
 import subprocess
 import sys
+import threading
+import time
+from array import array
+# Local imports
+import checkpoint
+from compressed import is_gzip, open_text, strip_gzip, with_compression
+from memory import MemoryBudget, row_size
+from pipeline import PIPELINE_QUEUE_DEPTH, PipelineStats, open_read_ahead
+from point_schema import SCHEMA_ROWS, Schema, detect_schema, read_schema
+from records import (WRITE_BATCH_ROWS, WRITE_BUFFER_SIZE, CountedLines, RecordWriter,
+                     read_records, write_records)
+from sniff import DEFAULT_FORMAT, FileFormat, sniff_file
+from suggest import REPORT_ENTRY_SIZE, UnknownCodeReport
 
 # set working directory atlantic-description-parser directory
 DIRNAME = os.path.dirname(os.path.abspath(__file__))
@@ -114,130 +129,733 @@ def number_of_codes(description_items: list, property_codes: list, misc_codes: l
 
 
 
-def process_file(input_file: str, property_codes: list, misc_codes: list) -> str:
+# Flags describing an interned description item
+PROPERTY_CODE = 1
+MISC_CODE = 2
+SIZE = 4
+TREE = 8
+SLASH = 16
+BACKSLASH = 32
+ANY_CODE = PROPERTY_CODE | MISC_CODE
+MARKED = SLASH | BACKSLASH
+
+# Item IDs are stored as unsigned 16 bit integers
+MAX_TOKENS = 65536
+
+# Formatting engines accepted by process_file
+ENGINES = ('python', 'numpy')
+
+# Rows formatted first under a memory budget, to measure how much memory a row takes
+SAMPLE_ROWS = 1000
+
+# Rows format_stream holds in memory at a time
+STREAM_BATCH_ROWS = 65536
+
+
+class TableFull(Exception):
+    """A TokenTable has no room for another item."""
+
+
+class TokenTable:
+    """
+    Interns description items as small integers.
+
+    Each distinct item is classified once, when it is first seen, and its flags are kept
+    in a bytearray indexed by its ID, so the formatting rules compare integers instead of
+    upper-casing items and matching size patterns for every row. Descriptions are encoded
+    as array('H'), two bytes per item, and decoded back to text only for output.
+
+    Lookups need no lock; new items are added under a lock so the table can be shared
+    between threads. Threads can fill the table between them after checking it had
+    room, so the last ID is also checked under the lock.
+    """
+
+    def __init__(self, catalog: 'CodeCatalog'):
+        """
+        Start an empty table.
+
+        Args:
+            catalog (CodeCatalog): Codes used to classify items
+        """
+        self.catalog = catalog
+        self.ids = {}
+        self.tokens = []
+        self.flags = bytearray()
+        self.tree_ids = set()
+        self._marked = {}
+        self._lock = threading.Lock()
+
+    def has_room(self, count: int) -> bool:
+        """Return True if count more items can be added."""
+        return len(self.tokens) + count <= MAX_TOKENS
+
+    def intern(self, token: str) -> int:
+        """
+        Return the ID of an item, adding it to the table if needed.
+
+        Args:
+            token (str): The item
+
+        Returns:
+            int: The item ID
+
+        Raises:
+            TableFull: If the item is new and the table already holds MAX_TOKENS items
+        """
+        with self._lock:
+            token_id = self.ids.get(token)
+            if token_id is None:
+                if len(self.tokens) >= MAX_TOKENS:
+                    raise TableFull(f"No room for {token!r} in a table of {MAX_TOKENS} items")
+                upper = token.upper()
+                flags = ((PROPERTY_CODE if upper in self.catalog.property_codes else 0)
+                         | (MISC_CODE if upper in self.catalog.misc_codes else 0)
+                         | (SIZE if item_is_size(token) else 0)
+                         | (TREE if upper == 'TREE' else 0)
+                         | (SLASH if token.startswith('/') else 0)
+                         | (BACKSLASH if token.startswith('\\') else 0))
+                token_id = len(self.tokens)
+                self.tokens.append(token)
+                self.flags.append(flags)
+                if flags & TREE:
+                    self.tree_ids.add(token_id)
+                self.ids[token] = token_id
+            return token_id
+
+    def mark(self, token_id: int, prefix: str) -> int:
+        """Return the ID of an item with a slash or backslash put in front of it."""
+        key = (prefix, token_id)
+        marked = self._marked.get(key)
+        if marked is None:
+            marked = self._marked[key] = self.intern(prefix + self.tokens[token_id])
+        return marked
+
+    def encode(self, items: list) -> array:
+        """
+        Encode description items as IDs.
+
+        Args:
+            items (list): The description items
+
+        Returns:
+            array: The item IDs
+        """
+        try:
+            return array('H', map(self.ids.__getitem__, items))
+        except KeyError:
+            return array('H', map(self.intern, items))
+
+    def decode(self, encoded) -> str:
+        """Return the description for encoded items, separated by single spaces."""
+        return ' '.join(map(self.tokens.__getitem__, encoded))
+
+
+class CodeCatalog:
+    """
+    Property corner and miscellaneous codes compiled for fast, case-insensitive lookups.
+
+    Building the catalog once and sharing it between rows, files and threads avoids
+    upper-casing every code for every comparison. The code sets are read-only after
+    construction; the catalog also owns the TokenTable that descriptions are encoded
+    with.
+    """
+
+    __slots__ = ('property_codes', 'misc_codes', 'all_codes', 'tokens')
+
+    def __init__(self, property_codes: list, misc_codes: list):
+        """
+        Compile the code lists.
+
+        Args:
+            property_codes (list): List of valid property corner codes
+            misc_codes (list): List of valid miscellaneous codes
+        """
+        self.property_codes = frozenset(code.upper() for code in property_codes)
+        self.misc_codes = frozenset(code.upper() for code in misc_codes)
+        self.all_codes = self.property_codes | self.misc_codes
+        self.tokens = TokenTable(self)
+
+    def token_table(self, count: int) -> TokenTable:
+        """
+        Return a token table with room for count more items.
+
+        A full table is replaced rather than cleared, so callers still holding it can
+        finish with it. Threads sharing the catalog can still fill the table between them;
+        intern then raises TableFull and the caller starts over with replace_full.
+
+        Args:
+            count (int): Number of items about to be encoded
+
+        Returns:
+            TokenTable: The table to encode with
+
+        Raises:
+            ValueError: If count is more than a table can hold
+        """
+        if count > MAX_TOKENS:
+            raise ValueError(f"Cannot encode {count} items in a table of {MAX_TOKENS}")
+        table = self.tokens
+        if not table.has_room(count):
+            table = self.tokens = TokenTable(self)
+        return table
+
+    def replace_full(self, table: TokenTable):
+        """Start a new token table, unless another thread already replaced the full one."""
+        if self.tokens is table:
+            self.tokens = TokenTable(self)
+
+    def number_of_codes(self, description_items: list) -> str:
+        """
+        Check if the description contains one or two valid codes.
+
+        Same as the module level number_of_codes, using the compiled code sets.
+
+        Args:
+            description_items (list): List of description items to check
+
+        Returns:
+            str: 'zero', 'one', or 'two' based on the number of valid codes found.
+        """
+        valid_codes = sum(1 for item in description_items[:2]
+                          if item.upper() in self.all_codes)
+        return ('zero', 'one', 'two')[valid_codes]
+
+
+def is_header_row(row: list) -> bool:
+    """
+    Check if a row is a header row by trying to convert its second column to a number.
+
+    Used where rows are seen one at a time without a detected Schema; process_file
+    detects the header once with point_schema instead.
+
+    Args:
+        row (list): The CSV row
+
+    Returns:
+        bool: True if the row should be passed through as a header
+    """
+    try:
+        if len(row) >= 2:
+            float(row[1])
+            return False
+        return True
+    except (ValueError, TypeError):
+        return True
+
+
+def format_description(description: str, catalog: CodeCatalog) -> str:
+    """
+    Apply the formatting rules to a single description.
+
+    The description is encoded with the catalog's TokenTable and the rules work on the
+    item IDs and their flags.
+
+    Args:
+        description (str): The description to format
+        catalog (CodeCatalog): Compiled property corner and miscellaneous codes
+
+    Returns:
+        str: The formatted description, with items separated by single spaces
+    """
+    desc_items = description.split()
+    # Each rule adds at most one marked item
+    table = catalog.token_table(len(desc_items) + 2)
+    try:
+        return _format_encoded(desc_items, table)
+    except TableFull:
+        # Other threads filled the table while this description was being encoded
+        catalog.replace_full(table)
+        return format_description(description, catalog)
+
+
+def _format_encoded(desc_items: list, table: TokenTable) -> str:
+    """Apply the formatting rules to description items encoded with table."""
+    ids = table.encode(desc_items)
+
+    # Special bypass condition: if 'TREE' is present, skip all processing
+    if len(ids) >= 2 and table.tree_ids.isdisjoint(ids):
+        flags = table.flags
+        first, second = flags[ids[0]], flags[ids[1]]
+        code_count = bool(first & ANY_CODE) + bool(second & ANY_CODE)
+
+        if code_count == 1:
+            # Rule for ONE code
+            # If first item is property code and second is size, add backslash
+            if first & PROPERTY_CODE and second & SIZE and not second & BACKSLASH:
+                ids[1] = table.mark(ids[1], '\\')
+            # If first is size and second is property code, swap and add backslash
+            elif first & SIZE and second & PROPERTY_CODE:
+                size_item = ids[0]
+                if not first & BACKSLASH:
+                    size_item = table.mark(size_item, '\\')
+                ids[0], ids[1] = ids[1], size_item
+            # If first item is property code and second is not a size, add forward slash
+            elif first & PROPERTY_CODE and not second & SIZE and not second & MARKED:
+                ids[1] = table.mark(ids[1], '/')
+            # If first item is miscellaneous code, add forward slash to second item
+            elif first & MISC_CODE:
+                if not second & MARKED:
+                    ids[1] = table.mark(ids[1], '/')
+
+        elif code_count == 2:
+            # Rule for TWO codes - ensure property corner code is after first code
+            if first & PROPERTY_CODE and second & MISC_CODE:
+                # Swap so property code comes after misc code
+                ids[0], ids[1] = ids[1], ids[0]
+
+            # Now handle the third item
+            if len(ids) >= 3:
+                third = flags[ids[2]]
+                if third & SIZE:
+                    if not third & BACKSLASH:
+                        ids[2] = table.mark(ids[2], '\\')
+                elif not third & MARKED:
+                    ids[2] = table.mark(ids[2], '/')
+
+    return table.decode(ids)
+
+
+def format_row(row: list, catalog: CodeCatalog, schema: Schema = None) -> list:
+    """
+    Apply the formatting rules to the description of a single row.
+
+    Header rows and rows with fewer than 5 columns are returned unchanged.
+
+    Args:
+        row (list): The CSV row, modified in place
+        catalog (CodeCatalog): Compiled property corner and miscellaneous codes
+        schema (Schema): Layout of the file the row comes from past its header rows; only
+            the row length is checked. Without one, the row is checked with is_header_row
+
+    Returns:
+        list: The formatted row
+    """
+    if schema is not None:
+        if schema.is_data(row):
+            row[schema.description] = format_description(row[schema.description], catalog)
+        return row
+
+    if is_header_row(row):
+        return row
+
+    if len(row) >= 5:
+        row[4] = format_description(row[4], catalog)
+
+    return row
+
+
+def find_unknown_code(description: str, catalog: CodeCatalog):
+    """
+    Find the code of a description if it is not a known code.
+
+    The code is the first of the first two items that is not a size or a note.
+
+    Args:
+        description (str): The description to check
+        catalog (CodeCatalog): Compiled property corner and miscellaneous codes
+
+    Returns:
+        str: The unknown code, or None if the code is known or there is no code
+    """
+    for item in description.split()[:2]:
+        if item_is_size(item) or item.startswith(('/', '\\')):
+            continue
+        return None if item.upper() in catalog.all_codes else item
+    return None
+
+
+def resumable(input_file: str, file_format: FileFormat) -> bool:
+    """
+    Return True if processing can resume from a byte offset into the input file.
+
+    Offsets into gzip data, or into UTF-16 text where a newline is two bytes, do not fall
+    on row boundaries the way checkpoints expect, so those files are processed in full.
+    """
+    return not is_gzip(input_file) and not file_format.encoding.startswith('utf-16')
+
+
+def processed_output_path(input_file: str, compress: bool = None) -> str:
+    """
+    Return the path process_file writes its output to for an input file.
+
+    Args:
+        input_file (str): Path to the preprocessed CSV file
+        compress (bool): Whether the output is gzip compressed (default: if the input is)
+    """
+    base, ext = os.path.splitext(strip_gzip(input_file))
+    base = base.replace('preprocessed_', '')  # Remove 'preprocessed' from base
+    if compress is None:
+        compress = is_gzip(input_file)
+    return with_compression(f"{base}_processed{ext}", compress)
+
+
+def unknown_code_report_path(input_file: str) -> str:
+    """Return the path of the unknown code report for an input file."""
+    base, _ = os.path.splitext(strip_gzip(input_file))
+    base = base.replace('preprocessed_', '')
+    return f"{base}_unknown_codes.csv"
+
+
+def process_file(input_file: str, property_codes: list, misc_codes: list,
+                 gui_mode: bool = True, incremental: bool = False,
+                 suggestion_index=None, engine: str = 'python',
+                 compress: bool = None, file_format: FileFormat = None,
+                 schema: Schema = None, batch_rows: int = WRITE_BATCH_ROWS,
+                 buffer_size: int = WRITE_BUFFER_SIZE, background_writer: bool = False,
+                 pipeline: bool = False, pipeline_stats: PipelineStats = None,
+                 resume: bool = False,
+                 checkpoint_rows: int = checkpoint.CHECKPOINT_ROWS,
+                 memory_budget: MemoryBudget = None, point_index=None,
+                 corner_grid=None, input_size: int = None) -> str:
     """
     Process the input file and write results to output file.
 
+    A full run writes to a partial file next to the output and renames it over the
+    output once it is complete. Every checkpoint_rows rows the partial file is flushed
+    to disk and checkpointed, unless the input or output is compressed or the input is
+    UTF-16, so a run that is cut off can be resumed with resume=True. The resumed run
+    writes the same output an uninterrupted one would have.
+
+    Rows are read, formatted and written batch_rows at a time. With pipeline=True the
+    input is read ahead and the output written behind by their own threads (see
+    pipeline.py), so reading and writing on a slow drive overlap with formatting.
+
+    In incremental mode only the rows appended since the last incremental run are
+    processed and appended to the existing output. If the previously processed part of
+    the input has changed, or there is no checkpoint yet, the whole file is processed.
+    A last row without a newline is only processed once the file has stopped growing,
+    and is processed again by the next run.
+
     Args:
         input_file (str): Path to the CSV file.
         property_codes (list): List of valid property corner codes.
         misc_codes (list): List of valid miscellaneous codes.
+        gui_mode (bool): Whether to show GUI dialogs (default: True)
+        incremental (bool): Only process rows appended since the last run (default: False)
+        suggestion_index (SuggestionIndex): If given, also write a report of the unknown
+            codes in the file with suggested replacements, next to the output file. In
+            incremental mode the report only covers the rows processed in this run.
+        engine (str): 'python' formats row by row, 'numpy' formats the whole description
+            column at once (see vectorized.py); both write identical output
+        compress (bool): Write a gzip compressed output. By default the output is
+            compressed if the input is. Compressed inputs are always processed in full
+        file_format (FileFormat): Encoding and dialect of the input, which the output is
+            written in as well; sniffed from the start of the file if not given
+        schema (Schema): Column layout of the input; detected from its first rows if
+            not given. Rows past the header rows are formatted without further checks
+            beyond their length
+        batch_rows (int): Rows formatted and written at a time
+        buffer_size (int): Buffer size of the output file in bytes
+        background_writer (bool): Write each batch from a background thread while the
+            next one is formatted, which helps most on slow network drives
+        pipeline (bool): Also read the input ahead from a background thread; the queue
+            depths and stalls of both threads are logged
+        pipeline_stats (PipelineStats): Statistics to add this file's pipeline to
+        resume (bool): Continue an interrupted full run from its last checkpoint; by
+            default a partial file left behind is discarded
+        checkpoint_rows (int): Rows written between checkpoints of a full run
+        memory_budget (MemoryBudget): Format no more rows at a time than fit in what is
+            left of the budget, stream large increments instead of reading them in one
+            go, and spill the unknown code report to disk once it would not fit
+        point_index (PointIndex): Add the point number and coordinates of every row to
+            this duplicates.PointIndex. Rows an earlier run formatted, before an increment
+            or a resumed checkpoint, are read and added too
+        corner_grid (CornerGrid): Add the property corner shots to this
+            duplicates.CornerGrid, in the same way
+        input_size (int): Size of the input when it was hashed; the file has stopped
+            growing if it is still this size (default: its size when it is sniffed)
     """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {', '.join(ENGINES)}")
     try:
-        with open(input_file, 'r', newline='', encoding='utf8') as infile:
-            logger.info("Processing input file: %s", input_file)
-            reader = csv.reader(infile)
-            rows = list(reader)  # Read all rows at once
-
         # Create output filename by adding _processed before the extension
-        base, ext = os.path.splitext(input_file)
-        base = base.replace('preprocessed_', '')  # Remove 'preprocessed' from base
-        output_file = f"{base}_processed{ext}"
+        output_file = processed_output_path(input_file, compress)
+        if input_size is None:
+            input_size = os.path.getsize(input_file)
+        if file_format is None:
+            file_format = sniff_file(input_file)
+        if incremental and not resumable(input_file, file_format):
+            logger.info("Processing %s in full", input_file)
+            incremental = False
+        if schema is None:
+            schema = read_schema(input_file, file_format)
+
+        catalog = CodeCatalog(property_codes, misc_codes)
+        report = None
+        if suggestion_index:
+            max_codes = memory_budget.capacity(REPORT_ENTRY_SIZE) if memory_budget else None
+            report = UnknownCodeReport(suggestion_index, max_codes=max_codes)
+        # Checkpoints need byte offsets into the input and a partial file to cut back
+        checkpointed = resumable(input_file, file_format) and not is_gzip(output_file)
+
+        start = 0
+        first_line = 1
+        limit = None
+        count = 0
+        target = output_file
+        tail = None
+        if incremental:
+            start, end, saved = checkpoint.resume_offsets(input_file, output_file)
+            if start:
+                first_line += saved.get("rows", 0)
+            limit = end - start
+            stop = checkpoint.settled_length(input_file, input_size, end)
+            if stop > end:
+                with open(input_file, 'rb') as infile:
+                    infile.seek(end)
+                    tail = infile.read(stop - end).decode(file_format.encoding,
+                                                          file_format.errors)
+        if not start:
+            # Full runs write to a partial file that replaces the output once complete
+            target = checkpoint.partial_path(output_file)
+            if resume and checkpointed:
+                start, _, saved = checkpoint.resume_partial(input_file, output_file)
+                if start and report and "unknown_codes" not in saved:
+                    logger.info("%s was not checked for unknown codes; starting over", target)
+                    start = 0
+            if start:
+                count = saved.get("rows", 0)
+                if report:
+                    report.counts, report.examples = saved["unknown_codes"]
+                if limit is not None:
+                    limit = end - start
+            else:
+                checkpoint.discard_partial(output_file)
+        appending = bool(start) and target == output_file
+        indexes = [index for index in (point_index, corner_grid) if index is not None]
+        if start:
+            # The rows before start were formatted by an earlier run
+            for index in indexes:
+                index.scan_file(input_file, file_format, schema, end=start)
+        checkpointed = checkpointed and not appending
+
+        logger.info("Processing input file: %s", input_file)
         logger.info("Writing to output file: %s",output_file)
-
-        with open(output_file, 'w', newline='', encoding='utf8') as outfile:
-            writer = csv.writer(outfile)
-
-            for row in rows:
-                # Check if it's a header row by trying to convert row[1] to float
-                try:
-                    if len(row) >= 2:
-                        float(row[1])
-                        is_header = False
-                    else:
-                        is_header = True
-                except (ValueError, TypeError):
-                    is_header = True
-
-                if is_header:
-                    writer.writerow(row)
-                    continue
-
-                if len(row) >= 5:
-                    description = row[4].strip()
-                    desc_items = description.split()
-
-                    if len(desc_items) >= 2:
-                        # Special bypass condition: if 'TREE' is present, skip all processing
-                        if any(item.upper() == 'TREE' for item in desc_items):
-                            # No processing applied - keep description as is
-                            pass
-                        else:
-                            code_count = number_of_codes(desc_items, property_codes, misc_codes)
-
-                            if code_count == 'one':
-                                # Rule for ONE code
-                                if len(desc_items) >= 2 and desc_items[0] != "TREE":
-                                    # If first item is property code and second is size,
-                                    # add backslash
-                                    if desc_items[0].upper() in (code.upper()
-                                        for code in property_codes) \
-                                            and item_is_size(desc_items[1]) \
-                                            and not desc_items[1].startswith('\\'):
-                                        desc_items[1] = '\\' + desc_items[1]
-                                    # If first is size and second is property code,
-                                    # swap and add backslash
-                                    elif item_is_size(desc_items[0]) and desc_items[1].upper() in \
-                                        (code.upper() for code in property_codes):
-                                        size_item = desc_items[0]
-                                        if not size_item.startswith('\\'):
-                                            size_item = '\\' + size_item
-                                        desc_items[0], desc_items[1] = desc_items[1], size_item
-                                    # If first item is property code and second is not a size,
-                                    # add forward slash
-                                    elif desc_items[0].upper() in \
-                                            (code.upper() for code in property_codes) \
-                                            and not item_is_size(desc_items[1]) \
-                                            and not desc_items[1].startswith('/') \
-                                            and not desc_items[1].startswith('\\'):
-                                        desc_items[1] = '/' + desc_items[1]
-                                    # If first item is miscellaneous code, add forward
-                                    # slash to second item
-                                    elif desc_items[0].upper() in \
-                                            (code.upper() for code in misc_codes):
-                                        if not desc_items[1].startswith('/') \
-                                                and not desc_items[1].startswith('\\'):
-                                            desc_items[1] = '/' + desc_items[1]
-
-                            elif code_count == 'two':
-                                # Rule for TWO codes - ensure property corner code is
-                                # after first code
-                                # Check if we need to reorder codes
-                                if desc_items[0].upper() in (code.upper()
-                                        for code in property_codes) and desc_items[1].upper() in \
-                                            (code.upper() for code in misc_codes):
-                                    # Swap so property code comes after misc code
-                                    desc_items[0], desc_items[1] = desc_items[1], desc_items[0]
-
-                                # Now handle the third item
-                                if len(desc_items) >= 3 and desc_items[1] != "TREE":
-                                    if item_is_size(desc_items[2]):
-                                        if not desc_items[2].startswith('\\'):
-                                            desc_items[2] = '\\' + desc_items[2]
-                                    else:
-                                        if not desc_items[2].startswith('/') and not \
-                                                desc_items[2].startswith('\\') and \
-                                                desc_items[1] != "TREE":
-                                            desc_items[2] = '/' + desc_items[2]
-
-                    # Update the description in the row
-                    row[4] = ' '.join(desc_items)
-
-                writer.writerow(row)
-
-        messagebox.showinfo("Processing Complete",
-                            f"File processed successfully. Output saved to {output_file}.")
+        # Appended rows come after the header
+        header_rows = 0 if appending else schema.header_rows
+
+        if engine == 'numpy':
+            # Imported here so the python engine does not need numpy
+            import vectorized
+
+        def format_batch(rows: list, quoted: set, writer: RecordWriter):
+            """Check, index, format and write a batch of rows read from the input."""
+            nonlocal count
+            skip = max(header_rows - count, 0)
+            data_rows = rows[skip:]
+            if report:
+                for line_number, row in enumerate(data_rows, start=first_line + count + skip):
+                    if schema.is_data(row):
+                        code = find_unknown_code(row[schema.description], catalog)
+                        if code:
+                            report.add(line_number, code)
+            for index in indexes:
+                for line_number, row in enumerate(data_rows, start=first_line + count + skip):
+                    index.add_row(input_file, line_number, row, schema, file_format)
+            if engine == 'numpy':
+                vectorized.format_rows(data_rows, catalog, schema)
+            else:
+                for row in data_rows:
+                    format_row(row, catalog, schema)
+            writer.write(rows, quoted)
+            count += len(rows)
+
+        started = time.perf_counter()
+        stats = PipelineStats()
+        if pipeline or (incremental and memory_budget and not memory_budget.fits(limit)):
+            source = open_read_ahead(input_file, start, limit, stats.read)
+        elif incremental:
+            with open(input_file, 'rb') as infile:
+                infile.seek(start)
+                source = io.BytesIO(infile.read(limit))
+        else:
+            source = open(input_file, 'rb')
+            source.seek(start)
+        text = {'encoding': file_format.encoding, 'errors': file_format.errors}
+        with source, open_text(source, compressed=is_gzip(input_file), **text) as infile, \
+                open_text(target, 'a' if start else 'w', compressed=is_gzip(output_file),
+                          buffering=buffer_size, **text) as outfile, \
+                RecordWriter(outfile, file_format, batch_rows, background_writer or pipeline,
+                             stats.write if pipeline else None) as writer:
+            lines = CountedLines(infile, file_format, start) if checkpointed else infile
+            hasher = checkpoint.PrefixHasher(input_file)
+            next_checkpoint = count + checkpoint_rows
+            # With a memory budget the first rows are a sample to size the batches by
+            read_rows = min(batch_rows, SAMPLE_ROWS) if memory_budget else batch_rows
+            # Read, format and write a batch of rows at a time, split only up to the
+            # description
+            while True:
+                rows, quoted = read_records(lines, schema.description, file_format,
+                                            read_rows)
+                if not rows:
+                    break
+                if read_rows != batch_rows:
+                    # The batch being formatted, its text, and the batches queued for a
+                    # background writer
+                    copies = 2 + (PIPELINE_QUEUE_DEPTH if background_writer or pipeline else 0)
+                    batch_rows = memory_budget.capacity(row_size(rows) * copies,
+                                                        most=batch_rows)
+                    writer.batch_rows = read_rows = batch_rows
+                    logger.info("Formatting %d rows at a time", batch_rows)
+                format_batch(rows, quoted, writer)
+                if checkpointed and count >= next_checkpoint:
+                    writer.sync()
+                    checkpoint.flush_to_disk(outfile)
+                    # Spilled counts are in temporary files that do not outlive the run
+                    extra = ({"unknown_codes": [report.counts, report.examples]}
+                             if report and not report.spilled else {})
+                    checkpoint.save_checkpoint(target, input_file, lines.offset,
+                                               hasher.checksum(lines.offset), rows=count,
+                                               **extra)
+                    next_checkpoint = count + checkpoint_rows
+        if target != output_file:
+            checkpoint.commit_partial(output_file)
+        formatted_size, formatted_rows = None, count
+        if tail:
+            # The checkpoint leaves the rows after the last newline out, so the output can
+            # be cut back to before them should the last row turn out to be incomplete
+            formatted_size = os.path.getsize(output_file)
+            with open_text(output_file, 'a', compressed=is_gzip(output_file), **text) as outfile, \
+                    RecordWriter(outfile, file_format) as writer:
+                format_batch(*read_records([tail], schema.description, file_format), writer)
+
+        if pipeline:
+            stats.seconds = time.perf_counter() - started
+            logger.info("Pipeline for %s: %s", input_file, stats.summary())
+            if pipeline_stats is not None:
+                pipeline_stats.add(stats)
+
+        if report:
+            report.write(unknown_code_report_path(input_file))
+
+        if incremental:
+            checkpoint.save_checkpoint(output_file, input_file, end,
+                                       output_size=formatted_size,
+                                       rows=first_line - 1 + formatted_rows)
+            logger.info("Processed %d rows starting at byte %d", count, start)
+
+        if gui_mode:
+            messagebox.showinfo("Processing Complete",
+                                f"File processed successfully. Output saved to {output_file}.")
     except FileNotFoundError:
         logger.error("Input file not found: %s", input_file)
-        messagebox.showerror("File Error", f"Could not find the specified file: {input_file}")
+        if gui_mode:
+            messagebox.showerror("File Error", f"Could not find the specified file: {input_file}")
         raise
     except Exception as e:
         logger.error("Error processing file: %s", e)
-        messagebox.showerror("Error", f"An error occurred while processing the file: {e}")
+        if gui_mode:
+            messagebox.showerror("Error", f"An error occurred while processing the file: {e}")
         raise
     return output_file
 
 
+def patch_file(input_file: str, rows, property_codes: list, misc_codes: list,
+               file_format: FileFormat = None, schema: Schema = None) -> str:
+    """
+    Reformat selected rows of an existing output after their input rows changed.
+
+    Args:
+        input_file (str): Path to the preprocessed CSV file
+        rows (Iterable): Data rows to reformat, numbered from 0 after the header
+        property_codes (list): List of valid property corner codes.
+        misc_codes (list): List of valid miscellaneous codes.
+        file_format (FileFormat): Encoding and dialect of both files (default: sniffed)
+        schema (Schema): Column layout of the input (default: detected)
+
+    Returns:
+        str: Path to the patched output file
+
+    Raises:
+        ValueError: If the output does not have the same number of rows as the input
+    """
+    output_file = processed_output_path(input_file)
+    records = {row + 1 for row in rows}
+    catalog = CodeCatalog(property_codes, misc_codes)
+    temp_file = f"{output_file}.tmp"
+    mismatch = False
+    if file_format is None:
+        file_format = sniff_file(input_file)
+    if schema is None:
+        schema = read_schema(input_file, file_format)
+    # Header rows are never reformatted
+    records = {record for record in records if record >= schema.header_rows}
+    text = {'encoding': file_format.encoding, 'errors': file_format.errors}
+    dialect = file_format.csv_options()
+    with open_text(input_file, **text) as infile, open_text(output_file, **text) as previous, \
+            open_text(temp_file, 'w', compressed=is_gzip(output_file), **text) as outfile:
+        writer = csv.writer(outfile, **dialect)
+        pairs = itertools.zip_longest(csv.reader(infile, **dialect),
+                                      csv.reader(previous, **dialect))
+        for number, (row, old_row) in enumerate(pairs):
+            if row is None or old_row is None:
+                mismatch = True
+                break
+            writer.writerow(format_row(row, catalog, schema) if number in records else old_row)
+    if mismatch:
+        os.remove(temp_file)
+        raise ValueError(f"{output_file} does not match {input_file}; process it in full")
+    os.replace(temp_file, output_file)
+    logger.info("Reformatted %d rows of %s", len(records), output_file)
+    return output_file
+
+
+def format_stream(infile, outfile, catalog: CodeCatalog, engine: str = 'python',
+                  file_format: FileFormat = DEFAULT_FORMAT, schema: Schema = None,
+                  memory_budget: MemoryBudget = None) -> int:
+    """
+    Format CSV rows read from one text stream and write them to another.
+
+    Rows are formatted in batches of STREAM_BATCH_ROWS, or fewer if they would not fit
+    in the memory budget, so memory stays bounded however long the stream is. Used for
+    point files inside archives, which have no path of their own.
+
+    Args:
+        infile: Text stream, or other iterator of lines, to read CSV rows from
+        outfile: Text stream to write the formatted rows to
+        catalog (CodeCatalog): Compiled property corner and miscellaneous codes
+        engine (str): One of ENGINES
+        file_format (FileFormat): Dialect of the rows, kept for the output
+        schema (Schema): Column layout of the rows; detected from the first rows if
+            not given
+        memory_budget (MemoryBudget): Size the batches to fit in what is left of it
+
+    Returns:
+        int: Number of rows written
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {', '.join(ENGINES)}")
+    if engine == 'numpy':
+        # Imported here so the python engine does not need numpy
+        import vectorized
+    lines = iter(infile)
+    if schema is None:
+        head = list(itertools.islice(lines, SCHEMA_ROWS))
+        schema = detect_schema(list(csv.reader(head, **file_format.csv_options())))
+        lines = itertools.chain(head, lines)
+    count = 0
+    batch_rows = STREAM_BATCH_ROWS
+    # With a memory budget the first rows are a sample to size the batches by
+    read_rows = min(batch_rows, SAMPLE_ROWS) if memory_budget else batch_rows
+    while True:
+        rows, quoted = read_records(lines, schema.description, file_format, read_rows)
+        if not rows:
+            break
+        if read_rows != batch_rows:
+            # The batch being formatted and its text
+            batch_rows = read_rows = memory_budget.capacity(row_size(rows) * 2,
+                                                            most=batch_rows)
+        data_rows = rows if count else rows[schema.header_rows:]
+        if engine == 'numpy':
+            vectorized.format_rows(data_rows, catalog, schema)
+        else:
+            for row in data_rows:
+                format_row(row, catalog, schema)
+        write_records(outfile, rows, quoted, file_format)
+        count += len(rows)
+    return count
+
+
 # GUI for file selection
 # def select_input_file() -> str:
 #     """
@@ -0,0 +1,405 @@
+"""
+pipeline.py
+
+Overlaps reading, processing and writing a point file.
+
+On a network share each stage waits on the drive while it reads a file, works the CPU
+while it processes the rows, then waits on the drive again while it writes them, one
+after the other. Pipelined, a read-ahead thread reads the input in blocks while the rows
+already read are processed, and a writer thread writes the output, in order, while the
+next rows are processed. The threads are joined by bounded queues, so only a few blocks
+wait at either end however large the file is.
+
+Each queue records how full it got, how long the threads on either side of it waited on
+each other, and how long its reader or writer thread spent on the file itself. The
+busiest stage is the one holding the others up; see PipelineStats.bottleneck.
+
+Example:
+    stats = PipelineStats()
+    started = time.perf_counter()
+    with open_read_ahead("job.csv", stats=stats.read) as source, \\
+            open_text(source) as infile, \\
+            open_text("job_processed.csv", 'w') as outfile, \\
+            WriteBehind(outfile, stats=stats.write) as writer:
+        for line in infile:
+            writer.write(line)
+    stats.seconds = time.perf_counter() - started
+    logger.info(stats.summary())
+"""
+# Standard library imports
+import io
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+
+# Bytes read from the input at a time
+PIPELINE_BLOCK_SIZE = 1024 * 1024
+# Blocks or batches a queue holds before the thread filling it has to wait
+PIPELINE_QUEUE_DEPTH = 4
+# The threads of a pipeline, in order
+STAGES = ('read', 'process', 'write')
+
+# How often a thread waiting on a queue checks whether the other end has stopped
+POLL_SECONDS = 0.1
+
+# Put on a queue after the last item
+_END = object()
+
+
+@dataclass
+class QueueStats:
+    """
+    How full a pipeline queue got and how long the threads on either end waited.
+
+    io_seconds is the time the read-ahead or writer thread at the file end of the queue
+    spent reading or writing the file.
+    """
+
+    items: int = 0
+    max_depth: int = 0
+    depth_total: int = 0
+    put_wait: float = 0.0
+    get_wait: float = 0.0
+    io_seconds: float = 0.0
+
+    @property
+    def mean_depth(self) -> float:
+        """Average number of items waiting in the queue just after each was added."""
+        return self.depth_total / self.items if self.items else 0.0
+
+    def add(self, other: 'QueueStats'):
+        """Add the statistics of another queue to these."""
+        self.items += other.items
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.depth_total += other.depth_total
+        self.put_wait += other.put_wait
+        self.get_wait += other.get_wait
+        self.io_seconds += other.io_seconds
+
+
+@dataclass
+class PipelineStats:
+    """
+    Queue statistics of the pipelines a stage ran, added up over its files.
+
+    seconds is the time the processing thread spent on the pipelines from start to end.
+    """
+
+    read: QueueStats = field(default_factory=QueueStats)
+    write: QueueStats = field(default_factory=QueueStats)
+    seconds: float = 0.0
+
+    def add(self, other: 'PipelineStats'):
+        """Add the statistics of another pipeline to these."""
+        self.read.add(other.read)
+        self.write.add(other.write)
+        self.seconds += other.seconds
+
+    def stalls(self) -> dict:
+        """
+        Return the seconds each thread spent waiting on the others.
+
+        The reader waits when the read queue is full, the processing thread when the
+        read queue is empty or the write queue is full, and the writer when the write
+        queue is empty.
+        """
+        return {'read': self.read.put_wait,
+                'process': self.read.get_wait + self.write.put_wait,
+                'write': self.write.get_wait}
+
+    def busy(self) -> dict:
+        """Return the seconds each thread spent working rather than waiting."""
+        stalls = self.stalls()
+        return {'read': self.read.io_seconds,
+                'process': max(self.seconds - stalls['process'], 0.0),
+                'write': self.write.io_seconds}
+
+    def bottleneck(self) -> str:
+        """Return the busiest stage, which the others wait on, or None if nothing ran."""
+        if not self.read.items and not self.write.items:
+            return None
+        busy = self.busy()
+        return max(STAGES, key=busy.get)
+
+    def summary(self) -> str:
+        """Return a one-line summary of the queue depths, busy times and stalls."""
+        def seconds(times: dict) -> str:
+            return ', '.join(f"{stage} {value:.2f} s" for stage, value in times.items())
+
+        return (f"read queue {self.read.items} blocks, depth {self.read.mean_depth:.1f} "
+                f"(max {self.read.max_depth}); write queue {self.write.items} batches, "
+                f"depth {self.write.mean_depth:.1f} (max {self.write.max_depth}); "
+                f"busy {seconds(self.busy())}; stalled {seconds(self.stalls())}; "
+                f"bottleneck: {self.bottleneck()}")
+
+
+class Cancelled(Exception):
+    """The thread on the other end of a queue has stopped."""
+
+
+class StageQueue:
+    """A bounded queue between two pipeline threads that keeps QueueStats."""
+
+    def __init__(self, depth: int = PIPELINE_QUEUE_DEPTH, stats: QueueStats = None):
+        """
+        Create a queue.
+
+        Args:
+            depth (int): Items the queue holds before put waits
+            stats (QueueStats): Statistics to add to (default: new ones)
+        """
+        self.stats = QueueStats() if stats is None else stats
+        self._queue = queue.Queue(maxsize=depth)
+        self._cancelled = threading.Event()
+
+    def put(self, item, count: bool = True):
+        """
+        Add an item, waiting while the queue is full.
+
+        Args:
+            item: The item
+            count (bool): Count the item in the statistics; end markers are not counted
+
+        Raises:
+            Cancelled: If the consumer has stopped
+        """
+        started = time.perf_counter()
+        while True:
+            if self._cancelled.is_set():
+                raise Cancelled
+            try:
+                self._queue.put(item, timeout=POLL_SECONDS)
+                break
+            except queue.Full:
+                pass
+        if count:
+            depth = self._queue.qsize()
+            self.stats.put_wait += time.perf_counter() - started
+            self.stats.items += 1
+            self.stats.max_depth = max(self.stats.max_depth, depth)
+            self.stats.depth_total += depth
+
+    def get(self):
+        """
+        Remove and return the next item, waiting while the queue is empty.
+
+        Raises:
+            Cancelled: If the producer has stopped
+        """
+        started = time.perf_counter()
+        while True:
+            if self._cancelled.is_set():
+                raise Cancelled
+            try:
+                item = self._queue.get(timeout=POLL_SECONDS)
+                break
+            except queue.Empty:
+                pass
+        self.stats.get_wait += time.perf_counter() - started
+        return item
+
+    def cancel(self):
+        """Stop the threads on both ends at their next put or get."""
+        self._cancelled.set()
+
+
+class ReadAhead(io.RawIOBase):
+    """
+    A binary stream whose blocks are read ahead by a background thread.
+
+    Wrap it in io.BufferedReader, as open_read_ahead does, to read it line by line. An
+    error raised while reading in the background is raised again by the read that
+    reaches it. Closing the stream stops the thread and closes the underlying file.
+    """
+
+    def __init__(self, raw, limit: int = None, block_size: int = PIPELINE_BLOCK_SIZE,
+                 depth: int = PIPELINE_QUEUE_DEPTH, stats: QueueStats = None):
+        """
+        Start reading ahead.
+
+        Args:
+            raw: Binary file to read, from its current position
+            limit (int): Read at most this many bytes (default: to the end of the file)
+            block_size (int): Bytes read at a time
+            depth (int): Blocks read ahead before the thread waits
+            stats (QueueStats): Statistics to add to (default: new ones)
+        """
+        super().__init__()
+        self.raw = raw
+        self._queue = StageQueue(depth, stats)
+        self.stats = self._queue.stats
+        self._block = memoryview(b'')
+        self._eof = False
+        self._thread = threading.Thread(target=self._run, args=(limit, block_size),
+                                        name="read-ahead", daemon=True)
+        self._thread.start()
+
+    def _run(self, limit: int, block_size: int):
+        """Read blocks into the queue until the end of the file or the limit."""
+        try:
+            while limit is None or limit > 0:
+                started = time.perf_counter()
+                block = self.raw.read(block_size if limit is None else min(block_size, limit))
+                self.stats.io_seconds += time.perf_counter() - started
+                if not block:
+                    break
+                if limit is not None:
+                    limit -= len(block)
+                self._queue.put(block)
+            item = _END
+        except BaseException as e:  # Raised again on the reading thread
+            item = e
+        try:
+            self._queue.put(item, count=False)
+        except Cancelled:
+            pass
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        """Copy the next bytes read ahead into buffer, waiting for them if need be."""
+        if not self._block:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if item is _END or isinstance(item, BaseException):
+                self._eof = True
+                if item is _END:
+                    return 0
+                raise item
+            self._block = memoryview(item)
+        size = min(len(buffer), len(self._block))
+        buffer[:size] = self._block[:size]
+        self._block = self._block[size:]
+        return size
+
+    def close(self):
+        """Stop the read-ahead thread and close the file."""
+        if not self.closed:
+            self._queue.cancel()
+            self._thread.join()
+            self.raw.close()
+        super().close()
+
+
+class WriteBehind:
+    """
+    Writes to a file from a background thread, in the order the writes were made.
+
+    Use it as a context manager, or call close, to wait for the last write and stop the
+    thread. An error raised while writing in the background is raised again by the next
+    write or by close.
+    """
+
+    def __init__(self, outfile, depth: int = PIPELINE_QUEUE_DEPTH, stats: QueueStats = None):
+        """
+        Start the writer thread.
+
+        Args:
+            outfile: File to write to
+            depth (int): Writes waiting before write blocks
+            stats (QueueStats): Statistics to add to (default: new ones)
+        """
+        self.outfile = outfile
+        self._queue = StageQueue(depth, stats)
+        self.stats = self._queue.stats
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Stop the thread without hiding the error that is already on its way out
+            self.abort()
+
+    def _run(self):
+        """Write items from the queue until the end marker."""
+        try:
+            while (data := self._queue.get()) is not _END:
+                if isinstance(data, threading.Event):
+                    # Everything written before the marker is in the file
+                    data.set()
+                    continue
+                started = time.perf_counter()
+                self.outfile.write(data)
+                self.stats.io_seconds += time.perf_counter() - started
+        except Cancelled:
+            pass
+        except BaseException as e:  # Raised again on the caller's thread
+            self._error = e
+            self._queue.cancel()
+
+    def _raise_error(self):
+        """Raise an error from the writer thread on the caller's thread."""
+        if self._error is not None:
+            raise self._error
+
+    def write(self, data):
+        """Hand data to the writer thread, waiting while its queue is full."""
+        self._raise_error()
+        try:
+            self._queue.put(data)
+        except Cancelled:
+            self._raise_error()
+            raise
+
+    def sync(self):
+        """Wait until the writer thread has written everything handed to it so far."""
+        self._raise_error()
+        written = threading.Event()
+        try:
+            self._queue.put(written, count=False)
+        except Cancelled:
+            self._raise_error()
+            raise
+        while not written.wait(POLL_SECONDS):
+            if not self._thread.is_alive():
+                break
+        self._raise_error()
+
+    def close(self):
+        """Wait for the writer thread to write everything and stop."""
+        if self._thread is not None:
+            try:
+                self._queue.put(_END, count=False)
+            except Cancelled:
+                pass
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+    def abort(self):
+        """Stop the writer thread without waiting for the writes still queued."""
+        if self._thread is not None:
+            self._queue.cancel()
+            self._thread.join()
+            self._thread = None
+
+
+def open_read_ahead(path, start: int = 0, limit: int = None, stats: QueueStats = None):
+    """
+    Open a file for binary reading with a read-ahead thread.
+
+    Args:
+        path (str): Path to the file
+        start (int): Offset to start reading at
+        limit (int): Read at most this many bytes (default: to the end of the file)
+        stats (QueueStats): Statistics to add to (default: new ones)
+
+    Returns:
+        io.BufferedReader: The stream; close it to stop the thread
+    """
+    raw = open(path, 'rb', buffering=0)
+    try:
+        raw.seek(start)
+        return io.BufferedReader(ReadAhead(raw, limit, stats=stats), PIPELINE_BLOCK_SIZE)
+    except BaseException:
+        raw.close()
+        raise
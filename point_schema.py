@@ -0,0 +1,245 @@
+"""
+point_schema.py
+
+Works out the column layout of a point file once, from its first few rows, so the
+format stage does not have to decide for every row whether it is a header.
+
+A point file holds one point per row in one of these layouts:
+
+    PNEZD   point, northing, easting, elevation, description
+    PENZD   point, easting, northing, elevation, description
+
+The point column holds either point numbers or point names (CP1, BM-A). Header rows are
+the rows before the first row whose coordinates are numbers; the layout is taken from the
+column names in the header, and is PNEZD when there is no header to tell.
+
+After detection every row past the header is data, and the only check left per row is
+whether it is long enough to have a description. Rows with a non-numeric northing, such
+as a point whose coordinates were left blank, are formatted like any other data row.
+
+The description is the fifth column unless the header names another one (Description,
+Desc, Code), which matters for exports with extra attribute columns. It can also be set
+by index or by header name with the description_column argument.
+
+Example:
+    schema = read_schema("job.csv")
+    for row in rows[schema.header_rows:]:
+        if schema.is_data(row):
+            row[schema.description] = format_description(row[schema.description], catalog)
+"""
+# Standard library imports
+import csv
+import itertools
+from dataclasses import dataclass
+# Local imports
+from compressed import open_text
+from sniff import DEFAULT_FORMAT, FileFormat
+
+# Rows read from the start of a file to work out its layout
+SCHEMA_ROWS = 20
+
+LAYOUTS = ('PNEZD', 'PENZD')
+
+# Lowercase column names, by the layout letter of the column
+COLUMN_NAMES = {
+    'P': {'p', 'pt', 'pnt', 'point', 'point number', 'point name', 'point id', 'name', 'id'},
+    'N': {'n', 'y', 'north', 'northing', 'northings', 'lat', 'latitude'},
+    'E': {'e', 'x', 'east', 'easting', 'eastings', 'lon', 'long', 'longitude'},
+    'Z': {'z', 'h', 'elev', 'elevation', 'height'},
+    'D': {'d', 'desc', 'description', 'code', 'raw description'},
+}
+# Names searched for the description column, best first
+DESCRIPTION_NAMES = ('description', 'desc', 'raw description', 'code', 'd')
+
+
+@dataclass(frozen=True)
+class Schema:
+    """Column layout of a point file."""
+
+    layout: str = 'PNEZD'
+    header_rows: int = 1
+    point_names: bool = False
+    # Index of the description when it is not where the layout puts it
+    description_column: int = None
+
+    @property
+    def point(self) -> int:
+        """Index of the point number or name column."""
+        return self.layout.index('P')
+
+    @property
+    def northing(self) -> int:
+        """Index of the northing column."""
+        return self.layout.index('N')
+
+    @property
+    def easting(self) -> int:
+        """Index of the easting column."""
+        return self.layout.index('E')
+
+    @property
+    def elevation(self) -> int:
+        """Index of the elevation column."""
+        return self.layout.index('Z')
+
+    @property
+    def description(self) -> int:
+        """Index of the description column."""
+        if self.description_column is not None:
+            return self.description_column
+        return self.layout.index('D')
+
+    def is_data(self, row: list) -> bool:
+        """Return True if a row past the header has a description to format."""
+        return len(row) > self.description
+
+
+# The layout every file was assumed to have before detection
+DEFAULT_SCHEMA = Schema()
+
+
+def _is_number(text: str) -> bool:
+    """Return True if a field holds a number."""
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def _normalize(name: str) -> str:
+    """Return a column name in lowercase with single spaces for underscores."""
+    return ' '.join(name.replace('_', ' ').lower().split())
+
+
+def _column_letter(name: str) -> str:
+    """Return the layout letter a column name stands for, or None."""
+    name = _normalize(name)
+    for letter, names in COLUMN_NAMES.items():
+        if name in names:
+            return letter
+    return None
+
+
+def layout_from_header(header: list) -> str:
+    """
+    Work out the layout from the column names of a header row.
+
+    Args:
+        header (list): The header row
+
+    Returns:
+        str: One of LAYOUTS, or None if the names do not match one
+    """
+    letters = ''.join(_column_letter(name) or '?' for name in header[:5])
+    for layout in LAYOUTS:
+        # The coordinate columns decide; point and description names vary too much
+        if letters[1:3] == layout[1:3]:
+            return layout
+    return None
+
+
+def find_description_column(header: list, description_column=None) -> int:
+    """
+    Find the index of the description column.
+
+    Args:
+        header (list): The header row, or None if the file has none
+        description_column (int or str): Index of the column (an int or a string of
+            digits), its name in the header, or None or 'auto' to look the name up in
+            DESCRIPTION_NAMES
+
+    Returns:
+        int: The index, or None to use the column the layout puts the description in
+
+    Raises:
+        ValueError: If the column is given by a name the header does not have
+    """
+    if isinstance(description_column, int):
+        return description_column
+    if description_column is not None and description_column.strip().isdigit():
+        return int(description_column)
+    names = [_normalize(name) for name in header or []]
+    if description_column is None or description_column == 'auto':
+        for name in DESCRIPTION_NAMES:
+            if name in names:
+                return names.index(name)
+        return None
+    if _normalize(description_column) not in names:
+        raise ValueError(f"No column named {description_column!r} in the header")
+    return names.index(_normalize(description_column))
+
+
+def detect_schema(rows: list, description_column=None) -> Schema:
+    """
+    Work out the layout of a point file from its first rows.
+
+    Args:
+        rows (list): The first rows of the file, as lists of fields; only the first
+            SCHEMA_ROWS are looked at
+        description_column (int or str): Index or header name of the description
+            column (default: found by name, or the fifth column)
+
+    Returns:
+        Schema: The detected layout
+
+    Raises:
+        ValueError: If the description column is named but not in the header
+    """
+    rows = rows[:SCHEMA_ROWS]
+    data = [index for index, row in enumerate(rows)
+            if len(row) >= 3 and _is_number(row[1]) and _is_number(row[2])]
+    if data:
+        header_rows = data[0]
+    else:
+        # No coordinates in the sample: only a row of column names counts as a header
+        header_rows = int(bool(rows) and layout_from_header(rows[0]) is not None)
+
+    header = rows[header_rows - 1] if header_rows else None
+    layout = layout_from_header(header) if header else None
+    column = find_description_column(header, description_column)
+    if column == (layout or LAYOUTS[0]).index('D'):
+        column = None
+    point_names = any(rows[index] and not _is_number(rows[index][0]) for index in data)
+    return Schema(layout=layout or LAYOUTS[0], header_rows=header_rows,
+                  point_names=point_names, description_column=column)
+
+
+def read_schema(path, file_format: FileFormat = DEFAULT_FORMAT,
+                description_column=None) -> Schema:
+    """
+    Work out the layout of a point file, reading only its first SCHEMA_ROWS rows.
+
+    Args:
+        path (str): Path to the file, which may be gzip compressed
+        file_format (FileFormat): Encoding and dialect of the file
+        description_column (int or str): Index or header name of the description
+            column (default: found by name, or the fifth column)
+
+    Returns:
+        Schema: The detected layout
+    """
+    with open_text(path, encoding=file_format.encoding, errors=file_format.errors) as f:
+        reader = csv.reader(f, **file_format.csv_options())
+        return detect_schema(list(itertools.islice(reader, SCHEMA_ROWS)), description_column)
+
+
+def sample_schema(sample: bytes, file_format: FileFormat = DEFAULT_FORMAT,
+                  description_column=None) -> Schema:
+    """
+    Work out the layout of a point file from a sample of its first bytes.
+
+    Args:
+        sample (bytes): The start of the file, such as the sample it was sniffed from
+        file_format (FileFormat): Encoding and dialect of the file
+        description_column (int or str): Index or header name of the description
+            column (default: found by name, or the fifth column)
+
+    Returns:
+        Schema: The detected layout
+    """
+    text = sample.decode(file_format.encoding, errors='ignore')
+    # The last line of the sample is usually cut short
+    lines = text.splitlines()[:-1] or text.splitlines()
+    reader = csv.reader(lines[:SCHEMA_ROWS], **file_format.csv_options())
+    return detect_schema(list(reader), description_column)
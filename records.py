@@ -0,0 +1,250 @@
+"""
+records.py
+
+Reads point file rows split only up to the description column, for the format stage.
+
+Wide exports carry many attribute columns after the description that the format stage
+never looks at. Instead of parsing every field with the csv module, each line is split
+on the delimiter at most description + 1 times: the fields up to and including the
+description become list items and everything after them stays one raw string, which is
+written back exactly as it was read.
+
+Lines that contain the quote character are parsed in full with the csv module instead,
+since a quoted field can hold the delimiter or even a line break, and are written back
+with csv.writer. Either way the output is identical to reading and writing every row with
+the csv module.
+
+RecordWriter is the output stage: it joins rows into one string per batch of
+WRITE_BATCH_ROWS rows and hands each batch to the file in a single write, optionally from
+a background thread so the next batch is formatted while the last one is written.
+
+Example:
+    with open_text("job.csv") as infile, open_text("job_processed.csv", 'w') as outfile:
+        rows, quoted = read_records(infile, schema.description)
+        ...
+        write_records(outfile, rows, quoted)
+"""
+# Standard library imports
+import codecs
+import csv
+import io
+import itertools
+# Local imports
+from pipeline import QueueStats, WriteBehind
+from sniff import DEFAULT_FORMAT, FileFormat
+
+# Line terminator csv.writer uses, and so every output of the format stage
+LINE_TERMINATOR = '\r\n'
+
+# Rows joined into each write, and the buffer size of the output files
+WRITE_BATCH_ROWS = 65536
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def read_records(lines, column: int, file_format: FileFormat = DEFAULT_FORMAT,
+                 limit: int = None) -> tuple:
+    """
+    Read rows split only up to a column.
+
+    Args:
+        lines (Iterator): Text lines read with newline='', such as an open file
+        column (int): Index of the last column to split off, the description
+        file_format (FileFormat): Dialect of the rows
+        limit (int): Read at most this many rows (default: all of them)
+
+    Returns:
+        tuple: The rows and the set of indexes of rows that were parsed in full. The
+        other rows hold the fields up to column, followed by the rest of the line as a
+        single raw string if there is any
+    """
+    lines = iter(lines)
+    delimiter, quotechar = file_format.delimiter, file_format.quotechar
+    options = file_format.csv_options()
+    rows, quoted = [], set()
+    for line in itertools.islice(lines, limit):
+        if quotechar in line:
+            # The csv module pulls more lines from the file if a quoted field spans them
+            quoted.add(len(rows))
+            rows.append(next(csv.reader(itertools.chain([line], lines), **options), []))
+            continue
+        line = line.rstrip('\r\n')
+        rows.append(line.split(delimiter, column + 1) if line else [])
+    return rows, quoted
+
+
+class CountedLines:
+    """
+    Iterates over the lines of a text stream, counting the bytes they were decoded from.
+
+    With newline='' every character of the file is part of a line, so after each line
+    the count is the byte offset of the next one. Each line is encoded back to count it,
+    which gives the bytes it was read from for every encoding sniff picks, since
+    undecodable bytes are kept as surrogate escapes; ASCII lines are just measured.
+    """
+
+    def __init__(self, lines, file_format: FileFormat = DEFAULT_FORMAT, start: int = 0):
+        """
+        Start counting.
+
+        Args:
+            lines (Iterator): Text lines read with newline=''
+            file_format (FileFormat): Encoding the lines were decoded from
+            start (int): Byte offset of the first line in the file
+        """
+        self._lines = iter(lines)
+        self._encoding = file_format.encoding
+        self._errors = file_format.errors
+        if self._encoding == 'utf-8-sig':
+            # The byte order mark is only at the start of the file, not before every line
+            self._encoding = 'utf-8'
+            start = start or len(codecs.BOM_UTF8)
+        self.offset = start
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        line = next(self._lines)
+        self.offset += (len(line) if line.isascii()
+                        else len(line.encode(self._encoding, self._errors)))
+        return line
+
+
+def batches(rows: list, quoted: set, size: int):
+    """
+    Split rows read with read_records into batches.
+
+    Args:
+        rows (list): The rows
+        quoted (set): Indexes of the rows that were parsed in full
+        size (int): Rows per batch
+
+    Yields:
+        tuple: The offset of the batch, its rows, and the indexes of its quoted rows
+        counted from the start of the batch
+    """
+    for start in range(0, len(rows), size):
+        end = start + size
+        yield (start, rows[start:end],
+               {index - start for index in quoted if start <= index < end})
+
+
+def join_records(rows: list, quoted: set, file_format: FileFormat = DEFAULT_FORMAT) -> str:
+    """
+    Return rows read with read_records as CSV text.
+
+    Args:
+        rows (list): The rows
+        quoted (set): Indexes of the rows that were parsed in full
+        file_format (FileFormat): Dialect of the rows
+
+    Returns:
+        str: The text csv.writer would write for the rows
+    """
+    delimiter = file_format.delimiter
+    if not quoted:
+        return ''.join([delimiter.join(row) + LINE_TERMINATOR for row in rows])
+    buffer = io.StringIO(newline='')
+    writer = csv.writer(buffer, **file_format.csv_options())
+    for index, row in enumerate(rows):
+        if index in quoted:
+            writer.writerow(row)
+        else:
+            buffer.write(delimiter.join(row) + LINE_TERMINATOR)
+    return buffer.getvalue()
+
+
+def write_records(outfile, rows: list, quoted: set, file_format: FileFormat = DEFAULT_FORMAT):
+    """
+    Write rows read with read_records.
+
+    Args:
+        outfile: Text stream opened with newline=''
+        rows (list): The rows
+        quoted (set): Indexes of the rows that were parsed in full
+        file_format (FileFormat): Dialect of the rows
+    """
+    outfile.write(join_records(rows, quoted, file_format))
+
+
+class RecordWriter:
+    """
+    Writes rows read with read_records in large batches.
+
+    Rows passed to write are joined into text straight away and collected until at least
+    batch_rows are waiting, then written with a single call. With background=True the
+    writes happen on a pipeline.WriteBehind thread, so the caller can format the next
+    batch while the previous one goes to disk.
+
+    Use it as a context manager, or call close, to write the last batch and stop the
+    thread. An error raised while writing in the background is raised again by the next
+    write or by close.
+    """
+
+    def __init__(self, outfile, file_format: FileFormat = DEFAULT_FORMAT,
+                 batch_rows: int = WRITE_BATCH_ROWS, background: bool = False,
+                 stats: QueueStats = None):
+        """
+        Start a writer.
+
+        Args:
+            outfile: Text stream opened with newline=''
+            file_format (FileFormat): Dialect of the rows
+            batch_rows (int): Rows collected before each write
+            background (bool): Write from a background thread
+            stats (QueueStats): Statistics of the background thread's queue to add to
+        """
+        if batch_rows < 1:
+            raise ValueError(f"batch_rows must be at least 1, got {batch_rows}")
+        self.outfile = outfile
+        self.file_format = file_format
+        self.batch_rows = batch_rows
+        self.rows_written = 0
+        self._pending = []
+        self._pending_rows = 0
+        self._writer = WriteBehind(outfile, stats=stats) if background else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            # Stop the thread without hiding the error that is already on its way out
+            self._writer.abort()
+
+    def write(self, rows: list, quoted: set = frozenset()):
+        """
+        Add rows to the output.
+
+        Args:
+            rows (list): The rows
+            quoted (set): Indexes of the rows that were parsed in full, counted from the
+                start of rows
+        """
+        self._pending.append(join_records(rows, quoted, self.file_format))
+        self._pending_rows += len(rows)
+        if self._pending_rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        """Write the rows collected so far."""
+        if not self._pending:
+            return
+        text = ''.join(self._pending)
+        self.rows_written += self._pending_rows
+        self._pending, self._pending_rows = [], 0
+        (self.outfile if self._writer is None else self._writer).write(text)
+
+    def sync(self):
+        """Write every row added so far, waiting for the background thread to write them."""
+        self.flush()
+        if self._writer is not None:
+            self._writer.sync()
+
+    def close(self):
+        """Write the last rows and wait for the background thread, if there is one."""
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
@@ -0,0 +1,237 @@
+"""
+service.py
+
+Asyncio API for running both processing stages on point data held in memory, so the
+parser can be embedded in web tooling where several users submit files at the same time.
+
+Point data is accepted as bytes or as a stream and the processed file is returned as
+bytes. The configuration is loaded and compiled once when the service starts; after that
+no dialog is shown, no Tk root is created and nothing is read from or written to disk.
+The CPU-bound work runs on an executor so the event loop stays responsive.
+
+Example:
+    async with ParserService.from_config_files("config/replacement_dict.json") as service:
+        result = await service.process_bytes(uploaded_bytes)
+        return result.data
+"""
+# Standard library imports
+import asyncio
+import io
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+# Third-party imports
+import pandas as pd
+# Local imports
+import parser3
+from batch import DEFAULT_MISCELLANEOUS_PATH, DEFAULT_PROPERTY_CORNERS_PATH
+from description_parser import apply_replacements
+from point_schema import sample_schema
+from sniff import SNIFF_BYTES, sniff_bytes
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class ProcessResult:
+    """Processed point data and a summary of what was done to it."""
+
+    data: bytes
+    rows: int
+    replacements: int
+    seconds: float
+
+
+def process_point_data(data: bytes, replacement_dict: dict,
+                       catalog: parser3.CodeCatalog) -> ProcessResult:
+    """
+    Run the replacement and format stages on an in-memory point file.
+
+    The result is byte-for-byte what DescriptionParser.process_file followed by
+    parser3.process_file would write to disk for the same input: the encoding and CSV
+    dialect are sniffed from the start of the data, both stages read it with them, and
+    the result is written in the same format.
+
+    Args:
+        data (bytes): Contents of a point file
+        replacement_dict (dict): Non-standard text mapped to its standard replacement
+        catalog (parser3.CodeCatalog): Compiled property corner and miscellaneous codes
+
+    Returns:
+        ProcessResult: The processed file contents
+
+    Raises:
+        pd.errors.EmptyDataError: If the data is empty
+        ValueError: If the data has fewer than 5 columns or no description column
+    """
+    started = time.perf_counter()
+    sample = data[:SNIFF_BYTES]
+    file_format = sniff_bytes(sample)
+    df = pd.read_csv(io.BytesIO(data), **file_format.read_csv_options())
+    if df.shape[1] < 5:
+        raise ValueError(f"CSV file must have at least 5 columns. Found: {df.shape[1]}")
+    schema = sample_schema(sample, file_format)
+    column = schema.description
+    if column >= df.shape[1]:
+        raise ValueError(f"No description column {column}: the data has {df.shape[1]} columns")
+
+    original_values = df.iloc[:, column].copy()
+    df.isetitem(column, apply_replacements(df.iloc[:, column], replacement_dict))
+    changes_made = int((original_values != df.iloc[:, column]).sum())
+
+    preprocessed = io.BytesIO()
+    df.to_csv(preprocessed, index=False, **file_format.to_csv_options())
+    preprocessed.seek(0)
+
+    output = io.StringIO(newline='')
+    with io.TextIOWrapper(preprocessed, encoding=file_format.encoding,
+                          errors=file_format.errors, newline='') as text:
+        rows = parser3.format_stream(text, output, catalog, file_format=file_format,
+                                     schema=schema)
+    return ProcessResult(output.getvalue().encode(file_format.encoding, file_format.errors),
+                         rows, changes_made, time.perf_counter() - started)
+
+
+# Per-process configuration for worker processes, set once by _init_worker
+_worker_config = {}
+
+
+def _init_worker(replacement_dict: dict, property_codes: list, misc_codes: list):
+    """Compile the configuration once in each worker process."""
+    _worker_config["replacement_dict"] = replacement_dict
+    _worker_config["catalog"] = parser3.CodeCatalog(property_codes, misc_codes)
+
+
+def _process_in_worker(data: bytes) -> ProcessResult:
+    """Process point data with the configuration compiled by _init_worker."""
+    return process_point_data(data, _worker_config["replacement_dict"],
+                              _worker_config["catalog"])
+
+
+class ParserService:
+    """Processes point data submitted concurrently from asyncio code."""
+
+    def __init__(self, replacement_dict: dict, property_codes: list, misc_codes: list,
+                 max_workers: int = None, use_processes: bool = True,
+                 max_bytes: int = None):
+        """
+        Compile the configuration and start the executor.
+
+        Args:
+            replacement_dict (dict): Non-standard text mapped to its standard replacement
+            property_codes (list): List of valid property corner codes
+            misc_codes (list): List of valid miscellaneous codes
+            max_workers (int): Number of jobs processed in parallel (default: CPU count)
+            use_processes (bool): Use worker processes, which sidestep the GIL, rather
+                than threads sharing one catalog
+            max_bytes (int): Reject submissions larger than this (optional)
+        """
+        self.replacement_dict = dict(replacement_dict)
+        self.catalog = parser3.CodeCatalog(property_codes, misc_codes)
+        self.max_bytes = max_bytes
+        if use_processes:
+            self.executor = ProcessPoolExecutor(
+                max_workers=max_workers, initializer=_init_worker,
+                initargs=(self.replacement_dict, list(property_codes), list(misc_codes)))
+            self._job = _process_in_worker
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers)
+            self._job = self._process_in_thread
+
+    @classmethod
+    def from_config_files(cls, dictionary_path: str,
+                          property_corners_path: str = DEFAULT_PROPERTY_CORNERS_PATH,
+                          miscellaneous_path: str = DEFAULT_MISCELLANEOUS_PATH,
+                          **kwargs) -> 'ParserService':
+        """
+        Create a service from the usual configuration files.
+
+        The files are read once here; processing never touches disk afterwards.
+
+        Args:
+            dictionary_path (str): Path to the replacement dictionary
+            property_corners_path (str): Path to the property corners file
+            miscellaneous_path (str): Path to the miscellaneous codes file
+            **kwargs: Passed on to ParserService
+
+        Returns:
+            ParserService: The started service
+
+        Raises:
+            ValueError: If the dictionary is not a JSON object or the code lists are empty
+        """
+        with open(dictionary_path, 'r', encoding='utf-8') as f:
+            replacement_dict = json.load(f)
+        if not isinstance(replacement_dict, dict):
+            raise ValueError("Dictionary file must contain a valid JSON object")
+        property_codes, misc_codes = [], []
+        for path, codes in ((property_corners_path, property_codes),
+                            (miscellaneous_path, misc_codes)):
+            with open(path, 'r', encoding='utf8') as f:
+                codes.extend(line.strip() for line in f)
+        if not property_codes or not misc_codes:
+            raise ValueError("Failed to load configuration files")
+        return cls(replacement_dict, property_codes, misc_codes, **kwargs)
+
+    def _process_in_thread(self, data: bytes) -> ProcessResult:
+        """Process point data with the catalog shared by all threads."""
+        return process_point_data(data, self.replacement_dict, self.catalog)
+
+    async def process_bytes(self, data: bytes) -> ProcessResult:
+        """
+        Process a point file held in memory.
+
+        Args:
+            data (bytes): Contents of a point file
+
+        Returns:
+            ProcessResult: The processed file contents
+
+        Raises:
+            ValueError: If the data is too large or has fewer than 5 columns
+        """
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            raise ValueError(f"Point data is larger than {self.max_bytes} bytes")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._job, bytes(data))
+
+    async def process_stream(self, stream) -> ProcessResult:
+        """
+        Read a point file from a stream and process it.
+
+        Args:
+            stream: An asyncio.StreamReader, any object with an async read(n) method, or
+                an async iterable of bytes chunks
+
+        Returns:
+            ProcessResult: The processed file contents
+        """
+        buffer = bytearray()
+        if hasattr(stream, 'read'):
+            while chunk := await stream.read(STREAM_CHUNK_SIZE):
+                buffer.extend(chunk)
+                self._check_size(buffer)
+        else:
+            async for chunk in stream:
+                buffer.extend(chunk)
+                self._check_size(buffer)
+        return await self.process_bytes(bytes(buffer))
+
+    def _check_size(self, buffer: bytearray):
+        """Stop reading a stream as soon as it goes over the size limit."""
+        if self.max_bytes is not None and len(buffer) > self.max_bytes:
+            raise ValueError(f"Point data is larger than {self.max_bytes} bytes")
+
+    def close(self):
+        """Shut down the executor."""
+        self.executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
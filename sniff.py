@@ -0,0 +1,164 @@
+"""
+sniff.py
+
+Works out the encoding and CSV dialect of a point file from its first few kilobytes, so
+files exported by older collectors in cp1252, with a byte order mark, or with another
+delimiter are read correctly by both stages without a manual re-save.
+
+The sample is checked for, in order:
+
+    - a byte order mark (UTF-8, UTF-16 LE or BE)
+    - bytes that are not valid UTF-8, which means a single-byte Windows code page (cp1252)
+    - the delimiter (comma, tab, semicolon or pipe) that splits the sample lines into the
+      same number of fields most consistently
+    - the quote character fields are wrapped in
+
+Every encoding is used with the surrogateescape error handler: a byte the sample did not
+predict, such as a cp1252 character far into a file that looked like ASCII, is carried
+through to the output unchanged instead of failing the run part way through.
+
+Example:
+    file_format = sniff_file("job.csv")
+    df = pd.read_csv("job.csv", **file_format.read_csv_options())
+"""
+# Standard library imports
+import codecs
+import csv
+import gzip
+import io
+from collections import Counter
+from dataclasses import dataclass
+# Local imports
+from compressed import is_gzip
+
+# Bytes read from the start of a file to work out its format
+SNIFF_BYTES = 8192
+
+DELIMITERS = (',', '\t', ';', '|')
+QUOTE_CHARACTERS = ('"', "'")
+FALLBACK_ENCODING = 'cp1252'
+ERRORS = 'surrogateescape'
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+@dataclass(frozen=True)
+class FileFormat:
+    """Encoding and CSV dialect of a point file."""
+
+    encoding: str = 'utf-8'
+    delimiter: str = ','
+    quotechar: str = '"'
+    errors: str = ERRORS
+
+    def csv_options(self) -> dict:
+        """Return the keyword arguments for csv.reader and csv.writer."""
+        return {'delimiter': self.delimiter, 'quotechar': self.quotechar}
+
+    def read_csv_options(self) -> dict:
+        """Return the keyword arguments for pd.read_csv."""
+        return {'encoding': self.encoding, 'encoding_errors': self.errors,
+                'sep': self.delimiter, 'quotechar': self.quotechar}
+
+    def to_csv_options(self) -> dict:
+        """Return the keyword arguments for DataFrame.to_csv."""
+        return {'encoding': self.encoding, 'errors': self.errors,
+                'sep': self.delimiter, 'quotechar': self.quotechar}
+
+
+# The format every file was assumed to have before sniffing
+DEFAULT_FORMAT = FileFormat()
+
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    Work out the encoding of a file from a sample of its first bytes.
+
+    Args:
+        sample (bytes): The start of the file
+
+    Returns:
+        str: A Python codec name
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # The sample can end part way through a character, which is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+
+
+def detect_dialect(text: str) -> tuple:
+    """
+    Work out the delimiter and quote character from the first lines of a file.
+
+    Each candidate delimiter splits the complete lines of the sample into fields; the one
+    that gives the most lines the same number of fields (at least two) is chosen, with
+    ties going to the earlier candidate in DELIMITERS. A single quote is only taken as
+    the quote character if fields open with it and never with a double quote.
+
+    Args:
+        text (str): The decoded start of the file
+
+    Returns:
+        tuple: The delimiter and the quote character
+    """
+    # The last line of the sample is usually cut short
+    lines = text.splitlines()[:-1] or text.splitlines()
+    lines = [line for line in lines if line.strip()]
+
+    best, best_score = ',', (0, 0)
+    for delimiter in DELIMITERS:
+        counts = Counter(len(row) for row in csv.reader(lines, delimiter=delimiter))
+        if not counts:
+            continue
+        fields, lines_agreeing = counts.most_common(1)[0]
+        score = (lines_agreeing, fields) if fields >= 2 else (0, 0)
+        if score > best_score:
+            best, best_score = delimiter, score
+
+    # A quoted field opens at the start of a line or straight after a delimiter
+    opened = Counter(field[0] for line in lines for field in line.split(best)
+                     if field[:1] in QUOTE_CHARACTERS)
+    quotechar = "'" if opened["'"] and not opened['"'] else '"'
+    return best, quotechar
+
+
+def sniff_bytes(sample: bytes) -> FileFormat:
+    """
+    Work out the format of a file from a sample of its first bytes.
+
+    Args:
+        sample (bytes): The start of the file, usually SNIFF_BYTES long
+
+    Returns:
+        FileFormat: The detected format
+    """
+    encoding = detect_encoding(sample)
+    text = sample.decode(encoding, errors='ignore')
+    delimiter, quotechar = detect_dialect(text)
+    return FileFormat(encoding=encoding, delimiter=delimiter, quotechar=quotechar)
+
+
+def sniff_file(path) -> FileFormat:
+    """
+    Work out the format of a point file, reading only its first SNIFF_BYTES bytes.
+
+    Gzip compressed files are sniffed on their decompressed content.
+
+    Args:
+        path (str): Path to the file
+
+    Returns:
+        FileFormat: The detected format
+    """
+    opener = gzip.open if is_gzip(path) else io.open
+    with opener(path, 'rb') as f:
+        return sniff_bytes(f.read(SNIFF_BYTES))
@@ -0,0 +1,297 @@
+"""
+suggest.py
+
+Suggests the closest standard codes for codes that are not in property_corners.txt or
+miscellaneous.txt, so typos such as PFC or IRFF can be fixed from a report instead of by
+searching the code lists by hand.
+
+Survey codes are short, which makes metric trees such as BK-trees visit almost every code
+on each lookup. Instead the index stores every variant of each code with up to
+max_distance characters deleted. Two strings within that edit distance always share such
+a variant, so a lookup only has to generate the deletions of the unknown code, collect the
+codes that share one and rank them by their true edit distance. Lookups stay well under a
+millisecond for catalogs of thousands of codes.
+
+Usage:
+    python suggest.py --code PFC
+    python suggest.py N:/jobs/2024/job1_processed.csv
+"""
+# Standard library imports
+import argparse
+import csv
+import heapq
+import logging
+import sys
+from functools import lru_cache
+from itertools import combinations
+# Local imports
+from compressed import open_text
+from memory import read_spilled, sorted_spilled, spill
+from point_schema import read_schema
+from sniff import sniff_file
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_DISTANCE = 2
+DEFAULT_SUGGESTIONS = 3
+DEFAULT_CACHE_SIZE = 4096
+MAX_EXAMPLE_LINES = 5
+# Rough bytes an unknown code report holds per distinct code
+REPORT_ENTRY_SIZE = 512
+
+
+def edit_distance(first: str, second: str, limit: int = None) -> int:
+    """
+    Count the single-character insertions, deletions, substitutions and adjacent
+    transpositions needed to turn one string into the other.
+
+    Args:
+        first (str): The first string
+        second (str): The second string
+        limit (int): Stop as soon as the distance is known to be above limit (optional)
+
+    Returns:
+        int: The edit distance, or limit + 1 if it is larger than limit
+    """
+    if first == second:
+        return 0
+    length = len(second)
+    if limit is not None and abs(len(first) - length) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(length + 1))
+    for i, char in enumerate(first, 1):
+        row = [i]
+        for j in range(1, length + 1):
+            other = second[j - 1]
+            cost = previous[j - 1] + (char != other)
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if row[j - 1] + 1 < cost:
+                cost = row[j - 1] + 1
+            if (before is not None and j > 1 and char == second[j - 2]
+                    and first[i - 2] == other and before[j - 2] + 1 < cost):
+                cost = before[j - 2] + 1
+            row.append(cost)
+        # Every path to the last cell passes through this row
+        if limit is not None and min(row) > limit:
+            return limit + 1
+        before, previous = previous, row
+    return previous[-1] if limit is None else min(previous[-1], limit + 1)
+
+
+def deletion_variants(word: str, max_distance: int) -> set:
+    """
+    Return every string made by deleting up to max_distance characters from word.
+
+    Args:
+        word (str): The word
+        max_distance (int): Maximum number of characters to delete
+
+    Returns:
+        set: The variants, including word itself
+    """
+    variants = {word}
+    for deletions in range(1, min(max_distance, len(word)) + 1):
+        for positions in combinations(range(len(word)), deletions):
+            variants.add(''.join(char for index, char in enumerate(word)
+                                 if index not in positions))
+    return variants
+
+
+class SuggestionIndex:
+    """Finds the closest known codes to an unknown code."""
+
+    def __init__(self, codes, max_distance: int = DEFAULT_MAX_DISTANCE,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        Build the index once for a code catalog.
+
+        Args:
+            codes (Iterable): Known codes; matching is case-insensitive
+            max_distance (int): Largest edit distance worth suggesting
+            cache_size (int): Number of unknown codes to remember suggestions for
+        """
+        self.max_distance = max_distance
+        self.codes = frozenset(code.strip().upper() for code in codes if code.strip())
+        self._variants = {}
+        for code in self.codes:
+            for variant in deletion_variants(code, max_distance):
+                self._variants.setdefault(variant, []).append(code)
+        self.suggest = lru_cache(maxsize=cache_size)(self._suggest)
+        logger.info("Built suggestion index for %d codes (%d variants)",
+                    len(self.codes), len(self._variants))
+
+    def _suggest(self, code: str, limit: int = DEFAULT_SUGGESTIONS) -> tuple:
+        """
+        Return the closest known codes to code.
+
+        Args:
+            code (str): The unknown code
+            limit (int): Maximum number of suggestions
+
+        Returns:
+            tuple: (code, distance) pairs, closest first
+        """
+        code = code.upper()
+        candidates = set()
+        for variant in deletion_variants(code, self.max_distance):
+            candidates.update(self._variants.get(variant, ()))
+
+        ranked = []
+        for candidate in candidates:
+            distance = edit_distance(code, candidate, self.max_distance)
+            if distance <= self.max_distance:
+                ranked.append((distance, abs(len(candidate) - len(code)), candidate))
+        ranked.sort()
+        return tuple((candidate, distance) for distance, _, candidate in ranked[:limit])
+
+
+class UnknownCodeReport:
+    """
+    Collects unknown codes seen in a file together with suggested replacements.
+
+    With max_codes set, the counts are spilled to a temporary file, sorted by code,
+    whenever more distinct codes than that are held; the runs are merged back, and
+    ranked with memory.sorted_spilled, when the report is written. The counts and
+    examples attributes then hold only the codes seen since the last spill.
+    """
+
+    def __init__(self, index: SuggestionIndex, limit: int = DEFAULT_SUGGESTIONS,
+                 max_codes: int = None):
+        """
+        Start an empty report.
+
+        Args:
+            index (SuggestionIndex): Index used to suggest replacements
+            limit (int): Maximum number of suggestions per code
+            max_codes (int): Distinct codes held in memory before they are spilled to
+                disk (default: no limit)
+        """
+        self.index = index
+        self.limit = limit
+        self.max_codes = max_codes
+        self.counts = {}
+        self.examples = {}
+        self._runs = []
+
+    @property
+    def spilled(self) -> bool:
+        """True if some of the counts are in temporary files rather than in counts."""
+        return bool(self._runs)
+
+    def add(self, line_number: int, code: str):
+        """Record an unknown code seen on a line of the input."""
+        code = code.upper()
+        self.counts[code] = self.counts.get(code, 0) + 1
+        lines = self.examples.setdefault(code, [])
+        if len(lines) < MAX_EXAMPLE_LINES:
+            lines.append(line_number)
+        if self.max_codes and len(self.counts) > self.max_codes:
+            self._spill()
+
+    def _spill(self):
+        """Move the counts held in memory to a temporary file, sorted by code."""
+        self._runs.append(spill((code, self.counts[code], self.examples[code])
+                                for code in sorted(self.counts)))
+        logger.info("Spilled %d unknown codes to disk", len(self.counts))
+        self.counts, self.examples = {}, {}
+
+    def _merged(self):
+        """Yield (code, count, example lines) for every code, with spilled runs added in."""
+        current = [(code, self.counts[code], self.examples[code])
+                   for code in sorted(self.counts)]
+        runs = [read_spilled(run, close=False) for run in self._runs]
+        merged = None
+        # Runs are in the order they were spilled, so examples stay in line order
+        for code, count, lines in heapq.merge(*runs, current, key=lambda item: item[0]):
+            if merged and merged[0] == code:
+                merged[1] += count
+                merged[2] = (merged[2] + lines)[:MAX_EXAMPLE_LINES]
+                continue
+            if merged:
+                yield tuple(merged)
+            merged = [code, count, lines]
+        if merged:
+            yield tuple(merged)
+
+    def _ranked(self):
+        """Yield the report rows, most frequent codes first."""
+        ranked = sorted_spilled(self._merged(), key=lambda item: (-item[1], item[0]),
+                                max_items=self.max_codes or sys.maxsize)
+        for code, count, lines in ranked:
+            suggestions = '; '.join(f"{candidate} ({distance})" for candidate, distance
+                                    in self.index.suggest(code, self.limit))
+            yield [code, count, suggestions, ' '.join(str(line) for line in lines)]
+
+    def rows(self) -> list:
+        """
+        Return the report rows, most frequent codes first.
+
+        Returns:
+            list: [code, count, suggestions, example lines] rows
+        """
+        return list(self._ranked())
+
+    def write(self, report_file: str):
+        """Write the report as a CSV file, one row at a time."""
+        written = 0
+        with open(report_file, 'w', newline='', encoding='utf8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Code", "Count", "Suggestions", "Lines"])
+            for row in self._ranked():
+                writer.writerow(row)
+                written += 1
+        logger.info("Wrote %d unknown codes to %s", written, report_file)
+
+
+def main(argv=None):
+    """Command line entry point for code suggestions."""
+    # Imported here because parser3 uses this module for its unknown code reports
+    import parser3
+    from batch import DEFAULT_MISCELLANEOUS_PATH, DEFAULT_PROPERTY_CORNERS_PATH
+
+    arg_parser = argparse.ArgumentParser(
+        description="Suggest standard codes for unknown codes in point files")
+    arg_parser.add_argument("files", nargs='*', help="Point files to report on")
+    arg_parser.add_argument("--code", action='append', default=[],
+                            help="Print suggestions for a single code")
+    arg_parser.add_argument("--property-corners", default=DEFAULT_PROPERTY_CORNERS_PATH,
+                            help="Path to the property corners file")
+    arg_parser.add_argument("--miscellaneous", default=DEFAULT_MISCELLANEOUS_PATH,
+                            help="Path to the miscellaneous codes file")
+    arg_parser.add_argument("--limit", type=int, default=DEFAULT_SUGGESTIONS,
+                            help="Suggestions per code")
+    args = arg_parser.parse_args(argv)
+
+    property_codes, misc_codes = parser3.load_code_lists(args.property_corners,
+                                                         args.miscellaneous)
+    catalog = parser3.CodeCatalog(property_codes, misc_codes)
+    index = SuggestionIndex(catalog.all_codes)
+
+    for code in args.code:
+        suggestions = ', '.join(f"{candidate} ({distance})"
+                                for candidate, distance in index.suggest(code, args.limit))
+        print(f"{code}: {suggestions or 'no close codes'}")
+
+    for input_file in args.files:
+        report = UnknownCodeReport(index, args.limit)
+        file_format = sniff_file(input_file)
+        schema = read_schema(input_file, file_format)
+        with open_text(input_file, encoding=file_format.encoding,
+                       errors=file_format.errors) as f:
+            rows = csv.reader(f, **file_format.csv_options())
+            for line_number, row in enumerate(rows, start=1):
+                if line_number <= schema.header_rows or not schema.is_data(row):
+                    continue
+                code = parser3.find_unknown_code(row[schema.description], catalog)
+                if code:
+                    report.add(line_number, code)
+        report_file = parser3.unknown_code_report_path(input_file)
+        report.write(report_file)
+        print(f"{input_file}: {len(report.counts)} unknown codes -> {report_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
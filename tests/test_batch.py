@@ -0,0 +1,124 @@
+"""Tests for batch module."""
+
+import json
+import csv
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import batch
+
+
+class TestCollectInputFiles:
+    """Test cases for input discovery."""
+
+    def test_directories_skip_generated_outputs(self, tmp_path):
+        """Test that outputs from earlier runs are not picked up as inputs."""
+        for name in ("a.csv", "b.txt", "preprocessed_a.csv", "a_processed.csv",
+                     "a_unknown_codes.csv", "notes.json"):
+            (tmp_path / name).write_text("x")
+
+        found = [path.name for path in batch.collect_input_files([tmp_path])]
+        assert found == ["a.csv", "b.txt"]
+
+    def test_explicit_files_are_kept(self, tmp_path):
+        """Test that files named on the command line are always processed."""
+        point_file = tmp_path / "points.dat"
+        point_file.write_text("x")
+        assert batch.collect_input_files([point_file]) == [point_file]
+
+
+class TestRunBatch:
+    """Test cases for batch processing with the manifest."""
+
+    @pytest.fixture
+    def archive(self, tmp_path, sample_csv_data, property_corners_file, miscellaneous_file,
+                sample_replacement_dict_file):
+        """Create a small archive of point files and configuration."""
+        archive_dir = tmp_path / "archive"
+        archive_dir.mkdir()
+        for name in ("job1.csv", "job2.csv"):
+            with open(archive_dir / name, 'w', newline='', encoding='utf8') as f:
+                csv.writer(f).writerows(sample_csv_data)
+        return {
+            "dir": archive_dir,
+            "kwargs": {
+                "dictionary_path": sample_replacement_dict_file,
+                "property_corners_path": property_corners_file,
+                "miscellaneous_path": miscellaneous_file,
+                "manifest_path": str(tmp_path / "manifest.jsonl"),
+            },
+        }
+
+    def test_incremental_last_row_without_newline(self, archive):
+        """Test that an incremental run writes a last row that has no newline."""
+        input_file = archive["dir"] / "job1.csv"
+        input_file.write_bytes(input_file.read_bytes().rstrip(b"\r\n"))
+        batch.run_batch([input_file], incremental=True, **archive["kwargs"])
+        incremental_output = (archive["dir"] / "job1_processed.csv").read_bytes()
+
+        batch.run_batch([input_file], force=True, **archive["kwargs"])
+        assert (archive["dir"] / "job1_processed.csv").read_bytes() == incremental_output
+
+    def test_first_run_processes_everything(self, archive):
+        """Test that a fresh manifest processes every file."""
+        report = batch.run_batch([archive["dir"]], **archive["kwargs"])
+
+        assert len(report.processed) == 2
+        assert report.skipped == []
+        assert (archive["dir"] / "job1_processed.csv").exists()
+
+    def test_rerun_skips_unchanged_files(self, archive):
+        """Test that a rerun only processes the file that changed."""
+        batch.run_batch([archive["dir"]], **archive["kwargs"])
+        with open(archive["dir"] / "job2.csv", 'a', newline='', encoding='utf8') as f:
+            csv.writer(f).writerow(["6", "1005.00", "2005.00", "105.00", "PCF 1/2"])
+
+        with patch('parser3.process_file', wraps=batch.parser3.process_file) as mock_process:
+            report = batch.run_batch([archive["dir"]], **archive["kwargs"])
+
+        assert [Path(p).name for p in report.skipped] == ["job1.csv"]
+        assert [Path(p).name for p in report.processed] == ["job2.csv"]
+        assert mock_process.call_count == 1
+
+    def test_config_change_forces_rerun(self, archive, tmp_path):
+        """Test that editing the dictionary invalidates the manifest."""
+        batch.run_batch([archive["dir"]], **archive["kwargs"])
+        with open(archive["kwargs"]["dictionary_path"], 'w') as f:
+            json.dump({"PCF": "PCF"}, f)
+
+        report = batch.run_batch([archive["dir"]], **archive["kwargs"])
+        assert len(report.processed) == 2
+        assert report.skipped == []
+
+    def test_force_ignores_manifest(self, archive):
+        """Test that force reprocesses unchanged files."""
+        batch.run_batch([archive["dir"]], **archive["kwargs"])
+        report = batch.run_batch([archive["dir"]], force=True, **archive["kwargs"])
+        assert len(report.processed) == 2
+
+    def test_failures_are_reported(self, archive):
+        """Test that one bad file does not stop the batch."""
+        (archive["dir"] / "broken.csv").write_text("Point,Northing\n1,1000.0\n")
+        report = batch.run_batch([archive["dir"]], **archive["kwargs"])
+
+        assert [Path(p).name for p in report.failed] == ["broken.csv"]
+        assert len(report.processed) == 2
+
+    def test_main_prints_summary(self, archive, capsys):
+        """Test the command line entry point."""
+        kwargs = archive["kwargs"]
+        argv = [str(archive["dir"]), "--dictionary", kwargs["dictionary_path"],
+                "--property-corners", kwargs["property_corners_path"],
+                "--miscellaneous", kwargs["miscellaneous_path"],
+                "--manifest", kwargs["manifest_path"]]
+        assert batch.main(argv) == 0
+        assert batch.main(argv) == 0
+
+        output = capsys.readouterr().out
+        assert "skipped (unchanged)" in output
+        assert "skipped 2 unchanged" in output
@@ -0,0 +1,287 @@
+"""Tests for checkpoint module."""
+
+import csv
+import json
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import checkpoint
+import parser3
+from description_parser import DescriptionParser
+
+
+class TestCheckpointHelpers:
+    """Test cases for byte offset helpers."""
+
+    def test_complete_length_stops_at_last_newline(self, tmp_path):
+        """Test that a partially written last row is left out."""
+        point_file = tmp_path / "points.csv"
+        point_file.write_bytes(b"a,b\r\nc,d\r\ne,f")
+        assert checkpoint.complete_length(point_file) == 10
+
+    def test_complete_length_without_newline(self, tmp_path):
+        """Test a file that does not contain a complete row yet."""
+        point_file = tmp_path / "points.csv"
+        point_file.write_bytes(b"a,b")
+        assert checkpoint.complete_length(point_file) == 0
+
+    def test_complete_length_across_blocks(self, tmp_path, monkeypatch):
+        """Test that the backwards scan crosses read block boundaries."""
+        monkeypatch.setattr(checkpoint, "READ_CHUNK_SIZE", 4)
+        point_file = tmp_path / "points.csv"
+        point_file.write_bytes(b"a,b\n" + b"x" * 17)
+        assert checkpoint.complete_length(point_file) == 4
+
+    def test_prefix_checksum_only_covers_prefix(self, tmp_path):
+        """Test that appending data does not change the prefix checksum."""
+        point_file = tmp_path / "points.csv"
+        point_file.write_bytes(b"a,b\n")
+        before = checkpoint.prefix_checksum(point_file, 4)
+        with open(point_file, 'ab') as f:
+            f.write(b"c,d\n")
+        assert checkpoint.prefix_checksum(point_file, 4) == before
+        assert checkpoint.prefix_checksum(point_file, 8) != before
+
+    def test_prefix_hasher_matches_prefix_checksum(self, tmp_path, monkeypatch):
+        """Test that hashing a prefix in steps gives the checksum of the whole prefix."""
+        monkeypatch.setattr(checkpoint, "READ_CHUNK_SIZE", 3)
+        point_file = tmp_path / "points.csv"
+        point_file.write_bytes(b"a,b\nc,d\ne,f\n")
+        hasher = checkpoint.PrefixHasher(point_file)
+        for length in (0, 4, 8, 12):
+            assert hasher.checksum(length) == checkpoint.prefix_checksum(point_file, length)
+
+
+class TestResumeOffsets:
+    """Test cases for deciding where a run starts."""
+
+    @pytest.fixture
+    def files(self, tmp_path):
+        """Create an input with a saved checkpoint for its first two rows."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_bytes(b"a,b\nc,d\n")
+        output_file = tmp_path / "points_processed.csv"
+        output_file.write_bytes(b"A,B\nC,D\n")
+        checkpoint.save_checkpoint(output_file, input_file, 8)
+        with open(input_file, 'ab') as f:
+            f.write(b"e,f\n")
+        return input_file, output_file
+
+    def test_no_checkpoint_runs_in_full(self, tmp_path):
+        """Test that a file without a checkpoint is processed from the start."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_bytes(b"a,b\n")
+        start, end, saved = checkpoint.resume_offsets(input_file, tmp_path / "out.csv")
+        assert (start, end, saved) == (0, 4, None)
+
+    def test_appended_rows_resume_from_offset(self, files):
+        """Test that only the appended rows are left to process."""
+        input_file, output_file = files
+        start, end, saved = checkpoint.resume_offsets(input_file, output_file)
+        assert (start, end) == (8, 12)
+        assert saved["offset"] == 8
+
+    def test_changed_prefix_runs_in_full(self, files):
+        """Test that editing an earlier row forces a full run."""
+        input_file, output_file = files
+        input_file.write_bytes(b"a,X\nc,d\ne,f\n")
+        assert checkpoint.resume_offsets(input_file, output_file)[0] == 0
+
+    def test_truncated_input_runs_in_full(self, files):
+        """Test that a shorter input forces a full run."""
+        input_file, output_file = files
+        input_file.write_bytes(b"a,b\n")
+        assert checkpoint.resume_offsets(input_file, output_file)[0] == 0
+
+    def test_edited_output_runs_in_full(self, files):
+        """Test that changing the output outside of a run forces a full run."""
+        input_file, output_file = files
+        output_file.write_bytes(b"A,B\n")
+        assert checkpoint.resume_offsets(input_file, output_file)[0] == 0
+
+    def test_unreadable_checkpoint_is_ignored(self, files):
+        """Test that a damaged checkpoint forces a full run."""
+        input_file, output_file = files
+        checkpoint.checkpoint_path(output_file).write_text("{broken")
+        assert checkpoint.resume_offsets(input_file, output_file)[0] == 0
+
+    def test_last_row_is_cut_back(self, tmp_path):
+        """Test that a row written after the checkpoint's offset is removed to redo it."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_bytes(b"a,b\nc,d")
+        output_file = tmp_path / "points_processed.csv"
+        output_file.write_bytes(b"A,B\nC,D\n")
+        checkpoint.save_checkpoint(output_file, input_file, 4, output_size=4)
+        with open(input_file, 'ab') as f:
+            f.write(b"x\ne,f\n")
+
+        assert checkpoint.resume_offsets(input_file, output_file)[:2] == (4, 13)
+        assert output_file.read_bytes() == b"A,B\n"
+
+    def test_settled_length(self, tmp_path):
+        """Test that the last row is only included while the file keeps its size."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_bytes(b"a,b\nc,d")
+        assert checkpoint.settled_length(input_file, 7, 4) == 7
+        assert checkpoint.settled_length(input_file, 6, 4) == 4
+
+
+class TestPartialFiles:
+    """Test cases for the partial files full runs write to."""
+
+    @pytest.fixture
+    def files(self, tmp_path):
+        """Create an input and a partial output checkpointed after its first row."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_bytes(b"a,b\nc,d\n")
+        output_file = tmp_path / "points_processed.csv"
+        partial = checkpoint.partial_path(output_file)
+        partial.write_bytes(b"A,B\n")
+        checkpoint.save_checkpoint(partial, input_file, 4, rows=1)
+        return input_file, output_file
+
+    def test_resume_cuts_unsaved_rows(self, files):
+        """Test that rows written after the last checkpoint are removed."""
+        input_file, output_file = files
+        partial = checkpoint.partial_path(output_file)
+        with open(partial, 'ab') as f:
+            f.write(b"C,")
+        start, end, saved = checkpoint.resume_partial(input_file, output_file)
+        assert (start, end, saved["rows"]) == (4, 8, 1)
+        assert partial.read_bytes() == b"A,B\n"
+
+    def test_nothing_to_resume(self, tmp_path):
+        """Test that a run without a partial file starts from the beginning."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_bytes(b"a,b\n")
+        assert checkpoint.resume_partial(input_file, tmp_path / "out.csv") == (0, 4, None)
+
+    def test_commit_and_discard(self, files):
+        """Test that a committed partial file replaces the output."""
+        input_file, output_file = files
+        output_file.write_bytes(b"old\n")
+        checkpoint.commit_partial(output_file)
+        assert output_file.read_bytes() == b"A,B\n"
+        assert not checkpoint.partial_path(output_file).exists()
+        assert not checkpoint.checkpoint_path(checkpoint.partial_path(output_file)).exists()
+        checkpoint.discard_partial(output_file)
+        assert output_file.exists()
+
+
+class Crash(Exception):
+    """Stands in for the process being killed."""
+
+
+class TestResumeInterrupted:
+    """Test cases for resuming runs of both stages after they were interrupted."""
+
+    @pytest.fixture
+    def input_file(self, tmp_path):
+        """Write a point file with a header and a mix of descriptions."""
+        input_file = tmp_path / "job.csv"
+        descriptions = ["1/2 PCF", '1/2" IRF CAP', "PLANTER BOX", "SSMH", "TREE"]
+        with open(input_file, 'w', newline='', encoding='utf8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Point", "Northing", "Easting", "Elevation", "Description"])
+            writer.writerows([str(number), f"{1000 + number / 8}", "2000.25", "100",
+                              descriptions[number % len(descriptions)]]
+                             for number in range(1, 1001))
+        return input_file
+
+    @pytest.fixture
+    def crash_after(self, monkeypatch):
+        """Make checkpoint.save_checkpoint raise Crash once it has been called n times."""
+        save_checkpoint = checkpoint.save_checkpoint
+
+        def crash_after(calls):
+            saved = []
+
+            def fail(*args, **kwargs):
+                if len(saved) == calls:
+                    raise Crash
+                saved.append(args[2])
+                save_checkpoint(*args, **kwargs)
+
+            monkeypatch.setattr(checkpoint, "save_checkpoint", fail)
+            return saved
+
+        return crash_after
+
+    @pytest.fixture
+    def parser(self, tmp_path):
+        """A DescriptionParser with a small dictionary."""
+        dictionary = tmp_path / "dict.json"
+        dictionary.write_text(json.dumps({"PLANTER": "PLTR", "TREE": "TR"}))
+        return DescriptionParser(str(dictionary), gui_mode=False)
+
+    @pytest.mark.parametrize("pipeline", [False, True])
+    def test_replace_stage(self, input_file, parser, crash_after, monkeypatch, pipeline):
+        """Test that a resumed replace stage writes what an uninterrupted one does."""
+        parser.pipeline = pipeline
+        output_file = parser.process_file(str(input_file))
+        expected = output_file.read_bytes()
+        output_file.unlink()
+
+        saved = crash_after(2)
+        with pytest.raises(Crash):
+            parser.process_file(str(input_file), checkpoint_rows=300)
+        assert not output_file.exists()
+        assert len(saved) == 2
+        monkeypatch.undo()
+
+        # Standardizing again only the rows past the checkpoint shows it was resumed
+        standardize_frame = parser.standardize_frame
+        lengths = []
+
+        def standardize(df, *args):
+            lengths.append(len(df))
+            return standardize_frame(df, *args)
+
+        monkeypatch.setattr(parser, "standardize_frame", standardize)
+        parser.process_file(str(input_file), resume=True, checkpoint_rows=300)
+        assert lengths == [400]
+        assert output_file.read_bytes() == expected
+        assert not checkpoint.partial_path(output_file).exists()
+
+    def test_changed_input_starts_over(self, input_file, parser, crash_after, monkeypatch):
+        """Test that a partial file is not resumed once its input has changed."""
+        output_file = Path(str(input_file).replace("job", "preprocessed_job"))
+        crash_after(1)
+        with pytest.raises(Crash):
+            parser.process_file(str(input_file), checkpoint_rows=300)
+        monkeypatch.undo()
+        input_file.write_text(input_file.read_text().replace("TREE", "PLANTER"))
+        parser.process_file(str(input_file), resume=True, checkpoint_rows=300)
+        assert "TR\r\n" not in output_file.read_text(newline='')
+        assert output_file.read_text(newline='').count("PLTR") == 400
+
+    @pytest.mark.parametrize("engine", parser3.ENGINES)
+    def test_format_stage(self, input_file, property_corners_file, miscellaneous_file,
+                          crash_after, monkeypatch, engine):
+        """Test that a resumed format stage writes what an uninterrupted one does."""
+        property_codes, misc_codes = parser3.load_code_lists(property_corners_file,
+                                                             miscellaneous_file)
+        options = dict(gui_mode=False, engine=engine, batch_rows=100, checkpoint_rows=250)
+        output_file = Path(parser3.process_file(str(input_file), property_codes, misc_codes,
+                                                **options))
+        expected = output_file.read_bytes()
+        output_file.unlink()
+
+        saved = crash_after(2)
+        with pytest.raises(Crash):
+            parser3.process_file(str(input_file), property_codes, misc_codes, **options)
+        assert not output_file.exists()
+        monkeypatch.undo()
+
+        # Rows after the last checkpoint were written but not saved
+        partial = checkpoint.partial_path(output_file)
+        assert partial.stat().st_size > checkpoint.load_checkpoint(partial)["output_size"]
+        parser3.process_file(str(input_file), property_codes, misc_codes, resume=True,
+                             **options)
+        assert output_file.read_bytes() == expected
+        assert not partial.exists()
+        assert 0 < saved[-1] < input_file.stat().st_size
@@ -0,0 +1,140 @@
+"""Tests for columnar module."""
+
+import csv
+import json
+import pandas as pd
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import batch
+import columnar
+import parser3
+from columnar import build_batches, build_table, load_table, require_pyarrow, write_columnar
+from description_parser import DescriptionParser
+
+
+DESCRIPTIONS = ["1/2 PCF", "SSMH RIM", "PCF NOTE", "TREE OAK", "PLANTER", ""]
+
+
+@pytest.fixture
+def point_files(tmp_path, property_corners_data, miscellaneous_data):
+    """A point file and the outputs of both stages."""
+    input_file = tmp_path / "job.csv"
+    with open(input_file, 'w', newline='', encoding='utf8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Point", "Northing", "Easting", "Elevation", "Description"])
+        for number, description in enumerate(DESCRIPTIONS, start=1):
+            writer.writerow([number, "1000.00", "2000.00", "100.00", description])
+    dictionary = tmp_path / "dict.json"
+    dictionary.write_text(json.dumps({"SSMH RIM": "SSMHR", "PLANTER": "PLTR"}))
+    parser = DescriptionParser(str(dictionary), gui_mode=False)
+    preprocessed = str(parser.process_file(str(input_file)))
+    processed = parser3.process_file(preprocessed, property_corners_data, miscellaneous_data,
+                                     gui_mode=False)
+    return str(input_file), preprocessed, processed
+
+
+class TestBuildTable:
+    """Test cases for building the columnar table."""
+
+    def test_columns(self, point_files, property_corners_data, miscellaneous_data):
+        """Test that original columns, both descriptions and rule flags are present."""
+        table = build_table(*point_files,
+                            parser3.CodeCatalog(property_corners_data, miscellaneous_data))
+        assert list(table.columns[:7]) == ["Point", "Northing", "Easting", "Elevation",
+                                           "Description", "raw_description",
+                                           "final_description"]
+        assert table["Northing"].tolist()[0] == "1000.00"
+        assert table["raw_description"].tolist() == DESCRIPTIONS
+        assert table["rule_replaced"].tolist() == [False, True, False, False, True, False]
+        assert table["rule_size_before_code"].tolist()[0]
+        assert table["rule_note_after_code"].tolist()[2]
+        assert table["rule_tree"].tolist()[3]
+
+    def test_final_descriptions_match_processed_csv(self, point_files,
+                                                    property_corners_data,
+                                                    miscellaneous_data):
+        """Test that the final descriptions are those written to the processed CSV."""
+        with open(point_files[2], newline='', encoding='utf8') as f:
+            expected = [row[4] for row in list(csv.reader(f))[1:]]
+        table = build_table(*point_files,
+                            parser3.CodeCatalog(property_corners_data, miscellaneous_data))
+        assert table["final_description"].tolist() == expected
+
+    def test_batches(self, point_files, property_corners_data, miscellaneous_data,
+                     monkeypatch):
+        """Test that the table is built a chunk of rows at a time with the same rows."""
+        catalog = parser3.CodeCatalog(property_corners_data, miscellaneous_data)
+        expected = build_table(*point_files, catalog)
+        monkeypatch.setattr(columnar, "BATCH_ROWS", 4)
+        batches = list(build_batches(*point_files, catalog))
+        assert [len(batch) for batch in batches] == [4, 2]
+        assert pd.concat(batches, ignore_index=True).equals(expected)
+
+    def test_row_counts_must_match(self, point_files, property_corners_data,
+                                   miscellaneous_data):
+        """Test that a processed file with rows missing is rejected."""
+        input_file, preprocessed, processed = point_files
+        with open(processed, encoding='utf8') as f:
+            lines = f.readlines()
+        with open(processed, 'w', encoding='utf8') as f:
+            f.writelines(lines[:-1])
+        with pytest.raises(ValueError, match="same number of rows"):
+            build_table(input_file, preprocessed, processed,
+                        parser3.CodeCatalog(property_corners_data, miscellaneous_data))
+
+    def test_pyarrow_required(self, monkeypatch):
+        """Test that columnar formats explain that they need pyarrow."""
+        monkeypatch.setitem(sys.modules, "pyarrow", None)
+        require_pyarrow("csv")
+        with pytest.raises(ImportError, match="pyarrow"):
+            require_pyarrow("parquet")
+
+    def test_unknown_format(self):
+        """Test that an unknown output format is rejected."""
+        with pytest.raises(ValueError):
+            require_pyarrow("xlsx")
+
+
+class TestColumnarFiles:
+    """Test cases for writing and loading columnar outputs."""
+
+    @pytest.mark.parametrize("output_format", ["parquet", "feather", "arrow"])
+    def test_round_trip(self, point_files, property_corners_data, miscellaneous_data,
+                        output_format):
+        """Test that each format loads back to the table that was written."""
+        pytest.importorskip("pyarrow")
+        path = write_columnar(*point_files, property_corners_data, miscellaneous_data,
+                              output_format)
+        assert path.endswith("job_processed." + output_format)
+        expected = build_table(*point_files,
+                               parser3.CodeCatalog(property_corners_data, miscellaneous_data))
+        assert load_table(path).to_pandas().equals(expected)
+
+    def test_written_in_batches(self, point_files, property_corners_data, miscellaneous_data,
+                                monkeypatch):
+        """Test that a table written a record batch at a time loads back whole."""
+        pytest.importorskip("pyarrow")
+        expected = build_table(*point_files,
+                               parser3.CodeCatalog(property_corners_data, miscellaneous_data))
+        monkeypatch.setattr(columnar, "BATCH_ROWS", 4)
+        path = write_columnar(*point_files, property_corners_data, miscellaneous_data,
+                              "parquet")
+        assert load_table(path).to_pandas().equals(expected)
+
+    def test_batch_writes_columnar_output(self, point_files, tmp_path, property_corners_file,
+                                          miscellaneous_file):
+        """Test that batch runs write the columnar output next to the CSV."""
+        pytest.importorskip("pyarrow")
+        input_file = point_files[0]
+        report = batch.run_batch([input_file], dictionary_path=str(tmp_path / "dict.json"),
+                                 property_corners_path=property_corners_file,
+                                 miscellaneous_path=miscellaneous_file,
+                                 output_format="arrow")
+        assert report.processed == [str(input_file)]
+        assert (tmp_path / "job_processed.csv").exists()
+        assert (tmp_path / "job_processed.arrow").exists()
@@ -0,0 +1,223 @@
+"""Tests for compressed module."""
+
+import csv
+import gzip
+import io
+import json
+import shutil
+import zipfile
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import batch
+import description_parser
+import parser3
+from compressed import open_text, point_file_members, with_compression
+
+
+DESCRIPTIONS = ["1/2 PCF", "SSMH RIM", "PCF NOTE", "TREE OAK", "PLANTER"]
+
+
+def point_file_text(descriptions=DESCRIPTIONS) -> str:
+    """Return the CSV text of a small point file."""
+    text = io.StringIO(newline='')
+    writer = csv.writer(text)
+    writer.writerow(["Point", "Northing", "Easting", "Elevation", "Description"])
+    for number, description in enumerate(descriptions, start=1):
+        writer.writerow([number, "1000.00", "2000.00", "100.00", description])
+    return text.getvalue()
+
+
+@pytest.fixture
+def options(tmp_path, property_corners_file, miscellaneous_file):
+    """Batch options with a small dictionary and a manifest outside the data."""
+    dictionary = tmp_path / "dict.json"
+    dictionary.write_text(json.dumps({"SSMH RIM": "SSMHR", "PLANTER": "PLTR"}))
+    return dict(dictionary_path=str(dictionary), property_corners_path=property_corners_file,
+                miscellaneous_path=miscellaneous_file, manifest_path=tmp_path / "manifest.jsonl")
+
+
+def plain_outputs(tmp_path, name, text, options) -> tuple:
+    """Return the preprocessed and processed outputs of a plain run over text."""
+    plain_dir = tmp_path / ("plain_" + name.replace("/", "_"))
+    plain_dir.mkdir()
+    input_file = plain_dir / "job.csv"
+    input_file.write_text(text, newline='')
+    batch.run_batch([input_file], **options)
+    return ((plain_dir / "preprocessed_job.csv").read_text(newline=""),
+            (plain_dir / "job_processed.csv").read_text(newline=""))
+
+
+class TestPaths:
+    """Test cases for naming and finding compressed files."""
+
+    def test_with_compression(self):
+        """Test that .gz suffixes are added and removed."""
+        assert with_compression("job.csv", True) == "job.csv.gz"
+        assert with_compression("job.csv.gz", False) == "job.csv"
+        assert with_compression("job.csv.gz", True) == "job.csv.gz"
+
+    def test_processed_output_path(self):
+        """Test that outputs of compressed files keep the point file extension."""
+        assert parser3.processed_output_path("preprocessed_job.csv.gz") == "job_processed.csv.gz"
+        assert parser3.processed_output_path("preprocessed_job.csv", True) == \
+            "job_processed.csv.gz"
+
+    def test_collect_input_files(self, tmp_path):
+        """Test that compressed inputs are found and compressed outputs are not."""
+        for name in ["a.csv.gz", "b.zip", "c.csv", "notes.gz", "preprocessed_a.csv.gz",
+                     "a_processed.csv.gz", "b_processed.zip", "preprocessed_b.zip"]:
+            (tmp_path / name).write_bytes(b"")
+        found = [path.name for path in batch.collect_input_files([tmp_path])]
+        assert found == ["a.csv.gz", "b.zip", "c.csv"]
+
+    def test_point_file_members(self, tmp_path):
+        """Test that only point files are taken from an archive."""
+        with zipfile.ZipFile(tmp_path / "crew.zip", 'w') as archive:
+            for name in ["day1/job.csv", "day1/", "readme.pdf", "job.TXT"]:
+                archive.writestr(name, "")
+            assert point_file_members(archive, batch.POINT_FILE_EXTENSIONS) == \
+                ["day1/job.csv", "job.TXT"]
+
+
+class TestGzip:
+    """Test cases for gzip compressed point files."""
+
+    def test_gzip_input(self, tmp_path, options):
+        """Test that a .gz input gives .gz outputs with the same content as a plain run."""
+        expected = plain_outputs(tmp_path, "job", point_file_text(), options)
+        input_file = tmp_path / "job.csv.gz"
+        with gzip.open(input_file, 'wt', newline='') as f:
+            f.write(point_file_text())
+        report = batch.run_batch([input_file], **options)
+        assert report.processed == [str(input_file)]
+        with open_text(tmp_path / "preprocessed_job.csv.gz") as f:
+            assert f.read() == expected[0]
+        with open_text(tmp_path / "job_processed.csv.gz") as f:
+            assert f.read() == expected[1]
+
+    def test_compressed_outputs(self, tmp_path, options):
+        """Test that plain inputs can be given compressed outputs."""
+        expected = plain_outputs(tmp_path, "job", point_file_text(), options)
+        input_file = tmp_path / "job.csv"
+        input_file.write_text(point_file_text(), newline='')
+        batch.run_batch([input_file], compress=True, **options)
+        with open_text(tmp_path / "job_processed.csv.gz") as f:
+            assert f.read() == expected[1]
+        assert not (tmp_path / "job_processed.csv").exists()
+
+    def test_compress_after_plain_run(self, tmp_path, options):
+        """Test that a file processed without compression is not skipped when it is asked for."""
+        input_file = tmp_path / "job.csv"
+        input_file.write_text(point_file_text(), newline='')
+        batch.run_batch([input_file], **options)
+        report = batch.run_batch([input_file], compress=True, **options)
+        assert report.processed == [str(input_file)]
+        assert (tmp_path / "job_processed.csv.gz").exists()
+        assert batch.run_batch([input_file], compress=True, **options).skipped == [
+            str(input_file)]
+
+    def test_incremental_gzip_runs_in_full(self, tmp_path, options):
+        """Test that incremental runs over a .gz input reprocess the whole file."""
+        input_file = tmp_path / "job.csv.gz"
+        with gzip.open(input_file, 'wt', newline='') as f:
+            f.write(point_file_text(DESCRIPTIONS[:2]))
+        batch.run_batch([input_file], incremental=True, **options)
+        with gzip.open(input_file, 'wt', newline='') as f:
+            f.write(point_file_text())
+        batch.run_batch([input_file], incremental=True, **options)
+        with open_text(tmp_path / "job_processed.csv.gz") as f:
+            assert len(list(csv.reader(f))) == len(DESCRIPTIONS) + 1
+
+
+class TestZip:
+    """Test cases for zip archives of point files."""
+
+    @pytest.mark.parametrize("engine", parser3.ENGINES)
+    def test_zip_members_match_plain_runs(self, tmp_path, options, monkeypatch, engine):
+        """Test that every member is processed as if it had been extracted."""
+        monkeypatch.setattr(parser3, "STREAM_BATCH_ROWS", 2)
+        monkeypatch.setattr(description_parser, "STREAM_CHUNK_ROWS", 2)
+        members = {"day1/job.csv": point_file_text(),
+                   "day2/job.txt": point_file_text(DESCRIPTIONS[::-1])}
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        archive_path = data_dir / "crew.zip"
+        with zipfile.ZipFile(archive_path, 'w') as archive:
+            for name, text in members.items():
+                archive.writestr(name, text)
+            archive.writestr("day2/empty.csv", "")
+            archive.writestr("day2/photo.jpg", b"\xff\xd8")
+
+        report = batch.run_batch([data_dir], engine=engine, **options)
+        assert report.processed == [str(archive_path)]
+        with zipfile.ZipFile(data_dir / "crew_processed.zip") as output, \
+                zipfile.ZipFile(data_dir / "preprocessed_crew.zip") as preprocessed:
+            assert sorted(output.namelist()) == ["day1/job_processed.csv",
+                                                 "day2/job_processed.txt"]
+            for name, text in members.items():
+                expected = plain_outputs(tmp_path, name, text, options)
+                folder, file_name = name.split("/")
+                stem, ext = file_name.split(".")
+                assert preprocessed.read(f"{folder}/preprocessed_{file_name}").decode() == \
+                    expected[0]
+                assert output.read(f"{folder}/{stem}_processed.{ext}").decode() == \
+                    expected[1]
+        assert not list(data_dir.glob("*.tmp"))
+
+        # An unchanged archive is skipped on the next run with the same engine
+        assert batch.run_batch([data_dir], engine=engine, **options).skipped == [
+            str(archive_path)]
+
+    def test_members_are_streamed(self, tmp_path, options, monkeypatch):
+        """Test that a member is written in chunks sized by the budget, as a plain run is."""
+        descriptions = [f"{description} {number}" for number in range(600)
+                        for description in DESCRIPTIONS]
+        # Column types that only the last rows settle, so chunks read alone disagree
+        text = point_file_text(descriptions) + "1001,TBD,2000.00,100.00,PCF\r\n"
+        expected = plain_outputs(tmp_path, "job", text, options)
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        with zipfile.ZipFile(data_dir / "crew.zip", 'w') as archive:
+            archive.writestr("job.csv", text)
+
+        capacities = []
+        original = batch.MemoryBudget.capacity
+
+        def capacity(self, *args, **kwargs):
+            capacities.append(original(self, *args, **kwargs))
+            return capacities[-1]
+
+        monkeypatch.setattr(batch.MemoryBudget, "capacity", capacity)
+        monkeypatch.setattr(batch.MemoryBudget, "headroom", lambda self: 20_000)
+        batch.run_batch([data_dir], max_memory=1 << 30, **options)
+        # The suggestion cache, the replacement stage's chunks and the format batches
+        assert len(capacities) == 3 and max(capacities) < len(descriptions)
+        with zipfile.ZipFile(data_dir / "crew_processed.zip") as output, \
+                zipfile.ZipFile(data_dir / "preprocessed_crew.zip") as preprocessed:
+            outputs = (preprocessed.read("preprocessed_job.csv").decode(),
+                       output.read("job_processed.csv").decode())
+        # Compared whole, as a diff of texts this long would take minutes
+        assert outputs == expected
+
+
+class TestFormatStream:
+    """Test cases for formatting streams in batches."""
+
+    def test_matches_process_file(self, tmp_path, property_corners_data,
+                                  miscellaneous_data, monkeypatch):
+        """Test that batched stream formatting writes the same rows as process_file."""
+        monkeypatch.setattr(parser3, "STREAM_BATCH_ROWS", 2)
+        input_file = tmp_path / "preprocessed_job.csv"
+        input_file.write_text(point_file_text(), newline='')
+        expected = Path(parser3.process_file(str(input_file), property_corners_data,
+                                             miscellaneous_data, gui_mode=False)).read_text(newline="")
+        output = io.StringIO(newline='')
+        catalog = parser3.CodeCatalog(property_corners_data, miscellaneous_data)
+        with open_text(input_file) as infile:
+            assert parser3.format_stream(infile, output, catalog) == len(DESCRIPTIONS) + 1
+        assert output.getvalue() == expected
@@ -12,7 +12,9 @@ import os
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from description_parser import DescriptionParser
+from description_parser import (DescriptionParser, PrefilterStats, apply_replacements,
+                                compile_prefilter, count_changes, resolve_storage,
+                                to_storage)
 
 
 class TestDescriptionParser:
@@ -175,6 +177,197 @@ class TestDescriptionParser:
         mock_messagebox.assert_not_called()
 
 
+class TestDescriptionParserIncremental:
+    """Test cases for incremental processing of growing files."""
+
+    @pytest.fixture
+    def sample_dict_path(self, tmp_path):
+        """Create a temporary dictionary file for testing."""
+        dict_file = tmp_path / "test_dict.json"
+        with open(dict_file, 'w') as f:
+            json.dump({"OLD_CODE": "NEW_CODE", "TEMP": "TEMPORARY"}, f)
+        return str(dict_file)
+
+    def write_lines(self, path, lines, mode='w'):
+        """Write raw CSV lines to a file."""
+        with open(path, mode, encoding='utf8', newline='') as f:
+            f.write(''.join(line + '\n' for line in lines))
+
+    def test_appended_rows_match_full_run(self, sample_dict_path, tmp_path):
+        """Test that incremental output equals a full run over the grown file."""
+        input_file = tmp_path / "points.csv"
+        self.write_lines(input_file, ["Point,Northing,Easting,Elevation,Description",
+                                      "1,1000.00,2000.00,100.00,OLD_CODE MARKER"])
+        parser = DescriptionParser(dictionary_path=sample_dict_path, gui_mode=False)
+        output_file = parser.process_file(str(input_file), incremental=True)
+
+        self.write_lines(input_file, ["2,1001.00,2001.00,101.00,TEMP SIGN",
+                                      "3,1002.00,2002.00,102.00,PCF 1/2"], mode='a')
+        parser.process_file(str(input_file), incremental=True)
+        incremental_output = Path(output_file).read_text()
+
+        parser.process_file(str(input_file))
+        assert Path(output_file).read_text() == incremental_output
+        assert "TEMPORARY SIGN" in incremental_output
+
+    def test_no_new_rows_leaves_output_alone(self, sample_dict_path, tmp_path):
+        """Test that a rerun without new rows does not rewrite the output."""
+        input_file = tmp_path / "points.csv"
+        self.write_lines(input_file, ["Point,Northing,Easting,Elevation,Description",
+                                      "1,1000.00,2000.00,100.00,OLD_CODE MARKER"])
+        parser = DescriptionParser(dictionary_path=sample_dict_path, gui_mode=False)
+        output_file = parser.process_file(str(input_file), incremental=True)
+
+        with patch('description_parser.pd.read_csv') as mock_read_csv:
+            assert parser.process_file(str(input_file), incremental=True) == output_file
+        mock_read_csv.assert_not_called()
+
+    def test_mismatched_types_fall_back_to_full_run(self, sample_dict_path, tmp_path):
+        """Test that new rows that do not fit the saved dtypes trigger a full run."""
+        input_file = tmp_path / "points.csv"
+        self.write_lines(input_file, ["Point,Northing,Easting,Elevation,Description",
+                                      "1,1000.00,2000.00,100.00,OLD_CODE MARKER"])
+        parser = DescriptionParser(dictionary_path=sample_dict_path, gui_mode=False)
+        output_file = parser.process_file(str(input_file), incremental=True)
+
+        self.write_lines(input_file, ["CP2,1001.00,2001.00,101.00,TEMP SIGN"], mode='a')
+        parser.process_file(str(input_file), incremental=True)
+
+        df = pd.read_csv(output_file)
+        assert df['Point'].tolist() == ['1', 'CP2']
+        assert df['Description'].tolist() == ['NEW_CODE MARKER', 'TEMPORARY SIGN']
+
+    def test_last_row_without_newline(self, sample_dict_path, tmp_path):
+        """Test that a last row without a newline is written, and redone if it grows."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_text("Point,Northing,Easting,Elevation,Description\n"
+                              "1,1000.00,2000.00,100.00,OLD_CODE MARKER\n"
+                              "2,1001.00,2001.00,101.00,TEMP", encoding='utf8', newline='')
+        parser = DescriptionParser(dictionary_path=sample_dict_path, gui_mode=False)
+        output_file = parser.process_file(str(input_file), incremental=True)
+        assert pd.read_csv(output_file)['Description'].tolist() == ['NEW_CODE MARKER',
+                                                                    'TEMPORARY']
+
+        with open(input_file, 'a', encoding='utf8', newline='') as f:
+            f.write(" SIGN\n3,1002.00,2002.00,102.00,OLD_CODE")
+        parser.process_file(str(input_file), incremental=True)
+        incremental_output = Path(output_file).read_text()
+        parser.process_file(str(input_file))
+        assert Path(output_file).read_text() == incremental_output
+        assert "TEMPORARY SIGN" in incremental_output
+
+    def test_growing_last_row_waits(self, sample_dict_path, tmp_path):
+        """Test that a last row without a newline is left alone while the file grows."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_text("Point,Northing,Easting,Elevation,Description\n"
+                              "1,1000.00,2000.00,100.00,OLD_CODE MARKER\n"
+                              "2,1001.00,2001.00,101.00,TE", encoding='utf8', newline='')
+        parser = DescriptionParser(dictionary_path=sample_dict_path, gui_mode=False)
+        output_file = parser.process_file(str(input_file), incremental=True, input_size=80)
+        assert pd.read_csv(output_file)['Point'].tolist() == [1]
+
+
+class TestReplacementPrefilter:
+    """Test cases for skipping descriptions that contain no dictionary key."""
+
+    def test_prefilter_finds_any_key(self):
+        """Test that the prefilter matches exactly the descriptions containing a key."""
+        prefilter = compile_prefilter(("AC PAD", "AC PERCH", "FC ", "\\LINE", "AC"))
+        assert prefilter.search("HVAC UNIT")
+        assert prefilter.search("EP \\LINE")
+        assert prefilter.search("FC EDGE")
+        assert not prefilter.search("FCEDGE")
+        assert not prefilter.search("PCF 1/2")
+
+    def test_matches_unfiltered_replacements(self):
+        """Test that filtered replacements equal applying every key to every row."""
+        replacement_dict = {"AB": "BA", "BA ": "X", " X": "", "C": "AB", "   ": " "}
+        descriptions = pd.Series(["AB C", "CCC", "BA X", "ZZZ", None, "A   B", "QQ BA "])
+        expected = descriptions.copy()
+        for old_text, new_text in replacement_dict.items():
+            expected = expected.str.replace(old_text, new_text, regex=False)
+
+        stats = PrefilterStats()
+        result = apply_replacements(descriptions, replacement_dict, stats=stats)
+        assert result.equals(expected)
+        assert (stats.rows, stats.rejected) == (7, 2)
+        assert stats.rejection_rate == pytest.approx(2 / 7)
+
+    def test_rejection_rate_is_reported(self, tmp_path):
+        """Test that the parser keeps a running count of skipped descriptions."""
+        dict_file = tmp_path / "dict.json"
+        dict_file.write_text(json.dumps({"OLD_CODE": "NEW_CODE"}))
+        input_file = tmp_path / "points.csv"
+        input_file.write_text("Point,Northing,Easting,Elevation,Description\n"
+                              "1,1000.00,2000.00,100.00,OLD_CODE MARKER\n"
+                              "2,1001.00,2001.00,101.00,PCF 1/2\n"
+                              "3,1002.00,2002.00,102.00,TREE\n")
+        parser = DescriptionParser(dictionary_path=str(dict_file), gui_mode=False)
+        parser.process_file(str(input_file))
+        assert (parser.prefilter_stats.rows, parser.prefilter_stats.rejected) == (3, 2)
+
+
+class TestDescriptionStorage:
+    """Test cases for holding descriptions as categories or Arrow strings."""
+
+    REPLACEMENTS = {"AB": "BA", "BA ": "X", " X": "", "C": "AB", "CCC": "BA X"}
+    DESCRIPTIONS = ["AB C", "CCC", "BA X", "ZZZ", None, "AB C", "QQ BA ", "ZZZ"]
+
+    @pytest.fixture(params=["category", "pyarrow"])
+    def storage(self, request):
+        """Each storage type other than Python strings."""
+        if request.param == "pyarrow":
+            pytest.importorskip("pyarrow")
+        return request.param
+
+    def test_replacements_match_object_storage(self, storage):
+        """Test that results, matched rows and stats equal those of Python strings."""
+        descriptions = pd.Series(self.DESCRIPTIONS)
+        expected_matches, expected_stats = {}, PrefilterStats()
+        expected = apply_replacements(descriptions, self.REPLACEMENTS, expected_matches,
+                                      expected_stats)
+
+        stored = to_storage(descriptions, storage)
+        matches, stats = {}, PrefilterStats()
+        result = apply_replacements(stored, self.REPLACEMENTS, matches, stats)
+        assert result.astype(object).where(result.notna(), None).tolist() == \
+            expected.where(expected.notna(), None).tolist()
+        assert matches == expected_matches
+        assert stats == expected_stats
+        assert count_changes(stored, result) == count_changes(descriptions, expected)
+
+    def test_output_file_matches_object_storage(self, storage, tmp_path):
+        """Test that the preprocessed file is the same whatever the storage."""
+        dict_file = tmp_path / "dict.json"
+        dict_file.write_text(json.dumps(self.REPLACEMENTS))
+        outputs = []
+        for option in ("object", storage):
+            input_file = tmp_path / option / "points.csv"
+            input_file.parent.mkdir()
+            input_file.write_text("Point,Northing,Easting,Elevation,Description\n" + "".join(
+                f"{number},1000.00,2000.00,100.00,{description or ''}\n"
+                for number, description in enumerate(self.DESCRIPTIONS, start=1)))
+            parser = DescriptionParser(dictionary_path=str(dict_file), gui_mode=False,
+                                       storage=option)
+            outputs.append(Path(parser.process_file(str(input_file))).read_bytes())
+        assert outputs[0] == outputs[1]
+
+    def test_pyarrow_falls_back_to_category(self, monkeypatch):
+        """Test that Arrow storage falls back to categories without pyarrow."""
+        monkeypatch.setitem(sys.modules, "pyarrow", None)
+        assert resolve_storage("pyarrow") == "category"
+
+    def test_unknown_storage(self):
+        """Test that an unknown storage type is rejected."""
+        with pytest.raises(ValueError):
+            resolve_storage("mmap")
+
+    def test_numeric_column_is_not_converted(self):
+        """Test that a column pandas read as numbers is written back unchanged."""
+        numbers = pd.Series([1.5, 2.0])
+        assert to_storage(numbers, "category") is numbers
+
+
 class TestDescriptionParserMain:
     """Test cases for main function."""
 
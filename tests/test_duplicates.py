@@ -0,0 +1,320 @@
+"""Tests for duplicates module."""
+
+import csv
+import gzip
+import io
+import math
+import zipfile
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import batch
+import checkpoint
+import parser3
+from duplicates import MAX_POINTS, CornerGrid, PointIndex, coordinate_hash, point_key
+from point_schema import Schema
+
+
+HEADER = ["Point", "Northing", "Easting", "Elevation", "Description"]
+
+
+def write_points(path, rows):
+    """Write a point file with a header row."""
+    with (gzip.open(path, 'wt', newline='', encoding='utf8') if path.suffix == '.gz'
+          else open(path, 'w', newline='', encoding='utf8')) as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+def write_archive(path, members):
+    """Write a zip archive of point files, given as rows by member name."""
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, rows in members.items():
+            text = io.StringIO(newline='')
+            csv.writer(text).writerows([HEADER] + rows)
+            archive.writestr(name, text.getvalue())
+
+
+def read_report(path):
+    """Return the rows of a duplicate report, without its header."""
+    with open(path, newline='', encoding='utf8') as f:
+        return list(csv.reader(f))[1:]
+
+
+class TestKeys:
+    """Test cases for comparing point numbers and coordinates."""
+
+    def test_point_key(self):
+        """Test that numeric point numbers compare as numbers and names as text."""
+        assert point_key(" 0012 ") == point_key("12") == "12"
+        assert point_key("CP12") != point_key("12")
+
+    def test_coordinate_hash(self):
+        """Test that the same shot written differently has the same hash."""
+        assert coordinate_hash("1000.5", "2000", "") == coordinate_hash("1000.500", "2000.0", "")
+        assert coordinate_hash("1000.5", "2000", "") != coordinate_hash("1000.6", "2000", "")
+
+
+class TestPointIndex:
+    """Test cases for finding point numbers used more than once."""
+
+    def add(self, index, rows, path="job.csv"):
+        """Add rows of point number, northing, easting, elevation."""
+        for line_number, (point, northing, easting, elevation) in enumerate(rows, start=2):
+            index.add(path, line_number, point, coordinate_hash(northing, easting, elevation))
+
+    def test_duplicates_and_conflicts(self):
+        """Test that re-uses are told apart by their coordinates, conflicts first."""
+        index = PointIndex()
+        self.add(index, [("1", "100", "200", "10"), ("2", "110", "210", "10"),
+                         ("3", "120", "220", "10")], "crew1.csv")
+        self.add(index, [("01", "100.000", "200", "10"), ("2", "111", "210", "10"),
+                         ("4", "130", "230", "10")], "crew2.csv")
+        reuses = list(index.reuses())
+        assert [(reuse.point, reuse.kind, reuse.count) for reuse in reuses] == [
+            ("2", "conflict", 2), ("1", "duplicate", 2)]
+        assert reuses[0].locations == [("crew1.csv", 3), ("crew2.csv", 3)]
+
+    @pytest.mark.parametrize("max_points", [None, 1, 3])
+    def test_spilled_index(self, max_points):
+        """Test that an index spilled to disk reports what one held in memory does."""
+        rows = [(str(number % 7), str(number % 5 == 0), "200", "10") for number in range(40)]
+        expected = PointIndex()
+        self.add(expected, rows)
+        index = PointIndex(max_points)
+        self.add(index, rows)
+        assert index.spilled == (max_points is not None)
+        assert list(index.reuses()) == list(expected.reuses())
+
+    def test_bounded_by_default(self):
+        """Test that an index has a memory limit unless it is given none."""
+        assert PointIndex().max_points == MAX_POINTS
+        assert PointIndex(None).max_points is None
+
+    def test_add_row_after_description(self):
+        """Test that coordinates after the description are split out of the raw rest."""
+        schema = Schema(layout='PNEZD', description_column=1)
+        index = PointIndex()
+        index.add_row("job.csv", 2, ["1", "IRF", "100,200,10,IRF"], schema)
+        index.add_row("job.csv", 3, ["1", "IRF", "100,201,10,IRF"], schema)
+        index.add_row("job.csv", 4, ["2"], schema)
+        assert [reuse.kind for reuse in index.reuses()] == ["conflict"]
+
+    def test_write(self, tmp_path):
+        """Test the report file and the counts of each kind."""
+        index = PointIndex()
+        self.add(index, [("7", "100", "200", "10"), ("7", "100", "200", "10"),
+                         ("8", "1", "2", "3")])
+        report = tmp_path / "duplicate_points.csv"
+        assert index.write(report) == {'duplicate': 1, 'conflict': 0}
+        assert read_report(report) == [["7", "duplicate", "2", "job.csv:2; job.csv:3"]]
+
+
+class TestCornerGrid:
+    """Test cases for finding property corners shot more than once."""
+
+    @pytest.fixture
+    def grid(self):
+        """An empty grid with a 0.1 tolerance."""
+        return CornerGrid(parser3.CodeCatalog(["IRF", "PCF"], ["EP", "FH"]), 0.1)
+
+    def add_rows(self, grid, rows):
+        """Add PNEZD rows, counting lines from 2."""
+        for line_number, row in enumerate(rows, start=2):
+            grid.add_row("job.csv", line_number, row, Schema())
+
+    def test_clusters(self, grid):
+        """Test that shots within the tolerance are joined, size conflicts first."""
+        self.add_rows(grid, [["1", "100.00", "200.00", "10", "IRF \\1/2"],
+                             ["2", "500.00", "500.00", "10", "PCF"],
+                             ["3", "100.05", "200.05", "10", "1/2 IRF"],
+                             ["4", "500.00", "500.09", "10", "PCF \\5/8"],
+                             ["5", "500.00", "500.18", "10", 'EP PCF 1/2"'],
+                             ["6", "100.00", "200.20", "10", "IRF"]])
+        clusters = grid.clusters()
+        assert [cluster.kind for cluster in clusters] == ["size-conflict", "repeat"]
+        assert [corner[0] for corner in clusters[0].corners] == ["2", "4", "5"]
+        assert clusters[0].sizes == ["1/2", "5/8"]
+        assert [corner[0] for corner in clusters[1].corners] == ["1", "3"]
+        assert clusters[1].extent == pytest.approx(0.0707, abs=1e-4)
+
+    def test_only_property_corners(self, grid):
+        """Test that other codes and rows without numeric coordinates are left out."""
+        self.add_rows(grid, [["1", "100", "200", "10", "EP"],
+                             ["2", "100", "200", "10", "FH IRF"],
+                             ["3", "", "200", "10", "IRF"],
+                             ["4", "100", "200", "10", "PCF CAP"],
+                             ["5", "100", "200", "10", "TREE"]])
+        assert len(grid) == 2
+        assert [corner[0] for corner in grid.clusters()[0].corners] == ["2", "4"]
+
+    def test_matches_pairwise(self, grid):
+        """Test that the grid finds the clusters comparing every pair would."""
+        shots = [(100 + (number * 37 % 41) * 0.06, 200 + (number * 13 % 29) * 0.06)
+                 for number in range(200)]
+        self.add_rows(grid, [[str(number), str(northing), str(easting), "0", "IRF"]
+                             for number, (northing, easting) in enumerate(shots)])
+        parents = list(range(len(shots)))
+
+        def root(item):
+            while parents[item] != item:
+                item = parents[item]
+            return item
+
+        for first in range(len(shots)):
+            for second in range(first):
+                if math.dist(shots[first], shots[second]) <= 0.1:
+                    parents[root(first)] = root(second)
+        expected = {}
+        for item in range(len(shots)):
+            expected.setdefault(root(item), set()).add(str(item))
+        assert ({frozenset(corner[0] for corner in cluster.corners)
+                 for cluster in grid.clusters()}
+                == {frozenset(group) for group in expected.values() if len(group) > 1})
+
+    def test_invalid_tolerance(self):
+        """Test that the tolerance must be positive."""
+        with pytest.raises(ValueError):
+            CornerGrid(parser3.CodeCatalog(["IRF"], []), 0)
+
+
+class TestFormatStage:
+    """Test cases for indexing points while the format stage runs."""
+
+    @pytest.mark.parametrize("engine", parser3.ENGINES)
+    def test_process_file(self, tmp_path, property_corners_file, miscellaneous_file, engine):
+        """Test that every data row of a formatted file is indexed by its line."""
+        input_file = tmp_path / "job.csv"
+        write_points(input_file, [["1", "100", "200", "10", "IRF 1/2"],
+                                  ["2", "110", "210", "10", "EP"],
+                                  ["1", "105", "200", "10", "IRF"]])
+        property_codes, misc_codes = parser3.load_code_lists(property_corners_file,
+                                                             miscellaneous_file)
+        index = PointIndex()
+        parser3.process_file(str(input_file), property_codes, misc_codes, gui_mode=False,
+                             engine=engine, point_index=index)
+        assert index.rows == 3
+        [reuse] = index.reuses()
+        assert (reuse.point, reuse.kind) == ("1", "conflict")
+        assert reuse.locations == [(str(input_file), 2), (str(input_file), 4)]
+
+    def test_resumed_run(self, tmp_path, property_corners_file, miscellaneous_file,
+                         monkeypatch):
+        """Test that the rows written before a checkpoint are indexed on resume."""
+        input_file = tmp_path / "job.csv"
+        write_points(input_file, [[str(number % 40), "100", "200", "10", "EP"]
+                                  for number in range(100)])
+        property_codes, misc_codes = parser3.load_code_lists(property_corners_file,
+                                                             miscellaneous_file)
+        save_checkpoint = checkpoint.save_checkpoint
+
+        def crash(*args, **kwargs):
+            save_checkpoint(*args, **kwargs)
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr(checkpoint, "save_checkpoint", crash)
+        with pytest.raises(KeyboardInterrupt):
+            parser3.process_file(str(input_file), property_codes, misc_codes,
+                                 gui_mode=False, batch_rows=30, checkpoint_rows=30,
+                                 point_index=PointIndex())
+        monkeypatch.setattr(checkpoint, "save_checkpoint", save_checkpoint)
+        index = PointIndex()
+        parser3.process_file(str(input_file), property_codes, misc_codes, gui_mode=False,
+                             batch_rows=30, resume=True, point_index=index)
+        assert index.rows == 100
+        counts = {reuse.point: reuse.count for reuse in index.reuses()}
+        assert counts == {str(number): 3 if number < 20 else 2 for number in range(40)}
+
+
+class TestBatch:
+    """Test cases for the duplicate report of a batch run."""
+
+    def test_check_duplicates(self, tmp_path, property_corners_file, miscellaneous_file):
+        """Test that points are checked across processed and unchanged files."""
+        write_points(tmp_path / "crew1.csv", [["1", "100", "200", "10", "IRF"],
+                                              ["2", "110", "210", "10", "EP"]])
+        options = dict(property_corners_path=property_corners_file,
+                       miscellaneous_path=miscellaneous_file, check_duplicates=True)
+        batch.run_batch([tmp_path], **options)
+        write_points(tmp_path / "crew2.csv.gz", [["1", "100", "200", "10", "IRF"],
+                                                 ["2", "120", "210", "10", "EP"]])
+        report = batch.run_batch([tmp_path], **options)
+        assert report.skipped == [str(tmp_path / "crew1.csv")]
+        assert report.duplicates == {'duplicate': 1, 'conflict': 1}
+        assert read_report(report.duplicate_report) == [
+            ["2", "conflict", "2", f"{tmp_path / 'crew1.csv'}:3; {tmp_path / 'crew2.csv.gz'}:3"],
+            ["1", "duplicate", "2", f"{tmp_path / 'crew1.csv'}:2; {tmp_path / 'crew2.csv.gz'}:2"]]
+
+    def test_spills_without_budget(self, tmp_path, property_corners_file,
+                                   miscellaneous_file, monkeypatch, caplog):
+        """Test that a run without a memory budget still spills a large index."""
+        monkeypatch.setattr(batch, "MAX_POINTS", 1)
+        write_points(tmp_path / "crew1.csv", [["1", "100", "200", "10", "IRF"],
+                                              ["2", "110", "210", "10", "EP"],
+                                              ["1", "100", "200", "10", "IRF"]])
+        with caplog.at_level("INFO", logger="duplicates"):
+            report = batch.run_batch([tmp_path], property_corners_path=property_corners_file,
+                                     miscellaneous_path=miscellaneous_file,
+                                     check_duplicates=True)
+        assert "Spilled" in caplog.text
+        assert report.duplicates == {'duplicate': 1, 'conflict': 0}
+
+    def test_report_is_not_an_input(self, tmp_path, property_corners_file,
+                                    miscellaneous_file):
+        """Test that the next run does not take the report for a point file."""
+        write_points(tmp_path / "crew1.csv", [["1", "100", "200", "10", "IRF"]])
+        options = dict(property_corners_path=property_corners_file,
+                       miscellaneous_path=miscellaneous_file, check_duplicates=True)
+        assert batch.run_batch([tmp_path], **options).duplicate_report == str(
+            tmp_path / "duplicate_points.csv")
+        report = batch.run_batch([tmp_path], **options)
+        assert (report.processed, report.failed) == ([], [])
+        assert report.skipped == [str(tmp_path / "crew1.csv")]
+        assert not list(tmp_path.glob("*.part"))
+
+    def test_corner_tolerance(self, tmp_path, property_corners_file, miscellaneous_file):
+        """Test that corners shot twice across files are reported with their sizes."""
+        write_points(tmp_path / "crew1.csv", [["1", "100", "200", "10", "PCF 1/2"],
+                                              ["2", "110", "210", "10", "SIGN"]])
+        write_points(tmp_path / "crew2.csv", [["7", "100.02", "200", "10", "5/8 PCF"]])
+        report = batch.run_batch([tmp_path], property_corners_path=property_corners_file,
+                                 miscellaneous_path=miscellaneous_file, corner_tolerance=0.1)
+        assert report.corners == {'repeat': 0, 'size-conflict': 1}
+        assert read_report(report.corner_report) == [
+            ["1", "size-conflict", "2", "0.020", "PCF", "1/2 5/8",
+             f"1 {tmp_path / 'crew1.csv'}:2; 7 {tmp_path / 'crew2.csv'}:2"]]
+
+    def test_corner_report_is_not_an_input(self, tmp_path, property_corners_file,
+                                           miscellaneous_file):
+        """Test that the next run does not process the corner report as survey data."""
+        write_points(tmp_path / "crew1.csv", [["1", "100", "200", "10", "PCF 1/2"],
+                                              ["2", "100.01", "200", "10", "PCF 5/8"]])
+        options = dict(property_corners_path=property_corners_file,
+                       miscellaneous_path=miscellaneous_file, corner_tolerance=0.1)
+        assert batch.run_batch([tmp_path], **options).corner_report == str(
+            tmp_path / "corner_clusters.csv")
+        report = batch.run_batch([tmp_path], **options)
+        assert (report.processed, report.skipped) == ([], [str(tmp_path / "crew1.csv")])
+        assert report.corners == {'repeat': 0, 'size-conflict': 1}
+        assert not (tmp_path / "corner_clusters_processed.csv").exists()
+
+    def test_zip_members(self, tmp_path, property_corners_file, miscellaneous_file):
+        """Test that points inside archives are checked, when processed and when skipped."""
+        write_points(tmp_path / "a.csv", [["1", "100", "200", "10", "PCF"]])
+        write_archive(tmp_path / "crew.zip", {"day1/b.csv": [["1", "150", "250", "10", "PCF"]],
+                                              "day1/empty.csv": []})
+        options = dict(property_corners_path=property_corners_file,
+                       miscellaneous_path=miscellaneous_file, check_duplicates=True)
+        expected = [["1", "conflict", "2",
+                     f"{tmp_path / 'a.csv'}:2; {tmp_path / 'crew.zip' / 'day1/b.csv'}:2"]]
+        first = batch.run_batch([tmp_path], **options)
+        assert first.processed == [str(tmp_path / "a.csv"), str(tmp_path / "crew.zip")]
+        assert read_report(first.duplicate_report) == expected
+        second = batch.run_batch([tmp_path], **options)
+        assert len(second.skipped) == 2
+        assert read_report(second.duplicate_report) == expected
@@ -0,0 +1,110 @@
+"""Tests for engine module."""
+
+import csv
+import itertools
+import pytest
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import parser3
+from description_parser import DescriptionParser
+from engine import DescriptionEngine
+
+
+@pytest.fixture
+def engine(sample_replacement_dict_data, property_corners_data, miscellaneous_data):
+    """An engine built from the shared sample configuration."""
+    return DescriptionEngine(sample_replacement_dict_data, property_corners_data,
+                             miscellaneous_data)
+
+
+class TestDescriptionEngine:
+    """Test cases for the in-memory engine."""
+
+    def test_matches_file_based_pipeline(self, engine, sample_csv_file,
+                                         sample_replacement_dict_file,
+                                         property_corners_data, miscellaneous_data):
+        """Test that descriptions match running both stages on disk."""
+        preprocessed = DescriptionParser(sample_replacement_dict_file,
+                                         gui_mode=False).process_file(sample_csv_file)
+        output_file = parser3.process_file(str(preprocessed), property_corners_data,
+                                           miscellaneous_data, gui_mode=False)
+        with open(output_file, newline='', encoding='utf8') as f:
+            expected = [row[4] for row in csv.reader(f)]
+
+        with open(sample_csv_file, newline='', encoding='utf8') as f:
+            actual = [row[4] for row in engine.process_rows(csv.reader(f))]
+
+        assert actual == expected
+
+    def test_from_config_files(self, sample_replacement_dict_file, property_corners_file,
+                               miscellaneous_file, engine):
+        """Test loading the configuration from the usual files."""
+        loaded = DescriptionEngine.from_config_files(
+            sample_replacement_dict_file, property_corners_file, miscellaneous_file)
+        description = "1/4 PCF TEMP"
+        assert loaded.process_description(description) == \
+            engine.process_description(description) == "PCF \\1/4 TEMPORARY"
+
+    def test_rows_are_processed_lazily(self, engine):
+        """Test that rows are yielded one at a time from an endless source."""
+        endless = (("1", "1000.0", "2000.0", "100.0", "PCF 1/2") for _ in itertools.count())
+        first_three = list(itertools.islice(engine.process_rows(endless), 3))
+        assert [row[4] for row in first_three] == ["PCF \\1/2"] * 3
+
+    def test_input_rows_are_not_modified(self, engine):
+        """Test that tuples and lists passed in are left untouched."""
+        row = ["1", "1000.0", "2000.0", "100.0", "1/4 PCF"]
+        processed = next(engine.process_rows([row]))
+        assert row[4] == "1/4 PCF"
+        assert processed[4] == "PCF \\1/4"
+
+    def test_headers_and_short_rows_pass_through(self, engine):
+        """Test that rows without a description are yielded unchanged."""
+        rows = [("Point", "Northing", "Easting", "Elevation", "MARKER"), ("1", "1000.0")]
+        assert list(engine.process_rows(rows)) == [list(rows[0]), list(rows[1])]
+
+    def test_layout_is_detected(self, engine):
+        """Test that header rows and the description column are found as files' are."""
+        rows = [("Job 42", "", "", "", "", ""),
+                ("Point", "Northing", "Easting", "Elevation", "Description", "Notes"),
+                ("1", "1000.0", "2000.0", "100.0", "1/4 PCF", "MARKER")]
+        assert list(engine.process_rows(rows)) == [
+            list(rows[0]), list(rows[1]), ["1", "1000.0", "2000.0", "100.0", "PCF \\1/4",
+                                           "MARKER"]]
+        wide = [("Point", "Northing", "Easting", "Elevation", "Layer", "Notes", "Desc"),
+                ("1", "1000.0", "2000.0", "100.0", "V", "x", "1/4 PCF")]
+        assert next(itertools.islice(engine.process_rows(wide), 1, None))[6] == "PCF \\1/4"
+
+    def test_dataframe_column(self, engine):
+        """Test processing a pandas column, including missing values."""
+        column = pd.Series(["OLD_CODE 1/2", None, "MARKER ST"])
+        assert list(engine.process_column(column)) == ["NEW_CODE 1/2", None, "MONUMENT /STREET"]
+
+    def test_shared_between_threads(self, engine):
+        """Test that one engine gives consistent results from many threads."""
+        descriptions = ["PCF 1/2 OLD_CODE", "1/4 PCF TEMP", "PCF TREE BLDG", "MARKER ST SIGN"]
+        expected = [engine.process_description(d) for d in descriptions]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: list(engine.process_column(descriptions)),
+                                        range(200)))
+        assert all(result == expected for result in results)
+
+    def test_cache_can_be_disabled(self, sample_replacement_dict_data, property_corners_data,
+                                   miscellaneous_data):
+        """Test that caching is optional and reported."""
+        uncached = DescriptionEngine(sample_replacement_dict_data, property_corners_data,
+                                     miscellaneous_data, cache_size=0)
+        assert uncached.process_description("PCF 1/2") == "PCF \\1/2"
+        assert uncached.cache_info() is None
+
+        cached = DescriptionEngine(sample_replacement_dict_data, property_corners_data,
+                                   miscellaneous_data)
+        cached.process_description("PCF 1/2")
+        cached.process_description("PCF 1/2")
+        assert cached.cache_info().hits == 1
@@ -0,0 +1,201 @@
+"""Tests for keyindex module."""
+
+import csv
+import gzip
+import json
+import shutil
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import batch
+from description_parser import DescriptionParser
+from keyindex import KeyIndex, index_path
+
+
+DESCRIPTIONS = ["PCF 1/2", "SSMH RIM", "AC PAD", "PLANTER BOX", "TREE", "FC EDGE",
+                "PVR CONC"]
+
+
+@pytest.fixture
+def point_file(tmp_path):
+    """A point file with descriptions that hit some of the dictionary keys."""
+    input_file = tmp_path / "job.csv"
+    with open(input_file, 'w', newline='', encoding='utf8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Point", "Northing", "Easting", "Elevation", "Description"])
+        for number, description in enumerate(DESCRIPTIONS, start=1):
+            writer.writerow([number, "1000.00", "2000.00", "100.00", description])
+    return input_file
+
+
+def write_dictionary(path, dictionary):
+    """Write a replacement dictionary and return its path."""
+    path.write_text(json.dumps(dictionary))
+    return str(path)
+
+
+def full_run_output(point_file, dictionary_path, tmp_path):
+    """Return the preprocessed output of a full run on a copy of the point file."""
+    reference_dir = tmp_path / "reference"
+    reference_dir.mkdir(exist_ok=True)
+    reference = reference_dir / point_file.name
+    shutil.copy(point_file, reference)
+    output = DescriptionParser(dictionary_path, gui_mode=False).process_file(str(reference))
+    return Path(output).read_bytes()
+
+
+class TestKeyIndex:
+    """Test cases for working out affected rows."""
+
+    @pytest.fixture
+    def index(self):
+        """An index of the sample descriptions under a small dictionary."""
+        return KeyIndex.build("hash", DESCRIPTIONS, {"SSMH RIM": "SSMHR", "FC ": "FC /"},
+                              {"SSMH RIM": [1], "FC ": [5]})
+
+    def test_rows_containing(self, index):
+        """Test that candidate rows are found from fragments of the key."""
+        assert index.rows_containing("AC PAD") == {2}
+        assert index.rows_containing("PCF") == {0}
+        assert index.rows_containing("   ") == set(range(len(DESCRIPTIONS)))
+
+    def test_changed_and_removed_keys(self, index):
+        """Test that rows matched by changed or removed keys are affected."""
+        assert index.affected_rows({"SSMH RIM": "MH", "FC ": "FC /"}) == {1}
+        assert index.affected_rows({"FC ": "FC /"}) == {1}
+        assert index.affected_rows({"SSMH RIM": "SSMHR", "FC ": "FC /"}) == set()
+
+    def test_added_keys(self, index):
+        """Test that rows an added key could match are affected."""
+        affected = index.affected_rows({"SSMH RIM": "SSMHR", "FC ": "FC /", "PLANTER": "PLTR"})
+        assert 3 in affected
+        assert 0 not in affected
+
+    def test_added_key_matching_earlier_replacement(self, index):
+        """Test that an added key matching text written by another key is caught."""
+        assert 1 in index.affected_rows({"SSMH RIM": "SSMHR", "FC ": "FC /", "MHR": "X"})
+
+    def test_reordered_keys_need_full_run(self, index):
+        """Test that reordering shared keys is reported as needing a full run."""
+        assert index.affected_rows({"FC ": "FC /", "SSMH RIM": "SSMHR"}) is None
+
+    def test_save_and_load(self, index, tmp_path):
+        """Test that an index survives a round trip through its file."""
+        path = tmp_path / "index.json"
+        index.save(path)
+        loaded = KeyIndex.load(path)
+        assert loaded.matches == index.matches
+        assert loaded.dictionary == index.dictionary
+        assert KeyIndex.load(tmp_path / "missing.json") is None
+
+
+class TestReapplyDictionary:
+    """Test cases for patching outputs after dictionary edits."""
+
+    @pytest.mark.parametrize("edited", [
+        {"SSMH RIM": "SSMHR", "PLANTER": "PLTR", "PVR ": "PVRS /"},
+        {"SSMH RIM": "MH /RIM"},
+        {"SSMH RIM": "SSMHR", "PLANTER": "PLTR", "AC PAD": "HVAC /PAD", "FC ": "FC /"},
+        {"SSMH RIM": "SSMHR", "SSMHR": "SSMH"},
+    ])
+    def test_matches_full_run(self, point_file, tmp_path, edited):
+        """Test that patched outputs are identical to processing in full."""
+        original = write_dictionary(tmp_path / "dict.json",
+                                    {"SSMH RIM": "SSMHR", "PLANTER": "PLTR",
+                                     "PVR ": "PVRS /"})
+        DescriptionParser(original, gui_mode=False).process_file(str(point_file),
+                                                                 build_index=True)
+
+        edited_path = write_dictionary(tmp_path / "edited.json", edited)
+        output_file, rows = DescriptionParser(edited_path, gui_mode=False) \
+            .reapply_dictionary(str(point_file))
+        assert len(rows) < len(DESCRIPTIONS)
+        assert Path(output_file).read_bytes() == full_run_output(point_file, edited_path,
+                                                                 tmp_path)
+
+    @pytest.mark.parametrize("gzip_input", [False, True])
+    def test_compressed_output(self, point_file, tmp_path, gzip_input):
+        """Test that compressed outputs are patched in place, through a partial file."""
+        if gzip_input:
+            compressed = tmp_path / "job.csv.gz"
+            compressed.write_bytes(gzip.compress(point_file.read_bytes()))
+            point_file = compressed
+        original = write_dictionary(tmp_path / "dict.json", {"SSMH RIM": "SSMHR"})
+        DescriptionParser(original, gui_mode=False).process_file(
+            str(point_file), build_index=True, compress=True)
+
+        edited = write_dictionary(tmp_path / "edited.json",
+                                  {"SSMH RIM": "SSMHR", "PLANTER": "PLTR"})
+        output_file, rows = DescriptionParser(edited, gui_mode=False).reapply_dictionary(
+            str(point_file), compress=True)
+        assert Path(output_file) == tmp_path / "preprocessed_job.csv.gz"
+        assert rows
+        assert not list(tmp_path.glob("*.partial"))
+        patched = gzip.decompress(Path(output_file).read_bytes())
+        full = DescriptionParser(edited, gui_mode=False).process_file(str(point_file),
+                                                                      compress=True)
+        assert patched == gzip.decompress(Path(full).read_bytes())
+
+    def test_changed_input_needs_full_run(self, point_file, tmp_path):
+        """Test that an index is not used once the input has changed."""
+        dictionary = write_dictionary(tmp_path / "dict.json", {"PLANTER": "PLTR"})
+        parser = DescriptionParser(dictionary, gui_mode=False)
+        parser.process_file(str(point_file), build_index=True)
+        with open(point_file, 'a', encoding='utf8') as f:
+            f.write("8,1000.00,2000.00,100.00,PLANTER\n")
+        assert parser.reapply_dictionary(str(point_file)) is None
+
+    def test_without_index(self, point_file, tmp_path):
+        """Test that files processed without an index need a full run."""
+        dictionary = write_dictionary(tmp_path / "dict.json", {"PLANTER": "PLTR"})
+        parser = DescriptionParser(dictionary, gui_mode=False)
+        output = parser.process_file(str(point_file))
+        assert not index_path(output).exists()
+        assert parser.reapply_dictionary(str(point_file)) is None
+
+
+class TestBatchKeyIndex:
+    """Test cases for dictionary edits in batch runs."""
+
+    def test_dictionary_edit_patches_outputs(self, point_file, tmp_path,
+                                             property_corners_file, miscellaneous_file):
+        """Test that a dictionary edit patches indexed outputs instead of rerunning."""
+        dictionary = tmp_path / "dict.json"
+        write_dictionary(dictionary, {"SSMH RIM": "SSMHR"})
+        options = dict(dictionary_path=str(dictionary),
+                       property_corners_path=property_corners_file,
+                       miscellaneous_path=miscellaneous_file,
+                       manifest_path=tmp_path / "manifest.jsonl")
+        first = batch.run_batch([point_file], key_index=True, **options)
+        assert first.processed and not first.patched
+
+        write_dictionary(dictionary, {"SSMH RIM": "SSMHR", "PLANTER": "PLTR"})
+        second = batch.run_batch([point_file], key_index=True, **options)
+        assert second.patched == [str(point_file)]
+        patched = (tmp_path / "job_processed.csv").read_bytes()
+
+        batch.run_batch([point_file], force=True, **options)
+        assert (tmp_path / "job_processed.csv").read_bytes() == patched
+
+    def test_compressed_outputs_are_patched(self, point_file, tmp_path, property_corners_file,
+                                            miscellaneous_file):
+        """Test that outputs written with compress are patched after a dictionary edit."""
+        dictionary = tmp_path / "dict.json"
+        write_dictionary(dictionary, {"SSMH RIM": "SSMHR"})
+        options = dict(dictionary_path=str(dictionary),
+                       property_corners_path=property_corners_file,
+                       miscellaneous_path=miscellaneous_file,
+                       manifest_path=tmp_path / "manifest.jsonl", compress=True)
+        batch.run_batch([point_file], key_index=True, **options)
+
+        write_dictionary(dictionary, {"SSMH RIM": "SSMHR", "PLANTER": "PLTR"})
+        second = batch.run_batch([point_file], key_index=True, **options)
+        assert second.patched == [str(point_file)]
+        patched = gzip.decompress((tmp_path / "job_processed.csv.gz").read_bytes())
+
+        batch.run_batch([point_file], force=True, **options)
+        assert gzip.decompress((tmp_path / "job_processed.csv.gz").read_bytes()) == patched
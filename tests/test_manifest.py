@@ -0,0 +1,106 @@
+"""Tests for manifest module."""
+
+import json
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from manifest import Manifest, config_fingerprint, file_sha256
+
+
+class TestManifestHelpers:
+    """Test cases for hashing helpers."""
+
+    def test_file_sha256_changes_with_content(self, tmp_path):
+        """Test that the content hash follows the file bytes."""
+        point_file = tmp_path / "points.csv"
+        point_file.write_text("1,1000.0,2000.0,100.0,PCF 1/2\n")
+        first = file_sha256(point_file)
+        assert first == file_sha256(point_file)
+
+        point_file.write_text("1,1000.0,2000.0,100.0,PCF 3/4\n")
+        assert file_sha256(point_file) != first
+
+    def test_config_fingerprint_depends_on_dictionary_order(self):
+        """Test that reordering replacements changes the fingerprint."""
+        first = config_fingerprint({"A": "B", "C": "D"}, ["pcf"], ["TREE"])
+        second = config_fingerprint({"C": "D", "A": "B"}, ["pcf"], ["TREE"])
+        assert first != second
+        assert first == config_fingerprint({"A": "B", "C": "D"}, ["pcf"], ["TREE"])
+
+    def test_config_fingerprint_depends_on_code_lists(self):
+        """Test that code list changes change the fingerprint."""
+        first = config_fingerprint({"A": "B"}, ["pcf"], ["TREE"])
+        assert first != config_fingerprint({"A": "B"}, ["pcf", "ptf"], ["TREE"])
+
+    def test_config_fingerprint_depends_on_options(self):
+        """Test that run options change the fingerprint, whatever their order."""
+        first = config_fingerprint({"A": "B"}, ["pcf"], ["TREE"], {"compress": False})
+        assert first != config_fingerprint({"A": "B"}, ["pcf"], ["TREE"], {"compress": True})
+        assert config_fingerprint({}, [], [], {"a": 1, "b": 2}) == \
+            config_fingerprint({}, [], [], {"b": 2, "a": 1})
+
+
+class TestManifest:
+    """Test cases for the Manifest class."""
+
+    @pytest.fixture
+    def processed_file(self, tmp_path):
+        """Create an input file and a matching output file."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_text("1,1000.0,2000.0,100.0,PCF 1/2\n")
+        output_file = tmp_path / "points_processed.csv"
+        output_file.write_text("1,1000.0,2000.0,100.0,PCF \\1/2\n")
+        return input_file, output_file
+
+    def test_record_and_reload(self, tmp_path, processed_file):
+        """Test that recorded entries survive a reload."""
+        input_file, output_file = processed_file
+        manifest_path = tmp_path / "manifest.jsonl"
+
+        manifest = Manifest(manifest_path)
+        manifest.record(input_file, "abc", "cfg", output_file)
+
+        reloaded = Manifest(manifest_path)
+        entry = reloaded.lookup(input_file)
+        assert entry["sha256"] == "abc"
+        assert entry["config"] == "cfg"
+        assert reloaded.is_current(input_file, "abc", "cfg")
+
+    def test_is_current_requires_matching_hash_config_and_output(self, tmp_path, processed_file):
+        """Test each condition that forces a file to be reprocessed."""
+        input_file, output_file = processed_file
+        manifest = Manifest(tmp_path / "manifest.jsonl")
+        manifest.record(input_file, "abc", "cfg", output_file)
+
+        assert not manifest.is_current(input_file, "changed", "cfg")
+        assert not manifest.is_current(input_file, "abc", "changed")
+        output_file.unlink()
+        assert not manifest.is_current(input_file, "abc", "cfg")
+
+    def test_last_record_wins_and_compact(self, tmp_path, processed_file):
+        """Test that later lines supersede earlier ones and compaction drops them."""
+        input_file, output_file = processed_file
+        manifest_path = tmp_path / "manifest.jsonl"
+        manifest = Manifest(manifest_path)
+        for digest in ("one", "two", "three"):
+            manifest.record(input_file, digest, "cfg", output_file)
+
+        manifest.compact()
+
+        lines = manifest_path.read_text().splitlines()
+        assert len(lines) == 1
+        assert json.loads(lines[0])["sha256"] == "three"
+
+    def test_bad_lines_are_ignored(self, tmp_path, processed_file):
+        """Test that a damaged line does not prevent loading the rest."""
+        input_file, output_file = processed_file
+        manifest_path = tmp_path / "manifest.jsonl"
+        Manifest(manifest_path).record(input_file, "abc", "cfg", output_file)
+        with open(manifest_path, 'a', encoding='utf-8') as f:
+            f.write("{not json\n")
+
+        assert Manifest(manifest_path).lookup(input_file)["sha256"] == "abc"
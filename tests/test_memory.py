@@ -0,0 +1,173 @@
+"""Tests for memory module."""
+
+import csv
+import gzip
+import json
+import numpy as np
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import batch
+import memory
+import parser3
+from description_parser import DescriptionParser, common_dtype
+from memory import (MemoryBudget, PeakMemory, format_size, parse_size, read_spilled,
+                    sorted_spilled, spill)
+
+
+DESCRIPTIONS = ["1/2 PCF", '1/2" IRF CAP', "PLANTER BOX", "SSMH", "TREE"]
+
+
+def write_job(path, rows=3000):
+    """Write a point file whose columns change type part of the way through."""
+    with (gzip.open(path, 'wt', newline='', encoding='utf8') if path.suffix == '.gz'
+          else open(path, 'w', newline='', encoding='utf8')) as f:
+        writer = csv.writer(f)
+        writer.writerow(["Point", "Northing", "Easting", "Elevation", "Description"])
+        for number in range(1, rows + 1):
+            writer.writerow([str(number) if number % 997 else f"CP{number}",
+                             f"{1000 + number / 8}" if number % 1500 else "",
+                             "2000.25", "100" if number < 2500 else "100.5",
+                             DESCRIPTIONS[number % len(DESCRIPTIONS)]])
+
+
+def read_output(path):
+    """Return the contents of an output, decompressed if need be."""
+    return gzip.decompress(path.read_bytes()) if path.suffix == '.gz' else path.read_bytes()
+
+
+class TestSizes:
+    """Test cases for reading and printing memory sizes."""
+
+    @pytest.mark.parametrize("text, size", [("512M", 512 * 1024 ** 2), ("4G", 4 * 1024 ** 3),
+                                            ("1.5gb", int(1.5 * 1024 ** 3)),
+                                            ("2 GiB", 2 * 1024 ** 3), ("1048576", 1048576)])
+    def test_parse_size(self, text, size):
+        """Test the units a budget can be given in."""
+        assert parse_size(text) == size
+
+    def test_parse_size_invalid(self):
+        """Test that anything else is rejected."""
+        with pytest.raises(ValueError):
+            parse_size("lots")
+
+    def test_format_size(self):
+        """Test that sizes are printed in the largest whole unit."""
+        assert format_size(1536 * 1024 ** 2) == "1.5 GB"
+        assert format_size(100) == "100 B"
+
+
+class TestMemoryBudget:
+    """Test cases for sizing work to the memory left."""
+
+    def test_capacity(self, monkeypatch):
+        """Test that half of the headroom is planned for, within the bounds given."""
+        monkeypatch.setattr(memory, "resident_size", lambda: 600)
+        budget = MemoryBudget(1000)
+        assert budget.headroom() == 400
+        assert budget.capacity(2, least=1) == 100
+        assert budget.capacity(2, most=10) == 10
+        assert budget.capacity(1000) == memory.MIN_ITEMS
+        assert budget.fits(200) and not budget.fits(201)
+
+    def test_invalid_budget(self):
+        """Test that a budget must be positive."""
+        with pytest.raises(ValueError):
+            MemoryBudget(0)
+
+    def test_peak_memory(self):
+        """Test that memory allocated inside the with block is seen in the peak."""
+        peak = PeakMemory()
+        with peak:
+            block = np.ones(64 * 1024 ** 2 // 8)
+            del block
+        assert peak.peak >= 64 * 1024 ** 2
+        assert "of 1.0 TB budget" in peak.summary(MemoryBudget(1024 ** 4))
+
+
+class TestSpill:
+    """Test cases for sorting more items than are held in memory."""
+
+    def test_round_trip(self):
+        """Test that spilled items are read back in order."""
+        items = [("PCF", 3, [1, 2]), ("SSMH", 1, [7])]
+        assert list(read_spilled(spill(items))) == items
+
+    @pytest.mark.parametrize("max_items", [1, 7, 1000])
+    def test_sorted_spilled(self, max_items):
+        """Test that items come out sorted however many runs they were spilled in."""
+        items = [(number * 7919) % 101 for number in range(100)]
+        assert list(sorted_spilled(items, key=lambda item: -item,
+                                   max_items=max_items)) == sorted(items, reverse=True)
+
+
+class TestBoundedStages:
+    """Test cases for running both stages within a memory budget."""
+
+    @pytest.fixture
+    def small_budget(self, monkeypatch):
+        """Leave the budget room for only a thousand rows at a time."""
+        monkeypatch.setattr(MemoryBudget, "headroom", lambda self: 64 * 1024)
+
+    @pytest.fixture
+    def dictionary(self, tmp_path):
+        """A small replacement dictionary."""
+        dictionary = tmp_path / "dict.json"
+        dictionary.write_text(json.dumps({"PLANTER": "PLTR", "TREE": "TR"}))
+        return str(dictionary)
+
+    def test_common_dtype(self):
+        """Test that chunk dtypes combine the way pandas combines its own chunks."""
+        assert common_dtype(np.dtype('int64'), np.dtype('float64')) == np.dtype('float64')
+        assert common_dtype(np.dtype('int64'), np.dtype('O')) == np.dtype('O')
+        assert common_dtype(np.dtype('bool'), np.dtype('float64')) == np.dtype('O')
+
+    @pytest.mark.parametrize("name", ["job.csv", "job.csv.gz"])
+    @pytest.mark.parametrize("pipeline", [False, True])
+    def test_replace_stage_in_chunks(self, tmp_path, dictionary, small_budget, name,
+                                     pipeline):
+        """Test that a file read in chunks is written as it is when read in one go."""
+        input_file = tmp_path / name
+        write_job(input_file)
+        output_file = DescriptionParser(dictionary, gui_mode=False).process_file(
+            str(input_file))
+        expected = read_output(output_file)
+
+        parser = DescriptionParser(dictionary, gui_mode=False, pipeline=pipeline,
+                                   memory_budget=MemoryBudget(1024 ** 3))
+        assert parser._chunk_rows(str(input_file), parser3.sniff_file(input_file)) == 1000
+        parser.process_file(str(input_file), build_index=True, checkpoint_rows=700)
+        assert read_output(output_file) == expected
+        assert not Path(f"{output_file}.keyindex.json").exists()
+
+    def test_header_only_file(self, tmp_path, dictionary, small_budget):
+        """Test that a file without rows is not streamed."""
+        input_file = tmp_path / "job.csv"
+        input_file.write_text("Point,Northing,Easting,Elevation,Description\n")
+        parser = DescriptionParser(dictionary, gui_mode=False,
+                                   memory_budget=MemoryBudget(1024 ** 3))
+        assert parser.process_file(str(input_file)).read_text() == input_file.read_text()
+
+    @pytest.mark.parametrize("engine", parser3.ENGINES)
+    def test_batch_within_budget(self, tmp_path, dictionary, property_corners_file,
+                                 miscellaneous_file, small_budget, engine):
+        """Test that a budgeted batch run writes the same outputs and reports its peaks."""
+        options = dict(dictionary_path=dictionary, property_corners_path=property_corners_file,
+                       miscellaneous_path=miscellaneous_file, engine=engine,
+                       report_unknown=True, force=True)
+        outputs = []
+        for max_memory in (None, 1024 ** 3):
+            job_dir = tmp_path / str(max_memory)
+            job_dir.mkdir()
+            write_job(job_dir / "job.csv")
+            report = batch.run_batch([job_dir], max_memory=max_memory,
+                                     manifest_path=job_dir / "manifest.jsonl", **options)
+            assert report.failed == []
+            outputs.append([path.read_bytes() for path in sorted(job_dir.glob("job_*"))])
+        assert outputs[0] == outputs[1]
+        assert set(report.memory) == {'replace', 'format'}
+        assert all(peak.peak > 0 for peak in report.memory.values())
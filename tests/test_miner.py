@@ -0,0 +1,179 @@
+"""Tests for miner module."""
+
+import csv
+import gzip
+import json
+import zipfile
+import pytest
+from collections import Counter
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import parser3
+from miner import (CountMinSketch, HeavyHitters, candidate_keys, main, mine_archive,
+                   mine_files, rank_candidates)
+from suggest import SuggestionIndex
+
+
+def write_points(path, descriptions):
+    """Write a point file with one row per description."""
+    with open(path, 'w', newline='', encoding='utf8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Point", "Northing", "Easting", "Elevation", "Description"])
+        for number, description in enumerate(descriptions, start=1):
+            writer.writerow([number, "1000.0", "2000.0", "100.0", description])
+
+
+@pytest.fixture
+def catalog(property_corners_data, miscellaneous_data):
+    """The shared sample code lists, compiled."""
+    return parser3.CodeCatalog(property_corners_data, miscellaneous_data)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """A small archive with known counts of unknown codes."""
+    jobs = tmp_path / "jobs"
+    (jobs / "2023").mkdir(parents=True)
+    write_points(jobs / "2023" / "a.csv", ["PFC 1/2"] * 5 + ["PCF 1/2", "MANHOLE RIM"])
+    write_points(jobs / "b.txt", ["PFC 5/8"] * 3 + ["HYD"] + ["MANHOLE RIM"] * 2)
+    write_points(jobs / "b_processed.txt", ["IGNORED"] * 50)
+    return jobs
+
+
+class TestCountMinSketch:
+    """Test cases for the sketch."""
+
+    def test_estimates_never_undercount(self):
+        """Test that estimates are at least the true counts, even in a tiny sketch."""
+        sketch = CountMinSketch(width=16, depth=3)
+        counts = Counter(f"CODE{i % 40}" for i in range(1000) if i % 7)
+        for key, count in counts.items():
+            sketch.add(key, count)
+        assert all(sketch.estimate(key) >= count for key, count in counts.items())
+        assert sketch.total == sum(counts.values())
+
+    def test_merge_matches_single_sketch(self):
+        """Test that merged sketches equal one sketch fed with all the keys."""
+        single, first, second = (CountMinSketch(64, 2) for _ in range(3))
+        for i in range(200):
+            key = f"K{i % 13}"
+            single.add(key)
+            (first if i % 2 else second).add(key)
+        first.merge(second)
+        assert first.rows == single.rows
+
+    def test_merge_rejects_other_dimensions(self):
+        """Test that sketches of different sizes cannot be merged."""
+        with pytest.raises(ValueError):
+            CountMinSketch(64, 2).merge(CountMinSketch(32, 2))
+
+
+class TestHeavyHitters:
+    """Test cases for the heavy hitter tracker."""
+
+    def test_keeps_heaviest_keys_within_capacity(self):
+        """Test that frequent keys survive pruning of a long tail of rare keys."""
+        hitters = HeavyHitters(CountMinSketch(1024, 4), capacity=5)
+        for i in range(2000):
+            hitters.add(f"RARE{i}")
+            if i % 4 == 0:
+                hitters.add("HEAVY")
+        assert len(hitters.examples) <= 10
+        assert hitters.top(1) == [("HEAVY", 500)]
+
+    def test_examples_are_limited(self):
+        """Test that examples stop being requested once a key has enough."""
+        hitters = HeavyHitters(CountMinSketch(64, 2))
+        for i in range(10):
+            examples = hitters.add("PFC")
+            if examples is not None:
+                examples.append(i)
+        assert hitters.examples["PFC"] == [0, 1, 2]
+
+
+class TestMining:
+    """Test cases for mining point files."""
+
+    def test_candidate_keys(self, catalog):
+        """Test that unknown codes are counted with their phrase and known codes are not."""
+        assert candidate_keys("MANHOLE RIM", catalog) == ["MANHOLE", "MANHOLE RIM"]
+        assert candidate_keys("1/2 PFC", catalog) == ["PFC", "1/2 PFC"]
+        assert candidate_keys("HYD", catalog) == ["HYD"]
+        assert candidate_keys("PCF 1/2", catalog) == []
+
+    def test_mine_files(self, archive, catalog):
+        """Test counts and example rows from a single file."""
+        hitters = mine_files([str(archive / "2023" / "a.csv")], catalog)
+        assert dict(hitters.top(2)) == {"PFC": 5, "PFC 1/2": 5}
+        assert hitters.examples["MANHOLE"][0].endswith(":8: 7,1000.0,2000.0,100.0,MANHOLE RIM")
+
+    def test_compressed_files(self, archive, tmp_path, catalog):
+        """Test that gzip files and the point files inside zip archives are mined."""
+        plain = archive / "2023" / "a.csv"
+        compressed = tmp_path / "compressed"
+        compressed.mkdir()
+        (compressed / "a.csv.gz").write_bytes(gzip.compress(plain.read_bytes()))
+        with zipfile.ZipFile(compressed / "crew.zip", 'w') as crew:
+            crew.write(plain, "day1/a.csv")
+            crew.writestr("day1/photo.jpg", b"\xff\xd8")
+        hitters = mine_files([str(compressed / "a.csv.gz"), str(compressed / "crew.zip")],
+                             catalog)
+        assert dict(hitters.top(2)) == {"PFC": 10, "PFC 1/2": 10}
+        assert hitters.examples["MANHOLE"][1].startswith(
+            f"{compressed / 'crew.zip' / 'day1/a.csv'}:8: ")
+
+    def test_sniffed_layout(self, tmp_path, catalog):
+        """Test that files in other encodings, dialects and layouts are mined."""
+        input_file = tmp_path / "job.csv"
+        input_file.write_bytes("Job;Caf\u00e9\r\nPoint;Northing;Easting;Elevation;Layer;Desc\r\n"
+                               "1;1000.0;2000.0;100.0;HYD;PFC 1/2\r\n"
+                               "2;1001.0;2001.0;101.0;V;MANHOLE \u00e9\r\n".encode('cp1252'))
+        hitters = mine_files([str(input_file)], catalog)
+        assert dict(hitters.top(10)) == {"PFC": 1, "PFC 1/2": 1, "MANHOLE": 1,
+                                         "MANHOLE \u00e9": 1}
+        assert hitters.examples["PFC"] == [
+            f"{input_file}:3: 1;1000.0;2000.0;100.0;HYD;PFC 1/2"]
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_mine_archive(self, archive, property_corners_data, miscellaneous_data, workers):
+        """Test that the archive is mined in full, with or without worker processes."""
+        hitters = mine_archive([archive], property_corners_data, miscellaneous_data,
+                               workers=workers)
+        counts = dict(hitters.top(10))
+        assert counts["PFC"] == 8
+        assert counts["MANHOLE RIM"] == 3
+        assert counts["HYD"] == 1
+        assert "IGNORED" not in counts
+
+    def test_rank_candidates(self, archive, property_corners_data, miscellaneous_data):
+        """Test that existing dictionary keys are left out and suggestions are added."""
+        hitters = mine_archive([archive], property_corners_data, miscellaneous_data,
+                               workers=1)
+        index = SuggestionIndex(property_corners_data + miscellaneous_data)
+        rows = rank_candidates(hitters, {"PFC ": "PCF"}, index, top=3)
+        assert [row[:2] for row in rows] == [["PFC 1/2", 5], ["MANHOLE", 3],
+                                             ["MANHOLE RIM", 3]]
+
+        rows = rank_candidates(hitters, suggestion_index=index, top=1)
+        assert rows[0][:2] == ["PFC", 8]
+        assert rows[0][2].startswith("PCF (1)")
+
+    def test_main_writes_candidates(self, archive, tmp_path, property_corners_file,
+                                    miscellaneous_file, capsys):
+        """Test the command line writes a ranked candidate file."""
+        dictionary = tmp_path / "dict.json"
+        dictionary.write_text(json.dumps({"HYD": "FH"}))
+        output = tmp_path / "candidates.csv"
+        assert main([str(archive), "--dictionary", str(dictionary), "--output", str(output),
+                     "--property-corners", property_corners_file,
+                     "--miscellaneous", miscellaneous_file, "--workers", "1"]) == 0
+        with open(output, newline='', encoding='utf8') as f:
+            rows = list(csv.reader(f))
+        assert rows[0] == ["Candidate", "Estimated Count", "Suggestions", "Examples"]
+        assert rows[1][:2] == ["PFC", "8"]
+        assert "HYD" not in [row[0] for row in rows]
+        assert "Wrote" in capsys.readouterr().out
@@ -1,5 +1,6 @@
 """Tests for parser3 module."""
 
+import threading
 import pytest
 import csv
 import tempfile
@@ -329,3 +330,210 @@ class TestParser3Main:
         # so this test documents the current behavior
         with pytest.raises(Exception):
             parser3.main()
+
+
+class TestParser3Incremental:
+    """Test cases for incremental processing of growing files."""
+
+    PROPERTY_CODES = ["PCF", "PTF", "RBC"]
+    MISC_CODES = ["TREE", "SIGN", "MARKER"]
+
+    def write_rows(self, path, rows, mode='w'):
+        """Write rows to a CSV file."""
+        with open(path, mode, newline='', encoding='utf8') as f:
+            csv.writer(f).writerows(rows)
+
+    def test_format_row_leaves_header_unchanged(self):
+        """Test that header rows are passed through."""
+        header = ["Point", "Northing", "Easting", "Elevation", "Description"]
+        assert parser3.format_row(list(header), parser3.CodeCatalog(["PCF"], ["TREE"])) == header
+
+    def test_format_row_applies_rules(self):
+        """Test that a data row is formatted."""
+        row = ["1", "1000.00", "2000.00", "100.00", "1/2  PCF"]
+        assert parser3.format_row(row, parser3.CodeCatalog(["PCF"], ["TREE"]))[4] == "PCF \\1/2"
+
+    def test_code_catalog_matches_number_of_codes(self):
+        """Test that the compiled catalog counts codes like number_of_codes."""
+        catalog = parser3.CodeCatalog(["pcf", "ptf"], ["TREE", "Sign"])
+        for items in (["PCF", "TREE"], ["x", "sign"], ["Ptf"], ["a", "b"], []):
+            assert catalog.number_of_codes(items) == parser3.number_of_codes(
+                items, ["pcf", "ptf"], ["TREE", "Sign"])
+
+    def test_appended_rows_match_full_run(self, tmp_path):
+        """Test that incremental output equals a full run over the grown file."""
+        input_file = tmp_path / "points.csv"
+        self.write_rows(input_file, [
+            ["Point", "Northing", "Easting", "Elevation", "Description"],
+            ["1", "1000.00", "2000.00", "100.00", "PCF 1/2"],
+        ])
+        output_file = parser3.process_file(str(input_file), self.PROPERTY_CODES,
+                                           self.MISC_CODES, gui_mode=False, incremental=True)
+
+        self.write_rows(input_file, [
+            ["2", "1001.00", "2001.00", "101.00", "1/4 PCF"],
+            ["3", "1002.00", "2002.00", "102.00", "PCF TREE"],
+        ], mode='a')
+        with patch('parser3.format_row', wraps=parser3.format_row) as mock_format:
+            parser3.process_file(str(input_file), self.PROPERTY_CODES, self.MISC_CODES,
+                                 gui_mode=False, incremental=True)
+        assert mock_format.call_count == 2
+        incremental_output = Path(output_file).read_bytes()
+
+        parser3.process_file(str(input_file), self.PROPERTY_CODES, self.MISC_CODES,
+                             gui_mode=False)
+        assert Path(output_file).read_bytes() == incremental_output
+
+    def test_changed_prefix_reprocesses_everything(self, tmp_path):
+        """Test that an edited earlier row triggers a full run."""
+        input_file = tmp_path / "points.csv"
+        self.write_rows(input_file, [["1", "1000.00", "2000.00", "100.00", "PCF 1/2"]])
+        output_file = parser3.process_file(str(input_file), self.PROPERTY_CODES,
+                                           self.MISC_CODES, gui_mode=False, incremental=True)
+
+        self.write_rows(input_file, [["1", "1000.00", "2000.00", "100.00", "PCF 3/4"],
+                                     ["2", "1001.00", "2001.00", "101.00", "PCF 1"]])
+        parser3.process_file(str(input_file), self.PROPERTY_CODES, self.MISC_CODES,
+                             gui_mode=False, incremental=True)
+
+        with open(output_file, newline='', encoding='utf8') as f:
+            descriptions = [row[4] for row in csv.reader(f)]
+        assert descriptions == ["PCF \\3/4", "PCF \\1"]
+
+    def test_partial_last_row_waits_for_next_run(self, tmp_path):
+        """Test that a row still being written is not processed."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_text("1,1000.00,2000.00,100.00,PCF 1/2\r\n2,1001.00,20",
+                              encoding='utf8', newline='')
+        output_file = parser3.process_file(str(input_file), self.PROPERTY_CODES,
+                                           self.MISC_CODES, gui_mode=False, incremental=True)
+        with open(input_file, 'a', encoding='utf8', newline='') as f:
+            f.write("01.00,101.00,1/4 PCF\r\n")
+        parser3.process_file(str(input_file), self.PROPERTY_CODES, self.MISC_CODES,
+                             gui_mode=False, incremental=True)
+
+        with open(output_file, newline='', encoding='utf8') as f:
+            descriptions = [row[4] for row in csv.reader(f)]
+        assert descriptions == ["PCF \\1/2", "PCF \\1/4"]
+
+    def test_last_row_without_newline(self, tmp_path):
+        """Test that a last row without a newline is written, and redone if it grows."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_text("1,1000.00,2000.00,100.00,PCF 1/2\r\n2,1001.00,2001.00,101.00,1/4",
+                              encoding='utf8', newline='')
+        output_file = parser3.process_file(str(input_file), self.PROPERTY_CODES,
+                                           self.MISC_CODES, gui_mode=False, incremental=True)
+        with open(output_file, newline='', encoding='utf8') as f:
+            assert [row[0] for row in csv.reader(f)] == ["1", "2"]
+
+        with open(input_file, 'a', encoding='utf8', newline='') as f:
+            f.write(" PCF\r\n3,1002.00,2002.00,102.00,PCF TREE")
+        parser3.process_file(str(input_file), self.PROPERTY_CODES, self.MISC_CODES,
+                             gui_mode=False, incremental=True)
+        incremental_output = Path(output_file).read_bytes()
+        parser3.process_file(str(input_file), self.PROPERTY_CODES, self.MISC_CODES,
+                             gui_mode=False)
+        assert Path(output_file).read_bytes() == incremental_output
+        assert b"PCF \\1/4" in incremental_output
+
+    def test_growing_last_row_waits(self, tmp_path):
+        """Test that a last row without a newline is left alone while the file grows."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_text("1,1000.00,2000.00,100.00,PCF 1/2\r\n2,1001.00,20",
+                              encoding='utf8', newline='')
+        output_file = parser3.process_file(str(input_file), self.PROPERTY_CODES,
+                                           self.MISC_CODES, gui_mode=False, incremental=True,
+                                           input_size=10)
+        with open(output_file, newline='', encoding='utf8') as f:
+            assert [row[0] for row in csv.reader(f)] == ["1"]
+
+
+class TestTokenTable:
+    """Test cases for the interned item encoding used by the formatting rules."""
+
+    @pytest.fixture
+    def catalog(self):
+        """A small catalog; 1 is both a size and a miscellaneous code."""
+        return parser3.CodeCatalog(["PCF", "IRF"], ["EP", "SIGN", "1"])
+
+    def test_round_trip(self, catalog):
+        """Test that descriptions are encoded as 16 bit IDs and decoded unchanged."""
+        items = "PCF  \\1/2 CAP PCF".split()
+        encoded = catalog.tokens.encode(items)
+        assert encoded.typecode == 'H'
+        assert encoded[0] == encoded[3]
+        assert catalog.tokens.decode(encoded) == "PCF \\1/2 CAP PCF"
+
+    def test_items_are_classified_once(self, catalog):
+        """Test the flags of interned items."""
+        table = catalog.tokens
+        flags = {item: table.flags[table.intern(item)]
+                 for item in ("pcf", "EP", "1", "\\1/2", "/CAP", "Tree")}
+        assert flags["pcf"] == parser3.PROPERTY_CODE
+        assert flags["EP"] == parser3.MISC_CODE
+        assert flags["1"] == parser3.MISC_CODE | parser3.SIZE
+        assert flags["\\1/2"] == parser3.SIZE | parser3.BACKSLASH
+        assert flags["/CAP"] == parser3.SLASH
+        assert flags["Tree"] == parser3.TREE
+        parser3.format_description("PCF 1/2", catalog)
+        with patch('parser3.item_is_size') as mock_is_size:
+            parser3.format_description("PCF 1/2", catalog)
+            parser3.format_description("PCF \\1/2", catalog)
+        mock_is_size.assert_not_called()
+
+    @pytest.mark.parametrize("description,expected", [
+        ("PCF 1/2", "PCF \\1/2"),
+        ("1/2 pcf", "pcf \\1/2"),
+        ("PCF CAP", "PCF /CAP"),
+        ("EP CAP", "EP /CAP"),
+        ("PCF EP 1/2", "EP PCF \\1/2"),
+        ("EP PCF CAP", "EP PCF /CAP"),
+        ("PCF tree 1/2", "PCF tree 1/2"),
+        ("  PCF   1/2 ", "PCF \\1/2"),
+        ("CAP", "CAP"),
+        ("", ""),
+    ])
+    def test_rules(self, catalog, description, expected):
+        """Test the formatting rules on encoded descriptions."""
+        assert parser3.format_description(description, catalog) == expected
+
+    def test_full_table_is_replaced(self, catalog, monkeypatch):
+        """Test that a full table is swapped for a new one instead of overflowing."""
+        monkeypatch.setattr(parser3, 'MAX_TOKENS', 8)
+        first_table = catalog.tokens
+        results = [parser3.format_description(f"PCF 1/{i}", catalog) for i in range(20)]
+        assert results == [f"PCF \\1/{i}" for i in range(20)]
+        assert catalog.tokens is not first_table
+        assert len(catalog.tokens.tokens) <= 8
+
+    def test_table_filled_by_other_threads(self, catalog, monkeypatch):
+        """Test that a table filled after its room was checked raises instead of overflowing."""
+        monkeypatch.setattr(parser3, 'MAX_TOKENS', 8)
+        first, second = catalog.token_table(4), catalog.token_table(4)
+        assert first is second
+        first.encode(["A", "B", "C", "D", "E"])
+        with pytest.raises(parser3.TableFull):
+            second.encode(["F", "G", "H", "I"])
+        assert len(first.tokens) == 8
+        assert parser3.format_description("PCF 1/2", catalog) == "PCF \\1/2"
+        assert catalog.tokens is not first
+
+    def test_shared_between_threads(self, catalog, monkeypatch):
+        """Test that threads sharing a catalog never fill a table past MAX_TOKENS."""
+        monkeypatch.setattr(parser3, 'MAX_TOKENS', 16)
+        tables = []
+
+        def format_many(thread):
+            for number in range(300):
+                description = f"PCF {thread}/{number} X{number}"
+                assert parser3.format_description(description, catalog) == \
+                    f"PCF \\{thread}/{number} X{number}"
+                tables.append(catalog.tokens)
+
+        threads = [threading.Thread(target=format_many, args=(thread,)) for thread in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(tables) == 2400
+        assert max(len(table.tokens) for table in tables) <= 16
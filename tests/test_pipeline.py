@@ -0,0 +1,224 @@
+"""Tests for pipeline module."""
+
+import csv
+import gzip
+import io
+import json
+import time
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import batch
+import parser3
+from description_parser import DescriptionParser
+from pipeline import (PipelineStats, QueueStats, ReadAhead, StageQueue, WriteBehind,
+                      open_read_ahead)
+
+
+DESCRIPTIONS = ["1/2 PCF", '1/2" IRF CAP', "PLANTER BOX", "PCF, NOTE", "SSMH", "TREE"]
+
+
+class SlowFile(io.StringIO):
+    """A text file that takes a while over every write."""
+
+    def write(self, text):
+        time.sleep(0.02)
+        return super().write(text)
+
+
+class FailingFile(io.BytesIO):
+    """A file that fails on every read and write."""
+
+    def read(self, size=-1):
+        raise OSError("network path not found")
+
+    def write(self, data):
+        raise OSError("disk full")
+
+
+class TestReadAhead:
+    """Test cases for reading a file ahead from a background thread."""
+
+    def test_reads_every_byte(self):
+        """Test that small blocks come back in order, as one stream."""
+        data = bytes(range(256)) * 100
+        with io.BufferedReader(ReadAhead(io.BytesIO(data), block_size=1000, depth=2)) as f:
+            assert f.read() == data
+
+    def test_start_and_limit(self, tmp_path):
+        """Test that a byte range of a file can be read."""
+        path = tmp_path / "job.csv"
+        path.write_bytes(b"0123456789")
+        stats = QueueStats()
+        with open_read_ahead(path, 2, 5, stats) as f:
+            assert f.read() == b"23456"
+        assert stats.items == 1
+
+    def test_read_error_raised(self):
+        """Test that an error in the read-ahead thread reaches the reader."""
+        with io.BufferedReader(ReadAhead(FailingFile())) as f:
+            with pytest.raises(OSError, match="network path"):
+                f.read()
+
+    def test_close_stops_thread(self):
+        """Test that closing the stream early stops a thread waiting on a full queue."""
+        reader = ReadAhead(io.BytesIO(b"x" * 100), block_size=1, depth=1)
+        reader.close()
+        assert not reader._thread.is_alive()
+        assert reader.raw.closed
+
+
+class TestWriteBehind:
+    """Test cases for writing from a background thread."""
+
+    def test_order_kept(self):
+        """Test that writes reach the file in the order they were made."""
+        output = io.StringIO()
+        with WriteBehind(output, depth=2) as writer:
+            for number in range(100):
+                writer.write(f"{number},")
+        assert output.getvalue() == ''.join(f"{number}," for number in range(100))
+        assert writer.stats.items == 100
+        assert writer.stats.max_depth <= 2
+
+    def test_write_error_raised(self):
+        """Test that a failed write is raised again on the caller's thread."""
+        writer = WriteBehind(FailingFile())
+        with pytest.raises(OSError, match="disk full"):
+            writer.write(b"1")
+            writer.close()
+
+    def test_sync(self):
+        """Test that sync returns once everything written so far is in the file."""
+        output = SlowFile()
+        with WriteBehind(output) as writer:
+            writer.write("1,")
+            writer.write("2,")
+            writer.sync()
+            assert output.getvalue() == "1,2,"
+            writer.write("3,")
+        assert output.getvalue() == "1,2,3,"
+        assert writer.stats.items == 3
+
+    def test_abort(self):
+        """Test that an error in the with block stops the thread without waiting."""
+        with pytest.raises(ValueError):
+            with WriteBehind(SlowFile()) as writer:
+                writer.write("1")
+                raise ValueError("formatting failed")
+        assert writer._thread is None
+
+
+class TestPipelineStats:
+    """Test cases for finding the bottleneck from queue statistics."""
+
+    def test_slow_writer(self):
+        """Test that a writer the processing thread waits on is the bottleneck."""
+        started = time.perf_counter()
+        with WriteBehind(SlowFile(), depth=1) as writer:
+            for _ in range(6):
+                writer.write("row\n")
+        stats = PipelineStats(write=writer.stats, seconds=time.perf_counter() - started)
+        assert stats.stalls()['process'] > stats.stalls()['write']
+        assert stats.bottleneck() == 'write'
+
+    def test_slow_processing(self):
+        """Test that processing the reader and writer wait on is the bottleneck."""
+        stats = PipelineStats()
+        started = time.perf_counter()
+        with open_read_ahead(__file__, stats=stats.read) as source, \
+                WriteBehind(io.BytesIO(), stats=stats.write) as writer:
+            for _ in range(3):
+                time.sleep(0.05)
+                writer.write(source.read(100))
+        stats.seconds = time.perf_counter() - started
+        assert stats.bottleneck() == 'process'
+        assert "bottleneck: process" in stats.summary()
+
+    def test_add(self):
+        """Test that statistics add up over files."""
+        total = PipelineStats()
+        total.add(PipelineStats(read=QueueStats(2, 3, 5, 0.5, 1.0, 0.25), seconds=2.0))
+        total.add(PipelineStats(read=QueueStats(2, 1, 1, 0.5, 1.0, 0.25), seconds=2.0))
+        assert total.read == QueueStats(4, 3, 6, 1.0, 2.0, 0.5)
+        assert total.busy() == {'read': 0.5, 'process': 2.0, 'write': 0.0}
+        assert total.read.mean_depth == 1.5
+        assert PipelineStats().bottleneck() is None
+
+    def test_queue_depth(self):
+        """Test that the depth is recorded after each put."""
+        queue = StageQueue(depth=3)
+        for number in range(3):
+            queue.put(number)
+        assert [queue.get() for _ in range(3)] == [0, 1, 2]
+        assert (queue.stats.items, queue.stats.max_depth, queue.stats.depth_total) == (3, 3, 6)
+
+
+class TestPipelinedStages:
+    """Test cases for running both stages pipelined."""
+
+    @pytest.fixture
+    def options(self, tmp_path, property_corners_file, miscellaneous_file):
+        """Batch options with a small dictionary and a manifest outside the data."""
+        dictionary = tmp_path / "dict.json"
+        dictionary.write_text(json.dumps({"PLANTER": "PLTR"}))
+        return dict(dictionary_path=str(dictionary), property_corners_path=property_corners_file,
+                    miscellaneous_path=miscellaneous_file,
+                    manifest_path=tmp_path / "manifest.jsonl")
+
+    def write_job(self, path, rows=3000):
+        """Write a point file with a header and quoted descriptions."""
+        with (gzip.open(path, 'wt', newline='', encoding='utf8') if path.suffix == '.gz'
+              else open(path, 'w', newline='', encoding='utf8')) as f:
+            writer = csv.writer(f)
+            writer.writerow(["Point", "Northing", "Easting", "Elevation", "Description"])
+            writer.writerows([str(number), f"{1000 + number / 8}", "2000.25", "100",
+                              DESCRIPTIONS[number % len(DESCRIPTIONS)]]
+                             for number in range(1, rows + 1))
+
+    @pytest.mark.parametrize("name", ["job.csv", "job.csv.gz"])
+    @pytest.mark.parametrize("engine", parser3.ENGINES)
+    def test_same_output(self, tmp_path, options, name, engine):
+        """Test that pipelined runs write the same files as plain ones."""
+        outputs = []
+        for pipeline in (False, True):
+            job_dir = tmp_path / str(pipeline)
+            job_dir.mkdir()
+            self.write_job(job_dir / name)
+            report = batch.run_batch([job_dir], engine=engine, pipeline=pipeline,
+                                     batch_rows=700, **options)
+            assert report.failed == []
+            outputs.append([gzip.decompress(path.read_bytes()) if path.suffix == '.gz'
+                            else path.read_bytes() for path in sorted(job_dir.iterdir())])
+        assert outputs[0] == outputs[1]
+        assert set(report.pipeline) == {'replace', 'format'}
+        assert report.pipeline['format'].write.items == 5
+        assert report.pipeline['replace'].read.items >= 1
+
+    def test_incremental(self, tmp_path, options):
+        """Test that appended rows are read ahead from the checkpoint onwards."""
+        input_file = tmp_path / "job.csv"
+        self.write_job(input_file, 100)
+        batch.run_batch([input_file], incremental=True, pipeline=True, **options)
+        with open(input_file, 'a', newline='', encoding='utf8') as f:
+            csv.writer(f).writerow(["101", "1.5", "2.5", "3.5", "1/2 PCF"])
+        batch.run_batch([input_file], incremental=True, pipeline=True, **options)
+        with open(tmp_path / "job_processed.csv", newline='', encoding='utf8') as f:
+            rows = list(csv.reader(f))
+        assert len(rows) == 102
+        assert rows[-1] == ["101", "1.5", "2.5", "3.5", "PCF \\1/2"]
+
+    def test_empty_frame(self, tmp_path):
+        """Test that a file with only a header is written with its header."""
+        input_file = tmp_path / "job.csv"
+        input_file.write_text("Point,Northing,Easting,Elevation,Description\n")
+        dictionary = tmp_path / "dict.json"
+        dictionary.write_text("{}")
+        parser = DescriptionParser(str(dictionary), gui_mode=False, pipeline=True)
+        output_file = parser.process_file(str(input_file))
+        assert output_file.read_text() == input_file.read_text()
+        assert parser.pipeline_stats.write.items == 1
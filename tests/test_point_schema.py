@@ -0,0 +1,159 @@
+"""Tests for point_schema module."""
+
+import csv
+import io
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import parser3
+from point_schema import (DEFAULT_SCHEMA, SCHEMA_ROWS, Schema, detect_schema,
+                          find_description_column, read_schema)
+from sniff import FileFormat
+
+
+HEADER = ["Point", "Northing", "Easting", "Elevation", "Description"]
+DATA = [["1", "1000.00", "2000.00", "100.00", "1/2 PCF"],
+        ["2", "1001.00", "2001.00", "101.00", "PCF NOTE"]]
+
+
+@pytest.fixture
+def catalog():
+    """A small code catalog."""
+    return parser3.CodeCatalog(["PCF"], ["SSMH"])
+
+
+class TestDetectSchema:
+    """Test cases for working out the layout of a point file."""
+
+    def test_pnezd_with_header(self):
+        """Test the usual layout with one header row."""
+        schema = detect_schema([HEADER] + DATA)
+        assert schema == Schema('PNEZD', 1, False)
+        assert (schema.point, schema.northing, schema.easting, schema.elevation,
+                schema.description) == (0, 1, 2, 3, 4)
+
+    @pytest.mark.parametrize("header", [
+        ["Point", "Easting", "Northing", "Elevation", "Description"],
+        ["PT", "X", "Y", "Z", "Code"],
+        ["point_id", " EAST ", "north", "elev", "desc"],
+    ])
+    def test_penzd(self, header):
+        """Test that easting-first headers are recognized."""
+        schema = detect_schema([header] + DATA)
+        assert schema.layout == 'PENZD'
+        assert (schema.northing, schema.easting) == (2, 1)
+
+    def test_no_header(self):
+        """Test that a file of data rows has no header rows."""
+        assert detect_schema(DATA) == Schema('PNEZD', 0, False)
+
+    def test_several_header_rows(self):
+        """Test that every row before the first coordinates is a header row."""
+        rows = [["Job 1234", "Surveyed 2024-05-01"], HEADER] + DATA
+        assert detect_schema(rows).header_rows == 2
+
+    def test_header_only(self):
+        """Test that a file with column names and no points has one header row."""
+        assert detect_schema([HEADER]) == DEFAULT_SCHEMA
+        assert detect_schema([["CP1", "PCF"]]).header_rows == 0
+        assert detect_schema([]).header_rows == 0
+
+    def test_point_names(self):
+        """Test that point names are told apart from point numbers."""
+        rows = [HEADER, ["CP1", "1000.00", "2000.00", "100.00", "CP"]] + DATA
+        assert detect_schema(rows).point_names
+        assert not detect_schema([HEADER] + DATA).point_names
+
+    def test_only_first_rows(self):
+        """Test that rows past the sample do not count."""
+        rows = [HEADER] * (SCHEMA_ROWS + 1) + DATA
+        assert detect_schema(rows) == Schema('PNEZD', 1, False)
+
+    def test_description_column(self):
+        """Test that the description column is found by name or given."""
+        header = ["Pt", "N", "E", "Z", "Layer", "Desc", "Code"]
+        assert find_description_column(header) == 5
+        assert find_description_column(header, "code") == 6
+        assert find_description_column(header, " 3 ") == 3
+        assert find_description_column(None) is None
+        with pytest.raises(ValueError):
+            find_description_column(header, "Remarks")
+        assert detect_schema([header] + DATA).description == 5
+        assert detect_schema([HEADER] + DATA).description_column is None
+
+    def test_read_schema(self, tmp_path):
+        """Test that the layout is read from a file in its own dialect."""
+        path = tmp_path / "job.csv"
+        with open(path, 'w', newline='', encoding='cp1252') as f:
+            csv.writer(f, delimiter=';').writerows(
+                [["Pt", "Easting", "Northing", "Élévation", "Desc"]] + DATA)
+        schema = read_schema(path, FileFormat(encoding='cp1252', delimiter=';'))
+        assert schema == Schema('PENZD', 1, False)
+
+
+class TestProcessFile:
+    """Test cases for formatting with a detected layout."""
+
+    def write_rows(self, path, rows):
+        """Write rows to a CSV file."""
+        with open(path, 'w', newline='', encoding='utf8') as f:
+            csv.writer(f).writerows(rows)
+
+    def read_rows(self, path):
+        """Read the rows of a CSV file."""
+        with open(path, newline='', encoding='utf8') as f:
+            return list(csv.reader(f))
+
+    @pytest.mark.parametrize("engine", parser3.ENGINES)
+    def test_blank_northing_is_formatted(self, tmp_path, engine):
+        """Test that data rows with a non-numeric northing are not taken for headers."""
+        input_file = tmp_path / "job.csv"
+        self.write_rows(input_file, [HEADER] + DATA + [["3", "", "", "", "1/2 PCF"]])
+        output_file = parser3.process_file(str(input_file), ["PCF"], ["SSMH"],
+                                           gui_mode=False, engine=engine)
+        rows = self.read_rows(output_file)
+        assert rows[0] == HEADER
+        assert [row[4] for row in rows[1:]] == ["PCF \\1/2", "PCF /NOTE", "PCF \\1/2"]
+
+    @pytest.mark.parametrize("engine", parser3.ENGINES)
+    def test_header_rows_passed_through(self, tmp_path, engine):
+        """Test that every detected header row is written unchanged."""
+        input_file = tmp_path / "job.csv"
+        title = ["Job", "1/2 PCF", "x", "y", "1/2 PCF"]
+        self.write_rows(input_file, [title, HEADER] + DATA)
+        output_file = parser3.process_file(str(input_file), ["PCF"], ["SSMH"],
+                                           gui_mode=False, engine=engine)
+        rows = self.read_rows(output_file)
+        assert rows[:2] == [title, HEADER]
+        assert rows[2][4] == "PCF \\1/2"
+
+    def test_header_checked_once(self, tmp_path, monkeypatch):
+        """Test that process_file does not check rows one by one for headers."""
+        input_file = tmp_path / "job.csv"
+        self.write_rows(input_file, [HEADER] + DATA * 50)
+        calls = []
+        monkeypatch.setattr(parser3, 'is_header_row', lambda row: calls.append(row))
+        parser3.process_file(str(input_file), ["PCF"], ["SSMH"], gui_mode=False)
+        assert calls == []
+
+    def test_format_stream(self, catalog):
+        """Test that a stream is formatted with the layout of its first rows."""
+        text = io.StringIO(newline='')
+        csv.writer(text).writerows([HEADER] + DATA + [["3", "", "", "", "1/2 PCF"]])
+        text.seek(0)
+        output = io.StringIO(newline='')
+        assert parser3.format_stream(text, output, catalog) == 4
+        rows = list(csv.reader(io.StringIO(output.getvalue(), newline='')))
+        assert rows[0] == HEADER
+        assert rows[3][4] == "PCF \\1/2"
+
+    def test_format_row_with_schema(self, catalog):
+        """Test that a schema skips the header check and formats by length alone."""
+        row = ["3", "", "", "", "1/2 PCF"]
+        assert parser3.format_row(list(row), catalog)[4] == "1/2 PCF"
+        assert parser3.format_row(list(row), catalog, DEFAULT_SCHEMA)[4] == "PCF \\1/2"
+        assert parser3.format_row(["3", ""], catalog, DEFAULT_SCHEMA) == ["3", ""]
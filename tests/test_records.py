@@ -0,0 +1,278 @@
+"""Tests for records module."""
+
+import csv
+import io
+import json
+import random
+import zipfile
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import batch
+import parser3
+from records import CountedLines, RecordWriter, batches, read_records, write_records
+from sniff import FileFormat
+
+
+def csv_round_trip(text: str, file_format: FileFormat = FileFormat()) -> str:
+    """Return text read and written back with the csv module."""
+    output = io.StringIO(newline='')
+    rows = csv.reader(io.StringIO(text, newline=''), **file_format.csv_options())
+    csv.writer(output, **file_format.csv_options()).writerows(rows)
+    return output.getvalue()
+
+
+def records_round_trip(text: str, column: int = 4,
+                       file_format: FileFormat = FileFormat()) -> str:
+    """Return text read and written back with read_records and write_records."""
+    output = io.StringIO(newline='')
+    rows, quoted = read_records(io.StringIO(text, newline=''), column, file_format)
+    write_records(output, rows, quoted, file_format)
+    return output.getvalue()
+
+
+class TestReadRecords:
+    """Test cases for splitting rows up to the description."""
+
+    def test_split_up_to_column(self):
+        """Test that fields after the description stay one raw string."""
+        rows, quoted = read_records(io.StringIO("1,2,3,4,PCF,a,b,,c\n", newline=''), 4)
+        assert rows == [["1", "2", "3", "4", "PCF", "a,b,,c"]]
+        assert quoted == set()
+
+    def test_short_and_empty_rows(self):
+        """Test that short rows and blank lines are read like the csv module reads them."""
+        rows, _ = read_records(io.StringIO("1,2\r\n\r\n1,2,3,4,PCF\r\n", newline=''), 4)
+        assert rows == [["1", "2"], [], ["1", "2", "3", "4", "PCF"]]
+
+    def test_quoted_rows_parsed_in_full(self):
+        """Test that rows with quotes are parsed by the csv module."""
+        text = '1,2,3,4,"PCF, NOTE",a\n2,2,3,4,8" PIPE\n3,2,3,4,"LINE\nBREAK",b\n4,2,3,4,P\n'
+        rows, quoted = read_records(io.StringIO(text, newline=''), 4)
+        assert rows == [["1", "2", "3", "4", "PCF, NOTE", "a"],
+                        ["2", "2", "3", "4", '8" PIPE'],
+                        ["3", "2", "3", "4", "LINE\nBREAK", "b"],
+                        ["4", "2", "3", "4", "P"]]
+        assert quoted == {0, 1, 2}
+
+    def test_limit(self):
+        """Test that a limited read leaves the rest of the lines unread."""
+        lines = iter(io.StringIO('1,"a\nb"\n2,c\n3,d\n', newline=''))
+        assert read_records(lines, 1, limit=1)[0] == [["1", "a\nb"]]
+        assert read_records(lines, 1)[0] == [["2", "c"], ["3", "d"]]
+
+
+class TestRoundTrip:
+    """Test cases for writing rows back exactly as the csv module would."""
+
+    @pytest.mark.parametrize("text", [
+        "Point,N,E,Z,D\n1,1000.00,2000.00,100.00,1/2 PCF\n",
+        "1,2,3,4,PCF,attr1,attr2\r\n2,2,3,4,PCF,,\r\n",
+        '1,2,3,4,"PCF, NOTE","x,y"\n2,2,3,4,8" PIPE,"q"\n',
+        '1,2,3,4,"A\r\nB"\r\n\r\n,,\n',
+        "1,2\n3\n\n",
+        "1, 2 ,3,4, PCF \n",
+    ])
+    def test_matches_csv_module(self, text):
+        """Test that the output is identical to a csv module round trip."""
+        assert records_round_trip(text) == csv_round_trip(text)
+
+    @pytest.mark.parametrize("file_format", [FileFormat(delimiter='\t'),
+                                             FileFormat(delimiter=';', quotechar="'")])
+    def test_other_dialects(self, file_format):
+        """Test round trips in other delimiters and quote characters."""
+        text = "1\t2;3\t4\t'PCF; NOTE'\ta\n2\t\"2\"\t3\t4\tPCF\n"
+        text = text if file_format.delimiter == '\t' else text.replace('\t', ';')
+        assert records_round_trip(text, 4, file_format) == csv_round_trip(text, file_format)
+
+    def test_fuzzed(self):
+        """Test random rows with quotes, delimiters and line breaks in their fields."""
+        rng = random.Random(3)
+        alphabet = ['A', 'B', '1', ' ', ',', '"', '\n', '\r', '/', '\\']
+        for _ in range(300):
+            output = io.StringIO(newline='')
+            writer = csv.writer(output)
+            for _ in range(rng.randint(1, 5)):
+                writer.writerow([''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 4)))
+                                 for _ in range(rng.randint(1, 9))])
+            text = output.getvalue()
+            for column in (0, 2, 4):
+                assert records_round_trip(text, column) == csv_round_trip(text)
+
+
+class TestRecordWriter:
+    """Test cases for writing rows in batches."""
+
+    TEXT = 'Point,N,E,Z,D\n' + ''.join(f'{n},2,3,4,"PCF, {n}"\n' if n % 7 == 0 else
+                                        f'{n},2,3,4,PCF {n},x\n' for n in range(1, 50))
+
+    class FailingFile(io.StringIO):
+        """A file that fails on every write."""
+
+        def write(self, text):
+            raise OSError("disk full")
+
+    def write_batched(self, text: str, batch_rows: int, background: bool) -> str:
+        """Return text read and written back through a RecordWriter in batches."""
+        output = io.StringIO(newline='')
+        rows, quoted = read_records(io.StringIO(text, newline=''), 4)
+        with RecordWriter(output, batch_rows=batch_rows, background=background) as writer:
+            for _, part, part_quoted in batches(rows, quoted, 3):
+                writer.write(part, part_quoted)
+        assert writer.rows_written == len(rows)
+        return output.getvalue()
+
+    @pytest.mark.parametrize("background", [False, True])
+    @pytest.mark.parametrize("batch_rows", [1, 5, 1000])
+    def test_matches_csv_module(self, batch_rows, background):
+        """Test that any batch size, in either mode, writes what the csv module writes."""
+        assert self.write_batched(self.TEXT, batch_rows, background) == csv_round_trip(self.TEXT)
+
+    def test_batches_collected(self):
+        """Test that rows are held until a whole batch is waiting."""
+        output = io.StringIO(newline='')
+        writer = RecordWriter(output, batch_rows=3)
+        writer.write([["1", "a"], ["2", "b"]])
+        assert output.getvalue() == ""
+        writer.write([["3", "c"]])
+        assert output.getvalue() == "1,a\r\n2,b\r\n3,c\r\n"
+        writer.write([["4", "d"]])
+        writer.close()
+        assert output.getvalue().endswith("4,d\r\n")
+
+    @pytest.mark.parametrize("background", [False, True])
+    def test_write_error_raised(self, background):
+        """Test that a failed write reaches the caller, also from the background thread."""
+        writer = RecordWriter(self.FailingFile(), batch_rows=1, background=background)
+        with pytest.raises(OSError, match="disk full"):
+            writer.write([["1", "a"]])
+            writer.close()
+
+    def test_invalid_batch_rows(self):
+        """Test that a batch must hold at least one row."""
+        with pytest.raises(ValueError):
+            RecordWriter(io.StringIO(), batch_rows=0)
+
+    @pytest.mark.parametrize("engine", parser3.ENGINES)
+    def test_process_file(self, tmp_path, engine):
+        """Test that the format stage writes the same file however its output is batched."""
+        input_file = tmp_path / "job.csv"
+        input_file.write_text("Job 1,x\n" + self.TEXT, encoding='utf8')
+        outputs = []
+        for batch_rows, background in [(65536, False), (1, False), (2, True)]:
+            output_file = parser3.process_file(
+                str(input_file), ["PCF"], ["SSMH"], gui_mode=False, engine=engine,
+                batch_rows=batch_rows, buffer_size=64, background_writer=background)
+            outputs.append(Path(output_file).read_bytes())
+        assert outputs[0] == outputs[1] == outputs[2]
+        rows = list(csv.reader(io.StringIO(outputs[0].decode(), newline='')))
+        assert rows[:2] == [["Job 1", "x"], ["Point", "N", "E", "Z", "D"]]
+        assert rows[2][4] == "PCF \\1"
+
+
+class TestCountedLines:
+    """Test cases for counting the bytes of the lines read so far."""
+
+    @pytest.mark.parametrize("encoding", ['utf8', 'utf-8-sig', 'cp1252'])
+    def test_offset_of_each_line(self, encoding):
+        """Test that the offset after each line is where the next one starts."""
+        data = "Point,Description\r\n1,CAFÉ\r\n2,\"A\nB\"\r\n3,PCF".encode(encoding)
+        infile = io.TextIOWrapper(io.BytesIO(data), encoding=encoding, newline='')
+        lines = CountedLines(infile, FileFormat(encoding=encoding))
+        start = 0
+        for line in lines:
+            assert data[start:lines.offset].decode(encoding) == line
+            start = lines.offset
+        assert lines.offset == len(data)
+
+    def test_start(self):
+        """Test that counting can start part of the way into a file."""
+        lines = CountedLines(io.StringIO("3,PCF\r\n", newline=''), start=100)
+        assert next(lines) == "3,PCF\r\n"
+        assert lines.offset == 107
+
+
+class TestDescriptionColumn:
+    """Test cases for running both stages over exports with extra columns."""
+
+    HEADER = ["Point", "Northing", "Easting", "Elevation", "Layer", "Description", "Notes"]
+
+    @pytest.fixture
+    def options(self, tmp_path, property_corners_file, miscellaneous_file):
+        """Batch options with a small dictionary and a manifest outside the data."""
+        dictionary = tmp_path / "dict.json"
+        dictionary.write_text(json.dumps({"PLANTER": "PLTR"}))
+        return dict(dictionary_path=str(dictionary), property_corners_path=property_corners_file,
+                    miscellaneous_path=miscellaneous_file,
+                    manifest_path=tmp_path / "manifest.jsonl")
+
+    def write_export(self, path, header=HEADER):
+        """Write a wide export with the description in the sixth column."""
+        with open(path, 'w', newline='', encoding='utf8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerow(["1", "1000.00", "2000.00", "100.00", "PCF 1/2", "1/2 PCF",
+                             "PLANTER"])
+            writer.writerow(["2", "1001.00", "2001.00", "101.00", "V", "PLANTER BOX", "x"])
+
+    def read_column(self, path, column):
+        """Read one column of a CSV file."""
+        with open(path, newline='', encoding='utf8') as f:
+            return [row[column] for row in csv.reader(f)]
+
+    @pytest.mark.parametrize("engine", ['python', 'numpy'])
+    def test_found_by_header_name(self, tmp_path, options, engine):
+        """Test that both stages use the column named Description."""
+        input_file = tmp_path / "job.csv"
+        self.write_export(input_file)
+        batch.run_batch([input_file], engine=engine, **options)
+        output_file = tmp_path / "job_processed.csv"
+        assert self.read_column(output_file, 5)[1:] == ["PCF \\1/2", "PLTR BOX"]
+        assert self.read_column(output_file, 4)[1:] == ["PCF 1/2", "V"]
+        assert self.read_column(output_file, 6)[1:] == ["PLANTER", "x"]
+
+    @pytest.mark.parametrize("description_column", [6, "6", "notes"])
+    def test_given_by_index_or_name(self, tmp_path, options, description_column):
+        """Test that the description column can be chosen."""
+        input_file = tmp_path / "job.csv"
+        self.write_export(input_file)
+        batch.run_batch([input_file], description_column=description_column, **options)
+        output_file = tmp_path / "job_processed.csv"
+        assert self.read_column(output_file, 6)[1:] == ["PLTR", "x"]
+        assert self.read_column(output_file, 5)[1:] == ["1/2 PCF", "PLANTER BOX"]
+
+    def test_rerun_with_other_column(self, tmp_path, options):
+        """Test that choosing another column reprocesses a file a plain run left unchanged."""
+        input_file = tmp_path / "job.csv"
+        self.write_export(input_file)
+        batch.run_batch([input_file], **options)
+        report = batch.run_batch([input_file], description_column=6, **options)
+        assert report.processed == [str(input_file)]
+        assert self.read_column(tmp_path / "job_processed.csv", 6)[1:] == ["PLTR", "x"]
+        assert batch.run_batch([input_file], description_column="6",
+                               **options).skipped == [str(input_file)]
+
+    def test_unknown_name_fails(self, tmp_path, options):
+        """Test that a column name the header lacks fails the file."""
+        input_file = tmp_path / "job.csv"
+        self.write_export(input_file)
+        report = batch.run_batch([input_file], description_column="Remarks", **options)
+        assert report.failed == [str(input_file)]
+
+    def test_zip_member(self, tmp_path, options):
+        """Test that archive members are mapped like plain files."""
+        input_file = tmp_path / "job.csv"
+        self.write_export(input_file)
+        archive_path = tmp_path / "crew.zip"
+        with zipfile.ZipFile(archive_path, 'w') as archive:
+            archive.write(input_file, "job.csv")
+        input_file.unlink()
+        batch.run_batch([archive_path], **options)
+        with zipfile.ZipFile(tmp_path / "crew_processed.zip") as archive:
+            rows = list(csv.reader(io.StringIO(archive.read("job_processed.csv").decode(),
+                                               newline='')))
+        assert [row[5] for row in rows[1:]] == ["PCF \\1/2", "PLTR BOX"]
@@ -0,0 +1,163 @@
+"""Tests for service module."""
+
+import asyncio
+import csv
+import json
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import parser3
+from description_parser import DescriptionParser
+from service import ParserService, process_point_data
+
+
+@pytest.fixture
+def point_bytes(sample_csv_data):
+    """Sample point data as it would be uploaded."""
+    lines = [','.join(row) for row in sample_csv_data]
+    return ('\r\n'.join(lines) + '\r\n').encode('utf8')
+
+
+@pytest.fixture
+def service(sample_replacement_dict_file, property_corners_file, miscellaneous_file):
+    """A service that shares one catalog between threads."""
+    parser_service = ParserService.from_config_files(
+        sample_replacement_dict_file, property_corners_file, miscellaneous_file,
+        max_workers=4, use_processes=False)
+    yield parser_service
+    parser_service.close()
+
+
+class TestProcessPointData:
+    """Test cases for the in-memory pipeline."""
+
+    def test_matches_file_based_pipeline(self, tmp_path, point_bytes,
+                                         sample_replacement_dict_file,
+                                         property_corners_file, miscellaneous_file):
+        """Test that in-memory output is identical to running both stages on disk."""
+        input_file = tmp_path / "points.csv"
+        input_file.write_bytes(point_bytes)
+        description_parser = DescriptionParser(sample_replacement_dict_file, gui_mode=False)
+        property_codes, misc_codes = parser3.load_code_lists(property_corners_file,
+                                                             miscellaneous_file)
+        preprocessed = description_parser.process_file(str(input_file))
+        output_file = parser3.process_file(str(preprocessed), property_codes, misc_codes,
+                                           gui_mode=False)
+
+        result = process_point_data(point_bytes, description_parser.replacement_dict,
+                                    parser3.CodeCatalog(property_codes, misc_codes))
+
+        assert result.data == Path(output_file).read_bytes()
+        assert result.rows == 6
+        assert result.replacements == 4
+
+    @pytest.mark.parametrize("delimiter, encoding", [(';', 'cp1252'), ('\t', 'utf-8-sig')])
+    def test_sniffed_upload_matches_file_based_pipeline(self, tmp_path, sample_csv_data,
+                                                        sample_replacement_dict_file,
+                                                        property_corners_file,
+                                                        miscellaneous_file, delimiter,
+                                                        encoding):
+        """Test that uploads in other encodings and dialects are read and written as files are."""
+        rows = sample_csv_data + [["6", "1005.00", "2005.00", "105.00", "TREE 45\u00b0 CAF\u00c9"]]
+        data = ''.join(delimiter.join(row) + '\r\n' for row in rows).encode(encoding)
+        input_file = tmp_path / "points.csv"
+        input_file.write_bytes(data)
+        description_parser = DescriptionParser(sample_replacement_dict_file, gui_mode=False)
+        property_codes, misc_codes = parser3.load_code_lists(property_corners_file,
+                                                             miscellaneous_file)
+        preprocessed = description_parser.process_file(str(input_file))
+        output_file = parser3.process_file(str(preprocessed), property_codes, misc_codes,
+                                           gui_mode=False)
+
+        result = process_point_data(data, description_parser.replacement_dict,
+                                    parser3.CodeCatalog(property_codes, misc_codes))
+
+        assert result.data == Path(output_file).read_bytes()
+        assert result.rows == 7
+        text = result.data.decode(encoding)
+        assert text.splitlines()[-1].split(delimiter)[-1] == "TREE 45\u00b0 CAF\u00c9"
+
+    def test_rejects_narrow_files(self):
+        """Test that files without a description column are rejected."""
+        with pytest.raises(ValueError, match="at least 5 columns"):
+            process_point_data(b"Point,Northing\n1,1000.0\n", {},
+                               parser3.CodeCatalog(["PCF"], ["TREE"]))
+
+
+class TestParserService:
+    """Test cases for the asyncio service."""
+
+    def test_concurrent_submissions(self, service, point_bytes):
+        """Test that many concurrent jobs all get the same result."""
+        async def submit_all():
+            return await asyncio.gather(*(service.process_bytes(point_bytes)
+                                          for _ in range(12)))
+
+        results = asyncio.run(submit_all())
+        assert len({result.data for result in results}) == 1
+        assert b"PCF \\1/2 NEW_CODE" in results[0].data
+
+    def test_process_stream_reader(self, service, point_bytes):
+        """Test reading point data from an asyncio stream."""
+        async def submit_stream():
+            reader = asyncio.StreamReader()
+            reader.feed_data(point_bytes[:40])
+            reader.feed_data(point_bytes[40:])
+            reader.feed_eof()
+            return await service.process_stream(reader)
+
+        result = asyncio.run(submit_stream())
+        assert result.data == asyncio.run(service.process_bytes(point_bytes)).data
+
+    def test_process_async_iterable(self, service, point_bytes):
+        """Test reading point data from an async iterable of chunks."""
+        async def chunks():
+            for start in range(0, len(point_bytes), 16):
+                yield point_bytes[start:start + 16]
+
+        result = asyncio.run(service.process_stream(chunks()))
+        assert result.rows == 6
+
+    def test_max_bytes_is_enforced(self, sample_replacement_dict_file, property_corners_file,
+                                   miscellaneous_file, point_bytes):
+        """Test that oversized submissions are rejected before processing."""
+        parser_service = ParserService.from_config_files(
+            sample_replacement_dict_file, property_corners_file, miscellaneous_file,
+            use_processes=False, max_bytes=10)
+        try:
+            with pytest.raises(ValueError, match="larger than 10 bytes"):
+                asyncio.run(parser_service.process_bytes(point_bytes))
+        finally:
+            parser_service.close()
+
+    def test_no_tk_or_disk_access_while_processing(self, service, point_bytes):
+        """Test that processing creates no Tk root and opens no files."""
+        with patch('tkinter.Tk', side_effect=AssertionError("Tk created")), \
+                patch('builtins.open', side_effect=AssertionError("disk touched")):
+            result = asyncio.run(service.process_bytes(point_bytes))
+        assert result.rows == 6
+
+    def test_process_pool_matches_threads(self, sample_replacement_dict_file,
+                                          property_corners_file, miscellaneous_file,
+                                          service, point_bytes):
+        """Test that worker processes compile the same catalog."""
+        async def submit():
+            async with ParserService.from_config_files(
+                    sample_replacement_dict_file, property_corners_file, miscellaneous_file,
+                    max_workers=2) as process_service:
+                return await process_service.process_bytes(point_bytes)
+
+        assert asyncio.run(submit()).data == asyncio.run(service.process_bytes(point_bytes)).data
+
+    def test_invalid_dictionary(self, tmp_path, property_corners_file, miscellaneous_file):
+        """Test that a dictionary that is not a JSON object is rejected."""
+        dictionary = tmp_path / "dict.json"
+        dictionary.write_text(json.dumps(["not", "a", "dict"]))
+        with pytest.raises(ValueError, match="valid JSON object"):
+            ParserService.from_config_files(str(dictionary), property_corners_file,
+                                            miscellaneous_file, use_processes=False)
@@ -0,0 +1,193 @@
+"""Tests for sniff module."""
+
+import codecs
+import csv
+import gzip
+import io
+import json
+import zipfile
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import batch
+from sniff import (DEFAULT_FORMAT, SNIFF_BYTES, FileFormat, detect_dialect, detect_encoding,
+                   sniff_bytes, sniff_file)
+
+
+DESCRIPTIONS = ["1/2 PCF", "SSMH RIM", "PCF NOTE", "CAFÉ PLANTER", "TREE OAK"]
+
+
+def point_file_text(descriptions=DESCRIPTIONS, delimiter=',', quotechar='"') -> str:
+    """Return the CSV text of a small point file in the given dialect."""
+    text = io.StringIO(newline='')
+    writer = csv.writer(text, delimiter=delimiter, quotechar=quotechar)
+    writer.writerow(["Point", "Northing", "Easting", "Elevation", "Description"])
+    for number, description in enumerate(descriptions, start=1):
+        writer.writerow([number, "1000.00", "2000.00", "100.00", description])
+    return text.getvalue()
+
+
+@pytest.fixture
+def options(tmp_path, property_corners_file, miscellaneous_file):
+    """Batch options with a small dictionary and a manifest outside the data."""
+    dictionary = tmp_path / "dict.json"
+    dictionary.write_text(json.dumps({"SSMH RIM": "SSMHR", "PLANTER": "PLTR"}))
+    return dict(dictionary_path=str(dictionary), property_corners_path=property_corners_file,
+                miscellaneous_path=miscellaneous_file, manifest_path=tmp_path / "manifest.jsonl")
+
+
+def run_outputs(directory, data: bytes, options) -> tuple:
+    """Run a batch over a point file holding data and return the bytes of both outputs."""
+    directory.mkdir()
+    input_file = directory / "job.csv"
+    input_file.write_bytes(data)
+    report = batch.run_batch([input_file], **options)
+    assert report.failed == []
+    return ((directory / "preprocessed_job.csv").read_bytes(),
+            (directory / "job_processed.csv").read_bytes())
+
+
+@pytest.fixture
+def utf8_outputs(tmp_path, options) -> tuple:
+    """Outputs of the plain UTF-8, comma separated point file, decoded."""
+    preprocessed, processed = run_outputs(tmp_path / "utf8",
+                                          point_file_text().encode('utf-8'), options)
+    return preprocessed.decode('utf-8'), processed.decode('utf-8')
+
+
+class TestDetectEncoding:
+    """Test cases for working out the encoding of a sample."""
+
+    @pytest.mark.parametrize("bom,encoding", [
+        (codecs.BOM_UTF8, 'utf-8-sig'),
+        (codecs.BOM_UTF16_LE, 'utf-16'),
+        (codecs.BOM_UTF16_BE, 'utf-16'),
+    ])
+    def test_byte_order_mark(self, bom, encoding):
+        """Test that a byte order mark decides the encoding."""
+        assert detect_encoding(bom + b"Point,Description\r\n") == encoding
+
+    def test_utf8(self):
+        """Test that valid UTF-8 is taken as UTF-8."""
+        assert detect_encoding("1,CAFÉ\r\n".encode('utf-8')) == 'utf-8'
+
+    def test_truncated_character(self):
+        """Test that a sample cut part way through a character is still UTF-8."""
+        assert detect_encoding("1,CAFÉ".encode('utf-8')[:-1]) == 'utf-8'
+
+    def test_cp1252(self):
+        """Test that bytes which are not UTF-8 fall back to cp1252."""
+        assert detect_encoding("1,CAFÉ ½\r\n".encode('cp1252')) == 'cp1252'
+
+
+class TestDetectDialect:
+    """Test cases for working out the delimiter and quote character."""
+
+    @pytest.mark.parametrize("delimiter", [',', '\t', ';', '|'])
+    def test_delimiter(self, delimiter):
+        """Test that each supported delimiter is found."""
+        assert detect_dialect(point_file_text(delimiter=delimiter)) == (delimiter, '"')
+
+    def test_commas_inside_fields(self):
+        """Test that commas in semicolon separated descriptions do not win."""
+        text = point_file_text(["PCF, NOTE", "SSMH, RIM, N", "PLANTER"], delimiter=';')
+        assert detect_dialect(text)[0] == ';'
+
+    def test_single_quotes(self):
+        """Test that fields wrapped in single quotes set the quote character."""
+        text = point_file_text(["PCF, NOTE", "SSMH RIM"], quotechar="'")
+        assert detect_dialect(text) == (',', "'")
+
+    def test_apostrophes(self):
+        """Test that apostrophes in double quoted files keep the double quote."""
+        text = point_file_text(["1/2' PCF", "SSMH, RIM", "8' FENCE"])
+        assert detect_dialect(text) == (',', '"')
+
+    def test_truncated_last_line(self):
+        """Test that the last, possibly cut short, line is not counted."""
+        text = point_file_text(delimiter='\t') + "6\t1000.00"
+        assert detect_dialect(text) == ('\t', '"')
+
+    def test_single_column(self):
+        """Test that a sample without delimiters falls back to commas."""
+        assert detect_dialect("PCF\nSSMH\n") == (',', '"')
+
+
+class TestSniffFile:
+    """Test cases for sniffing point files."""
+
+    def test_default(self):
+        """Test that the default format is what files were assumed to be."""
+        assert sniff_bytes(point_file_text().encode('utf-8')) == DEFAULT_FORMAT
+        assert DEFAULT_FORMAT.csv_options() == {'delimiter': ',', 'quotechar': '"'}
+
+    def test_only_start_is_read(self, tmp_path):
+        """Test that a cp1252 byte past the sample does not change the encoding."""
+        path = tmp_path / "job.csv"
+        text = point_file_text(["PCF"] * (SNIFF_BYTES // 20)) + "99,1,2,3,CAFÉ\r\n"
+        path.write_bytes(text.encode('cp1252'))
+        assert sniff_file(path).encoding == 'utf-8'
+
+    def test_gzip(self, tmp_path):
+        """Test that compressed files are sniffed on their content."""
+        path = tmp_path / "job.csv.gz"
+        with gzip.open(path, 'wb') as f:
+            f.write(point_file_text(delimiter=';').encode('cp1252'))
+        assert sniff_file(path) == FileFormat(encoding='cp1252', delimiter=';')
+
+
+class TestBatch:
+    """Test cases for running both stages over files in other formats."""
+
+    @pytest.mark.parametrize("encoding", ['cp1252', 'utf-8-sig', 'utf-16'])
+    def test_encoding_round_trip(self, tmp_path, options, utf8_outputs, encoding):
+        """Test that outputs are written in the encoding of the input."""
+        outputs = run_outputs(tmp_path / "encoded",
+                              point_file_text().encode(encoding), options)
+        assert [output.decode(encoding) for output in outputs] == list(utf8_outputs)
+
+    @pytest.mark.parametrize("delimiter,quotechar", [('\t', '"'), (';', '"'), (',', "'")])
+    def test_dialect_round_trip(self, tmp_path, options, utf8_outputs, delimiter, quotechar):
+        """Test that outputs keep the delimiter and quote character of the input."""
+        text = point_file_text(delimiter=delimiter, quotechar=quotechar)
+        outputs = run_outputs(tmp_path / "dialect", text.encode('utf-8'), options)
+        for output, expected in zip(outputs, utf8_outputs):
+            rows = list(csv.reader(io.StringIO(output.decode('utf-8'), newline=''),
+                                   delimiter=delimiter, quotechar=quotechar))
+            assert rows == list(csv.reader(io.StringIO(expected, newline='')))
+
+    def test_unpredicted_byte(self, tmp_path, options):
+        """Test that a byte the sample did not predict is carried through unchanged."""
+        descriptions = ["PCF"] * (SNIFF_BYTES // 20) + ["CAFÉ PLANTER"]
+        data = point_file_text(descriptions).encode('cp1252')
+        preprocessed, processed = run_outputs(tmp_path / "late", data, options)
+        assert preprocessed.endswith("CAFÉ PLTR\n".encode('cp1252'))
+        assert processed.endswith("CAFÉ PLTR\r\n".encode('cp1252'))
+
+    def test_incremental(self, tmp_path, options):
+        """Test that appended rows of a cp1252 file are processed in its encoding."""
+        input_file = tmp_path / "job.csv"
+        input_file.write_bytes(point_file_text().encode('cp1252'))
+        batch.run_batch([input_file], incremental=True, **options)
+        with open(input_file, 'ab') as f:
+            f.write("6,1000.00,2000.00,100.00,NOUVEAU PLANTER\r\n".encode('cp1252'))
+        batch.run_batch([input_file], incremental=True, **options)
+        processed = (tmp_path / "job_processed.csv").read_bytes().decode('cp1252')
+        assert processed.count("CAFÉ PLTR") == 1
+        assert processed.endswith("NOUVEAU PLTR\r\n")
+
+    def test_zip_member(self, tmp_path, options, utf8_outputs):
+        """Test that members of an archive are sniffed one by one."""
+        archive_path = tmp_path / "crew.zip"
+        with zipfile.ZipFile(archive_path, 'w') as archive:
+            archive.writestr("a.csv", point_file_text().encode('cp1252'))
+            archive.writestr("b.csv", point_file_text(delimiter='\t').encode('utf-8'))
+        batch.run_batch([archive_path], **options)
+        with zipfile.ZipFile(tmp_path / "crew_processed.zip") as archive:
+            assert archive.read("a_processed.csv").decode('cp1252') == utf8_outputs[1]
+            assert archive.read("b_processed.csv").decode('utf-8') == \
+                utf8_outputs[1].replace(',', '\t')
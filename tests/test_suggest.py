@@ -0,0 +1,165 @@
+"""Tests for suggest module."""
+
+import csv
+import random
+import string
+import time
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import parser3
+from suggest import SuggestionIndex, UnknownCodeReport, edit_distance, main
+
+
+@pytest.fixture
+def index(property_corners_data, miscellaneous_data):
+    """An index built from the shared sample code lists."""
+    return SuggestionIndex(property_corners_data + miscellaneous_data)
+
+
+class TestEditDistance:
+    """Test cases for the edit distance."""
+
+    @pytest.mark.parametrize("first,second,expected", [
+        ("PCF", "PCF", 0),
+        ("PFC", "PCF", 1),
+        ("PCFF", "PCF", 1),
+        ("PC", "PCF", 1),
+        ("RBX", "RBC", 1),
+        ("PCF", "", 3),
+        ("ABCD", "BADC", 2),
+    ])
+    def test_distances(self, first, second, expected):
+        """Test insertions, deletions, substitutions and transpositions."""
+        assert edit_distance(first, second) == expected
+        assert edit_distance(second, first) == expected
+
+    def test_limit_stops_early(self):
+        """Test that distances above the limit are reported as limit + 1."""
+        assert edit_distance("PCF", "MARKER", 2) == 3
+        assert edit_distance("PFC", "PCF", 2) == 1
+
+
+class TestSuggestionIndex:
+    """Test cases for SuggestionIndex."""
+
+    def test_suggests_closest_codes(self, index):
+        """Test that a transposed code is matched to the intended code."""
+        assert index.suggest("PFC")[0] == ("PCF", 1)
+
+    def test_case_insensitive(self, index):
+        """Test that unknown codes are matched regardless of case."""
+        assert index.suggest("pfc") == index.suggest("PFC")
+
+    def test_no_close_codes(self, index):
+        """Test that nothing is suggested for codes far from every known code."""
+        assert index.suggest("XYZXYZ") == ()
+
+    def test_limit(self, index):
+        """Test that at most limit suggestions are returned, closest first."""
+        suggestions = index.suggest("PC", 2)
+        assert len(suggestions) == 2
+        assert [distance for _, distance in suggestions] == sorted(
+            distance for _, distance in suggestions)
+
+    def test_matches_brute_force(self):
+        """Test the index against comparing with every code."""
+        rng = random.Random(3)
+        codes = {''.join(rng.choice("ABCDE") for _ in range(rng.randint(1, 5)))
+                 for _ in range(300)}
+        index = SuggestionIndex(codes)
+        for _ in range(200):
+            query = ''.join(rng.choice("ABCDEF") for _ in range(rng.randint(1, 6)))
+            expected = sorted((edit_distance(query, code), abs(len(code) - len(query)), code)
+                              for code in codes)
+            expected = tuple((code, distance) for distance, _, code in expected
+                             if distance <= 2)[:3]
+            assert index.suggest(query) == expected
+
+    def test_large_catalog_is_fast(self):
+        """Test that lookups in a catalog of thousands of codes stay under a millisecond."""
+        rng = random.Random(1)
+        codes = {''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(3, 8)))
+                 for _ in range(5000)}
+        index = SuggestionIndex(codes)
+        queries = [code[:1] + code[2:] for code in sorted(codes)[:500]]
+        started = time.perf_counter()
+        for query in queries:
+            index.suggest(query)
+        # Generous bound so slow CI machines do not fail the test
+        assert (time.perf_counter() - started) / len(queries) < 0.005
+
+
+class TestUnknownCodeReport:
+    """Test cases for unknown code reports."""
+
+    def test_rows_are_ranked_by_count(self, index, tmp_path):
+        """Test that the most frequent unknown codes are reported first."""
+        report = UnknownCodeReport(index)
+        for line_number, code in enumerate(["RBX", "PFC", "PFC", "pfc"], start=2):
+            report.add(line_number, code)
+        rows = report.rows()
+        assert rows[0][:2] == ["PFC", 3]
+        assert rows[0][2].startswith("PCF (1)")
+        assert rows[0][3] == "3 4 5"
+        assert rows[1][0] == "RBX"
+
+        report_file = tmp_path / "report.csv"
+        report.write(report_file)
+        with open(report_file, newline='', encoding='utf8') as f:
+            assert next(csv.reader(f)) == ["Code", "Count", "Suggestions", "Lines"]
+
+    def test_spilled_counts_are_merged(self, index):
+        """Test that a report spilled to disk ranks codes as one held in memory does."""
+        rng = random.Random(7)
+        codes = [rng.choice(["PFC", "RBX", "MARKR", "IRFF", "XYZ", "QQ"]) + str(rng.randrange(4))
+                 for _ in range(300)]
+        in_memory, spilled = UnknownCodeReport(index), UnknownCodeReport(index, max_codes=5)
+        for line_number, code in enumerate(codes, start=2):
+            in_memory.add(line_number, code)
+            spilled.add(line_number, code)
+        assert spilled.spilled and not in_memory.spilled
+        assert spilled.rows() == in_memory.rows()
+        assert spilled.rows() == in_memory.rows()
+
+    def test_process_file_writes_report(self, tmp_path, index, property_corners_data,
+                                        miscellaneous_data):
+        """Test that parser3 reports unknown codes with their line numbers."""
+        input_file = tmp_path / "preprocessed_job.csv"
+        with open(input_file, 'w', newline='', encoding='utf8') as f:
+            csv.writer(f).writerows([
+                ["Point", "Northing", "Easting", "Elevation", "Description"],
+                ["1", "1000.0", "2000.0", "100.0", "PCF 1/2"],
+                ["2", "1001.0", "2001.0", "101.0", "1/2 PFC"],
+                ["3", "1002.0", "2002.0", "102.0", "MARKR /NOTE"],
+            ])
+        parser3.process_file(str(input_file), property_corners_data, miscellaneous_data,
+                             gui_mode=False, suggestion_index=index)
+
+        with open(tmp_path / "job_unknown_codes.csv", newline='', encoding='utf8') as f:
+            rows = list(csv.reader(f))[1:]
+        assert [(row[0], row[3]) for row in rows] == [("MARKR", "4"), ("PFC", "3")]
+        assert rows[0][2].startswith("MARKER (1)")
+
+    def test_main_sniffs_files(self, tmp_path, property_corners_file, miscellaneous_file):
+        """Test that reports are made from files in other encodings, dialects and layouts."""
+        input_file = tmp_path / "job.csv"
+        input_file.write_bytes("Job;Caf\u00e9\r\nPoint;Northing;Easting;Elevation;Layer;Desc\r\n"
+                               "1;1000.0;2000.0;100.0;PFC;PFC 1/2\r\n"
+                               "2;1001.0;2001.0;101.0;V;MARKR \u00e9\r\n".encode('cp1252'))
+        assert main([str(input_file), "--property-corners", property_corners_file,
+                     "--miscellaneous", miscellaneous_file]) == 0
+        with open(tmp_path / "job_unknown_codes.csv", newline='', encoding='utf8') as f:
+            rows = list(csv.reader(f))[1:]
+        assert sorted((row[0], row[3]) for row in rows) == [("MARKR", "4"), ("PFC", "3")]
+
+    def test_main_prints_suggestions(self, property_corners_file, miscellaneous_file,
+                                     capsys):
+        """Test the command line lookup of a single code."""
+        assert main(["--code", "PFC", "--property-corners", property_corners_file,
+                     "--miscellaneous", miscellaneous_file]) == 0
+        assert "PFC: PCF (1)" in capsys.readouterr().out
@@ -0,0 +1,97 @@
+"""Tests for vectorized module."""
+
+import csv
+import random
+import pytest
+import pandas as pd
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import parser3
+from vectorized import format_descriptions, format_rows
+
+
+ITEMS = ["PCF", "pcf", "1/2", "\\1/2", "5/8\"", "\\5/8\"", "1 1/2", "3'", "/X", "\\", "/",
+         "TREE", "tree", "Xtree", "EP", "ep", "FH", "SIGN", "IRF", "RBF", "X", "1", "\\5"]
+
+
+@pytest.fixture
+def catalog(property_corners_data, miscellaneous_data):
+    """The shared sample code lists, compiled."""
+    return parser3.CodeCatalog(property_corners_data, miscellaneous_data)
+
+
+class TestFormatDescriptions:
+    """Test cases for column-at-a-time formatting."""
+
+    @pytest.mark.parametrize("description", [
+        "PCF 1/2", "1/2 PCF", "\\1/2 PCF", "PCF NOTE", "EP NOTE", "PCF EP 1/2",
+        "PCF EP NOTE MORE", "EP PCF 1/2", "TREE PCF 1/2", "PCF", "", "  PCF   1/2  NOTE ",
+        "PCF /NOTE", "PCF \\1/2",
+    ])
+    def test_matches_row_by_row(self, catalog, description):
+        """Test the documented cases against parser3.format_description."""
+        expected = parser3.format_description(description, catalog)
+        assert list(format_descriptions([description], catalog)) == [expected]
+
+    def test_matches_row_by_row_fuzzed(self, catalog):
+        """Test random descriptions, with irregular whitespace, against the row engine."""
+        rng = random.Random(0)
+        descriptions = []
+        for _ in range(5000):
+            description = " ".join(rng.choice(ITEMS) for _ in range(rng.randint(0, 6)))
+            if rng.random() < 0.2:
+                description = " " + description.replace(" ", " \t ") + "  "
+            descriptions.append(description)
+        expected = [parser3.format_description(d, catalog) for d in descriptions]
+        assert list(format_descriptions(descriptions, catalog)) == expected
+
+    def test_categorical_column(self, catalog):
+        """Test that a categorical column is formatted, keeping missing descriptions."""
+        descriptions = pd.Series(["1/2 PCF", None, "PCF NOTE", "1/2 PCF"], dtype="category")
+        assert list(format_descriptions(descriptions, catalog)) == [
+            "PCF \\1/2", None, "PCF /NOTE", "PCF \\1/2"]
+
+    def test_empty_column(self, catalog):
+        """Test that an empty column gives an empty result."""
+        assert len(format_descriptions([], catalog)) == 0
+
+    def test_format_rows_skips_headers_and_short_rows(self, catalog):
+        """Test that only data rows are formatted, as in parser3.format_row."""
+        rows = [["Point", "Northing", "Easting", "Elevation", "Description"],
+                ["1", "1000.0", "2000.0", "100.0", "1/2 PCF"],
+                ["2", "1000.0", "2000.0"]]
+        assert format_rows(rows, catalog) == [
+            ["Point", "Northing", "Easting", "Elevation", "Description"],
+            ["1", "1000.0", "2000.0", "100.0", "PCF \\1/2"],
+            ["2", "1000.0", "2000.0"]]
+
+
+class TestNumpyEngine:
+    """Test cases for parser3.process_file with the numpy engine."""
+
+    def test_output_identical(self, tmp_path, property_corners_data, miscellaneous_data):
+        """Test that both engines write the same file."""
+        input_file = tmp_path / "job.csv"
+        rng = random.Random(1)
+        with open(input_file, 'w', newline='', encoding='utf8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Point", "Northing", "Easting", "Elevation", "Description"])
+            for number in range(1, 500):
+                writer.writerow([number, "1000.0", "2000.0", "100.0",
+                                 " ".join(rng.choice(ITEMS) for _ in range(rng.randint(1, 4)))])
+        outputs = []
+        for engine in parser3.ENGINES:
+            output = parser3.process_file(str(input_file), property_corners_data,
+                                          miscellaneous_data, gui_mode=False, engine=engine)
+            outputs.append(Path(output).read_bytes())
+        assert outputs[0] == outputs[1]
+
+    def test_unknown_engine(self, tmp_path, property_corners_data, miscellaneous_data):
+        """Test that an unknown engine name is rejected."""
+        with pytest.raises(ValueError):
+            parser3.process_file(str(tmp_path / "job.csv"), property_corners_data,
+                                 miscellaneous_data, gui_mode=False, engine="gpu")
@@ -0,0 +1,264 @@
+"""Tests for watcher module."""
+
+import csv
+import gzip
+import io
+import zipfile
+import pytest
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the modules
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import watcher
+
+
+class FakeClock:
+    """Manually advanced clock for debounce tests."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDebouncer:
+    """Test cases for detecting files that are still being written."""
+
+    def test_file_is_ready_after_settle_period(self, tmp_path):
+        """Test that an unchanged file becomes ready once it has settled."""
+        clock = FakeClock()
+        debouncer = watcher.Debouncer(settle_seconds=2.0, clock=clock)
+        point_file = tmp_path / "points.csv"
+        point_file.write_text("1,1000.0,2000.0,100.0,PCF\n")
+
+        debouncer.observe(point_file)
+        assert debouncer.ready() == []
+        clock.now = 2.5
+        assert debouncer.ready() == [(point_file, 0.0)]
+        assert len(debouncer) == 0
+
+    def test_growing_file_restarts_settle_period(self, tmp_path):
+        """Test that a file still being written is held back."""
+        clock = FakeClock()
+        debouncer = watcher.Debouncer(settle_seconds=2.0, clock=clock)
+        point_file = tmp_path / "points.csv"
+        point_file.write_text("1,1000.0,2000.0,100.0,PCF\n")
+        debouncer.observe(point_file)
+
+        clock.now = 1.5
+        with open(point_file, 'a') as f:
+            f.write("2,1001.0,2001.0,101.0,PCF\n")
+        assert debouncer.ready() == []
+        clock.now = 3.0
+        assert debouncer.ready() == []
+        clock.now = 3.6
+        assert debouncer.ready() == [(point_file, 0.0)]
+
+    def test_deleted_file_is_dropped(self, tmp_path):
+        """Test that files removed before settling are forgotten."""
+        debouncer = watcher.Debouncer(settle_seconds=0)
+        point_file = tmp_path / "points.csv"
+        point_file.write_text("x")
+        debouncer.observe(point_file)
+        point_file.unlink()
+        assert debouncer.ready() == []
+        assert len(debouncer) == 0
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="inotify is Linux only")
+class TestInotifySource:
+    """Test cases for inotify change events."""
+
+    def test_queue_overflow_rescans(self, tmp_path, monkeypatch):
+        """Test that every file is reported again when the kernel dropped events."""
+        source = watcher.InotifySource(tmp_path)
+        try:
+            assert source.changed(0) == []
+            for name in ("job1.csv", "job2.csv"):
+                (tmp_path / name).write_text("x")
+            overflow = watcher.INOTIFY_EVENT.pack(-1, watcher.IN_Q_OVERFLOW, 0, 0)
+            monkeypatch.setattr(watcher.os, "read", lambda fd, size: overflow)
+            assert sorted(source.changed(1)) == ["job1.csv", "job2.csv"]
+        finally:
+            source.close()
+
+
+class TestWatchMetrics:
+    """Test cases for watch metrics."""
+
+    def test_snapshot_reports_percentiles(self):
+        """Test latency percentiles and counters."""
+        metrics = watcher.WatchMetrics()
+        for seconds in range(1, 101):
+            metrics.record(True, float(seconds), 0.0, float(seconds) / 2)
+        metrics.record(False, 1.0, 0.0, 1.0)
+        metrics.update_queue(pending=3, settling=1, in_flight=2, blocked=True)
+
+        snapshot = metrics.snapshot()
+        assert snapshot["completed"] == 100
+        assert snapshot["failed"] == 1
+        assert snapshot["latency_seconds"]["max"] == 100.0
+        assert snapshot["latency_seconds"]["p50"] == 50.0
+        assert snapshot["max_pending"] == 3
+        assert snapshot["backpressure_ticks"] == 1
+
+    def test_empty_snapshot(self):
+        """Test percentiles before any file finished."""
+        snapshot = watcher.WatchMetrics().snapshot()
+        assert snapshot["latency_seconds"] == {"p50": None, "p95": None, "max": None}
+
+
+class TestIntakeWatcher:
+    """Test cases for processing files dropped into the intake folder."""
+
+    @pytest.fixture
+    def folders(self, tmp_path):
+        """Create intake and output folders."""
+        intake = tmp_path / "intake"
+        intake.mkdir()
+        return intake, tmp_path / "output"
+
+    @pytest.fixture
+    def make_watcher(self, folders, sample_replacement_dict_file, property_corners_file,
+                     miscellaneous_file):
+        """Build watchers that use threads and no settle period."""
+        created = []
+
+        def factory(**kwargs):
+            options = dict(dictionary_path=sample_replacement_dict_file,
+                           property_corners_path=property_corners_file,
+                           miscellaneous_path=miscellaneous_file,
+                           settle_seconds=0, poll_interval=0, use_processes=False)
+            options.update(kwargs)
+            intake_watcher = watcher.IntakeWatcher(*folders, **options)
+            created.append(intake_watcher)
+            return intake_watcher
+
+        yield factory
+        for intake_watcher in created:
+            intake_watcher.close()
+
+    def drop_file(self, intake, name, sample_csv_data):
+        """Write a point file into the intake folder."""
+        with open(intake / name, 'w', newline='', encoding='utf8') as f:
+            csv.writer(f).writerows(sample_csv_data)
+
+    @pytest.mark.parametrize("use_inotify", [False, None])
+    def test_files_are_processed_and_moved(self, folders, make_watcher, sample_csv_data,
+                                           use_inotify):
+        """Test that dropped files end up processed in the output folder."""
+        intake, output = folders
+        intake_watcher = make_watcher(use_inotify=use_inotify)
+        self.drop_file(intake, "job1.csv", sample_csv_data)
+
+        intake_watcher.step(timeout=0)
+        intake_watcher.step(timeout=0)
+        intake_watcher.drain()
+
+        assert sorted(p.name for p in output.iterdir()) == [
+            "job1.csv", "job1_processed.csv", "preprocessed_job1.csv"]
+        assert not (intake / "job1.csv").exists()
+        assert intake_watcher.metrics.snapshot()["completed"] == 1
+
+    def test_compressed_files(self, folders, make_watcher, sample_csv_data):
+        """Test that the watcher takes the same compressed inputs as a batch run."""
+        intake, output = folders
+        intake_watcher = make_watcher(use_inotify=False)
+        text = io.StringIO(newline='')
+        csv.writer(text).writerows(sample_csv_data)
+        with gzip.open(intake / "job1.csv.gz", 'wt', newline='', encoding='utf8') as f:
+            f.write(text.getvalue())
+        with zipfile.ZipFile(intake / "crew.zip", 'w') as archive:
+            archive.writestr("day1/job2.csv", text.getvalue())
+        assert watcher.is_intake_file(intake / "crew.zip")
+        assert not watcher.is_intake_file(intake / "~job1.csv")
+
+        intake_watcher.step(timeout=0)
+        intake_watcher.drain()
+
+        assert sorted(p.name for p in output.iterdir()) == [
+            "crew.zip", "crew_processed.zip", "job1.csv.gz", "job1_processed.csv.gz",
+            "preprocessed_crew.zip", "preprocessed_job1.csv.gz"]
+        with zipfile.ZipFile(output / "crew_processed.zip") as archive:
+            assert archive.namelist() == ["day1/job2_processed.csv"]
+
+    def test_same_name_does_not_overwrite(self, folders, make_watcher, sample_csv_data):
+        """Test that a file dropped again under the same name gets numbered results."""
+        intake, output = folders
+        intake_watcher = make_watcher(use_inotify=False)
+        for _ in range(2):
+            self.drop_file(intake, "job1.csv", sample_csv_data)
+            intake_watcher.step(timeout=0)
+            intake_watcher.drain()
+
+        assert sorted(p.name for p in output.iterdir()) == [
+            "job1.csv", "job1_2.csv", "job1_2_processed.csv", "job1_processed.csv",
+            "preprocessed_job1.csv", "preprocessed_job1_2.csv"]
+        assert intake_watcher.metrics.snapshot()["completed"] == 2
+
+    def test_result_paths(self, tmp_path):
+        """Test that compressed inputs are numbered before their extensions."""
+        (tmp_path / "job1_processed.csv.gz").write_text("x")
+        assert [path.name for path in watcher.result_paths(tmp_path, "job1.csv.gz")] == [
+            "job1_2_processed.csv.gz", "preprocessed_job1_2.csv.gz", "job1_2.csv.gz"]
+
+    def test_non_point_files_are_ignored(self, folders, make_watcher):
+        """Test that notes and earlier outputs are left in the intake."""
+        intake, _ = folders
+        intake_watcher = make_watcher(use_inotify=False)
+        (intake / "notes.docx").write_text("x")
+        (intake / "job1_processed.csv").write_text("x")
+
+        intake_watcher.step(timeout=0)
+        intake_watcher.drain()
+
+        assert (intake / "notes.docx").exists()
+        assert intake_watcher.metrics.snapshot()["completed"] == 0
+
+    def test_backpressure_holds_files_in_intake(self, folders, make_watcher, sample_csv_data):
+        """Test that files beyond the pool capacity wait in the intake."""
+        intake, output = folders
+        intake_watcher = make_watcher(use_inotify=False, workers=1, max_queued=0)
+        for index in range(3):
+            self.drop_file(intake, f"job{index}.csv", sample_csv_data)
+
+        intake_watcher.step(timeout=0)
+        snapshot = intake_watcher.metrics.snapshot()
+        assert snapshot["in_flight"] + snapshot["completed"] == 1
+        assert snapshot["backpressure_ticks"] >= 1
+        assert len(list(intake.glob("*.csv"))) >= 2
+
+        for _ in range(10):
+            intake_watcher.drain()
+            intake_watcher.step(timeout=0)
+        intake_watcher.drain()
+        assert intake_watcher.metrics.snapshot()["completed"] == 3
+        assert len(list(output.glob("*_processed.csv"))) == 3
+
+    def test_failed_files_are_moved_aside(self, folders, make_watcher):
+        """Test that a file that cannot be processed goes to the failed folder."""
+        intake, _ = folders
+        intake_watcher = make_watcher(use_inotify=False)
+        (intake / "broken.csv").write_text("Point,Northing\n1,1000.0\n")
+
+        intake_watcher.step(timeout=0)
+        intake_watcher.drain()
+
+        assert (intake / watcher.FAILED_DIR_NAME / "broken.csv").exists()
+        assert intake_watcher.metrics.snapshot()["failed"] == 1
+
+    def test_interrupted_files_are_requeued(self, folders, make_watcher, sample_csv_data):
+        """Test that files left mid-processing by a crash are picked up again."""
+        intake, output = folders
+        processing = intake / watcher.PROCESSING_DIR_NAME
+        processing.mkdir()
+        self.drop_file(processing, "job1.csv", sample_csv_data)
+
+        intake_watcher = make_watcher(use_inotify=False)
+        intake_watcher.step(timeout=0)
+        intake_watcher.drain()
+
+        assert (output / "job1_processed.csv").exists()
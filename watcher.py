@@ -0,0 +1,563 @@
+"""
+watcher.py
+
+Watches an intake folder and runs both processing stages on point files as soon as crews
+drop them in.
+
+New files are noticed through inotify where the platform has it and by polling the folder
+otherwise. A file is only picked up once its size and modification time have stopped
+changing for a settle period, so files that are still being copied are left alone. Ready
+files are moved into a ".processing" folder inside the intake, processed by a bounded
+worker pool and then moved, together with their outputs, to the output folder. Files that
+fail are moved to a "failed" folder inside the intake.
+
+Usage:
+    python watcher.py N:/intake N:/processed --workers 4 --metrics-file watch_metrics.json
+"""
+# Standard library imports
+import argparse
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import shutil
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+# Local imports
+import parser3
+from batch import (DEFAULT_MISCELLANEOUS_PATH, DEFAULT_PROPERTY_CORNERS_PATH,
+                   is_generated_file, is_point_file, process_zip)
+from compressed import is_gzip, is_zip, strip_gzip, with_compression
+from description_parser import DescriptionParser
+
+logger = logging.getLogger(__name__)
+
+PROCESSING_DIR_NAME = '.processing'
+FAILED_DIR_NAME = 'failed'
+LATENCY_WINDOW = 1000
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def is_intake_file(path: Path) -> bool:
+    """
+    Return True for files the watcher should process.
+
+    These are the point files batch processes, .gz files and zip archives included,
+    other than hidden and temporary files.
+    """
+    return (not path.name.startswith(('.', '~'))
+            and is_point_file(path)
+            and not is_generated_file(path))
+
+
+class PollingSource:
+    """Reports every file in a folder on each call; used where inotify is unavailable."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def changed(self, timeout: float) -> list:
+        """Wait for the poll interval and return the names of all files in the folder."""
+        time.sleep(timeout)
+        with os.scandir(self.directory) as entries:
+            return [entry.name for entry in entries if entry.is_file()]
+
+    def close(self):
+        """Nothing to release for polling."""
+
+
+class InotifySource:
+    """
+    Reports the names of files that were created, written or moved into a folder.
+
+    If the kernel's event queue overflows, say during a burst of drops, the events that
+    did not fit are lost, so every file in the folder is reported instead.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, f"inotify_add_watch failed for {directory}")
+        self._first_call = True
+
+    def _scan(self) -> list:
+        """Return the names of all files in the folder."""
+        with os.scandir(self.directory) as entries:
+            return [entry.name for entry in entries if entry.is_file()]
+
+    def changed(self, timeout: float) -> list:
+        """Wait up to timeout for events and return the names of the files they concern."""
+        if self._first_call:
+            # Pick up files that were already waiting before the watch started
+            self._first_call = False
+            return self._scan()
+
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed; rescanning %s", self.directory)
+                return self._scan()
+            name = data[offset:offset + name_length].rstrip(b'\0')
+            offset += name_length
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self):
+        """Close the inotify file descriptor."""
+        os.close(self._fd)
+
+
+def open_source(directory: Path, use_inotify: bool = None):
+    """
+    Create the change source for a folder.
+
+    Args:
+        directory (Path): Folder to watch
+        use_inotify (bool): Force inotify on or off; None uses it when available
+
+    Returns:
+        InotifySource or PollingSource: The change source
+    """
+    if use_inotify is not False and sys.platform.startswith('linux'):
+        try:
+            return InotifySource(directory)
+        except (OSError, AttributeError) as e:
+            if use_inotify:
+                raise
+            logger.warning("inotify unavailable (%s); falling back to polling", e)
+    return PollingSource(directory)
+
+
+class Debouncer:
+    """Tracks candidate files until their size and modification time stop changing."""
+
+    def __init__(self, settle_seconds: float, clock=time.monotonic):
+        self.settle_seconds = settle_seconds
+        self.clock = clock
+        self._candidates = {}
+
+    @staticmethod
+    def _signature(path: Path):
+        """Return the size and modification time of a file, or None if it is gone."""
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def observe(self, path: Path):
+        """Note that a file may have changed."""
+        if path not in self._candidates:
+            now = self.clock()
+            self._candidates[path] = (self._signature(path), now, now)
+
+    def ready(self) -> list:
+        """
+        Return files that have not changed for the settle period.
+
+        Returns:
+            list: (path, first_seen) pairs for files that are ready, in the order they
+            were first seen
+        """
+        now = self.clock()
+        ready = []
+        for path, (signature, changed_at, first_seen) in list(self._candidates.items()):
+            current = self._signature(path)
+            if current is None:
+                del self._candidates[path]
+            elif current != signature:
+                self._candidates[path] = (current, now, first_seen)
+            elif now - changed_at >= self.settle_seconds:
+                del self._candidates[path]
+                ready.append((path, first_seen))
+        return sorted(ready, key=lambda item: item[1])
+
+    def __len__(self):
+        return len(self._candidates)
+
+
+class WatchMetrics:
+    """Thread-safe counters and latency figures for sizing the processing machine."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.pending = 0
+        self.settling = 0
+        self.max_pending = 0
+        self.backpressure_ticks = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._queue_waits = deque(maxlen=LATENCY_WINDOW)
+        self._processing_times = deque(maxlen=LATENCY_WINDOW)
+
+    def update_queue(self, pending: int, settling: int, in_flight: int, blocked: bool):
+        """Record the current queue state after a scheduling pass."""
+        with self._lock:
+            self.pending = pending
+            self.settling = settling
+            self.in_flight = in_flight
+            self.max_pending = max(self.max_pending, pending)
+            if blocked:
+                self.backpressure_ticks += 1
+
+    def record(self, succeeded: bool, latency: float, queue_wait: float, processing: float):
+        """Record a finished file."""
+        with self._lock:
+            if succeeded:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._latencies.append(latency)
+            self._queue_waits.append(queue_wait)
+            self._processing_times.append(processing)
+
+    @staticmethod
+    def _percentiles(values) -> dict:
+        """Return p50, p95 and max of a collection of seconds."""
+        if not values:
+            return {"p50": None, "p95": None, "max": None}
+        ordered = sorted(values)
+        last = len(ordered) - 1
+        return {
+            "p50": ordered[round(0.50 * last)],
+            "p95": ordered[round(0.95 * last)],
+            "max": ordered[last],
+        }
+
+    def snapshot(self) -> dict:
+        """Return the current metrics as a plain dictionary."""
+        with self._lock:
+            return {
+                "completed": self.completed,
+                "failed": self.failed,
+                "in_flight": self.in_flight,
+                "pending": self.pending,
+                "settling": self.settling,
+                "max_pending": self.max_pending,
+                "backpressure_ticks": self.backpressure_ticks,
+                "latency_seconds": self._percentiles(self._latencies),
+                "queue_wait_seconds": self._percentiles(self._queue_waits),
+                "processing_seconds": self._percentiles(self._processing_times),
+            }
+
+
+# Worker state, loaded once per worker by _init_worker
+_worker_config = {}
+
+
+def _init_worker(dictionary_path, property_corners_path, miscellaneous_path):
+    """Load the dictionary and code lists once for each worker."""
+    property_codes, misc_codes = parser3.load_code_lists(property_corners_path,
+                                                         miscellaneous_path)
+    if not property_codes or not misc_codes:
+        raise ValueError("Failed to load configuration files")
+    _worker_config["description_parser"] = DescriptionParser(dictionary_path=dictionary_path,
+                                                             gui_mode=False)
+    _worker_config["codes"] = (property_codes, misc_codes)
+    _worker_config["catalog"] = parser3.CodeCatalog(property_codes, misc_codes)
+
+
+def result_paths(output_dir: Path, input_name: str) -> list:
+    """
+    Return where the processed output, preprocessed output and input of a file are moved.
+
+    If output_dir already holds results under those names, say because a crew dropped
+    job.csv twice in one day, the input name gets a number instead: job_2.csv,
+    preprocessed_job_2.csv and job_2_processed.csv.
+
+    Args:
+        output_dir (Path): Folder that receives the results
+        input_name (str): File name of the input
+
+    Returns:
+        list: The three destination paths, none of which exists yet
+    """
+    base = Path(strip_gzip(input_name))
+    number = 1
+    while True:
+        name = input_name if number == 1 else with_compression(
+            f"{base.stem}_{number}{base.suffix}", is_gzip(input_name))
+        preprocessed = f"preprocessed_{name}"
+        paths = [output_dir / parser3.processed_output_path(preprocessed),
+                 output_dir / preprocessed, output_dir / name]
+        if not any(path.exists() for path in paths):
+            return paths
+        number += 1
+
+
+def process_intake_file(input_file: str, output_dir: str) -> tuple[list, float]:
+    """
+    Run both stages on a claimed file and move the input and outputs to output_dir.
+
+    Earlier results in output_dir are never overwritten; see result_paths.
+
+    Args:
+        input_file (str): Path to the file inside the processing folder
+        output_dir (str): Folder that receives the results
+
+    Returns:
+        tuple: (paths of the moved files, processing time in seconds)
+    """
+    started = time.perf_counter()
+    property_codes, misc_codes = _worker_config["codes"]
+    description_parser = _worker_config["description_parser"]
+    if is_zip(input_file):
+        processed = process_zip(input_file, description_parser, _worker_config["catalog"])
+        preprocessed = Path(input_file).parent / f"preprocessed_{Path(input_file).name}"
+    else:
+        preprocessed = description_parser.process_file(input_file)
+        processed = parser3.process_file(str(preprocessed), property_codes, misc_codes,
+                                         gui_mode=False)
+    destinations = result_paths(Path(output_dir), Path(input_file).name)
+    if destinations[2].name != Path(input_file).name:
+        logger.warning("%s already has results for %s; moving these in as %s", output_dir,
+                       Path(input_file).name, destinations[2].name)
+    moved = []
+    for path, destination in zip((processed, preprocessed, input_file), destinations):
+        os.replace(path, destination)
+        moved.append(str(destination))
+    return moved, time.perf_counter() - started
+
+
+class IntakeWatcher:
+    """Feeds ready point files from an intake folder to a bounded worker pool."""
+
+    def __init__(self, intake_dir, output_dir, dictionary_path: str = None,
+                 property_corners_path: str = DEFAULT_PROPERTY_CORNERS_PATH,
+                 miscellaneous_path: str = DEFAULT_MISCELLANEOUS_PATH,
+                 workers: int = 2, max_queued: int = 4, settle_seconds: float = 2.0,
+                 poll_interval: float = 1.0, use_inotify: bool = None,
+                 use_processes: bool = True):
+        """
+        Set up the folders and the change source.
+
+        Args:
+            intake_dir (str): Folder crews drop point files into
+            output_dir (str): Folder that receives inputs and outputs once processed
+            dictionary_path (str): Path to the replacement dictionary (optional)
+            property_corners_path (str): Path to the property corners file
+            miscellaneous_path (str): Path to the miscellaneous codes file
+            workers (int): Number of files processed at the same time
+            max_queued (int): Files submitted beyond the busy workers before holding back
+            settle_seconds (float): How long a file must stay unchanged before processing
+            poll_interval (float): Seconds between scans or event waits
+            use_inotify (bool): Force inotify on or off; None uses it when available
+            use_processes (bool): Use worker processes rather than threads
+        """
+        self.intake_dir = Path(intake_dir)
+        self.output_dir = Path(output_dir)
+        self.processing_dir = self.intake_dir / PROCESSING_DIR_NAME
+        self.failed_dir = self.intake_dir / FAILED_DIR_NAME
+        for directory in (self.output_dir, self.processing_dir, self.failed_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        self.capacity = workers + max_queued
+        self.poll_interval = poll_interval
+        self.debouncer = Debouncer(settle_seconds)
+        self.metrics = WatchMetrics()
+        self.source = open_source(self.intake_dir, use_inotify)
+        self._pending = deque()
+        self._pending_paths = set()
+        self._in_flight = {}
+        self._requeue_interrupted()
+
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self.executor = executor_class(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(dictionary_path, property_corners_path, miscellaneous_path))
+
+    def _requeue_interrupted(self):
+        """Move files left in the processing folder by an earlier run back to the intake."""
+        for leftover in self.processing_dir.iterdir():
+            if leftover.is_file() and is_intake_file(leftover):
+                logger.info("Requeueing interrupted file %s", leftover.name)
+                os.replace(leftover, self.intake_dir / leftover.name)
+            elif leftover.is_file():
+                leftover.unlink()
+
+    def _claim(self, path: Path):
+        """Move a ready file into the processing folder so nothing else picks it up."""
+        claimed = self.processing_dir / path.name
+        try:
+            os.replace(path, claimed)
+        except OSError as e:
+            logger.warning("Could not claim %s, will retry: %s", path, e)
+            return None
+        return claimed
+
+    def _collect(self, timeout: float = 0):
+        """Record files whose processing has finished."""
+        if not self._in_flight:
+            return
+        done, _ = wait(list(self._in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            claimed, first_seen, submitted = self._in_flight.pop(future)
+            finished = time.monotonic()
+            try:
+                moved, processing = future.result()
+                logger.info("Processed %s -> %s", claimed.name, moved[0])
+                succeeded = True
+            except Exception as e:
+                logger.error("Failed to process %s: %s", claimed.name, e)
+                if claimed.exists():
+                    shutil.move(str(claimed), str(self.failed_dir / claimed.name))
+                processing = finished - submitted
+                succeeded = False
+            self.metrics.record(succeeded, finished - first_seen, submitted - first_seen,
+                                processing)
+
+    def step(self, timeout: float = None):
+        """
+        Run one pass: take in change events, schedule ready files and collect results.
+
+        Args:
+            timeout (float): Seconds to wait for changes (default: the poll interval)
+        """
+        timeout = self.poll_interval if timeout is None else timeout
+        for name in self.source.changed(timeout):
+            path = self.intake_dir / name
+            if is_intake_file(path) and path not in self._pending_paths:
+                self.debouncer.observe(path)
+        for path, first_seen in self.debouncer.ready():
+            self._pending.append((path, first_seen))
+            self._pending_paths.add(path)
+        self._collect()
+
+        while self._pending and len(self._in_flight) < self.capacity:
+            path, first_seen = self._pending.popleft()
+            self._pending_paths.discard(path)
+            claimed = self._claim(path)
+            if claimed is None:
+                self.debouncer.observe(path)
+                continue
+            future = self.executor.submit(process_intake_file, str(claimed),
+                                          str(self.output_dir))
+            self._in_flight[future] = (claimed, first_seen, time.monotonic())
+
+        self.metrics.update_queue(len(self._pending), len(self.debouncer),
+                                  len(self._in_flight), blocked=bool(self._pending))
+
+    def drain(self):
+        """Wait for every submitted file to finish."""
+        while self._in_flight:
+            self._collect(timeout=None)
+        self.metrics.update_queue(len(self._pending), len(self.debouncer), 0, blocked=False)
+
+    def run(self, stop_event: threading.Event = None, metrics_file: str = None,
+            metrics_interval: float = 30.0):
+        """
+        Watch the intake folder until stop_event is set.
+
+        Args:
+            stop_event (threading.Event): Event that ends the watch (optional)
+            metrics_file (str): Path to write a JSON metrics snapshot to (optional)
+            metrics_interval (float): Seconds between metrics reports
+        """
+        stop_event = stop_event or threading.Event()
+        logger.info("Watching %s with %s", self.intake_dir, type(self.source).__name__)
+        last_report = time.monotonic()
+        try:
+            while not stop_event.is_set():
+                self.step()
+                if time.monotonic() - last_report >= metrics_interval:
+                    self.report(metrics_file)
+                    last_report = time.monotonic()
+            self.drain()
+        finally:
+            self.report(metrics_file)
+            self.close()
+
+    def report(self, metrics_file: str = None):
+        """Log the current metrics and optionally write them to a JSON file."""
+        snapshot = self.metrics.snapshot()
+        logger.info("Watch metrics: %s", snapshot)
+        if metrics_file:
+            with open(metrics_file, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, indent=2)
+        return snapshot
+
+    def close(self):
+        """Shut down the worker pool and release the change source."""
+        self.executor.shutdown(wait=True)
+        self.source.close()
+
+
+def main(argv=None):
+    """Command line entry point for watch mode."""
+    arg_parser = argparse.ArgumentParser(
+        description="Process point files as they arrive in an intake folder")
+    arg_parser.add_argument("intake", help="Folder crews drop point files into")
+    arg_parser.add_argument("output", help="Folder that receives processed files")
+    arg_parser.add_argument("--dictionary", help="Path to the replacement dictionary")
+    arg_parser.add_argument("--property-corners", default=DEFAULT_PROPERTY_CORNERS_PATH,
+                            help="Path to the property corners file")
+    arg_parser.add_argument("--miscellaneous", default=DEFAULT_MISCELLANEOUS_PATH,
+                            help="Path to the miscellaneous codes file")
+    arg_parser.add_argument("--workers", type=int, default=2,
+                            help="Number of files processed at the same time")
+    arg_parser.add_argument("--max-queued", type=int, default=4,
+                            help="Files queued beyond the busy workers")
+    arg_parser.add_argument("--settle", type=float, default=2.0,
+                            help="Seconds a file must stay unchanged before processing")
+    arg_parser.add_argument("--poll-interval", type=float, default=1.0,
+                            help="Seconds between folder scans")
+    arg_parser.add_argument("--no-inotify", action="store_true",
+                            help="Always poll the intake folder")
+    arg_parser.add_argument("--metrics-file", help="Write a JSON metrics snapshot here")
+    arg_parser.add_argument("--metrics-interval", type=float, default=30.0,
+                            help="Seconds between metrics reports")
+    args = arg_parser.parse_args(argv)
+
+    watcher = IntakeWatcher(args.intake, args.output, dictionary_path=args.dictionary,
+                            property_corners_path=args.property_corners,
+                            miscellaneous_path=args.miscellaneous,
+                            workers=args.workers, max_queued=args.max_queued,
+                            settle_seconds=args.settle, poll_interval=args.poll_interval,
+                            use_inotify=False if args.no_inotify else None)
+    stop_event = threading.Event()
+    try:
+        watcher.run(stop_event, metrics_file=args.metrics_file,
+                    metrics_interval=args.metrics_interval)
+    except KeyboardInterrupt:
+        logger.info("Stopping watch")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())